@@ -104,10 +104,9 @@ def resample_and_scale_image(font_config, original_image):
     elif font_config['raster_type'] == 'palette':
         palette_fileame = f"colors/{font_config['palette']}.gpl"
         palette_filepath = os.path.join(os.path.dirname(__file__), palette_fileame)
-        temp_img_filepath = os.path.join(os.path.dirname(__file__), 'temp.png')
-        font_image.convert('RGB').save(temp_img_filepath)
-        au.convert_to_palette(temp_img_filepath, temp_img_filepath, palette_filepath, 'RGB')
-        font_image = Image.open(temp_img_filepath).convert('RGBA')
+        font_image = font_image.convert('RGB').convert('RGBA')
+        converted = au.convert_rgba_buffer(font_image.tobytes(), font_image.width, font_image.height, palette_filepath, 'RGB')
+        font_image = Image.frombytes('RGBA', font_image.size, converted)
 
     return font_config, font_image
 
@@ -710,16 +709,12 @@ def write_rgba2_font(font_config, font_image, tgt_font_filepath):
     char_images = get_chars_from_image(font_config, font_image)
 
     # Convert each image into an RGBA2 image
-    temp_png_filepath = os.path.join(os.path.dirname(__file__), 'temp.png')
-    temp_rgba2_filepath = os.path.join(os.path.dirname(__file__), 'temp.rgba2')
     for ascii_code in range(ascii_start, ascii_end + 1):
         char_image = char_images.get(ascii_code)
         if char_image:
             # Convert the image to RGBA2 format
-            char_image.save(temp_png_filepath)
-            au.img_to_rgba2(temp_png_filepath, temp_rgba2_filepath)
-            with open(temp_rgba2_filepath, 'rb') as f:
-                rgba2_image = f.read()
+            char_image = char_image.convert('RGBA')
+            rgba2_image = au.pack_rgba2(char_image.tobytes())
             # Update the processed image in the dictionary
             char_images[ascii_code] = rgba2_image
 
@@ -738,12 +733,6 @@ def write_rgba2_font(font_config, font_image, tgt_font_filepath):
     with open(tgt_font_filepath, 'wb') as f:
         f.write(font_data)
 
-    # Clean up temporary files
-    if os.path.exists(temp_png_filepath):
-        os.remove(temp_png_filepath)
-    if os.path.exists(temp_rgba2_filepath):
-        os.remove(temp_rgba2_filepath)
-
 if __name__ == '__main__':
     font_source_dir = 'tgt'
     font_filename = 'Arial Black_Regular_12x12.xml'
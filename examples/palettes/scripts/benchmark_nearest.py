@@ -0,0 +1,30 @@
+import agonutils as au
+import random
+import time
+
+# Measures nearest-color search speed in pixels/second.
+# Every pixel of the test image is a distinct random color and each run uses a freshly
+# loaded palette, so the RGB inverse colormap starts empty and every pixel is a real search.
+
+def random_rgba_image(width, height, seed=1234):
+    rng = random.Random(seed)
+    data = bytearray(rng.randbytes(width * height * 4))
+    data[3::4] = b'\xff' * (width * height)  # Fully opaque
+    return bytes(data)
+
+if __name__ == '__main__':
+    palettes_dir = 'examples/palettes'
+    width, height = 512, 384
+    runs = 5
+    image_data = random_rgba_image(width, height)
+
+    for palette_name in ('Agon16', 'Agon64'):
+        palette_filepath = f'{palettes_dir}/{palette_name}.gpl'
+        for method in ('RGB', 'HSV'):
+            best = float('inf')
+            for _ in range(runs):
+                palette = au.Palette(palette_filepath)
+                start_time = time.perf_counter()
+                au.convert_rgba_buffer(image_data, width, height, palette, method)
+                best = min(best, time.perf_counter() - start_time)
+            print(f'{palette_name} {method}: {width * height / best / 1e6:.2f} Mpixels/s')
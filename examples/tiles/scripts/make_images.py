@@ -30,41 +30,35 @@ def convert_to_png(originals_dir):
                 os.remove(input_image_path)
 
 
-def convert_to_palette(originals_dir, output_dir_processed, palette_filepath, palete_conversion_method, transparent_rgb):
+def convert_images(originals_dir, output_dir_processed, output_dir_rgba, palette_filepath, palete_conversion_method, transparent_rgb):
     """
-    Convert .png files to the Agon palette and save them in the processed directory.
+    Convert .png files to the Agon palette, saving the palette .png in the processed directory
+    and the .rgba2 in the rgba directory. Each subdirectory is converted as one batch.
     """
+    palette = au.Palette(palette_filepath)
     for root, _, files in os.walk(originals_dir):
-        for file in files:
+        input_image_paths = []
+        for file in sorted(files):
             if file.endswith('.png'):
                 input_image_path = os.path.join(root, file)
-                output_image_path = os.path.join(output_dir_processed, os.path.relpath(input_image_path, originals_dir))
-                os.makedirs(os.path.dirname(output_image_path), exist_ok=True)
-
                 with Image.open(input_image_path) as img:
                     if "icc_profile" in img.info:
                         img.info.pop("icc_profile")
                     img.save(input_image_path, 'PNG')  # Ensure PNG is valid for processing
-                au.convert_to_palette(
-                    input_image_path, output_image_path, palette_filepath, palete_conversion_method, transparent_rgb
-                )
+                input_image_paths.append(input_image_path)
+        if not input_image_paths:
+            continue
 
+        rel_dir = os.path.relpath(root, originals_dir)
+        processed_dir = os.path.join(output_dir_processed, rel_dir)
+        rgba_dir = os.path.join(output_dir_rgba, rel_dir)
+        os.makedirs(processed_dir, exist_ok=True)
+        os.makedirs(rgba_dir, exist_ok=True)
 
-def convert_to_rgba(output_dir_processed, output_dir_rgba, image_type):
-    """
-    Convert palette-converted .png files to .rgba2 or .rgba8 format.
-    """
-    for root, _, files in os.walk(output_dir_processed):
-        for file in files:
-            if file.endswith('.png'):
-                input_image_path = os.path.join(root, file)
-                output_image_path = os.path.join(output_dir_rgba, os.path.relpath(input_image_path, output_dir_processed))
-                os.makedirs(os.path.dirname(output_image_path), exist_ok=True)
-
-                if image_type == 1:
-                    au.img_to_rgba2(input_image_path, output_image_path)
-                else:
-                    au.img_to_rgba8(input_image_path, output_image_path)
+        start_time = time.perf_counter()
+        au.batch_convert(input_image_paths, {'png': processed_dir, 'rgba2': rgba_dir},
+                         palette, palete_conversion_method, transparent_color=transparent_rgb)
+        print(f'{rel_dir}: converted {len(input_image_paths)} images in {time.perf_counter() - start_time} seconds')
 
 
 def write_assembly_files(output_dir_rgba, asm_base_dir):
@@ -216,11 +210,8 @@ if __name__ == '__main__':
     # Convert non-PNG files to PNG
     convert_to_png(originals_dir)
 
-    # Convert original PNGs to Agon palette
-    convert_to_palette(originals_dir, output_dir_processed, palette_filepath, palete_conversion_method, transparent_rgb)
-
-    # Convert palette PNGs to RGBA format
-    convert_to_rgba(output_dir_processed, output_dir_rgba, image_type)
+    # Convert original PNGs to Agon palette PNGs and RGBA2222 files
+    convert_images(originals_dir, output_dir_processed, output_dir_rgba, palette_filepath, palete_conversion_method, transparent_rgb)
 
     # Write assembly files
     write_assembly_files(output_dir_rgba, asm_base_dir)
@@ -13,7 +13,7 @@ def get_pkg_config_flags(packages):
         return [], []
 
 # List of required libraries
-ffmpeg_packages = ["libavformat", "libavcodec", "libswscale", "libavutil", "libpng"]
+ffmpeg_packages = ["libavformat", "libavcodec", "libswscale", "libswresample", "libavutil", "libpng"]
 
 # Get flags from pkg-config
 cflags, libs = get_pkg_config_flags(ffmpeg_packages)
@@ -29,8 +29,8 @@ elif sys.platform == "linux":
 
 module = Extension(
     'agonutils',
-    sources=['src/agonutils.c', 'src/images.c', 'src/agm.c', 'src/rle.c', 'src/simz.c'],
-    libraries=['avformat', 'avcodec', 'swscale', 'avutil', 'png16'],
+    sources=['src/agonutils.c', 'src/images.c', 'src/palette.c', 'src/parallel.c', 'src/stream.c', 'src/agm.c', 'src/agmaudio.c', 'src/agmfile.c', 'src/rle.c', 'src/simz.c', 'src/szip.c'],
+    libraries=['avformat', 'avcodec', 'swscale', 'swresample', 'avutil', 'png16'],
     library_dirs=library_dirs,
     include_dirs=['src'],  # Keeping 'src' in include_dirs
     extra_compile_args=cflags,
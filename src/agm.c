@@ -1,4 +1,13 @@
 #include "agm.h"
+#include "agmaudio.h"
+#include "palette.h"
+#include "parallel.h"
+#include <libavcodec/avcodec.h>
+#include <libavformat/avformat.h>
+#include <libswscale/swscale.h>
+#include <libavutil/imgutils.h>
+#include <pthread.h>
+#include <string.h>
 
 // Helper: Reuse dithering with lookback.
 // Processes 'size' pixels.
@@ -25,6 +34,15 @@ void dither_lookback(
     }
 }
 
+// Helper: Count changed pixels.
+int count_changed(const uint8_t *oldFrame, const uint8_t *newFrame, int size) {
+    int changed = 0;
+    for (int i = 0; i < size; i++) {
+        changed += oldFrame[i] != newFrame[i];
+    }
+    return changed;
+}
+
 // Helper: Compute frame difference.
 // For each pixel, diff = 0 if oldFinal == newFinal, else diff = newFinal.
 void compute_difference(const uint8_t *oldFinal, const uint8_t *newFinal, int size, uint8_t *diff_out) {
@@ -33,113 +51,1471 @@ void compute_difference(const uint8_t *oldFinal, const uint8_t *newFinal, int si
     }
 }
 
-int _process_mp4(const char *input_file, const char *output_file, int output_width, int output_height, const char *palette_file, const char *noDither_method, const char *dither_method, int lookback, bool has_transparent_color, const uint8_t transparent_rgb[3]) {
-    AVFormatContext *format_ctx = avformat_alloc_context();
-    avformat_open_input(&format_ctx, input_file, NULL, NULL);
-    avformat_find_stream_info(format_ctx, NULL);
+// The video being encoded: demuxer, decoder and scaler.
+// Scaling produces RGBA at the output size in one sws_scale pass, from the cropped source region.
+typedef struct {
+    AVFormatContext *format_ctx;
+    AVCodecContext *codec_ctx;
+    struct SwsContext *sws_ctx;
+    int stream_index;
+    AVFrame *decoded;
+    AVPacket *packet;
+    int crop_x, crop_y, crop_w, crop_h;  // Source region that is scaled to the output size
+    int output_width, output_height;
+    int scale_flags;
+} _agm_source;
 
-    unsigned video_stream_index = 0;
-    for (unsigned i = 0; i < format_ctx->nb_streams; i++) {
-        if (format_ctx->streams[i]->codecpar->codec_type == AVMEDIA_TYPE_VIDEO) {
-            video_stream_index = i;
-            break;
+static void _agm_source_close(_agm_source *source) {
+    av_packet_free(&source->packet);
+    av_frame_free(&source->decoded);
+    sws_freeContext(source->sws_ctx);
+    source->sws_ctx = NULL;
+    avcodec_free_context(&source->codec_ctx);
+    avformat_close_input(&source->format_ctx);
+}
+
+// Work out the source region to scale: the whole frame, the largest centered region with the
+// output's aspect ratio, or an explicit rectangle. Returns false if the rectangle doesn't fit.
+static bool _agm_source_resolve_crop(_agm_source *source, const AgmOptions *options) {
+    int src_w = source->codec_ctx->width, src_h = source->codec_ctx->height;
+    source->crop_x = source->crop_y = 0;
+    source->crop_w = src_w;
+    source->crop_h = src_h;
+    if (options->crop_mode == AGM_CROP_CENTER) {
+        if ((long long)src_w * options->height > (long long)src_h * options->width) {
+            source->crop_w = (int)((long long)src_h * options->width / options->height);
+            source->crop_x = (src_w - source->crop_w) / 2;
+        } else {
+            source->crop_h = (int)((long long)src_w * options->height / options->width);
+            source->crop_y = (src_h - source->crop_h) / 2;
+        }
+    } else if (options->crop_mode == AGM_CROP_RECT) {
+        if (options->crop_x < 0 || options->crop_y < 0 || options->crop_w <= 0 || options->crop_h <= 0
+            || options->crop_x + options->crop_w > src_w || options->crop_y + options->crop_h > src_h) {
+            return false;
         }
+        source->crop_x = options->crop_x;
+        source->crop_y = options->crop_y;
+        source->crop_w = options->crop_w;
+        source->crop_h = options->crop_h;
     }
+    return source->crop_w > 0 && source->crop_h > 0;
+}
 
-    AVCodecParameters *codec_params = format_ctx->streams[video_stream_index]->codecpar;
+// Open input_file's best video stream with the decoder threading and scaler options asked for
+static int _agm_source_open(_agm_source *source, const char *input_file, const AgmOptions *options) {
+    memset(source, 0, sizeof(_agm_source));
+    source->output_width = options->width;
+    source->output_height = options->height;
+    source->scale_flags = options->scale_flags;
+    if (avformat_open_input(&source->format_ctx, input_file, NULL, NULL) < 0) {
+        return AGM_OPEN_FAILED;
+    }
+    source->stream_index = -1;
+    if (avformat_find_stream_info(source->format_ctx, NULL) >= 0) {
+        source->stream_index = av_find_best_stream(source->format_ctx, AVMEDIA_TYPE_VIDEO, -1, -1, NULL, 0);
+    }
+    if (source->stream_index < 0) {
+        _agm_source_close(source);
+        return AGM_OPEN_FAILED;
+    }
+
+    AVCodecParameters *codec_params = source->format_ctx->streams[source->stream_index]->codecpar;
     const AVCodec *codec = avcodec_find_decoder(codec_params->codec_id);
-    AVCodecContext *codec_ctx = avcodec_alloc_context3(codec);
-    avcodec_parameters_to_context(codec_ctx, codec_params);
-    avcodec_open2(codec_ctx, codec, NULL);
+    source->codec_ctx = codec ? avcodec_alloc_context3(codec) : NULL;
+    if (!source->codec_ctx || avcodec_parameters_to_context(source->codec_ctx, codec_params) < 0) {
+        _agm_source_close(source);
+        return AGM_OPEN_FAILED;
+    }
+    // Threading has to be set before the decoder is opened; thread_count 0 lets FFmpeg pick
+    source->codec_ctx->thread_count = options->decode_threads;
+    source->codec_ctx->thread_type = options->decode_thread_type;
+    if (avcodec_open2(source->codec_ctx, codec, NULL) < 0) {
+        _agm_source_close(source);
+        return AGM_OPEN_FAILED;
+    }
 
-    Palette palette;
-    _load_gimp_palette(palette_file, &palette);
+    if (!_agm_source_resolve_crop(source, options)) {
+        _agm_source_close(source);
+        return AGM_BAD_CROP;
+    }
+    source->sws_ctx = sws_getContext(source->crop_w, source->crop_h, source->codec_ctx->pix_fmt,
+                                     options->width, options->height, AV_PIX_FMT_RGBA,
+                                     options->scale_flags, NULL, NULL, NULL);
+    source->decoded = av_frame_alloc();
+    source->packet = av_packet_alloc();
+    if (!source->sws_ctx || !source->decoded || !source->packet) {
+        _agm_source_close(source);
+        return source->sws_ctx ? AGM_NO_MEMORY : AGM_OPEN_FAILED;
+    }
+    return AGM_OK;
+}
 
-    struct SwsContext *sws_ctx = sws_getContext(codec_ctx->width, codec_ctx->height, codec_ctx->pix_fmt, output_width, output_height, AV_PIX_FMT_RGBA, SWS_BILINEAR, NULL, NULL, NULL);
+// Scale the frame in source->decoded into rgba (output_width * output_height * 4 bytes).
+// Cropping just moves the plane pointers, so the scaler reads only the region it needs.
+static bool _agm_source_scale(_agm_source *source, uint8_t *rgba) {
+    AVFrame *decoded = source->decoded;
+    if (decoded->width != source->codec_ctx->width || decoded->height != source->codec_ctx->height) {
+        // Mid-stream size changes don't match the scaler we set up
+        return false;
+    }
+    if (source->crop_w != decoded->width || source->crop_h != decoded->height) {
+        decoded->crop_left = source->crop_x;
+        decoded->crop_top = source->crop_y;
+        decoded->crop_right = decoded->width - source->crop_x - source->crop_w;
+        decoded->crop_bottom = decoded->height - source->crop_y - source->crop_h;
+        // Bitstream formats only get their right and bottom edges cropped, which leaves the wrong region
+        if (av_frame_apply_cropping(decoded, AV_FRAME_CROP_UNALIGNED) < 0
+            || decoded->width != source->crop_w || decoded->height != source->crop_h) {
+            return false;
+        }
+    }
+    // The decoder can settle on a different pixel format than the stream parameters promised,
+    // so follow the frame's; the cached context is reused as long as the format holds
+    source->sws_ctx = sws_getCachedContext(source->sws_ctx, source->crop_w, source->crop_h, (enum AVPixelFormat)decoded->format,
+                                           source->output_width, source->output_height, AV_PIX_FMT_RGBA,
+                                           source->scale_flags, NULL, NULL, NULL);
+    if (!source->sws_ctx) {
+        return false;
+    }
+    uint8_t *dst_data[4] = { rgba, NULL, NULL, NULL };
+    int dst_linesize[4] = { source->output_width * 4, 0, 0, 0 };
+    sws_scale(source->sws_ctx, (const uint8_t * const*)decoded->data, decoded->linesize, 0, source->crop_h, dst_data, dst_linesize);
+    return true;
+}
 
-    AVFrame *frame = av_frame_alloc();
-    AVFrame *rgba_frame = av_frame_alloc();
-    int buffer_size = av_image_get_buffer_size(AV_PIX_FMT_RGBA, output_width, output_height, 1);
-    uint8_t *buffer = av_malloc(buffer_size);
-    av_image_fill_arrays(rgba_frame->data, rgba_frame->linesize, buffer, AV_PIX_FMT_RGBA, output_width, output_height, 1);
+// One video frame travelling through the pipeline.
+// Frames come from a pool allocated once per run and are recycled by the write stage.
+typedef struct {
+    int index;        // Decode order, starting at 0
+    uint8_t *rgba;    // Scaled RGBA8888 frame; converted in place with the dither method
+    uint8_t *no;      // Packed RGBA2 no-dither frame
+    uint8_t *dither;  // Packed RGBA2 dither frame; holds the final frame after the lookback stage
+    bool delta_ok;    // Set by the lookback stage when frame->no holds a usable difference frame
+    bool repeat;      // Set by the lookback stage when the final frame is identical to the previous one
+} _agm_frame;
 
-    FILE *fp = fopen(output_file, "wb");
+// Bounded FIFO of frames between two pipeline stages.
+// Producers block while it is full, consumers while it is empty.
+// Closing lets consumers drain what's left; aborting wakes everyone and drops the rest.
+// Queues only borrow frames; the pool owns them.
+typedef struct {
+    _agm_frame **items;
+    int capacity, head, count;
+    int next_index;  // Frame index the next _frame_queue_put_ordered will accept
+    bool closed, aborted;
+    pthread_mutex_t lock;
+    pthread_cond_t not_empty, not_full;
+} _frame_queue;
 
-    int frame_pixel_count = output_width * output_height;
-    uint8_t *oldNo = malloc(frame_pixel_count);
-    uint8_t *oldFinal = malloc(frame_pixel_count);
-    uint16_t *unchanged_count = calloc(frame_pixel_count, sizeof(uint16_t));
-    int first_frame = 1;
+static bool _frame_queue_init(_frame_queue *queue, int capacity) {
+    queue->items = (_agm_frame **)malloc(sizeof(_agm_frame *) * capacity);
+    if (!queue->items) return false;
+    queue->capacity = capacity;
+    queue->head = queue->count = 0;
+    queue->next_index = 0;
+    queue->closed = queue->aborted = false;
+    pthread_mutex_init(&queue->lock, NULL);
+    pthread_cond_init(&queue->not_empty, NULL);
+    pthread_cond_init(&queue->not_full, NULL);
+    return true;
+}
 
-    AVPacket packet;
-    int frame_index = 0;
-    while (av_read_frame(format_ctx, &packet) >= 0) {
-        if (packet.stream_index == (int)video_stream_index) {
-            avcodec_send_packet(codec_ctx, &packet);
-            while (avcodec_receive_frame(codec_ctx, frame) == 0) {
-                frame_index++;
-
-                sws_scale(sws_ctx, (const uint8_t * const*)frame->data, frame->linesize, 0, codec_ctx->height, rgba_frame->data, rgba_frame->linesize);
-
-                uint8_t *converted_rgba = malloc(buffer_size);
-                memcpy(converted_rgba, rgba_frame->data[0], buffer_size);
-
-                uint8_t *no_rgba = malloc(buffer_size);
-                uint8_t *dither_rgba = malloc(buffer_size);
-                memcpy(no_rgba, converted_rgba, buffer_size);
-                memcpy(dither_rgba, converted_rgba, buffer_size);
-                free(converted_rgba);
-
-                _convert_method_rgb(no_rgba, output_width, output_height, &palette, has_transparent_color, transparent_rgb);
-                _convert_method_rgb(dither_rgba, output_width, output_height, &palette, has_transparent_color, transparent_rgb);
-
-                uint8_t *newNo = malloc(frame_pixel_count);
-                uint8_t *newDither = malloc(frame_pixel_count);
-                _rgba32_to_rgba2(no_rgba, frame_pixel_count, newNo);
-                _rgba32_to_rgba2(dither_rgba, frame_pixel_count, newDither);
-                free(no_rgba);
-                free(dither_rgba);
-
-                uint8_t *finalDither = malloc(frame_pixel_count);
-                if (first_frame) {
-                    memcpy(oldNo, newNo, frame_pixel_count);
-                    memcpy(oldFinal, newDither, frame_pixel_count);
-                    memcpy(finalDither, newDither, frame_pixel_count);
-                    first_frame = 0;
-                } else {
-                    dither_lookback(oldNo, newNo, oldFinal, newDither, unchanged_count, frame_pixel_count, lookback, finalDither);
-                    memcpy(oldNo, newNo, frame_pixel_count);
-                    memcpy(oldFinal, finalDither, frame_pixel_count);
+static void _frame_queue_destroy(_frame_queue *queue) {
+    free(queue->items);
+    pthread_mutex_destroy(&queue->lock);
+    pthread_cond_destroy(&queue->not_empty);
+    pthread_cond_destroy(&queue->not_full);
+}
+
+static void _frame_queue_push_locked(_frame_queue *queue, _agm_frame *frame) {
+    queue->items[(queue->head + queue->count) % queue->capacity] = frame;
+    queue->count++;
+    pthread_cond_signal(&queue->not_empty);
+}
+
+// Append a frame. Returns false if the queue was aborted.
+static bool _frame_queue_put(_frame_queue *queue, _agm_frame *frame) {
+    pthread_mutex_lock(&queue->lock);
+    while (queue->count == queue->capacity && !queue->aborted) {
+        pthread_cond_wait(&queue->not_full, &queue->lock);
+    }
+    bool ok = !queue->aborted;
+    if (ok) _frame_queue_push_locked(queue, frame);
+    pthread_mutex_unlock(&queue->lock);
+    return ok;
+}
+
+// Like _frame_queue_put, but waits until every lower-indexed frame has been put,
+// so frames finished out of order by parallel workers come out in decode order.
+static bool _frame_queue_put_ordered(_frame_queue *queue, _agm_frame *frame) {
+    pthread_mutex_lock(&queue->lock);
+    while ((frame->index != queue->next_index || queue->count == queue->capacity) && !queue->aborted) {
+        pthread_cond_wait(&queue->not_full, &queue->lock);
+    }
+    bool ok = !queue->aborted;
+    if (ok) {
+        _frame_queue_push_locked(queue, frame);
+        queue->next_index++;
+        // Several producers may be waiting for their turn
+        pthread_cond_broadcast(&queue->not_full);
+    }
+    pthread_mutex_unlock(&queue->lock);
+    return ok;
+}
+
+// Take the oldest frame, or NULL once the queue is closed and empty, or aborted.
+static _agm_frame* _frame_queue_get(_frame_queue *queue) {
+    _agm_frame *frame = NULL;
+    pthread_mutex_lock(&queue->lock);
+    while (queue->count == 0 && !queue->closed && !queue->aborted) {
+        pthread_cond_wait(&queue->not_empty, &queue->lock);
+    }
+    if (queue->count > 0 && !queue->aborted) {
+        frame = queue->items[queue->head];
+        queue->head = (queue->head + 1) % queue->capacity;
+        queue->count--;
+        pthread_cond_broadcast(&queue->not_full);
+    }
+    pthread_mutex_unlock(&queue->lock);
+    return frame;
+}
+
+static void _frame_queue_close(_frame_queue *queue) {
+    pthread_mutex_lock(&queue->lock);
+    queue->closed = true;
+    pthread_cond_broadcast(&queue->not_empty);
+    pthread_mutex_unlock(&queue->lock);
+}
+
+static void _frame_queue_abort(_frame_queue *queue) {
+    pthread_mutex_lock(&queue->lock);
+    queue->aborted = true;
+    pthread_cond_broadcast(&queue->not_empty);
+    pthread_cond_broadcast(&queue->not_full);
+    pthread_mutex_unlock(&queue->lock);
+}
+
+struct _agm_pipeline;
+
+// Per conversion worker state
+typedef struct {
+    struct _agm_pipeline *p;
+    uint8_t *scratch;  // Source copy for the no-dither method: one row for row methods, else a whole frame
+} _agm_worker;
+
+// Pipeline stages timed in AgmStats
+enum {
+    AGM_STAGE_DECODE,
+    AGM_STAGE_SCALE,
+    AGM_STAGE_CONVERT,
+    AGM_STAGE_LOOKBACK,
+    AGM_STAGE_RLE,
+    AGM_STAGE_WRITE,
+    AGM_STAGE_COUNT
+};
+
+// Shared state for one _process_mp4 run
+typedef struct _agm_pipeline {
+    int width, height, pixel_count;
+    Palette *palette;
+    const char *noDither_method, *dither_method;
+    bool same_methods;      // No-dither and dither methods match, so convert once
+    bool row_nodither;      // The no-dither method can run a row at a time
+    int lookback;
+    int keyframe_interval;  // At most this many frames from one keyframe to the next; <= 1 writes no difference frames
+    double scene_cut_threshold;  // Change ratio that resets the lookback state; 0 never does
+    bool decimate;          // Drop frames in the decode stage to bring source_rate down to target_rate
+    AVRational source_rate, target_rate;
+    int source_frames;      // Frames decoded so far, kept or dropped; decode stage only
+    bool has_transparent_color;
+    uint8_t transparent_rgb[3];
+    bool write_file;        // Run the RLE + write stage; without it the frames are left in write_queue for an iterator
+    FILE *fp;
+    AgmAudio *audio;        // Audio track to interleave, NULL if none
+    uint8_t *audio_chunk;   // Write stage buffer for one chunk
+    size_t audio_chunk_size;
+    size_t audio_chunks_written;
+    bool audio_done;        // Every decoded sample has been written
+    _agm_source *source;
+    _frame_queue free_frames;     // Frame pool: write stage -> decode
+    _frame_queue convert_queue;   // decode -> conversion workers
+    _frame_queue lookback_queue;  // conversion workers -> lookback, in frame order
+    _frame_queue write_queue;     // lookback -> RLE + write
+    int worker_count;
+    int workers_left;  // Conversion workers still running; the last one out closes lookback_queue
+    int status;        // First error hit by any stage, AGM_OK if none
+    AgmStats stats;
+    double start_time;                   // When the run started, for stats.elapsed_time
+    long long stage_ns[AGM_STAGE_COUNT];  // Time spent working in each stage, summed over its threads
+    bool (*progress)(void *arg, const AgmStats *stats);  // Called after each frame is written, if set
+    void *progress_arg;
+    // Buffers, all allocated before the pipeline starts
+    _agm_frame *frames;
+    uint8_t *frame_memory;
+    _agm_worker *workers;
+    uint8_t *scratch_memory;
+    uint8_t *oldNo, *oldFinal;  // Lookback stage state; oldNo trades places with frame->no buffers
+    uint16_t *unchanged_count;
+    uint8_t *rle_buffer;        // Write stage output, reused for every frame
+    uint8_t *rle_delta_buffer;  // Same, for the delta encoding
+    // Output file state, owned by the write stage
+    AgmHeader header;
+    size_t record_offset;        // File offset of the next record
+    uint32_t *index;             // Per record: file offset, size word
+    size_t index_count, index_capacity;
+    size_t change_ratio_count, change_ratio_capacity;  // Lookback stage's stats.change_ratios
+    // Stage threads
+    pthread_t *worker_handles;
+    bool *worker_started;
+    pthread_t decode_handle, lookback_handle, write_handle;
+    bool decode_started, lookback_started, write_started;
+} _agm_pipeline;
+
+// Count an allocation in the run's stats; stages may allocate concurrently
+static void _pipeline_allocated(_agm_pipeline *p, size_t size) {
+    __atomic_fetch_add(&p->stats.allocations, 1, __ATOMIC_RELAXED);
+    __atomic_fetch_add(&p->stats.allocated_bytes, (long long)size, __ATOMIC_RELAXED);
+}
+
+// malloc, counted in the run's stats
+static void* _pipeline_malloc(_agm_pipeline *p, size_t size) {
+    void *ptr = malloc(size);
+    if (ptr) _pipeline_allocated(p, size);
+    return ptr;
+}
+
+static void _pipeline_copied(_agm_pipeline *p, size_t bytes) {
+    __atomic_fetch_add(&p->stats.bytes_copied, (long long)bytes, __ATOMIC_RELAXED);
+}
+
+// Add the time since *start to a stage's total and restart the clock
+static void _stage_lap(_agm_pipeline *p, int stage, double *start) {
+    double now = _monotonic_seconds();
+    __atomic_fetch_add(&p->stage_ns[stage], (long long)((now - *start) * 1e9), __ATOMIC_RELAXED);
+    *start = now;
+}
+
+// Fill in the stage times and elapsed time of stats from the pipeline's counters
+static void _pipeline_times(_agm_pipeline *p, AgmStats *stats) {
+    double times[AGM_STAGE_COUNT];
+    for (int i = 0; i < AGM_STAGE_COUNT; i++) {
+        times[i] = __atomic_load_n(&p->stage_ns[i], __ATOMIC_RELAXED) / 1e9;
+    }
+    stats->decode_time = times[AGM_STAGE_DECODE];
+    stats->scale_time = times[AGM_STAGE_SCALE];
+    stats->convert_time = times[AGM_STAGE_CONVERT];
+    stats->lookback_time = times[AGM_STAGE_LOOKBACK];
+    stats->rle_time = times[AGM_STAGE_RLE];
+    stats->write_time = times[AGM_STAGE_WRITE];
+    stats->elapsed_time = _monotonic_seconds() - p->start_time;
+}
+
+// Copy the stats so far for a progress callback, while the other stages keep running.
+// The write stage owns the frame counts; the rest are read atomically. change_ratios is left out.
+static void _pipeline_snapshot(_agm_pipeline *p, AgmStats *stats) {
+    memset(stats, 0, sizeof(AgmStats));
+    stats->frames = p->stats.frames;
+    stats->keyframes = p->stats.keyframes;
+    stats->repeats = p->stats.repeats;
+    stats->bytes_written = p->stats.bytes_written;
+    stats->audio_chunks = p->stats.audio_chunks;
+    stats->audio_samples = p->stats.audio_samples;
+    stats->frames_dropped = __atomic_load_n(&p->stats.frames_dropped, __ATOMIC_RELAXED);
+    stats->scene_cuts = __atomic_load_n(&p->stats.scene_cuts, __ATOMIC_RELAXED);
+    stats->allocations = __atomic_load_n(&p->stats.allocations, __ATOMIC_RELAXED);
+    stats->allocated_bytes = __atomic_load_n(&p->stats.allocated_bytes, __ATOMIC_RELAXED);
+    stats->bytes_copied = __atomic_load_n(&p->stats.bytes_copied, __ATOMIC_RELAXED);
+    _pipeline_times(p, stats);
+}
+
+// Stop every stage, dropping the frames in flight
+static void _pipeline_abort(_agm_pipeline *p) {
+    _frame_queue_abort(&p->free_frames);
+    _frame_queue_abort(&p->convert_queue);
+    _frame_queue_abort(&p->lookback_queue);
+    _frame_queue_abort(&p->write_queue);
+}
+
+// Record the first error and stop every stage
+static void _pipeline_fail(_agm_pipeline *p, int status) {
+    int expected = AGM_OK;
+    __atomic_compare_exchange_n(&p->status, &expected, status, false, __ATOMIC_ACQ_REL, __ATOMIC_ACQUIRE);
+    _pipeline_abort(p);
+}
+
+static int _pipeline_status(_agm_pipeline *p) {
+    return __atomic_load_n(&p->status, __ATOMIC_ACQUIRE);
+}
+
+static void _convert_worker_done(_agm_pipeline *p) {
+    if (__atomic_sub_fetch(&p->workers_left, 1, __ATOMIC_ACQ_REL) == 0) {
+        _frame_queue_close(&p->lookback_queue);
+    }
+}
+
+// Convert one frame with both methods. The dither method runs in place on frame->rgba;
+// the no-dither method works from a copy, a row at a time where it can so the copy stays in cache.
+static void _convert_frame(_agm_pipeline *p, uint8_t *scratch, _agm_frame *frame) {
+    size_t row_bytes = (size_t)p->width * 4;
+    if (p->same_methods) {
+        _convert_to_palette(frame->rgba, p->width, p->height, p->palette, p->dither_method, p->has_transparent_color, p->transparent_rgb, 1);
+        _rgba32_to_rgba2(frame->rgba, p->pixel_count, frame->dither);
+        memcpy(frame->no, frame->dither, p->pixel_count);
+        _pipeline_copied(p, p->pixel_count);
+        return;
+    }
+
+    if (p->row_nodither) {
+        for (int y = 0; y < p->height; y++) {
+            memcpy(scratch, &frame->rgba[y * row_bytes], row_bytes);
+            _convert_row_to_palette(scratch, p->width, y, p->palette, p->noDither_method, p->has_transparent_color, p->transparent_rgb);
+            _rgba32_to_rgba2(scratch, p->width, &frame->no[(size_t)y * p->width]);
+        }
+    } else {
+        memcpy(scratch, frame->rgba, row_bytes * p->height);
+        _convert_to_palette(scratch, p->width, p->height, p->palette, p->noDither_method, p->has_transparent_color, p->transparent_rgb, 1);
+        _rgba32_to_rgba2(scratch, p->pixel_count, frame->no);
+    }
+    _pipeline_copied(p, row_bytes * p->height);
+
+    _convert_to_palette(frame->rgba, p->width, p->height, p->palette, p->dither_method, p->has_transparent_color, p->transparent_rgb, 1);
+    _rgba32_to_rgba2(frame->rgba, p->pixel_count, frame->dither);
+}
+
+// Stage 2: palette-convert whole frames, several at once.
+// Each frame is converted single-threaded; the parallelism comes from running one worker per core.
+static void* _convert_worker(void *arg) {
+    _agm_worker *worker = (_agm_worker *)arg;
+    _agm_pipeline *p = worker->p;
+    _agm_frame *frame;
+    while ((frame = _frame_queue_get(&p->convert_queue)) != NULL) {
+        double start = _monotonic_seconds();
+        _convert_frame(p, worker->scratch, frame);
+        _stage_lap(p, AGM_STAGE_CONVERT, &start);
+        if (!_frame_queue_put_ordered(&p->lookback_queue, frame)) break;
+    }
+    _convert_worker_done(p);
+    return NULL;
+}
+
+// A delta frame can only mark pixels as changed or skipped; a pixel that turns
+// transparent would read as "unchanged", so such frames must be keyframes.
+static bool _delta_representable(const uint8_t *oldFinal, const uint8_t *newFinal, int size) {
+    bool ok = true;
+    for (int i = 0; i < size; i++) {
+        ok &= oldFinal[i] == newFinal[i] || (newFinal[i] & 0xC0) != 0;
+    }
+    return ok;
+}
+
+// Append a frame's change ratio to stats.change_ratios, growing it as needed. Returns false if out of memory.
+static bool _record_change_ratio(_agm_pipeline *p, double change_ratio) {
+    if (p->change_ratio_count == p->change_ratio_capacity) {
+        size_t capacity = p->change_ratio_capacity ? p->change_ratio_capacity * 2 : 1024;
+        double *change_ratios = (double *)realloc(p->stats.change_ratios, capacity * sizeof(double));
+        if (!change_ratios) {
+            return false;
+        }
+        p->stats.change_ratios = change_ratios;
+        p->change_ratio_capacity = capacity;
+        _pipeline_allocated(p, capacity * sizeof(double));
+    }
+    p->stats.change_ratios[p->change_ratio_count++] = change_ratio;
+    return true;
+}
+
+// Stage 3: dither lookback, which depends on the previous frame so runs in frame order on one thread.
+// Scene cuts restart the lookback as if from the first frame and are never delta frames.
+// In delta mode it also leaves the difference from the previous final frame in frame->no.
+static void* _lookback_stage(void *arg) {
+    _agm_pipeline *p = (_agm_pipeline *)arg;
+    _agm_frame *frame;
+    bool first_frame = true;
+    while ((frame = _frame_queue_get(&p->lookback_queue)) != NULL) {
+        double start = _monotonic_seconds();
+        double change_ratio = 1.0;
+        bool scene_cut = false;
+        if (!first_frame) {
+            change_ratio = (double)count_changed(p->oldNo, frame->no, p->pixel_count) / p->pixel_count;
+            scene_cut = p->scene_cut_threshold > 0 && change_ratio >= p->scene_cut_threshold;
+        }
+        if (!_record_change_ratio(p, change_ratio)) {
+            _pipeline_fail(p, AGM_NO_MEMORY);
+            break;
+        }
+        if (scene_cut) {
+            // Keep frame->dither as is and forget how long pixels have held still
+            memset(p->unchanged_count, 0, sizeof(uint16_t) * p->pixel_count);
+            __atomic_fetch_add(&p->stats.scene_cuts, 1, __ATOMIC_RELAXED);
+        } else if (!first_frame) {
+            // Safe in place: each final pixel only depends on the same pixel of newDither
+            dither_lookback(p->oldNo, frame->no, p->oldFinal, frame->dither, p->unchanged_count, p->pixel_count, p->lookback, frame->dither);
+        }
+        // frame->no isn't needed downstream, so keep it as the next frame's oldNo
+        // and reuse the old oldNo buffer for the difference frame
+        uint8_t *swap = p->oldNo;
+        p->oldNo = frame->no;
+        frame->no = swap;
+
+        // A frame identical to the last needs neither a difference frame nor a new oldFinal.
+        // Repeats are found whatever the keyframe_interval, as the empty record costs nothing to decode
+        frame->repeat = !first_frame && !scene_cut && memcmp(p->oldFinal, frame->dither, p->pixel_count) == 0;
+        frame->delta_ok = !first_frame && !scene_cut && p->keyframe_interval > 1
+            && _delta_representable(p->oldFinal, frame->dither, p->pixel_count);
+        if (frame->delta_ok && !frame->repeat) {
+            compute_difference(p->oldFinal, frame->dither, p->pixel_count, frame->no);
+        }
+        if (!frame->repeat) {
+            memcpy(p->oldFinal, frame->dither, p->pixel_count);
+            _pipeline_copied(p, p->pixel_count);
+        }
+        first_frame = false;
+        _stage_lap(p, AGM_STAGE_LOOKBACK, &start);
+
+        if (!_frame_queue_put(&p->write_queue, frame)) break;
+    }
+    _frame_queue_close(&p->write_queue);
+    return NULL;
+}
+
+// Add the next record to the frame index, growing it as needed.
+// Fails with AGM_WRITE_FAILED if the file would outgrow the index's 32-bit offsets.
+static int _agm_index_append(_agm_pipeline *p, uint32_t size_word) {
+    if (p->record_offset + sizeof(uint32_t) + (size_word & AGM_RECORD_SIZE_MASK) > UINT32_MAX) {
+        return AGM_WRITE_FAILED;
+    }
+    if (p->index_count == p->index_capacity) {
+        size_t capacity = p->index_capacity ? p->index_capacity * 2 : 1024;
+        uint32_t *index = (uint32_t *)realloc(p->index, capacity * 2 * sizeof(uint32_t));
+        if (!index) {
+            return AGM_NO_MEMORY;
+        }
+        p->index = index;
+        p->index_capacity = capacity;
+        _pipeline_allocated(p, capacity * 2 * sizeof(uint32_t));
+    }
+    p->index[p->index_count * 2] = (uint32_t)p->record_offset;
+    p->index[p->index_count * 2 + 1] = size_word;
+    p->index_count++;
+    return AGM_OK;
+}
+
+// Append the frame index after the last record and fill in the header's frame count and index offset
+static bool _agm_finish_file(_agm_pipeline *p) {
+    for (size_t i = 0; i < p->index_count * 2; i++) {
+        if (!_agm_write_u32(p->fp, p->index[i])) return false;
+    }
+    p->header.frame_count = (uint32_t)p->index_count;
+    p->header.index_offset = (uint32_t)p->record_offset;
+    if (p->stats.repeats) {
+        // Repeats are empty delta records, even when keyframe_interval asked for keyframes only
+        p->header.flags |= AGM_CODEC_DELTA;
+    }
+    p->stats.bytes_written += (long long)(p->header.header_size + p->index_count * AGM_INDEX_ENTRY_SIZE);
+    return fseek(p->fp, 0, SEEK_SET) == 0 && _agm_write_header(p->fp, &p->header);
+}
+
+// Append audio chunks until the written audio reaches end_sample or runs out; the last chunk is padded with silence
+static int _write_audio_until(_agm_pipeline *p, uint64_t end_sample) {
+    while (!p->audio_done && (uint64_t)p->audio_chunks_written * p->audio_chunk_size < end_sample) {
+        size_t count = _agm_audio_read(p->audio, p->audio_chunks_written * p->audio_chunk_size, p->audio_chunk, p->audio_chunk_size);
+        if (count < p->audio_chunk_size) {
+            if (_agm_audio_failed(p->audio)) return AGM_DECODE_FAILED;
+            p->audio_done = true;
+            if (count == 0) break;
+            memset(&p->audio_chunk[count], 0, p->audio_chunk_size - count);
+        }
+        if (p->record_offset + sizeof(uint32_t) + p->audio_chunk_size > UINT32_MAX
+            || !_agm_write_u32(p->fp, (uint32_t)p->audio_chunk_size | AGM_AUDIO_FLAG)
+            || fwrite(p->audio_chunk, sizeof(uint8_t), p->audio_chunk_size, p->fp) != p->audio_chunk_size) {
+            return AGM_WRITE_FAILED;
+        }
+        p->record_offset += sizeof(uint32_t) + p->audio_chunk_size;
+        p->audio_chunks_written++;
+        p->stats.audio_chunks++;
+        p->stats.audio_samples += (long long)count;
+        p->stats.bytes_written += (long long)(sizeof(uint32_t) + p->audio_chunk_size);
+    }
+    return AGM_OK;
+}
+
+// Audio chunks due before a frame: those starting before the frame ends
+static int _write_audio_for_frame(_agm_pipeline *p, int frame_number) {
+    uint64_t end_sample = ((uint64_t)frame_number * p->header.audio_rate * p->header.fps_den + p->header.fps_num - 1) / p->header.fps_num;
+    return _write_audio_until(p, end_sample);
+}
+
+// Stage 4: RLE-compress final frames, append them to the output file and return the frames to the pool.
+// A frame is written as a delta when allowed and smaller than the keyframe encoding, and after the audio chunks due by its end.
+// Repeated frames are written as empty deltas without encoding anything, unless a keyframe is due.
+// After each frame the progress callback, if any, gets the stats so far; otherwise the frame count goes to stderr.
+static void* _write_stage(void *arg) {
+    _agm_pipeline *p = (_agm_pipeline *)arg;
+    _agm_frame *frame;
+    int since_keyframe = 0;
+    while ((frame = _frame_queue_get(&p->write_queue)) != NULL) {
+        double start = _monotonic_seconds();
+        uint8_t *record = p->rle_buffer;
+        size_t compressed_size = 0;
+        uint32_t flags = 0;
+        bool keyframe_due = p->keyframe_interval > 1 && since_keyframe + 1 >= p->keyframe_interval;
+        bool delta = frame->delta_ok && !keyframe_due;
+        if (frame->repeat && !keyframe_due) {
+            flags = AGM_DELTA_FLAG;
+            p->stats.repeats++;
+        } else {
+            compressed_size = _rle_encode_into(frame->dither, p->pixel_count, p->rle_buffer);
+            if (delta) {
+                size_t delta_size = _rle_encode_into(frame->no, p->pixel_count, p->rle_delta_buffer);
+                if (delta_size < compressed_size) {
+                    record = p->rle_delta_buffer;
+                    compressed_size = delta_size;
+                    flags = AGM_DELTA_FLAG;
                 }
-                free(newNo);
-                free(newDither);
-
-                size_t compressed_size = 0;
-                uint8_t *compressed_frame = _rle_encode_internal(finalDither, frame_pixel_count, &compressed_size);
-                uint32_t compressed_size_le = (uint32_t)compressed_size;
-                fwrite(&compressed_size_le, sizeof(uint32_t), 1, fp);
-                fwrite(compressed_frame, sizeof(uint8_t), compressed_size, fp);
-                free(compressed_frame);
-                free(finalDither);
-
-                fprintf(stderr, "\rFrame %d processed", frame_index);
-                fflush(stderr);
             }
         }
-        av_packet_unref(&packet);
+        int frame_number = frame->index + 1;
+        _stage_lap(p, AGM_STAGE_RLE, &start);
+        if (!_frame_queue_put(&p->free_frames, frame)) break;
+        start = _monotonic_seconds();
+
+        uint32_t size_word = (uint32_t)compressed_size | flags;
+        int status = p->audio ? _write_audio_for_frame(p, frame_number) : AGM_OK;
+        if (status == AGM_OK && compressed_size > AGM_RECORD_SIZE_MASK) status = AGM_WRITE_FAILED;
+        if (status == AGM_OK) status = _agm_index_append(p, size_word);
+        if (status == AGM_OK
+            && (!_agm_write_u32(p->fp, size_word) || fwrite(record, sizeof(uint8_t), compressed_size, p->fp) != compressed_size)) {
+            status = AGM_WRITE_FAILED;
+        }
+        if (status != AGM_OK) {
+            _pipeline_fail(p, status);
+            break;
+        }
+        p->record_offset += sizeof(uint32_t) + compressed_size;
+        if (flags) {
+            since_keyframe++;
+        } else {
+            since_keyframe = 0;
+            p->stats.keyframes++;
+        }
+        p->stats.frames = frame_number;
+        p->stats.bytes_written += (long long)(sizeof(uint32_t) + compressed_size);
+        _stage_lap(p, AGM_STAGE_WRITE, &start);
+
+        if (p->progress) {
+            AgmStats snapshot;
+            _pipeline_snapshot(p, &snapshot);
+            if (!p->progress(p->progress_arg, &snapshot)) {
+                _pipeline_fail(p, AGM_CANCELLED);
+                break;
+            }
+        } else {
+            fprintf(stderr, "\rFrame %d processed", frame_number);
+            fflush(stderr);
+        }
+    }
+    return NULL;
+}
+
+// Frame-rate decimation: keep a decoded frame once its time reaches the next output frame's time.
+// Called for every decoded frame, with the number of frames kept so far.
+static bool _keep_decoded_frame(_agm_pipeline *p, int frame_index) {
+    int64_t source_index = p->source_frames++;
+    if (!p->decimate) return true;
+    // source_index / source_rate >= frame_index / target_rate, without rounding
+    return source_index * p->source_rate.den * p->target_rate.num >= (int64_t)frame_index * p->target_rate.den * p->source_rate.num;
+}
+
+// Scale every frame the decoder has ready into a pooled frame and queue it for conversion.
+// Frames dropped by the decimation are never scaled. Returns false once the pipeline has failed.
+static bool _queue_decoded_frames(_agm_pipeline *p, _agm_source *source, int *frame_index) {
+    int ret;
+    double start = _monotonic_seconds();
+    while ((ret = avcodec_receive_frame(source->codec_ctx, source->decoded)) == 0) {
+        _stage_lap(p, AGM_STAGE_DECODE, &start);
+        if (!_keep_decoded_frame(p, *frame_index)) {
+            __atomic_fetch_add(&p->stats.frames_dropped, 1, __ATOMIC_RELAXED);
+            continue;
+        }
+        _agm_frame *frame = _frame_queue_get(&p->free_frames);
+        if (!frame) return false;
+        frame->index = (*frame_index)++;
+
+        start = _monotonic_seconds();
+        if (!_agm_source_scale(source, frame->rgba)) {
+            _pipeline_fail(p, AGM_DECODE_FAILED);
+            return false;
+        }
+        _stage_lap(p, AGM_STAGE_SCALE, &start);
+        if (!_frame_queue_put(&p->convert_queue, frame)) return false;
+        start = _monotonic_seconds();
+    }
+    _stage_lap(p, AGM_STAGE_DECODE, &start);
+    if (ret != AVERROR(EAGAIN) && ret != AVERROR_EOF) {
+        _pipeline_fail(p, AGM_DECODE_FAILED);
+        return false;
+    }
+    return true;
+}
+
+// Allocate every buffer the run needs and fill the frame pool. Returns false if out of memory.
+// extra_frames adds to the pool, letting the stages run further ahead of the consumer.
+static bool _pipeline_alloc(_agm_pipeline *p, int workers, int extra_frames) {
+    // Enough frames to keep every worker busy with a couple queued on each side, without buffering the whole video
+    int pool_size = workers * 2 + 4 + extra_frames;
+    size_t frame_bytes = (size_t)p->pixel_count * 6;  // rgba, no, dither
+    size_t scratch_bytes = (size_t)p->width * 4 * (p->row_nodither ? 1 : p->height);
+
+    if (!_frame_queue_init(&p->free_frames, pool_size)) return false;
+    if (!_frame_queue_init(&p->convert_queue, pool_size)) return false;
+    if (!_frame_queue_init(&p->lookback_queue, pool_size)) return false;
+    if (!_frame_queue_init(&p->write_queue, pool_size)) return false;
+
+    p->frames = (_agm_frame *)_pipeline_malloc(p, sizeof(_agm_frame) * pool_size);
+    // The lookback stage's oldNo lives in the same block, as it swaps with the frames' no buffers
+    p->frame_memory = (uint8_t *)_pipeline_malloc(p, frame_bytes * pool_size + p->pixel_count);
+    p->workers = (_agm_worker *)_pipeline_malloc(p, sizeof(_agm_worker) * workers);
+    p->scratch_memory = p->same_methods ? NULL : (uint8_t *)_pipeline_malloc(p, scratch_bytes * workers);
+    p->oldFinal = (uint8_t *)_pipeline_malloc(p, p->pixel_count);
+    p->unchanged_count = (uint16_t *)_pipeline_malloc(p, sizeof(uint16_t) * p->pixel_count);
+    if (p->write_file) {
+        p->rle_buffer = (uint8_t *)_pipeline_malloc(p, RLE_ENCODE_MAX_SIZE((size_t)p->pixel_count));
+        if (!p->rle_buffer) return false;
+    }
+    if (p->audio) {
+        p->audio_chunk = (uint8_t *)_pipeline_malloc(p, p->audio_chunk_size);
+        if (!p->audio_chunk) return false;
     }
-    fprintf(stderr, "\n");
+    if (p->write_file && p->keyframe_interval > 1) {
+        p->rle_delta_buffer = (uint8_t *)_pipeline_malloc(p, RLE_ENCODE_MAX_SIZE((size_t)p->pixel_count));
+        if (!p->rle_delta_buffer) return false;
+    }
+    if (!p->frames || !p->frame_memory || !p->workers || (!p->same_methods && !p->scratch_memory)
+        || !p->oldFinal || !p->unchanged_count) {
+        return false;
+    }
+    memset(p->unchanged_count, 0, sizeof(uint16_t) * p->pixel_count);
+    p->oldNo = &p->frame_memory[frame_bytes * pool_size];
 
-    fclose(fp);
-    av_free(buffer);
-    av_frame_free(&frame);
-    av_frame_free(&rgba_frame);
-    sws_freeContext(sws_ctx);
-    avcodec_free_context(&codec_ctx);
-    avformat_close_input(&format_ctx);
-    free(oldNo);
-    free(oldFinal);
-    free(unchanged_count);
+    for (int i = 0; i < pool_size; i++) {
+        uint8_t *memory = &p->frame_memory[frame_bytes * i];
+        p->frames[i].index = 0;
+        p->frames[i].rgba = memory;
+        p->frames[i].no = memory + (size_t)p->pixel_count * 4;
+        p->frames[i].dither = memory + (size_t)p->pixel_count * 5;
+        _frame_queue_put(&p->free_frames, &p->frames[i]);
+    }
+    for (int t = 0; t < workers; t++) {
+        p->workers[t].p = p;
+        p->workers[t].scratch = p->scratch_memory ? &p->scratch_memory[scratch_bytes * t] : NULL;
+    }
+    return true;
+}
 
-    return 0;
+static void _pipeline_free(_agm_pipeline *p) {
+    if (p->free_frames.items) _frame_queue_destroy(&p->free_frames);
+    if (p->convert_queue.items) _frame_queue_destroy(&p->convert_queue);
+    if (p->lookback_queue.items) _frame_queue_destroy(&p->lookback_queue);
+    if (p->write_queue.items) _frame_queue_destroy(&p->write_queue);
+    free(p->frames);
+    free(p->frame_memory);
+    free(p->workers);
+    free(p->scratch_memory);
+    free(p->oldFinal);
+    free(p->unchanged_count);
+    free(p->rle_buffer);
+    free(p->rle_delta_buffer);
+    free(p->audio_chunk);
+    free(p->index);
+    free(p->stats.change_ratios);
+    free(p->worker_handles);
+    free(p->worker_started);
+}
+
+// Stage 1: decode and scale every frame, then close the conversion queue
+static void _decode_frames(_agm_pipeline *p) {
+    _agm_source *source = p->source;
+    int frame_index = 0;
+    bool running = _pipeline_status(p) == AGM_OK;
+    double start = _monotonic_seconds();
+    while (running && av_read_frame(source->format_ctx, source->packet) >= 0) {
+        if (source->packet->stream_index == source->stream_index) {
+            int ret = avcodec_send_packet(source->codec_ctx, source->packet);
+            _stage_lap(p, AGM_STAGE_DECODE, &start);
+            if (ret < 0 && ret != AVERROR(EAGAIN)) {
+                _pipeline_fail(p, AGM_DECODE_FAILED);
+                running = false;
+            } else {
+                running = _queue_decoded_frames(p, source, &frame_index);
+            }
+        }
+        av_packet_unref(source->packet);
+        start = _monotonic_seconds();
+    }
+    if (running) {
+        // Drain the frames the decoder is still holding back
+        avcodec_send_packet(source->codec_ctx, NULL);
+        _queue_decoded_frames(p, source, &frame_index);
+    }
+    _frame_queue_close(&p->convert_queue);
+}
+
+static void* _decode_stage(void *arg) {
+    _decode_frames((_agm_pipeline *)arg);
+    return NULL;
+}
+
+// Start the conversion workers, the lookback stage and, if the run writes a file, the write stage.
+// With decode_thread set the decode stage gets a thread too; otherwise the caller runs _decode_frames.
+// Failures are recorded in p->status; _pipeline_join must be called either way.
+static void _pipeline_start(_agm_pipeline *p, int workers, bool decode_thread) {
+    p->worker_handles = (pthread_t *)malloc(sizeof(pthread_t) * workers);
+    p->worker_started = (bool *)calloc(workers, sizeof(bool));
+    if (!p->worker_handles || !p->worker_started) {
+        _pipeline_fail(p, AGM_NO_MEMORY);
+        _frame_queue_close(&p->write_queue);
+        return;
+    }
+
+    p->worker_count = workers;
+    p->workers_left = workers;
+    for (int t = 0; t < workers; ++t) {
+        p->worker_started[t] = pthread_create(&p->worker_handles[t], NULL, _convert_worker, &p->workers[t]) == 0;
+        if (!p->worker_started[t]) {
+            _pipeline_fail(p, AGM_NO_MEMORY);
+            _convert_worker_done(p);
+        }
+    }
+    p->lookback_started = pthread_create(&p->lookback_handle, NULL, _lookback_stage, p) == 0;
+    if (!p->lookback_started) {
+        _pipeline_fail(p, AGM_NO_MEMORY);
+        _frame_queue_close(&p->write_queue);
+    }
+    if (p->write_file) {
+        p->write_started = pthread_create(&p->write_handle, NULL, _write_stage, p) == 0;
+        if (!p->write_started) _pipeline_fail(p, AGM_NO_MEMORY);
+    }
+    if (decode_thread) {
+        p->decode_started = pthread_create(&p->decode_handle, NULL, _decode_stage, p) == 0;
+        if (!p->decode_started) {
+            _pipeline_fail(p, AGM_NO_MEMORY);
+            _frame_queue_close(&p->convert_queue);
+        }
+    }
+}
+
+// Wait for every stage thread to finish
+static void _pipeline_join(_agm_pipeline *p) {
+    if (p->decode_started) pthread_join(p->decode_handle, NULL);
+    for (int t = 0; t < p->worker_count; ++t) {
+        if (p->worker_started[t]) pthread_join(p->worker_handles[t], NULL);
+    }
+    if (p->lookback_started) pthread_join(p->lookback_handle, NULL);
+    if (p->write_started) pthread_join(p->write_handle, NULL);
+    p->decode_started = p->lookback_started = p->write_started = false;
+    p->worker_count = 0;
+}
+
+// Run the decode stage on the calling thread and the other stages on their own threads
+static void _run_pipeline(_agm_pipeline *p, int workers) {
+    _pipeline_start(p, workers, false);
+    _decode_frames(p);
+    _pipeline_join(p);
+}
+
+// Set up a run's pipeline state from the options; buffers are allocated separately by _pipeline_alloc
+static void _pipeline_init(_agm_pipeline *p, _agm_source *source, Palette *palette, const AgmOptions *options) {
+    memset(p, 0, sizeof(_agm_pipeline));
+    p->width = options->width;
+    p->height = options->height;
+    p->pixel_count = options->width * options->height;
+    p->palette = palette;
+    p->noDither_method = options->noDither_method;
+    p->dither_method = options->dither_method;
+    p->same_methods = strcasecmp(options->noDither_method, options->dither_method) == 0;
+    p->row_nodither = _is_row_conversion_method(options->noDither_method);
+    p->lookback = options->lookback;
+    p->keyframe_interval = options->keyframe_interval;
+    p->scene_cut_threshold = options->scene_cut_threshold;
+    p->has_transparent_color = options->has_transparent_color;
+    memcpy(p->transparent_rgb, options->transparent_rgb, 3);
+    p->source = source;
+    p->status = AGM_OK;
+    p->start_time = _monotonic_seconds();
+}
+
+int _process_mp4(const char *input_file, const char *output_file, Palette *palette, const AgmOptions *options, AgmStats *stats) {
+    memset(stats, 0, sizeof(AgmStats));
+
+    _agm_source source;
+    int status = _agm_source_open(&source, input_file, options);
+    if (status != AGM_OK) {
+        return status;
+    }
+    AVRational frame_rate = av_guess_frame_rate(source.format_ctx, source.format_ctx->streams[source.stream_index], NULL);
+    bool known_rate = frame_rate.num > 0 && frame_rate.den > 0;
+    // Decimation only ever lowers the frame rate, and needs to know what it's lowering it from
+    AVRational target_rate = av_d2q(options->target_fps, 100000);
+    bool decimate = known_rate && options->target_fps > 0 && av_cmp_q(target_rate, frame_rate) < 0;
+    AVRational source_rate = frame_rate;
+    if (decimate) {
+        frame_rate = target_rate;
+    }
+
+    // The audio track is decoded alongside the video by its own demuxer.
+    // Without an audio stream, or a frame rate to pace it by, the file is video only.
+    AgmAudio audio;
+    int audio_found = 0;
+    if (options->audio_rate > 0 && known_rate) {
+        audio_found = _agm_audio_open(&audio, input_file, options->audio_rate);
+        if (audio_found <= 0) {
+            _agm_audio_close(&audio);
+        }
+        if (audio_found < 0) {
+            _agm_source_close(&source);
+            return AGM_DECODE_FAILED;
+        }
+    }
+
+    int workers = _resolve_thread_count(options->workers);
+    _agm_pipeline p;
+    _pipeline_init(&p, &source, palette, options);
+    p.write_file = true;
+    p.progress = options->progress;
+    p.progress_arg = options->progress_arg;
+    p.decimate = decimate;
+    p.source_rate = source_rate;
+    p.target_rate = target_rate;
+    if (audio_found > 0) {
+        p.audio = &audio;
+        // By default one chunk holds a frame's worth of samples
+        p.audio_chunk_size = options->audio_chunk_size > 0 ? (size_t)options->audio_chunk_size
+            : (size_t)(((uint64_t)options->audio_rate * frame_rate.den + frame_rate.num - 1) / frame_rate.num);
+    }
+
+    if (!_pipeline_alloc(&p, workers, 0)) {
+        p.status = AGM_NO_MEMORY;
+    } else if (p.audio && !_agm_audio_start(p.audio)) {
+        p.status = AGM_NO_MEMORY;
+    } else if ((p.fp = fopen(output_file, "wb")) == NULL) {
+        p.status = AGM_WRITE_FAILED;
+    } else {
+        // The frame count, index offset and audio length are filled in once everything is written.
+        // Files without audio keep the version 1 header.
+        p.header.version = p.audio ? AGM_VERSION : 1;
+        p.header.header_size = p.audio ? AGM_AUDIO_HEADER_SIZE : AGM_HEADER_SIZE;
+        p.header.width = (uint16_t)options->width;
+        p.header.height = (uint16_t)options->height;
+        p.header.fps_num = known_rate ? (uint32_t)frame_rate.num : 0;
+        p.header.fps_den = known_rate ? (uint32_t)frame_rate.den : 1;
+        p.header.palette_id = options->palette_id;
+        p.header.flags = AGM_CODEC_RLE | (options->keyframe_interval > 1 ? AGM_CODEC_DELTA : 0) | (p.audio ? AGM_CODEC_AUDIO : 0);
+        p.header.audio_rate = p.audio ? (uint32_t)options->audio_rate : 0;
+        p.header.audio_chunk_size = (uint32_t)p.audio_chunk_size;
+        p.record_offset = p.header.header_size;
+
+        if (!_agm_write_header(p.fp, &p.header)) {
+            p.status = AGM_WRITE_FAILED;
+        } else {
+            _run_pipeline(&p, workers);
+            double start = _monotonic_seconds();
+            if (p.status == AGM_OK && p.audio) {
+                // Audio running past the last frame
+                p.status = _write_audio_until(&p, UINT64_MAX);
+                p.header.audio_sample_count = (uint32_t)p.stats.audio_samples;
+            }
+            if (p.status == AGM_OK && !_agm_finish_file(&p)) {
+                p.status = AGM_WRITE_FAILED;
+            }
+            _stage_lap(&p, AGM_STAGE_WRITE, &start);
+        }
+        if (fclose(p.fp) != 0 && p.status == AGM_OK) {
+            p.status = AGM_WRITE_FAILED;
+        }
+        if (!p.progress) {
+            fprintf(stderr, "\n");
+        }
+    }
+    _pipeline_times(&p, &p.stats);
+    *stats = p.stats;
+    p.stats.change_ratios = NULL;  // Handed over to the caller
+
+    if (p.audio) _agm_audio_close(p.audio);
+    _pipeline_free(&p);
+    _agm_source_close(&source);
+    return p.status;
+}
+
+// swscale algorithms by name, for scale_algorithm=
+static const struct { const char *name; int flags; } _scale_algorithms[] = {
+    {"fast_bilinear", SWS_FAST_BILINEAR},
+    {"bilinear", SWS_BILINEAR},
+    {"bicubic", SWS_BICUBIC},
+    {"point", SWS_POINT},
+    {"area", SWS_AREA},
+    {"lanczos", SWS_LANCZOS},
+};
+
+// Fill in the decoder and scaler settings from mp4_to_agm's keyword arguments.
+// Returns false with a Python exception set if any of them is invalid.
+static bool _parse_source_options(AgmOptions *options, int decode_threads, const char *thread_type, const char *scale_algorithm, PyObject *crop) {
+    if (decode_threads < 0) {
+        PyErr_SetString(PyExc_ValueError, "decode_threads must not be negative");
+        return false;
+    }
+    options->decode_threads = decode_threads;
+
+    if (strcasecmp(thread_type, "frame") == 0) {
+        options->decode_thread_type = FF_THREAD_FRAME;
+    } else if (strcasecmp(thread_type, "slice") == 0) {
+        options->decode_thread_type = FF_THREAD_SLICE;
+    } else if (strcasecmp(thread_type, "frame+slice") == 0) {
+        options->decode_thread_type = FF_THREAD_FRAME | FF_THREAD_SLICE;
+    } else {
+        PyErr_Format(PyExc_ValueError, "Unknown thread_type '%s', expected 'frame', 'slice' or 'frame+slice'", thread_type);
+        return false;
+    }
+
+    options->scale_flags = -1;
+    for (size_t i = 0; i < sizeof(_scale_algorithms) / sizeof(_scale_algorithms[0]); i++) {
+        if (strcasecmp(scale_algorithm, _scale_algorithms[i].name) == 0) {
+            options->scale_flags = _scale_algorithms[i].flags;
+        }
+    }
+    if (options->scale_flags < 0) {
+        PyErr_Format(PyExc_ValueError, "Unknown scale_algorithm '%s'", scale_algorithm);
+        return false;
+    }
+
+    options->crop_mode = AGM_CROP_NONE;
+    if (crop == Py_None) {
+        return true;
+    }
+    if (PyUnicode_Check(crop)) {
+        if (PyUnicode_CompareWithASCIIString(crop, "center") != 0) {
+            PyErr_SetString(PyExc_ValueError, "crop must be None, 'center' or an (x, y, w, h) tuple");
+            return false;
+        }
+        options->crop_mode = AGM_CROP_CENTER;
+        return true;
+    }
+    if (!PyArg_ParseTuple(crop, "iiii", &options->crop_x, &options->crop_y, &options->crop_w, &options->crop_h)) {
+        PyErr_SetString(PyExc_ValueError, "crop must be None, 'center' or an (x, y, w, h) tuple");
+        return false;
+    }
+    if (options->crop_x < 0 || options->crop_y < 0 || options->crop_w <= 0 || options->crop_h <= 0) {
+        PyErr_SetString(PyExc_ValueError, "crop rectangle must have a non-negative origin and a positive size");
+        return false;
+    }
+    options->crop_mode = AGM_CROP_RECT;
+    return true;
+}
+
+// Raise the Python exception for a failed run's status; always returns NULL
+static PyObject* _agm_error(int status, const char *src_file) {
+    switch (status) {
+        case AGM_NO_MEMORY:
+            return PyErr_NoMemory();
+        case AGM_OPEN_FAILED:
+            PyErr_Format(PyExc_IOError, "Failed to open video file '%s'", src_file);
+            return NULL;
+        case AGM_BAD_CROP:
+            PyErr_Format(PyExc_ValueError, "crop rectangle doesn't fit inside the frames of '%s'", src_file);
+            return NULL;
+        case AGM_DECODE_FAILED:
+            PyErr_Format(PyExc_IOError, "Failed to decode video file '%s'", src_file);
+            return NULL;
+        default:
+            PyErr_SetString(PyExc_IOError, "Failed to write target file");
+            return NULL;
+    }
+}
+
+// Build the Python stats dict for a run, adding change_ratios (stolen) if not NULL
+static PyObject* _agm_stats_dict(const AgmStats *stats, int pixel_count, PyObject *change_ratios) {
+    int frames = stats->frames > 0 ? stats->frames : 1;
+    long long raw_bytes = (long long)stats->frames * pixel_count;
+    PyObject *dict = Py_BuildValue("{s:i,s:i,s:i,s:i,s:L,s:L,s:L,s:d,s:L,s:d,s:i,s:i,s:L,"
+                                   "s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d,s:d}",
+        "frames", stats->frames,
+        "keyframes", stats->keyframes,
+        "repeats", stats->repeats,
+        "frames_dropped", stats->frames_dropped,
+        "bytes_written", stats->bytes_written,
+        "allocations", stats->allocations,
+        "allocated_bytes", stats->allocated_bytes,
+        "allocations_per_frame", (double)stats->allocations / frames,
+        "bytes_copied", stats->bytes_copied,
+        "bytes_copied_per_frame", (double)stats->bytes_copied / frames,
+        "scene_cuts", stats->scene_cuts,
+        "audio_chunks", stats->audio_chunks,
+        "audio_samples", stats->audio_samples,
+        "decode_time", stats->decode_time,
+        "scale_time", stats->scale_time,
+        "convert_time", stats->convert_time,
+        "lookback_time", stats->lookback_time,
+        "rle_time", stats->rle_time,
+        "write_time", stats->write_time,
+        "elapsed_time", stats->elapsed_time,
+        "frames_per_second", stats->elapsed_time > 0 ? stats->frames / stats->elapsed_time : 0.0,
+        "bytes_per_frame", (double)stats->bytes_written / frames,
+        "compression_ratio", stats->bytes_written > 0 ? (double)raw_bytes / stats->bytes_written : 0.0);
+    if (!change_ratios) {
+        return dict;
+    }
+    if (!dict || PyDict_SetItemString(dict, "change_ratios", change_ratios) < 0) {
+        Py_XDECREF(dict);
+        dict = NULL;
+    }
+    Py_DECREF(change_ratios);
+    return dict;
+}
+
+// mp4_to_agm's progress= callback, run from the encoder's write thread
+typedef struct {
+    PyObject *callback;
+    int pixel_count;
+    PyObject *error_type, *error_value, *error_traceback;  // What the callback raised, to re-raise on return
+} _agm_progress;
+
+static bool _agm_call_progress(void *arg, const AgmStats *stats) {
+    _agm_progress *progress = (_agm_progress *)arg;
+    PyGILState_STATE gil = PyGILState_Ensure();
+    PyObject *stats_dict = _agm_stats_dict(stats, progress->pixel_count, NULL);
+    PyObject *result = stats_dict ? PyObject_CallOneArg(progress->callback, stats_dict) : NULL;
+    bool ok = result != NULL;
+    if (!ok) {
+        PyErr_Fetch(&progress->error_type, &progress->error_value, &progress->error_traceback);
+    }
+    Py_XDECREF(result);
+    Py_XDECREF(stats_dict);
+    PyGILState_Release(gil);
+    return ok;
+}
+
+PyObject* mp4_to_agm(PyObject *self, PyObject *args, PyObject *kwargs) {
+    const char *src_file, *tgt_file, *noDither_method, *dither_method;
+    const char *thread_type = "frame+slice", *scale_algorithm = "bilinear";
+    int width, height, lookback, keyframe_interval = 0, workers = 0, decode_threads = 0;
+    int audio_rate = 0, audio_chunk_size = 0;
+    double scene_cut_threshold = 0.0, target_fps = 0.0;
+    PyObject *palette_arg, *transparent_color = Py_None, *palette_id_arg = Py_None, *crop = Py_None, *progress_arg = Py_None;
+    static char *kwlist[] = {"src_file", "tgt_file", "width", "height", "palette", "nodither_method", "dither_method", "lookback", "transparent_color", "keyframe_interval", "workers", "palette_id", "scene_cut_threshold", "audio_rate", "audio_chunk_size", "decode_threads", "thread_type", "scale_algorithm", "crop", "target_fps", "progress", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ssiiOssi|OiiOdiiissOdO", kwlist, &src_file, &tgt_file, &width, &height, &palette_arg, &noDither_method, &dither_method, &lookback, &transparent_color, &keyframe_interval, &workers, &palette_id_arg, &scene_cut_threshold, &audio_rate, &audio_chunk_size, &decode_threads, &thread_type, &scale_algorithm, &crop, &target_fps, &progress_arg)) {
+        return NULL;
+    }
+
+    if (width <= 0 || height <= 0 || width > UINT16_MAX || height > UINT16_MAX) {
+        PyErr_SetString(PyExc_ValueError, "width and height must be between 1 and 65535");
+        return NULL;
+    }
+    if (lookback < 0 || keyframe_interval < 0) {
+        PyErr_SetString(PyExc_ValueError, "lookback and keyframe_interval must not be negative");
+        return NULL;
+    }
+    if (!(scene_cut_threshold >= 0.0 && scene_cut_threshold <= 1.0)) {
+        PyErr_SetString(PyExc_ValueError, "scene_cut_threshold must be between 0.0 and 1.0");
+        return NULL;
+    }
+    if (progress_arg != Py_None && !PyCallable_Check(progress_arg)) {
+        PyErr_SetString(PyExc_TypeError, "progress must be callable or None");
+        return NULL;
+    }
+    if (!(target_fps >= 0.0 && target_fps <= 1000.0)) {
+        PyErr_SetString(PyExc_ValueError, "target_fps must be between 0 and 1000");
+        return NULL;
+    }
+    if (audio_rate < 0 || audio_chunk_size < 0 || (size_t)audio_chunk_size > AGM_RECORD_SIZE_MASK) {
+        PyErr_SetString(PyExc_ValueError, "audio_rate and audio_chunk_size must not be negative, and chunks must be under 1 GiB");
+        return NULL;
+    }
+    if (!_is_palette_conversion_method(noDither_method)) {
+        PyErr_Format(PyExc_ValueError, "Unknown palette conversion method '%s'", noDither_method);
+        return NULL;
+    }
+    if (!_is_palette_conversion_method(dither_method)) {
+        PyErr_Format(PyExc_ValueError, "Unknown palette conversion method '%s'", dither_method);
+        return NULL;
+    }
+
+    AgmOptions options;
+    memset(&options, 0, sizeof(options));
+    options.width = width;
+    options.height = height;
+    options.noDither_method = noDither_method;
+    options.dither_method = dither_method;
+    options.lookback = lookback;
+    options.keyframe_interval = keyframe_interval;
+    options.scene_cut_threshold = scene_cut_threshold;
+    options.audio_rate = audio_rate;
+    options.audio_chunk_size = audio_chunk_size;
+    options.target_fps = target_fps;
+    options.workers = workers;
+    _agm_progress progress = {progress_arg, width * height, NULL, NULL, NULL};
+    if (progress_arg != Py_None) {
+        options.progress = _agm_call_progress;
+        options.progress_arg = &progress;
+    }
+    if (!_parse_source_options(&options, decode_threads, thread_type, scale_algorithm, crop)) {
+        return NULL;
+    }
+
+    options.has_transparent_color = _parse_transparent_color(transparent_color, options.transparent_rgb);
+    if (PyErr_Occurred()) {
+        return NULL;
+    }
+
+    PyObject *palette_obj = _palette_object_from_arg(palette_arg);
+    if (!palette_obj) {
+        return NULL;
+    }
+    Palette *palette = &((PaletteObject *)palette_obj)->palette;
+
+    // The palette id defaults to the number of colors, which tells the Agon palettes apart
+    options.palette_id = (uint32_t)palette->size;
+    if (palette_id_arg != Py_None) {
+        options.palette_id = (uint32_t)PyLong_AsUnsignedLong(palette_id_arg);
+        if (PyErr_Occurred()) {
+            Py_DECREF(palette_obj);
+            return NULL;
+        }
+    }
+
+    int status;
+    AgmStats stats;
+    Py_BEGIN_ALLOW_THREADS
+    status = _process_mp4(src_file, tgt_file, palette, &options, &stats);
+    Py_END_ALLOW_THREADS
+    Py_DECREF(palette_obj);
+
+    if (status == AGM_CANCELLED && progress.error_type) {
+        free(stats.change_ratios);
+        PyErr_Restore(progress.error_type, progress.error_value, progress.error_traceback);
+        return NULL;
+    }
+    // The callback may also have failed after another error had already stopped the run
+    Py_XDECREF(progress.error_type);
+    Py_XDECREF(progress.error_value);
+    Py_XDECREF(progress.error_traceback);
+    if (status != AGM_OK) {
+        free(stats.change_ratios);
+        return _agm_error(status, src_file);
+    }
+
+    PyObject *change_ratios = PyList_New(stats.frames);
+    for (int i = 0; change_ratios && i < stats.frames; i++) {
+        PyObject *ratio = PyFloat_FromDouble(stats.change_ratios[i]);
+        if (!ratio) {
+            Py_CLEAR(change_ratios);
+            break;
+        }
+        PyList_SET_ITEM(change_ratios, i, ratio);
+    }
+    free(stats.change_ratios);
+    if (!change_ratios) {
+        return NULL;
+    }
+    return _agm_stats_dict(&stats, width * height, change_ratios);
+}
+
+// ----------------------------------------------------------------
+// agonutils.iter_video_frames: the pipeline minus the write stage.
+// The decode, conversion and lookback stages run on their own threads and
+// fill the frame pool ahead of the consumer; __next__ copies the oldest
+// finished frame out and hands its buffers back to the pool.
+// ----------------------------------------------------------------
+
+typedef struct {
+    PyObject_HEAD
+    _agm_pipeline p;
+    _agm_source source;
+    PyObject *palette_obj;    // Kept alive for the conversion workers
+    char *src_file;           // Owned copies; the pipeline points at the method names
+    char *noDither_method;
+    char *dither_method;
+    bool started;             // Source open and pipeline set up, so both need freeing
+    bool running;             // Frames may still come; cleared by whichever of __next__ and close() ends it
+    bool joined;              // Stage threads joined (or never started)
+} VideoFrameIteratorObject;
+
+// End the iteration and wait for the stage threads, first stopping them if abort is set.
+// Call with the GIL: __next__ waits without it, so close() on another thread can get here
+// at the same time, and only the caller that sets joined may join the threads.
+static void _video_frames_stop(VideoFrameIteratorObject *self, bool abort) {
+    self->running = false;
+    if (self->joined) {
+        return;
+    }
+    self->joined = true;
+    Py_BEGIN_ALLOW_THREADS
+    if (abort) _pipeline_abort(&self->p);
+    _pipeline_join(&self->p);
+    Py_END_ALLOW_THREADS
+}
+
+static void VideoFrameIterator_dealloc(VideoFrameIteratorObject *self) {
+    _video_frames_stop(self, true);
+    if (self->started) {
+        _pipeline_free(&self->p);
+        _agm_source_close(&self->source);
+    }
+    Py_XDECREF(self->palette_obj);
+    free(self->src_file);
+    free(self->noDither_method);
+    free(self->dither_method);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static PyObject* VideoFrameIterator_next(VideoFrameIteratorObject *self) {
+    if (!self->running) {
+        return NULL;
+    }
+    _agm_frame *frame;
+    Py_BEGIN_ALLOW_THREADS
+    frame = _frame_queue_get(&self->p.write_queue);
+    Py_END_ALLOW_THREADS
+
+    if (frame) {
+        PyObject *result = PyBytes_FromStringAndSize((const char *)frame->dither, self->p.pixel_count);
+        _frame_queue_put(&self->p.free_frames, frame);
+        return result;
+    }
+
+    // close() on another thread stopped the pipeline while we waited
+    if (self->joined) {
+        self->running = false;
+        return NULL;
+    }
+    // Every frame has been handed out, or a stage failed
+    _video_frames_stop(self, false);
+    int status = _pipeline_status(&self->p);
+    return status == AGM_OK ? NULL : _agm_error(status, self->src_file);
+}
+
+static PyObject* VideoFrameIterator_close(VideoFrameIteratorObject *self, PyObject *Py_UNUSED(ignored)) {
+    _video_frames_stop(self, true);
+    Py_RETURN_NONE;
+}
+
+static PyObject* VideoFrameIterator_enter(VideoFrameIteratorObject *self, PyObject *Py_UNUSED(ignored)) {
+    Py_INCREF(self);
+    return (PyObject *)self;
+}
+
+static PyObject* VideoFrameIterator_exit(VideoFrameIteratorObject *self, PyObject *args) {
+    return VideoFrameIterator_close(self, NULL);
+}
+
+static PyMethodDef VideoFrameIterator_methods[] = {
+    {"close", (PyCFunction)VideoFrameIterator_close, METH_NOARGS, "close() -> None\n\nStop decoding and drop any frames not yet taken."},
+    {"__enter__", (PyCFunction)VideoFrameIterator_enter, METH_NOARGS, NULL},
+    {"__exit__", (PyCFunction)VideoFrameIterator_exit, METH_VARARGS, NULL},
+    {NULL, NULL, 0, NULL}  // Sentinel
+};
+
+PyTypeObject VideoFrameIteratorType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "agonutils.VideoFrameIterator",
+    .tp_doc = "Iterator over a video's palette-converted frames, as returned by iter_video_frames",
+    .tp_basicsize = sizeof(VideoFrameIteratorObject),
+    .tp_itemsize = 0,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_dealloc = (destructor)VideoFrameIterator_dealloc,
+    .tp_iter = PyObject_SelfIter,
+    .tp_iternext = (iternextfunc)VideoFrameIterator_next,
+    .tp_methods = VideoFrameIterator_methods,
+};
+
+PyObject* iter_video_frames(PyObject *self, PyObject *args, PyObject *kwargs) {
+    const char *src_file, *method, *noDither_method = "RGB";
+    const char *thread_type = "frame+slice", *scale_algorithm = "bilinear";
+    int width, height, lookback, workers = 0, prefetch = 8, decode_threads = 0;
+    PyObject *palette_arg, *transparent_color = Py_None, *crop = Py_None;
+    static char *kwlist[] = {"src_file", "width", "height", "palette", "method", "lookback", "nodither_method", "transparent_color", "workers", "prefetch", "decode_threads", "thread_type", "scale_algorithm", "crop", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "siiOsi|sOiiissO", kwlist, &src_file, &width, &height, &palette_arg, &method, &lookback, &noDither_method, &transparent_color, &workers, &prefetch, &decode_threads, &thread_type, &scale_algorithm, &crop)) {
+        return NULL;
+    }
+
+    if (width <= 0 || height <= 0 || width > UINT16_MAX || height > UINT16_MAX) {
+        PyErr_SetString(PyExc_ValueError, "width and height must be between 1 and 65535");
+        return NULL;
+    }
+    if (lookback < 0 || prefetch < 0) {
+        PyErr_SetString(PyExc_ValueError, "lookback and prefetch must not be negative");
+        return NULL;
+    }
+    if (!_is_palette_conversion_method(method)) {
+        PyErr_Format(PyExc_ValueError, "Unknown palette conversion method '%s'", method);
+        return NULL;
+    }
+    if (!_is_palette_conversion_method(noDither_method)) {
+        PyErr_Format(PyExc_ValueError, "Unknown palette conversion method '%s'", noDither_method);
+        return NULL;
+    }
+
+    AgmOptions options;
+    memset(&options, 0, sizeof(options));
+    options.width = width;
+    options.height = height;
+    options.lookback = lookback;
+    options.workers = workers;
+    if (!_parse_source_options(&options, decode_threads, thread_type, scale_algorithm, crop)) {
+        return NULL;
+    }
+    options.has_transparent_color = _parse_transparent_color(transparent_color, options.transparent_rgb);
+    if (PyErr_Occurred()) {
+        return NULL;
+    }
+
+    VideoFrameIteratorObject *iterator = PyObject_New(VideoFrameIteratorObject, &VideoFrameIteratorType);
+    if (!iterator) {
+        return NULL;
+    }
+    iterator->palette_obj = NULL;
+    iterator->started = iterator->running = false;
+    iterator->joined = true;
+    iterator->src_file = strdup(src_file);
+    iterator->noDither_method = strdup(noDither_method);
+    iterator->dither_method = strdup(method);
+    if (!iterator->src_file || !iterator->noDither_method || !iterator->dither_method) {
+        Py_DECREF(iterator);
+        return PyErr_NoMemory();
+    }
+    options.noDither_method = iterator->noDither_method;
+    options.dither_method = iterator->dither_method;
+
+    iterator->palette_obj = _palette_object_from_arg(palette_arg);
+    if (!iterator->palette_obj) {
+        Py_DECREF(iterator);
+        return NULL;
+    }
+    Palette *palette = &((PaletteObject *)iterator->palette_obj)->palette;
+
+    int status;
+    Py_BEGIN_ALLOW_THREADS
+    status = _agm_source_open(&iterator->source, src_file, &options);
+    if (status == AGM_OK) {
+        int worker_count = _resolve_thread_count(options.workers);
+        _pipeline_init(&iterator->p, &iterator->source, palette, &options);
+        iterator->started = true;
+        if (_pipeline_alloc(&iterator->p, worker_count, prefetch)) {
+            _pipeline_start(&iterator->p, worker_count, true);
+            iterator->running = true;
+            iterator->joined = false;
+            status = _pipeline_status(&iterator->p);
+        } else {
+            status = AGM_NO_MEMORY;
+        }
+    }
+    Py_END_ALLOW_THREADS
+
+    if (status != AGM_OK) {
+        _agm_error(status, src_file);
+        Py_DECREF(iterator);
+        return NULL;
+    }
+    return (PyObject *)iterator;
 }
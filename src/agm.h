@@ -5,23 +5,124 @@
 extern "C" {
 #endif
 
-#include <libavcodec/avcodec.h>
-#include <libavformat/avformat.h>
-#include <libswscale/swscale.h>
-#include <libavutil/imgutils.h>
+#include <Python.h>
 #include <stdio.h>
 #include <stdint.h>
+#include "agmfile.h"
 #include "images.h"
 #include "rle.h"
-#include <Python.h>
 
 // ----------------------------------------------------------------
 // Internal MP4 Processing Function:
-// Processes an MP4 file by extracting frames, applying palette conversion 
-// (with both no-dither and dither methods), reusing dithering with lookback, 
+// Processes an MP4 file by extracting frames, applying palette conversion
+// (with both no-dither and dither methods), reusing dithering with lookback,
 // and writing out a single custom movie file (packed RGBA2 frames).
+//
+// The work runs as a pipeline of threads connected by bounded queues:
+//   decode + scale (calling thread) -> palette conversion ('workers' threads,
+//   frames converted independently) -> dither lookback (one thread, in frame
+//   order) -> RLE + write (one thread).
+// Decoding can use FFmpeg's frame and slice threading, and swscale crops and
+// scales each frame to the output size in a single pass.
+// Frame buffers come from a pool sized once from output_width/height and are
+// recycled, so the per-frame loop allocates nothing.
+// Pure C; safe to call with the GIL released.
+//
+// Output is an AGM container (see agmfile.h). With a keyframe_interval above 1,
+// frames after the first may be written as delta frames: the RLE of
+// compute_difference against the previous frame, so transparent runs mean
+// "leave these pixels alone" and opaque pixels overwrite. Frames where a pixel
+// turns transparent, or where the delta isn't smaller, are written as keyframes.
+// A frame identical to the previous one is written as an empty delta record
+// whatever the keyframe_interval, unless the interval makes a keyframe due.
+//
+// Scene cuts: when scene_cut_threshold is set, a frame whose no-dither pixels
+// changed from the previous frame's by at least that fraction is treated like
+// the first frame: the lookback state is reset, its dither frame is used as
+// is, and it's written as a keyframe.
+//
+// Frame rate: with target_fps below the source's frame rate, the decode stage
+// drops frames before they're scaled, keeping each frame whose time reaches
+// the next output frame's. The header gets the target rate. Sources without
+// a known frame rate keep every frame.
+//
+// Repeats: a frame whose final output is identical to the previous frame's is
+// written as an empty delta frame ("nothing changed") when delta frames are on.
+//
+// Audio: with audio_rate set, the input's audio stream is decoded on its own
+// thread (see agmaudio.h), resampled to signed 8-bit mono PCM and written as
+// fixed-size chunks between the frames, each frame preceded by the chunks
+// that start before it ends. Inputs without audio, or without a known frame
+// rate, get a video-only file.
 // ----------------------------------------------------------------
-int _process_mp4(const char *input_file, const char *output_file, int output_width, int output_height, const char *palette_file, const char *noDither_method, const char *dither_method, int lookback, bool has_transparent_color, const uint8_t transparent_rgb[3]);
+
+// Result codes for _process_mp4
+enum {
+    AGM_OK,
+    AGM_OPEN_FAILED,    // Input missing, unreadable or without a decodable video stream
+    AGM_DECODE_FAILED,
+    AGM_WRITE_FAILED,
+    AGM_NO_MEMORY,
+    AGM_BAD_CROP,       // Crop rectangle doesn't fit inside the source frame
+    AGM_CANCELLED       // The progress callback returned false
+};
+
+struct AgmStats;
+
+// Source region scaled to the output size
+enum {
+    AGM_CROP_NONE,      // Whole frame
+    AGM_CROP_CENTER,    // Largest centered region with the output's aspect ratio
+    AGM_CROP_RECT       // crop_x, crop_y, crop_w, crop_h
+};
+
+// Settings for one _process_mp4 run
+typedef struct {
+    int width, height;              // Output size
+    const char *noDither_method;    // Both methods must pass _is_palette_conversion_method
+    const char *dither_method;
+    int lookback;
+    int keyframe_interval;          // Longest run of frames from one keyframe to the next; 0 or 1 writes no difference frames, only repeats
+    double scene_cut_threshold;     // Change ratio at which a frame counts as a scene cut; 0 disables detection
+    double target_fps;              // Output frame rate; 0, or anything at or above the source's, keeps every frame
+    int audio_rate;                 // Audio track sample rate in Hz; 0 leaves the audio out
+    int audio_chunk_size;           // Bytes per audio chunk; 0 for one frame's worth
+    uint32_t palette_id;            // Stored in the header for the player
+    bool has_transparent_color;
+    uint8_t transparent_rgb[3];
+    int workers;                    // Conversion threads; <= 0 means one per CPU
+    int decode_threads;             // Decoder threads; 0 lets FFmpeg pick
+    int decode_thread_type;         // FF_THREAD_FRAME and/or FF_THREAD_SLICE
+    int scale_flags;                // SWS_* scaling algorithm
+    int crop_mode;                  // AGM_CROP_*
+    int crop_x, crop_y, crop_w, crop_h;
+    // Called on the write thread after each frame with the stats so far; returning false stops the run.
+    // NULL prints the frame count to stderr instead.
+    bool (*progress)(void *arg, const struct AgmStats *stats);
+    void *progress_arg;
+} AgmOptions;
+
+// Buffer and copy counts and stage timings for one _process_mp4 run
+typedef struct AgmStats {
+    int frames;                 // Frames written
+    int keyframes;              // Of which keyframes
+    int repeats;                // Of which repeats of the previous frame, written as empty delta frames
+    int frames_dropped;         // Decoded frames left out to reach target_fps
+    long long bytes_written;    // Whole file: header, records and frame index
+    long long allocations;      // Buffers allocated by the encoder; all up front, none per frame
+    long long allocated_bytes;
+    long long bytes_copied;     // memcpy traffic between frame buffers
+    int scene_cuts;             // Frames where the lookback state was reset
+    int audio_chunks;           // Audio chunks written
+    long long audio_samples;    // Audio samples written, not counting the last chunk's padding
+    // Seconds each stage spent working, summed over its threads and not counting waits for other stages.
+    // Writing includes waiting for the audio track.
+    double decode_time, scale_time, convert_time, lookback_time, rle_time, write_time;
+    double elapsed_time;        // Wall time of the whole run
+    double *change_ratios;      // Per frame, the fraction of no-dither pixels that changed from the previous frame (1.0 for the first); the caller frees it
+} AgmStats;
+
+int _process_mp4(const char *input_file, const char *output_file, Palette *palette, const AgmOptions *options, AgmStats *stats);
 
 // ----------------------------------------------------------------
 // Internal Helper Functions
@@ -31,14 +132,37 @@ int _process_mp4(const char *input_file, const char *output_file, int output_wid
 //   - If oldNo[i] == newNo[i], increment unchanged_count[i]; otherwise, reset it to 0.
 //   - If unchanged_count[i] < lookback, use oldDither[i] (if unchanged) or newDither[i] (if changed);
 //     else, force newDither[i].
-// The final result is stored in final_out.
+// The final result is stored in final_out, which may be the same buffer as newDither.
 void dither_lookback(const uint8_t *oldNo, const uint8_t *newNo, const uint8_t *oldDither, const uint8_t *newDither, uint16_t *unchanged_count, int size, int lookback, uint8_t *final_out);
 
+// Count the pixels that differ between two frames of length 'size'.
+int count_changed(const uint8_t *oldFrame, const uint8_t *newFrame, int size);
+
 // Compute an 8-bit difference frame between oldFinal and newFinal.
 // For each pixel: diff = 0 if unchanged; otherwise diff = newFinal[i].
 // The difference is stored in diff_out (length 'size').
 void compute_difference(const uint8_t *oldFinal, const uint8_t *newFinal, int size, uint8_t *diff_out);
 
+// ===================================================
+// Prototypes for the Python C-extension entry points:
+// ---------------------------------------------------
+
+// mp4_to_agm(src_file, tgt_file, width, height, palette, nodither_method, dither_method, lookback, transparent_color=None, keyframe_interval=0, workers=0, palette_id=None, scene_cut_threshold=0.0, audio_rate=0, audio_chunk_size=0, decode_threads=0, thread_type='frame+slice', scale_algorithm='bilinear', crop=None, target_fps=0.0, progress=None) -> dict
+// palette may be a palette file path or an agonutils.Palette; palette_id defaults to the number of colors.
+// crop is None, 'center' or an (x, y, w, h) source rectangle.
+// progress, if given, is called with the stats dict so far (without change_ratios) after each frame;
+// an exception from it stops the run and is raised by mp4_to_agm.
+// Returns the run's AgmStats as a dict, with frames_per_second, bytes_per_frame and compression_ratio
+// (RGBA2 frame bytes over file size) worked out from it
+PyObject* mp4_to_agm(PyObject *self, PyObject *args, PyObject *kwargs);
+
+// iter_video_frames(src_file, width, height, palette, method, lookback, nodither_method='RGB', transparent_color=None, workers=0, prefetch=8, decode_threads=0, thread_type='frame+slice', scale_algorithm='bilinear', crop=None) -> VideoFrameIterator
+// Yields each frame as width * height bytes of packed RGBA2, converted and lookback-filtered as mp4_to_agm
+// would write it. The decode and conversion stages run ahead on background threads, up to prefetch
+// frames beyond what the pipeline itself holds.
+PyObject* iter_video_frames(PyObject *self, PyObject *args, PyObject *kwargs);
+extern PyTypeObject VideoFrameIteratorType;
+
 #ifdef __cplusplus
 }
 #endif
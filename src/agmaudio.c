@@ -0,0 +1,196 @@
+#include "agmaudio.h"
+#include <stdlib.h>
+#include <string.h>
+#include <libavutil/channel_layout.h>
+#include <libavutil/version.h>
+
+int _agm_audio_open(AgmAudio *audio, const char *input_file, int sample_rate) {
+    memset(audio, 0, sizeof(AgmAudio));
+    pthread_mutex_init(&audio->lock, NULL);
+    pthread_cond_init(&audio->progress, NULL);
+    audio->sample_rate = sample_rate;
+
+    if (avformat_open_input(&audio->format_ctx, input_file, NULL, NULL) < 0
+        || avformat_find_stream_info(audio->format_ctx, NULL) < 0) {
+        return -1;
+    }
+    audio->stream_index = av_find_best_stream(audio->format_ctx, AVMEDIA_TYPE_AUDIO, -1, -1, NULL, 0);
+    if (audio->stream_index == AVERROR_STREAM_NOT_FOUND) {
+        return 0;
+    }
+    if (audio->stream_index < 0) {
+        return -1;
+    }
+    // Let the demuxer drop every other stream's packets
+    for (unsigned int i = 0; i < audio->format_ctx->nb_streams; i++) {
+        if ((int)i != audio->stream_index) {
+            audio->format_ctx->streams[i]->discard = AVDISCARD_ALL;
+        }
+    }
+
+    AVCodecParameters *codec_params = audio->format_ctx->streams[audio->stream_index]->codecpar;
+    const AVCodec *codec = avcodec_find_decoder(codec_params->codec_id);
+    audio->codec_ctx = codec ? avcodec_alloc_context3(codec) : NULL;
+    if (!audio->codec_ctx || avcodec_parameters_to_context(audio->codec_ctx, codec_params) < 0
+        || avcodec_open2(audio->codec_ctx, codec, NULL) < 0) {
+        return -1;
+    }
+
+    // Mix down to mono unsigned 8-bit; signing the samples is a bit flip afterwards
+#if LIBAVUTIL_VERSION_INT >= AV_VERSION_INT(57, 28, 100)
+    AVChannelLayout mono = AV_CHANNEL_LAYOUT_MONO;
+    if (swr_alloc_set_opts2(&audio->swr_ctx, &mono, AV_SAMPLE_FMT_U8, sample_rate,
+                            &audio->codec_ctx->ch_layout, audio->codec_ctx->sample_fmt, audio->codec_ctx->sample_rate,
+                            0, NULL) < 0
+        || swr_init(audio->swr_ctx) < 0) {
+        return -1;
+    }
+#else
+    // Before FFmpeg 5.1 layouts are bitmasks, and some decoders leave the mask unset
+    int64_t in_layout = audio->codec_ctx->channel_layout
+        ? (int64_t)audio->codec_ctx->channel_layout
+        : av_get_default_channel_layout(audio->codec_ctx->channels);
+    audio->swr_ctx = swr_alloc_set_opts(NULL, AV_CH_LAYOUT_MONO, AV_SAMPLE_FMT_U8, sample_rate,
+                                        in_layout, audio->codec_ctx->sample_fmt, audio->codec_ctx->sample_rate,
+                                        0, NULL);
+    if (!audio->swr_ctx || swr_init(audio->swr_ctx) < 0) {
+        return -1;
+    }
+#endif
+    audio->decoded = av_frame_alloc();
+    audio->packet = av_packet_alloc();
+    if (!audio->decoded || !audio->packet) {
+        return -1;
+    }
+    return 1;
+}
+
+// Resample up to in_count input samples (NULL to flush the resampler) onto the end of the sample buffer.
+// Returns false if out of memory or the resampler fails.
+static bool _agm_audio_append(AgmAudio *audio, const uint8_t **input, int in_count) {
+    int max_out = swr_get_out_samples(audio->swr_ctx, in_count);
+    if (max_out < 0) return false;
+
+    // Only this thread grows the buffer or writes past sample_count, so the lock is only
+    // needed while the buffer may move and when publishing the new samples
+    pthread_mutex_lock(&audio->lock);
+    bool ok = true;
+    if (audio->sample_count + (size_t)max_out > audio->capacity) {
+        size_t capacity = audio->capacity ? audio->capacity : (size_t)audio->sample_rate;
+        while (capacity < audio->sample_count + (size_t)max_out) capacity *= 2;
+        uint8_t *samples = (uint8_t *)realloc(audio->samples, capacity);
+        if (samples) {
+            audio->samples = samples;
+            audio->capacity = capacity;
+        } else {
+            ok = false;
+        }
+    }
+    uint8_t *dst = ok ? &audio->samples[audio->sample_count] : NULL;
+    pthread_mutex_unlock(&audio->lock);
+    if (!ok) return false;
+
+    int converted = swr_convert(audio->swr_ctx, &dst, max_out, input, in_count);
+    if (converted < 0) return false;
+    for (int i = 0; i < converted; i++) {
+        dst[i] ^= 0x80;
+    }
+
+    pthread_mutex_lock(&audio->lock);
+    audio->sample_count += (size_t)converted;
+    pthread_cond_broadcast(&audio->progress);
+    pthread_mutex_unlock(&audio->lock);
+    return true;
+}
+
+// Resample every frame the decoder has ready. Returns false on an error.
+static bool _agm_audio_drain(AgmAudio *audio) {
+    int ret;
+    while ((ret = avcodec_receive_frame(audio->codec_ctx, audio->decoded)) == 0) {
+        bool ok = _agm_audio_append(audio, (const uint8_t **)audio->decoded->extended_data, audio->decoded->nb_samples);
+        av_frame_unref(audio->decoded);
+        if (!ok) return false;
+    }
+    return ret == AVERROR(EAGAIN) || ret == AVERROR_EOF;
+}
+
+static bool _agm_audio_stopping(AgmAudio *audio) {
+    return __atomic_load_n(&audio->stopping, __ATOMIC_ACQUIRE);
+}
+
+static void* _agm_audio_thread(void *arg) {
+    AgmAudio *audio = (AgmAudio *)arg;
+    bool ok = true;
+    while (ok && !_agm_audio_stopping(audio) && av_read_frame(audio->format_ctx, audio->packet) >= 0) {
+        if (audio->packet->stream_index == audio->stream_index) {
+            int ret = avcodec_send_packet(audio->codec_ctx, audio->packet);
+            ok = (ret >= 0 || ret == AVERROR(EAGAIN)) && _agm_audio_drain(audio);
+        }
+        av_packet_unref(audio->packet);
+    }
+    if (ok && !_agm_audio_stopping(audio)) {
+        // Drain the decoder, then the samples the resampler is holding back
+        avcodec_send_packet(audio->codec_ctx, NULL);
+        ok = _agm_audio_drain(audio);
+        size_t before;
+        do {
+            before = _agm_audio_sample_count(audio);
+            ok = ok && _agm_audio_append(audio, NULL, 0);
+        } while (ok && _agm_audio_sample_count(audio) > before);
+    }
+
+    pthread_mutex_lock(&audio->lock);
+    audio->failed = !ok;
+    audio->finished = true;
+    pthread_cond_broadcast(&audio->progress);
+    pthread_mutex_unlock(&audio->lock);
+    return NULL;
+}
+
+bool _agm_audio_start(AgmAudio *audio) {
+    audio->started = pthread_create(&audio->thread, NULL, _agm_audio_thread, audio) == 0;
+    return audio->started;
+}
+
+size_t _agm_audio_read(AgmAudio *audio, size_t offset, uint8_t *dst, size_t count) {
+    pthread_mutex_lock(&audio->lock);
+    while (audio->sample_count < offset + count && !audio->finished) {
+        pthread_cond_wait(&audio->progress, &audio->lock);
+    }
+    size_t available = audio->sample_count > offset ? audio->sample_count - offset : 0;
+    if (available > count) available = count;
+    if (available) memcpy(dst, &audio->samples[offset], available);
+    pthread_mutex_unlock(&audio->lock);
+    return available;
+}
+
+size_t _agm_audio_sample_count(AgmAudio *audio) {
+    pthread_mutex_lock(&audio->lock);
+    size_t count = audio->sample_count;
+    pthread_mutex_unlock(&audio->lock);
+    return count;
+}
+
+bool _agm_audio_failed(AgmAudio *audio) {
+    pthread_mutex_lock(&audio->lock);
+    bool failed = audio->failed;
+    pthread_mutex_unlock(&audio->lock);
+    return failed;
+}
+
+void _agm_audio_close(AgmAudio *audio) {
+    if (audio->started) {
+        __atomic_store_n(&audio->stopping, true, __ATOMIC_RELEASE);
+        pthread_join(audio->thread, NULL);
+        audio->started = false;
+    }
+    av_packet_free(&audio->packet);
+    av_frame_free(&audio->decoded);
+    swr_free(&audio->swr_ctx);
+    avcodec_free_context(&audio->codec_ctx);
+    avformat_close_input(&audio->format_ctx);
+    free(audio->samples);
+    audio->samples = NULL;
+    pthread_mutex_destroy(&audio->lock);
+    pthread_cond_destroy(&audio->progress);
+}
@@ -0,0 +1,70 @@
+#ifndef AGMAUDIO_H
+#define AGMAUDIO_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#include <pthread.h>
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+#include <libavformat/avformat.h>
+#include <libavcodec/avcodec.h>
+#include <libswresample/swresample.h>
+
+// ----------------------------------------------------------------
+// Audio track for AGM movies.
+// Decodes a video file's audio stream on its own thread, with its own
+// demuxer, to signed 8-bit mono PCM (the Agon's sample format) at the
+// requested rate. The AGM write stage reads the samples back as they
+// arrive, so audio never waits on the video pipeline or the other way round.
+// ----------------------------------------------------------------
+
+typedef struct {
+    // Decoded samples, guarded by lock; the buffer grows as decoding goes on
+    uint8_t *samples;
+    size_t sample_count, capacity;
+    bool finished;  // Decoding has stopped: end of stream, error or _agm_audio_stop
+    bool failed;    // Decoding hit an error or ran out of memory
+    bool stopping;
+    pthread_mutex_t lock;
+    pthread_cond_t progress;
+    // Decoder state, owned by the audio thread once started
+    AVFormatContext *format_ctx;
+    AVCodecContext *codec_ctx;
+    struct SwrContext *swr_ctx;
+    AVFrame *decoded;
+    AVPacket *packet;
+    int stream_index;
+    int sample_rate;
+    pthread_t thread;
+    bool started;
+} AgmAudio;
+
+// Open input_file's best audio stream for decoding to sample_rate Hz.
+// Returns 1 if ready, 0 if the file has no audio stream, -1 if it can't be decoded or memory ran out.
+// Call _agm_audio_close afterwards in every case.
+int _agm_audio_open(AgmAudio *audio, const char *input_file, int sample_rate);
+
+// Start decoding on a background thread. Returns false if the thread couldn't be started.
+bool _agm_audio_start(AgmAudio *audio);
+
+// Copy up to count samples starting at sample offset into dst, waiting for them to be decoded.
+// Returns the number copied, short only once decoding has finished.
+size_t _agm_audio_read(AgmAudio *audio, size_t offset, uint8_t *dst, size_t count);
+
+// Total samples decoded so far
+size_t _agm_audio_sample_count(AgmAudio *audio);
+
+// True if decoding stopped with an error
+bool _agm_audio_failed(AgmAudio *audio);
+
+// Stop the audio thread if it's running, and free everything
+void _agm_audio_close(AgmAudio *audio);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // AGMAUDIO_H
@@ -0,0 +1,453 @@
+#define PY_SSIZE_T_CLEAN
+
+#include "agmfile.h"
+#include <fcntl.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+static void _put_le16(uint8_t *dst, uint16_t value) {
+    dst[0] = (uint8_t)value;
+    dst[1] = (uint8_t)(value >> 8);
+}
+
+static void _put_le32(uint8_t *dst, uint32_t value) {
+    dst[0] = (uint8_t)value;
+    dst[1] = (uint8_t)(value >> 8);
+    dst[2] = (uint8_t)(value >> 16);
+    dst[3] = (uint8_t)(value >> 24);
+}
+
+static uint16_t _get_le16(const uint8_t *src) {
+    return (uint16_t)(src[0] | (src[1] << 8));
+}
+
+static uint32_t _get_le32(const uint8_t *src) {
+    return (uint32_t)src[0] | ((uint32_t)src[1] << 8) | ((uint32_t)src[2] << 16) | ((uint32_t)src[3] << 24);
+}
+
+bool _agm_write_header(FILE *fp, const AgmHeader *header) {
+    uint8_t bytes[AGM_AUDIO_HEADER_SIZE] = {0};
+    memcpy(bytes, AGM_MAGIC, 4);
+    _put_le16(&bytes[4], header->version);
+    _put_le16(&bytes[6], header->header_size);
+    _put_le16(&bytes[8], header->width);
+    _put_le16(&bytes[10], header->height);
+    _put_le32(&bytes[12], header->fps_num);
+    _put_le32(&bytes[16], header->fps_den);
+    _put_le32(&bytes[20], header->palette_id);
+    _put_le32(&bytes[24], header->flags);
+    _put_le32(&bytes[28], header->frame_count);
+    _put_le32(&bytes[32], header->index_offset);
+    size_t size = AGM_HEADER_SIZE;
+    if (header->header_size >= AGM_AUDIO_HEADER_SIZE) {
+        _put_le32(&bytes[40], header->audio_rate);
+        _put_le32(&bytes[44], header->audio_chunk_size);
+        _put_le32(&bytes[48], header->audio_sample_count);
+        size = AGM_AUDIO_HEADER_SIZE;
+    }
+    return fwrite(bytes, 1, size, fp) == size;
+}
+
+bool _agm_write_u32(FILE *fp, uint32_t value) {
+    uint8_t bytes[4];
+    _put_le32(bytes, value);
+    return fwrite(bytes, 1, 4, fp) == 4;
+}
+
+const char* _agm_read_header(const uint8_t *data, size_t file_size, AgmHeader *header) {
+    if (file_size < AGM_HEADER_SIZE || memcmp(data, AGM_MAGIC, 4) != 0) {
+        return "Not an AGM file (missing AGMV header)";
+    }
+    header->version = _get_le16(&data[4]);
+    header->header_size = _get_le16(&data[6]);
+    header->width = _get_le16(&data[8]);
+    header->height = _get_le16(&data[10]);
+    header->fps_num = _get_le32(&data[12]);
+    header->fps_den = _get_le32(&data[16]);
+    header->palette_id = _get_le32(&data[20]);
+    header->flags = _get_le32(&data[24]);
+    header->frame_count = _get_le32(&data[28]);
+    header->index_offset = _get_le32(&data[32]);
+
+    if (header->version == 0 || header->version > AGM_VERSION) {
+        return "Unsupported AGM version";
+    }
+    if (header->header_size < AGM_HEADER_SIZE || header->header_size > file_size) {
+        return "Corrupt AGM header";
+    }
+    header->audio_rate = header->audio_chunk_size = header->audio_sample_count = 0;
+    if (header->version >= 2 && header->header_size >= AGM_AUDIO_HEADER_SIZE) {
+        header->audio_rate = _get_le32(&data[40]);
+        header->audio_chunk_size = _get_le32(&data[44]);
+        header->audio_sample_count = _get_le32(&data[48]);
+    }
+    if (header->width == 0 || header->height == 0) {
+        return "AGM file has no frame size";
+    }
+    // frame_count * 8 can't overflow 64 bits
+    if (header->index_offset < header->header_size
+        || (uint64_t)header->index_offset + (uint64_t)header->frame_count * AGM_INDEX_ENTRY_SIZE > file_size) {
+        return "AGM frame index is missing or truncated (was the file finished?)";
+    }
+    return NULL;
+}
+
+bool _agm_apply_record(const uint8_t *data, size_t size, bool delta, uint8_t *frame, size_t pixel_count) {
+    if (delta && size == 0) {
+        // Repeat of the previous frame
+        return true;
+    }
+    size_t out = 0;
+    size_t i = 0;
+    while (i < size) {
+        uint8_t cmd = data[i++];
+        uint8_t type = cmd & 0xC0;
+        size_t count = (size_t)(cmd & 0x3F) + 1;
+        uint8_t pixel;
+        if (type == 0x40) {
+            // Transparent run; in a delta frame, pixels left as they were
+            pixel = 0x00;
+        } else if (type == 0x80) {
+            if (i < size && (data[i] & 0xC0) == 0xC0) {
+                pixel = data[i++];
+            } else {
+                pixel = 0xC0 | (cmd & 0x3F);
+                count = 1;
+            }
+        } else {
+            return false;
+        }
+        if (count > pixel_count - out) {
+            return false;
+        }
+        if (!delta || pixel != 0x00) {
+            memset(&frame[out], pixel, count);
+        }
+        out += count;
+    }
+    return out == pixel_count;
+}
+
+typedef struct {
+    PyObject_HEAD
+    uint8_t *map;           // Whole file, mapped read-only; NULL once closed
+    size_t map_size;
+    AgmHeader header;
+    uint8_t *frame;         // Last decoded frame
+    Py_ssize_t frame_number;  // Which frame 'frame' holds, -1 if none
+} AgmReaderObject;
+
+static void _agm_reader_close(AgmReaderObject *self) {
+    if (self->map) {
+        munmap(self->map, self->map_size);
+        self->map = NULL;
+    }
+    free(self->frame);
+    self->frame = NULL;
+    self->frame_number = -1;
+}
+
+// AgmReader(path): map the file and check its header and index
+static int AgmReader_init(AgmReaderObject *self, PyObject *args, PyObject *kwargs) {
+    PyObject *path_bytes = NULL;
+    static char *kwlist[] = {"path", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O&", kwlist, PyUnicode_FSConverter, &path_bytes)) {
+        return -1;
+    }
+    // Re-initialising an existing object replaces its file
+    _agm_reader_close(self);
+
+    const char *path = PyBytes_AS_STRING(path_bytes);
+    int fd = open(path, O_RDONLY);
+    struct stat st;
+    if (fd < 0 || fstat(fd, &st) != 0) {
+        PyErr_Format(PyExc_IOError, "Failed to open AGM file '%s'", path);
+        if (fd >= 0) close(fd);
+        Py_DECREF(path_bytes);
+        return -1;
+    }
+    if (st.st_size < AGM_HEADER_SIZE) {
+        close(fd);
+        PyErr_Format(PyExc_ValueError, "'%s' is not an AGM file (missing AGMV header)", path);
+        Py_DECREF(path_bytes);
+        return -1;
+    }
+    void *map = mmap(NULL, (size_t)st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (map == MAP_FAILED) {
+        PyErr_Format(PyExc_IOError, "Failed to map AGM file '%s'", path);
+        Py_DECREF(path_bytes);
+        return -1;
+    }
+    self->map = (uint8_t *)map;
+    self->map_size = (size_t)st.st_size;
+
+    const char *error = _agm_read_header(self->map, self->map_size, &self->header);
+    if (error) {
+        PyErr_Format(PyExc_ValueError, "%s: '%s'", error, path);
+        _agm_reader_close(self);
+        Py_DECREF(path_bytes);
+        return -1;
+    }
+    Py_DECREF(path_bytes);
+
+    self->frame = (uint8_t *)calloc((size_t)self->header.width * self->header.height, 1);
+    if (!self->frame) {
+        _agm_reader_close(self);
+        PyErr_NoMemory();
+        return -1;
+    }
+    return 0;
+}
+
+static void AgmReader_dealloc(AgmReaderObject *self) {
+    _agm_reader_close(self);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static bool _agm_reader_check_open(AgmReaderObject *self) {
+    if (!self->map) {
+        PyErr_SetString(PyExc_ValueError, "I/O operation on closed AgmReader");
+        return false;
+    }
+    return true;
+}
+
+// Index entry for frame i: record offset and size word
+static void _agm_reader_entry(AgmReaderObject *self, Py_ssize_t i, uint32_t *offset, uint32_t *size_word) {
+    const uint8_t *entry = &self->map[self->header.index_offset + (size_t)i * AGM_INDEX_ENTRY_SIZE];
+    *offset = _get_le32(entry);
+    *size_word = _get_le32(entry + 4);
+}
+
+// Locate frame i's RLE data in the map, or set ValueError if the index points outside the file
+static const uint8_t* _agm_reader_record(AgmReaderObject *self, Py_ssize_t i, size_t *size, bool *delta) {
+    uint32_t offset, size_word;
+    _agm_reader_entry(self, i, &offset, &size_word);
+    *size = size_word & AGM_RECORD_SIZE_MASK;
+    *delta = (size_word & AGM_DELTA_FLAG) != 0;
+    if ((uint64_t)offset + 4 + *size > self->map_size) {
+        PyErr_Format(PyExc_ValueError, "AGM frame %zd lies outside the file", i);
+        return NULL;
+    }
+    return &self->map[offset + 4];
+}
+
+static Py_ssize_t AgmReader_len(AgmReaderObject *self) {
+    return self->map ? (Py_ssize_t)self->header.frame_count : 0;
+}
+
+// reader[i] -> bytes: frame i as width * height packed RGBA2 pixels
+static PyObject* AgmReader_item(AgmReaderObject *self, Py_ssize_t i) {
+    if (!_agm_reader_check_open(self)) return NULL;
+    if (i < 0 || i >= (Py_ssize_t)self->header.frame_count) {
+        PyErr_SetString(PyExc_IndexError, "AGM frame index out of range");
+        return NULL;
+    }
+
+    size_t pixel_count = (size_t)self->header.width * self->header.height;
+    if (self->frame_number != i) {
+        // Walk back to the nearest keyframe, or to the frame already decoded
+        Py_ssize_t start = i;
+        for (;;) {
+            uint32_t offset, size_word;
+            _agm_reader_entry(self, start, &offset, &size_word);
+            if (!(size_word & AGM_DELTA_FLAG) || start == self->frame_number + 1 || start == 0) break;
+            start--;
+        }
+        for (Py_ssize_t f = start; f <= i; f++) {
+            size_t size;
+            bool delta;
+            const uint8_t *data = _agm_reader_record(self, f, &size, &delta);
+            if (!data) {
+                self->frame_number = -1;
+                return NULL;
+            }
+            // A fresh reader or one reset by an error has no frame to apply a delta to
+            if (delta && (self->frame_number < 0 || f != self->frame_number + 1)) {
+                self->frame_number = -1;
+                PyErr_Format(PyExc_ValueError, "AGM frame %zd is a delta with no keyframe before it", f);
+                return NULL;
+            }
+            if (!_agm_apply_record(data, size, delta, self->frame, pixel_count)) {
+                self->frame_number = -1;
+                PyErr_Format(PyExc_ValueError, "AGM frame %zd is corrupt", f);
+                return NULL;
+            }
+            self->frame_number = f;
+        }
+    }
+    return PyBytes_FromStringAndSize((const char *)self->frame, (Py_ssize_t)pixel_count);
+}
+
+// reader.is_keyframe(i) -> bool
+static PyObject* AgmReader_is_keyframe(AgmReaderObject *self, PyObject *args) {
+    Py_ssize_t i;
+    if (!PyArg_ParseTuple(args, "n", &i)) return NULL;
+    if (!_agm_reader_check_open(self)) return NULL;
+    if (i < 0) i += (Py_ssize_t)self->header.frame_count;
+    if (i < 0 || i >= (Py_ssize_t)self->header.frame_count) {
+        PyErr_SetString(PyExc_IndexError, "AGM frame index out of range");
+        return NULL;
+    }
+    uint32_t offset, size_word;
+    _agm_reader_entry(self, i, &offset, &size_word);
+    return PyBool_FromLong(!(size_word & AGM_DELTA_FLAG));
+}
+
+// reader.record(i) -> bytes: frame i's RLE data as stored
+static PyObject* AgmReader_record(AgmReaderObject *self, PyObject *args) {
+    Py_ssize_t i;
+    if (!PyArg_ParseTuple(args, "n", &i)) return NULL;
+    if (!_agm_reader_check_open(self)) return NULL;
+    if (i < 0) i += (Py_ssize_t)self->header.frame_count;
+    if (i < 0 || i >= (Py_ssize_t)self->header.frame_count) {
+        PyErr_SetString(PyExc_IndexError, "AGM frame index out of range");
+        return NULL;
+    }
+    size_t size;
+    bool delta;
+    const uint8_t *data = _agm_reader_record(self, i, &size, &delta);
+    if (!data) return NULL;
+    return PyBytes_FromStringAndSize((const char *)data, (Py_ssize_t)size);
+}
+
+// reader.audio() -> bytes: the audio track as signed 8-bit mono PCM, empty if there is none
+static PyObject* AgmReader_audio(AgmReaderObject *self, PyObject *Py_UNUSED(ignored)) {
+    if (!_agm_reader_check_open(self)) return NULL;
+    size_t total = (self->header.flags & AGM_CODEC_AUDIO) ? self->header.audio_sample_count : 0;
+    PyObject *result = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)total);
+    if (!result) return NULL;
+    uint8_t *out = (uint8_t *)PyBytes_AS_STRING(result);
+
+    // Audio chunks aren't indexed, so walk every record up to the frame index
+    size_t copied = 0;
+    size_t offset = self->header.header_size;
+    while (copied < total && offset + 4 <= self->header.index_offset) {
+        uint32_t size_word = _get_le32(&self->map[offset]);
+        size_t size = size_word & AGM_RECORD_SIZE_MASK;
+        if (offset + 4 + size > self->header.index_offset) break;
+        if (size_word & AGM_AUDIO_FLAG) {
+            size_t count = size < total - copied ? size : total - copied;
+            memcpy(&out[copied], &self->map[offset + 4], count);
+            copied += count;
+        }
+        offset += 4 + size;
+    }
+    if (copied < total) {
+        Py_DECREF(result);
+        PyErr_SetString(PyExc_ValueError, "AGM audio track is truncated");
+        return NULL;
+    }
+    return result;
+}
+
+static PyObject* AgmReader_close(AgmReaderObject *self, PyObject *Py_UNUSED(ignored)) {
+    _agm_reader_close(self);
+    Py_RETURN_NONE;
+}
+
+static PyObject* AgmReader_enter(AgmReaderObject *self, PyObject *Py_UNUSED(ignored)) {
+    if (!_agm_reader_check_open(self)) return NULL;
+    Py_INCREF(self);
+    return (PyObject *)self;
+}
+
+static PyObject* AgmReader_exit(AgmReaderObject *self, PyObject *args) {
+    _agm_reader_close(self);
+    Py_RETURN_FALSE;
+}
+
+static PyObject* AgmReader_repr(AgmReaderObject *self) {
+    if (!self->map) {
+        return PyUnicode_FromString("<agonutils.AgmReader (closed)>");
+    }
+    return PyUnicode_FromFormat("<agonutils.AgmReader %ux%u, %u frames>",
+                                (unsigned)self->header.width, (unsigned)self->header.height, (unsigned)self->header.frame_count);
+}
+
+static PyObject* AgmReader_get_width(AgmReaderObject *self, void *closure) {
+    return PyLong_FromLong(self->header.width);
+}
+
+static PyObject* AgmReader_get_height(AgmReaderObject *self, void *closure) {
+    return PyLong_FromLong(self->header.height);
+}
+
+static PyObject* AgmReader_get_fps(AgmReaderObject *self, void *closure) {
+    if (self->header.fps_den == 0) return PyFloat_FromDouble(0.0);
+    return PyFloat_FromDouble((double)self->header.fps_num / self->header.fps_den);
+}
+
+static PyObject* AgmReader_get_frame_rate(AgmReaderObject *self, void *closure) {
+    return Py_BuildValue("(kk)", (unsigned long)self->header.fps_num, (unsigned long)self->header.fps_den);
+}
+
+static PyObject* AgmReader_get_palette_id(AgmReaderObject *self, void *closure) {
+    return PyLong_FromUnsignedLong(self->header.palette_id);
+}
+
+static PyObject* AgmReader_get_audio_rate(AgmReaderObject *self, void *closure) {
+    return PyLong_FromUnsignedLong((self->header.flags & AGM_CODEC_AUDIO) ? self->header.audio_rate : 0);
+}
+
+static PyObject* AgmReader_get_audio_chunk_size(AgmReaderObject *self, void *closure) {
+    return PyLong_FromUnsignedLong((self->header.flags & AGM_CODEC_AUDIO) ? self->header.audio_chunk_size : 0);
+}
+
+static PyObject* AgmReader_get_flags(AgmReaderObject *self, void *closure) {
+    return PyLong_FromUnsignedLong(self->header.flags);
+}
+
+static PyObject* AgmReader_get_version(AgmReaderObject *self, void *closure) {
+    return PyLong_FromLong(self->header.version);
+}
+
+static PyGetSetDef AgmReader_getset[] = {
+    {"width", (getter)AgmReader_get_width, NULL, "Frame width in pixels", NULL},
+    {"height", (getter)AgmReader_get_height, NULL, "Frame height in pixels", NULL},
+    {"fps", (getter)AgmReader_get_fps, NULL, "Frames per second (0.0 if unknown)", NULL},
+    {"frame_rate", (getter)AgmReader_get_frame_rate, NULL, "Frame rate as a (numerator, denominator) tuple", NULL},
+    {"palette_id", (getter)AgmReader_get_palette_id, NULL, "Palette id stored by the encoder", NULL},
+    {"flags", (getter)AgmReader_get_flags, NULL, "Codec flags (1 = RLE, 2 = delta frames, 4 = audio)", NULL},
+    {"audio_rate", (getter)AgmReader_get_audio_rate, NULL, "Audio sample rate in Hz (0 without audio)", NULL},
+    {"audio_chunk_size", (getter)AgmReader_get_audio_chunk_size, NULL, "Bytes per interleaved audio chunk (0 without audio)", NULL},
+    {"version", (getter)AgmReader_get_version, NULL, "AGM format version", NULL},
+    {NULL, NULL, NULL, NULL, NULL}  // Sentinel
+};
+
+static PyMethodDef AgmReader_methods[] = {
+    {"is_keyframe", (PyCFunction)AgmReader_is_keyframe, METH_VARARGS, "is_keyframe(index: int) -> bool"},
+    {"record", (PyCFunction)AgmReader_record, METH_VARARGS, "record(index: int) -> bytes\n\nThe frame's RLE data as stored in the file."},
+    {"audio", (PyCFunction)AgmReader_audio, METH_NOARGS, "audio() -> bytes\n\nThe audio track as signed 8-bit mono PCM at audio_rate; empty without audio."},
+    {"close", (PyCFunction)AgmReader_close, METH_NOARGS, "close() -> None"},
+    {"__enter__", (PyCFunction)AgmReader_enter, METH_NOARGS, NULL},
+    {"__exit__", (PyCFunction)AgmReader_exit, METH_VARARGS, NULL},
+    {NULL, NULL, 0, NULL}  // Sentinel
+};
+
+static PySequenceMethods AgmReader_as_sequence = {
+    .sq_length = (lenfunc)AgmReader_len,
+    .sq_item = (ssizeargfunc)AgmReader_item,
+};
+
+PyTypeObject AgmReaderType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "agonutils.AgmReader",
+    .tp_doc = "AgmReader(path: str | os.PathLike) -> AgmReader\n\n"
+              "Memory-mapped reader for AGM movies written by mp4_to_agm. reader[i] returns frame i "
+              "as width * height bytes of packed RGBA2; delta frames are rebuilt from the keyframe before them.",
+    .tp_basicsize = sizeof(AgmReaderObject),
+    .tp_itemsize = 0,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc)AgmReader_init,
+    .tp_dealloc = (destructor)AgmReader_dealloc,
+    .tp_repr = (reprfunc)AgmReader_repr,
+    .tp_as_sequence = &AgmReader_as_sequence,
+    .tp_methods = AgmReader_methods,
+    .tp_getset = AgmReader_getset,
+};
@@ -0,0 +1,104 @@
+#ifndef AGMFILE_H
+#define AGMFILE_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#include <Python.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdio.h>
+
+// ----------------------------------------------------------------
+// AGM movie container, as written by _process_mp4 and read by agonutils.AgmReader.
+// All integers are little-endian.
+//
+//   Header (header_size bytes):
+//      0  char[4]  magic "AGMV"
+//      4  uint16   version (AGM_VERSION)
+//      6  uint16   header size; frame records start here, so later versions can append fields
+//      8  uint16   width
+//     10  uint16   height
+//     12  uint32   frame rate numerator
+//     16  uint32   frame rate denominator (0/1 if unknown)
+//     20  uint32   palette id (by default the number of palette colors)
+//     24  uint32   codec flags (AGM_CODEC_*)
+//     28  uint32   frame count
+//     32  uint32   file offset of the frame index
+//     36  uint32   reserved, 0
+//   Version 2 adds, for files with an audio track (AGM_CODEC_AUDIO):
+//     40  uint32   audio sample rate in Hz
+//     44  uint32   audio chunk size in bytes
+//     48  uint32   audio sample count, not counting the padding of the last chunk
+//   Records, in order: uint32 size word, then that many bytes of data
+//   (the size is the word's low 30 bits).
+//   Frame records hold RLE data (see rle.h). AGM_DELTA_FLAG in the size word
+//   marks a delta frame, whose transparent runs leave the previous frame's
+//   pixels in place. An empty delta frame repeats the previous frame.
+//   Audio records (AGM_AUDIO_FLAG) hold one chunk of signed 8-bit mono PCM.
+//   Before each frame come the chunks that start before that frame ends, so a
+//   player reading the file front to back always has the frame's audio.
+//   Frame index: per frame, uint32 record offset and uint32 size word.
+//   Audio records aren't indexed.
+// ----------------------------------------------------------------
+
+#define AGM_MAGIC "AGMV"
+#define AGM_VERSION 2               // Newest version written and read; files without audio are written as version 1
+#define AGM_HEADER_SIZE 40           // Version 1 header
+#define AGM_AUDIO_HEADER_SIZE 52     // Version 2 header
+#define AGM_INDEX_ENTRY_SIZE 8
+
+// Record size word flags
+#define AGM_DELTA_FLAG 0x80000000u   // Delta frame
+#define AGM_AUDIO_FLAG 0x40000000u   // Audio chunk
+#define AGM_RECORD_SIZE_MASK 0x3FFFFFFFu
+
+// Codec flags
+#define AGM_CODEC_RLE   0x1  // Frames are RLE-compressed RGBA2222
+#define AGM_CODEC_DELTA 0x2  // Delta frames may appear between keyframes
+#define AGM_CODEC_AUDIO 0x4  // Audio chunks are interleaved with the frames
+
+typedef struct {
+    uint16_t version;
+    uint16_t header_size;
+    uint16_t width, height;
+    uint32_t fps_num, fps_den;
+    uint32_t palette_id;
+    uint32_t flags;
+    uint32_t frame_count;
+    uint32_t index_offset;
+    uint32_t audio_rate;          // 0 without an audio track
+    uint32_t audio_chunk_size;
+    uint32_t audio_sample_count;
+} AgmHeader;
+
+// Write the header (header_size bytes) at the current file position. Returns false on a write error.
+bool _agm_write_header(FILE *fp, const AgmHeader *header);
+
+// Write a little-endian uint32 at the current file position. Returns false on a write error.
+bool _agm_write_u32(FILE *fp, uint32_t value);
+
+// Parse and check a header from the start of a file of file_size bytes.
+// Returns NULL on success, else a message saying what's wrong.
+const char* _agm_read_header(const uint8_t *data, size_t file_size, AgmHeader *header);
+
+// Decode one frame record's RLE data into frame (pixel_count packed RGBA2 pixels).
+// Keyframes overwrite every pixel; delta frames skip transparent runs, and an empty one changes nothing.
+// Returns false if the data is malformed or doesn't cover exactly pixel_count pixels.
+bool _agm_apply_record(const uint8_t *data, size_t size, bool delta, uint8_t *frame, size_t pixel_count);
+
+// ----------------------------------------------------------------
+// agonutils.AgmReader:
+// Memory-maps an AGM file and decodes any frame on request. Frames are
+// found through the frame index; a delta frame is rebuilt from the nearest
+// keyframe before it, and stepping forward one frame decodes one record.
+// audio() gathers the audio chunks by walking the records in order.
+// ----------------------------------------------------------------
+extern PyTypeObject AgmReaderType;
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // AGMFILE_H
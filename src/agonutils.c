@@ -1,6 +1,13 @@
 #define PY_SSIZE_T_CLEAN
 
+#include "agm.h"
+#include "agmfile.h"
 #include "images.h"
+#include "palette.h"
+#include "rle.h"
+#include "simz.h"
+#include "stream.h"
+#include "szip.h"
 
 // Function: Simple hello world function
 PyObject* hello(PyObject* self, PyObject* args) {
@@ -11,10 +18,34 @@ PyObject* hello(PyObject* self, PyObject* args) {
 // Define the methods callable from Python
 static PyMethodDef MyMethods[] = {
     {"convert_to_palette", (PyCFunction)convert_to_palette, METH_VARARGS | METH_KEYWORDS, 
-     "convert_to_palette(src_file: str, tgt_file: str, palette_file: str, palette_conversion_method: str, transparent_color: Optional[tuple[int, int, int]] = None) -> None"},
+     "convert_to_palette(src_file: str, tgt_file: str, palette_file: str | Palette, palette_conversion_method: str, transparent_color: Optional[tuple[int, int, int, int]] = None, threads: int = 1) -> None"},
     
     {"img_to_rgba2", (PyCFunction)img_to_rgba2, METH_VARARGS | METH_KEYWORDS, 
-     "img_to_rgba2(src_file: str, tgt_file: str, palette_file: str, palette_conversion_method: str, transparent_color: Optional[tuple[int, int, int]] = None) -> None"},
+     "img_to_rgba2(src_file: str, tgt_file: str, palette_file: str | Palette, palette_conversion_method: str, transparent_color: Optional[tuple[int, int, int, int]] = None, threads: int = 1) -> None"},
+    
+    {"convert_rgba_buffer", (PyCFunction)convert_rgba_buffer, METH_VARARGS | METH_KEYWORDS, 
+     "convert_rgba_buffer(buffer: Buffer, width: int, height: int, palette: str | Palette, palette_conversion_method: str, transparent_color: Optional[tuple[int, int, int, int]] = None, stride: int = 0, threads: int = 1) -> bytes"},
+    
+    {"rgba_to_rgba2_buffer", (PyCFunction)rgba_to_rgba2_buffer, METH_VARARGS | METH_KEYWORDS, 
+     "rgba_to_rgba2_buffer(buffer: Buffer, width: int, height: int, palette: Optional[str | Palette] = None, palette_conversion_method: str = 'RGB', transparent_color: Optional[tuple[int, int, int, int]] = None, stride: int = 0, threads: int = 1) -> bytes"},
+    
+    {"batch_convert", (PyCFunction)batch_convert, METH_VARARGS | METH_KEYWORDS, 
+     "batch_convert(src_paths: Iterable[str], out_dir: str | dict[str, str], palette: str | Palette, palette_conversion_method: str, outputs: Sequence[str] = ('png', 'rgba2'), transparent_color: Optional[tuple[int, int, int, int]] = None, workers: int = 0) -> list[dict]"},
+    
+    {"stream_convert", (PyCFunction)stream_convert, METH_VARARGS | METH_KEYWORDS, 
+     "stream_convert(src_file: str, tgt_file: str, palette: str | Palette, palette_conversion_method: str, transparent_color: Optional[tuple[int, int, int, int]] = None, output: str = 'png') -> None"},
+    
+    {"mp4_to_agm", (PyCFunction)mp4_to_agm, METH_VARARGS | METH_KEYWORDS, 
+     "mp4_to_agm(src_file: str, tgt_file: str, width: int, height: int, palette: str | Palette, nodither_method: str, dither_method: str, lookback: int, transparent_color: Optional[tuple[int, int, int, int]] = None, keyframe_interval: int = 0, workers: int = 0, palette_id: Optional[int] = None, scene_cut_threshold: float = 0.0, audio_rate: int = 0, audio_chunk_size: int = 0, decode_threads: int = 0, thread_type: str = 'frame+slice', scale_algorithm: str = 'bilinear', crop: None | str | tuple[int, int, int, int] = None, target_fps: float = 0.0, progress: Optional[Callable[[dict], None]] = None) -> dict"},
+    
+    {"iter_video_frames", (PyCFunction)iter_video_frames, METH_VARARGS | METH_KEYWORDS, 
+     "iter_video_frames(src_file: str, width: int, height: int, palette: str | Palette, method: str, lookback: int, nodither_method: str = 'RGB', transparent_color: Optional[tuple[int, int, int, int]] = None, workers: int = 0, prefetch: int = 8, decode_threads: int = 0, thread_type: str = 'frame+slice', scale_algorithm: str = 'bilinear', crop: None | str | tuple[int, int, int, int] = None) -> Iterator[bytes]"},
+    
+    {"pack_rgba2", pack_rgba2, METH_VARARGS, 
+     "pack_rgba2(buffer: Buffer) -> bytes"},
+    
+    {"unpack_rgba2", unpack_rgba2, METH_VARARGS, 
+     "unpack_rgba2(buffer: Buffer) -> bytes"},
     
     {"rgba8_to_img", rgba8_to_img, METH_VARARGS, 
      "rgba8_to_img(input_filepath: str, output_filepath: str, width: int, height: int) -> None"},
@@ -25,6 +56,30 @@ static PyMethodDef MyMethods[] = {
     {"csv_to_palette", csv_to_palette, METH_VARARGS, 
      "csv_to_palette(csv_filepath: str) -> Palette"},
     
+    {"simz_encode", simz_encode, METH_VARARGS, 
+     "simz_encode(input_file: str, output_file: str) -> None"},
+    
+    {"simz_decode", simz_decode, METH_VARARGS, 
+     "simz_decode(input_file: str, output_file: str) -> None"},
+    
+    {"simz_encode_bytes", (PyCFunction)simz_encode_bytes, METH_VARARGS | METH_KEYWORDS, 
+     "simz_encode_bytes(data: bytes, independent_blocks: bool = False, threads: int = 0) -> bytes"},
+    
+    {"simz_decode_bytes", (PyCFunction)simz_decode_bytes, METH_VARARGS | METH_KEYWORDS, 
+     "simz_decode_bytes(data: bytes, threads: int = 0) -> bytes"},
+    
+    {"szip_compress", (PyCFunction)szip_compress, METH_VARARGS | METH_KEYWORDS, 
+     "szip_compress(data: bytes, blocksize: int = 41, order: int = 3) -> bytes"},
+    
+    {"szip_decompress", szip_decompress, METH_VARARGS, 
+     "szip_decompress(data: bytes) -> bytes"},
+    
+    {"rle_encode", (PyCFunction)rle_encode, METH_VARARGS | METH_KEYWORDS, 
+     "rle_encode(data: bytes, *, into: bytearray = None) -> bytes | int"},
+    
+    {"rle_decode", (PyCFunction)rle_decode, METH_VARARGS | METH_KEYWORDS, 
+     "rle_decode(data: bytes, expected_size: int = None, *, into: bytearray = None) -> bytes | int"},
+    
     {"hello", hello, METH_NOARGS, 
      "hello() -> None"},
     
@@ -43,5 +98,28 @@ static struct PyModuleDef agonutilsmodule = {
 
 // Module initialization function
 PyMODINIT_FUNC PyInit_agonutils(void) {
-    return PyModule_Create(&agonutilsmodule);
+    if (PyType_Ready(&PaletteType) < 0 || PyType_Ready(&AgmReaderType) < 0 || PyType_Ready(&VideoFrameIteratorType) < 0) {
+        return NULL;
+    }
+
+    PyObject *module = PyModule_Create(&agonutilsmodule);
+    if (!module) {
+        return NULL;
+    }
+
+    Py_INCREF(&PaletteType);
+    if (PyModule_AddObject(module, "Palette", (PyObject *)&PaletteType) < 0) {
+        Py_DECREF(&PaletteType);
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    Py_INCREF(&AgmReaderType);
+    if (PyModule_AddObject(module, "AgmReader", (PyObject *)&AgmReaderType) < 0) {
+        Py_DECREF(&AgmReaderType);
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    return module;
 }
@@ -1,6 +1,30 @@
 #include "images.h"
+#include "palette.h"
+#include "parallel.h"
 #include <math.h>
 #include <float.h>  // For FLT_MAX (instead of INFINITY)
+#include <limits.h>
+#include <sched.h>
+#include <sys/stat.h>
+
+// Helper function: Set up libpng read transforms so rows come out as 8-bit RGBA, whatever the source format
+void _png_set_rgba8_transforms(png_structp png, png_infop info) {
+    png_byte color_type = png_get_color_type(png, info);
+    png_byte bit_depth = png_get_bit_depth(png, info);
+
+    if (bit_depth == 16) png_set_strip_16(png);
+    if (color_type == PNG_COLOR_TYPE_PALETTE) png_set_palette_to_rgb(png);
+    if (color_type == PNG_COLOR_TYPE_GRAY && bit_depth < 8) png_set_expand_gray_1_2_4_to_8(png);
+    if (png_get_valid(png, info, PNG_INFO_tRNS)) png_set_tRNS_to_alpha(png);
+
+    if (color_type == PNG_COLOR_TYPE_RGB || color_type == PNG_COLOR_TYPE_GRAY || color_type == PNG_COLOR_TYPE_PALETTE)
+        png_set_filler(png, 0xFF, PNG_FILLER_AFTER);
+
+    if (color_type == PNG_COLOR_TYPE_GRAY || color_type == PNG_COLOR_TYPE_GRAY_ALPHA)
+        png_set_gray_to_rgb(png);
+
+    png_read_update_info(png, info);
+}
 
 // Helper function to read a PNG file into RGBA format
 int _read_png(const char *filename, uint8_t **image_data, int *width, int *height) {
@@ -26,22 +50,9 @@ int _read_png(const char *filename, uint8_t **image_data, int *width, int *heigh
 
     *width = png_get_image_width(png, info);
     *height = png_get_image_height(png, info);
-    png_byte color_type = png_get_color_type(png, info);
-    png_byte bit_depth = png_get_bit_depth(png, info);
 
     // Ensure the image is in 8-bit per channel RGBA format
-    if (bit_depth == 16) png_set_strip_16(png);
-    if (color_type == PNG_COLOR_TYPE_PALETTE) png_set_palette_to_rgb(png);
-    if (color_type == PNG_COLOR_TYPE_GRAY && bit_depth < 8) png_set_expand_gray_1_2_4_to_8(png);
-    if (png_get_valid(png, info, PNG_INFO_tRNS)) png_set_tRNS_to_alpha(png);
-
-    if (color_type == PNG_COLOR_TYPE_RGB || color_type == PNG_COLOR_TYPE_GRAY || color_type == PNG_COLOR_TYPE_PALETTE)
-        png_set_filler(png, 0xFF, PNG_FILLER_AFTER);
-
-    if (color_type == PNG_COLOR_TYPE_GRAY || color_type == PNG_COLOR_TYPE_GRAY_ALPHA)
-        png_set_gray_to_rgb(png);
-
-    png_read_update_info(png, info);
+    _png_set_rgba8_transforms(png, info);
 
     // Allocate memory for RGBA data
     *image_data = (uint8_t *)malloc(*width * *height * 4);
@@ -179,17 +190,10 @@ void _hsv_to_rgb(float h, float s, float v, uint8_t *r, uint8_t *g, uint8_t *b)
     *b = (uint8_t)((b_temp + m) * 255.0f);
 }
 
-// Helper function to quantize an 8-bit channel to 2-bit
+// Quantize an 8-bit channel to 2 bits: 0-63 -> 0, 64-127 -> 1, 128-191 -> 2, 192-255 -> 3.
+// That is exactly the top two bits, so a shift does the job of a lookup table.
 uint8_t _quantize_channel(uint8_t channel) {
-    if (channel < 64) {
-        return 0;
-    } else if (channel < 128) {
-        return 1;
-    } else if (channel < 192) {
-        return 2;
-    } else {
-        return 3;
-    }
+    return channel >> 6;
 }
 
 // Helper function to encode 8-bit RGBA into a 2-bit packed pixel
@@ -204,83 +208,223 @@ uint8_t _eight_to_two(uint8_t r, uint8_t g, uint8_t b, uint8_t a) {
     return (a_q << 6) | (b_q << 4) | (g_q << 2) | r_q;
 }
 
-// Helper function to decode a 2-bit pixel into 8-bit RGBA (used for palette colors)
-void _two_to_eight(uint8_t pixel, uint8_t *r, uint8_t *g, uint8_t *b, uint8_t *a) {
-    // Extract the individual 2-bit values from the byte
-    *a = (pixel >> 6) & 0b11;
-    *b = (pixel >> 4) & 0b11;
-    *g = (pixel >> 2) & 0b11;
-    *r = pixel & 0b11;
+// RGBA2222 byte -> RGBA8888 pixel, stored as the 4 output bytes so one 32-bit copy writes a whole pixel.
+// 2-bit values map to 0, 85, 170, 255 (i.e. value * 85).
+#define RGBA2_CHANNEL(p, shift) (uint8_t)((((p) >> (shift)) & 0x3) * 85)
+#define RGBA2_EXPAND(p) { RGBA2_CHANNEL(p, 0), RGBA2_CHANNEL(p, 2), RGBA2_CHANNEL(p, 4), RGBA2_CHANNEL(p, 6) }
+#define RGBA2_EXPAND4(p) RGBA2_EXPAND(p), RGBA2_EXPAND((p) + 1), RGBA2_EXPAND((p) + 2), RGBA2_EXPAND((p) + 3)
+#define RGBA2_EXPAND16(p) RGBA2_EXPAND4(p), RGBA2_EXPAND4((p) + 4), RGBA2_EXPAND4((p) + 8), RGBA2_EXPAND4((p) + 12)
+#define RGBA2_EXPAND64(p) RGBA2_EXPAND16(p), RGBA2_EXPAND16((p) + 16), RGBA2_EXPAND16((p) + 32), RGBA2_EXPAND16((p) + 48)
+static const uint8_t rgba2_expand_lut[256][4] = {
+    RGBA2_EXPAND64(0), RGBA2_EXPAND64(64), RGBA2_EXPAND64(128), RGBA2_EXPAND64(192)
+};
 
-    // Map the 2-bit values to 8-bit values (0, 85, 170, 255)
-    static const uint8_t mapping[4] = {0, 85, 170, 255};
-    *r = mapping[*r];
-    *g = mapping[*g];
-    *b = mapping[*b];
-    *a = mapping[*a];
+void _two_to_eight(uint8_t pixel, uint8_t *r, uint8_t *g, uint8_t *b, uint8_t *a) {
+    const uint8_t *rgba = rgba2_expand_lut[pixel];
+    *r = rgba[0];
+    *g = rgba[1];
+    *b = rgba[2];
+    *a = rgba[3];
 }
 
-void _rgba32_to_rgba2(uint8_t *image_data, size_t num_pixels, uint8_t *output_buffer) {
+// Pack RGBA8888 pixels to RGBA2222 bytes.
+// Straight-line shifts and ors per pixel, which the compiler vectorizes.
+void _rgba32_to_rgba2(const uint8_t *image_data, size_t num_pixels, uint8_t *output_buffer) {
     for (size_t i = 0; i < num_pixels; ++i) {
-        // Each pixel is 4 bytes (RGBA)
-        uint8_t r = image_data[i * 4 + 0];
-        uint8_t g = image_data[i * 4 + 1];
-        uint8_t b = image_data[i * 4 + 2];
-        uint8_t a = image_data[i * 4 + 3];
+        const uint8_t *pixel = &image_data[i * 4];
+        output_buffer[i] = (uint8_t)((pixel[0] >> 6) | ((pixel[1] >> 6) << 2) | ((pixel[2] >> 6) << 4) | ((pixel[3] >> 6) << 6));
+    }
+}
 
-        // Encode 8-bit RGBA into a 2-bit packed format
-        output_buffer[i] = _eight_to_two(r, g, b, a);
+// Expand RGBA2222 bytes to RGBA8888 pixels, one table lookup and one 32-bit copy per pixel
+void _rgba2_to_rgba32(const uint8_t *rgba2_data, size_t num_pixels, uint8_t *image_data) {
+    for (size_t i = 0; i < num_pixels; ++i) {
+        memcpy(&image_data[i * 4], rgba2_expand_lut[rgba2_data[i]], 4);
     }
 }
 
 // Function to calculate Euclidean distance between two RGB colors in the Color struct
+// The squared sum is an exact integer, so this matches sqrtf(powf(...) + ...) bit for bit
 float _distance_rgb(const Color *color1, const Color *color2) {
-    return sqrtf(powf(color1->r - color2->r, 2) +
-                 powf(color1->g - color2->g, 2) +
-                 powf(color1->b - color2->b, 2));
+    int dr = color1->r - color2->r;
+    int dg = color1->g - color2->g;
+    int db = color1->b - color2->b;
+    return sqrtf((float)(dr * dr + dg * dg + db * db));
+}
+
+// Brute-force search for the index of the nearest RGB color in the palette.
+// Ranks by integer squared distance, which orders entries exactly as the
+// float Euclidean distance does (sqrtf is strictly monotonic over the integer
+// sums involved), and keeps the first entry on ties.
+// Scores a chunk of entries at a time from the structure-of-arrays planes in a
+// branch-free loop the compiler can vectorize, then picks the first minimum.
+static size_t _nearest_rgb_index(uint8_t r, uint8_t g, uint8_t b, const Palette *palette) {
+    size_t nearest_index = 0;
+    int32_t min_distance = INT32_MAX;
+
+    if (!palette->rgb_planes) {
+        for (size_t i = 0; i < palette->size; ++i) {
+            int dr = r - palette->colors[i].r;
+            int dg = g - palette->colors[i].g;
+            int db = b - palette->colors[i].b;
+            int distance = dr * dr + dg * dg + db * db;
+            if (distance < min_distance) {
+                min_distance = distance;
+                nearest_index = i;
+            }
+        }
+        return nearest_index;
+    }
+
+    const int32_t *reds = palette->rgb_planes;
+    const int32_t *greens = reds + palette->size;
+    const int32_t *blues = greens + palette->size;
+    int32_t distances[PALETTE_SEARCH_CHUNK];
+
+    for (size_t base = 0; base < palette->size; base += PALETTE_SEARCH_CHUNK) {
+        size_t count = palette->size - base < PALETTE_SEARCH_CHUNK ? palette->size - base : PALETTE_SEARCH_CHUNK;
+
+        int32_t chunk_min = INT32_MAX;
+        for (size_t i = 0; i < count; ++i) {
+            int32_t dr = r - reds[base + i];
+            int32_t dg = g - greens[base + i];
+            int32_t db = b - blues[base + i];
+            int32_t distance = dr * dr + dg * dg + db * db;
+            distances[i] = distance;
+            chunk_min = distance < chunk_min ? distance : chunk_min;
+        }
+
+        // Strictly smaller only, so earlier chunks win ties
+        if (chunk_min < min_distance) {
+            size_t i = 0;
+            while (distances[i] != chunk_min) ++i;
+            min_distance = chunk_min;
+            nearest_index = base + i;
+        }
+    }
+    return nearest_index;
 }
 
 // Function to find the nearest RGB color in the palette
+// Results are memoized in the palette's inverse colormap, so each distinct
+// 24-bit color is searched for at most once per palette.
 const Color* _nearest_rgb(const Color *target_rgb, const Palette *palette) {
-    const Color *nearest_color = NULL;
-    float min_distance = FLT_MAX;  // Set to max float value
-    for (size_t i = 0; i < palette->size; ++i) {
-        float distance = _distance_rgb(target_rgb, &palette->colors[i]);
-        if (distance < min_distance) {
-            min_distance = distance;
-            nearest_color = &palette->colors[i];
-        }
+    if (palette->size == 0) return NULL;
+
+    if (!palette->rgb_lookup) {
+        return &palette->colors[_nearest_rgb_index(target_rgb->r, target_rgb->g, target_rgb->b, palette)];
+    }
+
+    uint32_t key = ((uint32_t)target_rgb->r << 16) | ((uint32_t)target_rgb->g << 8) | target_rgb->b;
+    uint8_t entry = LOOKUP_LOAD(&palette->rgb_lookup[key]);
+    if (entry == 0) {
+        entry = (uint8_t)(_nearest_rgb_index(target_rgb->r, target_rgb->g, target_rgb->b, palette) + 1);
+        LOOKUP_STORE(&palette->rgb_lookup[key], entry);
     }
-    return nearest_color;
+    return &palette->colors[entry - 1];
 }
 
-const Color* _nearest_hsv(const Color *target_hsv, const Palette *palette) {
-    const Color *nearest_color = NULL;
-    float min_distance = FLT_MAX;
+// Non-negative floats order the same way as their IEEE bit patterns read as integers.
+// Comparing bits keeps the search loops free of float compares, which the compiler
+// will not turn into vector selects while FP exceptions are honoured.
+static inline int32_t _float_bits(float value) {
+    int32_t bits;
+    memcpy(&bits, &value, sizeof(bits));
+    return bits;
+}
 
-    // Iterate through each color in the palette
-    for (size_t i = 0; i < palette->size; ++i) {
-        const Color *palette_color = &palette->colors[i];
+static inline float _bits_float(int32_t bits) {
+    float value;
+    memcpy(&value, &bits, sizeof(value));
+    return value;
+}
 
-        // Compute the hue distance, accounting for wrap-around
-        float hue_distance = fabsf(target_hsv->h - palette_color->h);
-        if (hue_distance > 0.5) {
-            hue_distance = 1.0 - hue_distance;  // Wrap around the hue circle
-        }
+// Squared HSV distance with hue wrap-around (hues are in [0, 1))
+static inline float _distance_hsv_squared(float h1, float s1, float v1, float h2, float s2, float v2) {
+    // Wrap around the hue circle: the shorter way round is min(d, 1 - d), which
+    // equals the original "d > 0.5 ? 1 - d : d"
+    float hue_distance = fabsf(h1 - h2);
+    int32_t direct = _float_bits(hue_distance);
+    int32_t wrapped = _float_bits(1.0f - hue_distance);
+    hue_distance = _bits_float(direct < wrapped ? direct : wrapped);
+    float ds = s1 - s2;
+    float dv = v1 - v2;
+    return hue_distance * hue_distance + ds * ds + dv * dv;
+}
+
+// Find the nearest HSV color in the palette.
+// Entries are ranked by Euclidean distance as before, but the square root is only
+// taken for the few entries that tie with the smallest squared distance: distinct
+// float squares can share a square root, and the first such entry must win.
+static size_t _nearest_hsv_index(float h, float s, float v, const Palette *palette) {
+    size_t nearest_index = 0;
+    float min_distance = FLT_MAX;
 
-        // Compute the Euclidean distance in the HSV space
-        float distance = sqrtf(powf(hue_distance, 2) +
-                               powf(target_hsv->s - palette_color->s, 2) +
-                               powf(target_hsv->v - palette_color->v, 2));
+    if (!palette->hsv_planes) {
+        for (size_t i = 0; i < palette->size; ++i) {
+            const Color *palette_color = &palette->colors[i];
+            float distance = sqrtf(_distance_hsv_squared(h, s, v, palette_color->h, palette_color->s, palette_color->v));
+            if (distance < min_distance) {
+                min_distance = distance;
+                nearest_index = i;
+            }
+        }
+        return nearest_index;
+    }
 
-        // If this is the smallest distance so far, store this color as the nearest
-        if (distance < min_distance) {
-            min_distance = distance;
-            nearest_color = palette_color;
+    // Same chunked structure-of-arrays search as _nearest_rgb_index, in float
+    const float *hues = palette->hsv_planes;
+    const float *sats = hues + palette->size;
+    const float *vals = sats + palette->size;
+    float distances[PALETTE_SEARCH_CHUNK];
+
+    for (size_t base = 0; base < palette->size; base += PALETTE_SEARCH_CHUNK) {
+        size_t count = palette->size - base < PALETTE_SEARCH_CHUNK ? palette->size - base : PALETTE_SEARCH_CHUNK;
+
+        // Distances are never negative, so the minimum is an integer reduction over their bits
+        int32_t min_bits = INT32_MAX;
+        for (size_t i = 0; i < count; ++i) {
+            float distance = _distance_hsv_squared(h, s, v, hues[base + i], sats[base + i], vals[base + i]);
+            int32_t bits = _float_bits(distance);
+            distances[i] = distance;
+            min_bits = bits < min_bits ? bits : min_bits;
+        }
+        float chunk_min = _bits_float(min_bits);
+
+        float chunk_distance = sqrtf(chunk_min);
+        if (chunk_distance < min_distance) {
+            // Only squares within a couple of ulps of the minimum can share its square root
+            float tie_limit = chunk_min * (1.0f + 4.0f * FLT_EPSILON);
+            size_t i = 0;
+            while (distances[i] > tie_limit || sqrtf(distances[i]) != chunk_distance) ++i;
+            min_distance = chunk_distance;
+            nearest_index = base + i;
         }
     }
 
-    return nearest_color;
+    return nearest_index;
+}
+
+const Color* _nearest_hsv(const Color *target_hsv, const Palette *palette) {
+    if (palette->size == 0) return NULL;
+    return &palette->colors[_nearest_hsv_index(target_hsv->h, target_hsv->s, target_hsv->v, palette)];
+}
+
+// Index of the nearest palette entry by HSV distance for a 24-bit RGB color.
+// The HSV of a pixel only depends on its RGB, so results are memoized per
+// palette in hsv_lookup the same way _nearest_rgb memoizes RGB matches.
+static size_t _nearest_hsv_index_rgb(uint8_t r, uint8_t g, uint8_t b, const Palette *palette) {
+    uint32_t key = ((uint32_t)r << 16) | ((uint32_t)g << 8) | b;
+    uint8_t entry = palette->hsv_lookup ? LOOKUP_LOAD(&palette->hsv_lookup[key]) : 0;
+    if (entry == 0) {
+        float h, s, v;
+        _rgb_to_hsv(r, g, b, &h, &s, &v);
+        size_t index = _nearest_hsv_index(h, s, v, palette);
+        if (!palette->hsv_lookup) return index;
+        entry = (uint8_t)(index + 1);
+        LOOKUP_STORE(&palette->hsv_lookup[key], entry);
+    }
+    return entry - 1;
 }
 
 // Helper function: Parse Python arguments into a Color struct (internal use)
@@ -313,6 +457,11 @@ int _load_gimp_palette(const char *filename, Palette *palette) {
     size_t capacity = 256;  // Initial capacity for 256 colors
 
     // Allocate memory for the palette
+    palette->rgb_lookup = NULL;
+    palette->rgb_planes = NULL;
+    palette->hsv_planes = NULL;
+    palette->hsv_lookup = NULL;
+    palette->hsv_rgb = NULL;
     palette->colors = (Color *)malloc(capacity * sizeof(Color));
     if (!palette->colors) {
         fprintf(stderr, "Error: Memory allocation failed\n");
@@ -326,9 +475,10 @@ int _load_gimp_palette(const char *filename, Palette *palette) {
             continue;
         }
 
-        // Parse RGB values from each valid line
+        // Parse RGB values (and the optional color name) from each valid line
         int r, g, b;
-        if (sscanf(line, "%d %d %d", &r, &g, &b) == 3) {
+        char name[64] = "";
+        if (sscanf(line, "%d %d %d %63[^\r\n]", &r, &g, &b, name) >= 3) {
             // Check if we need to resize the array
             if (color_count >= capacity) {
                 capacity *= 2;
@@ -344,6 +494,7 @@ int _load_gimp_palette(const char *filename, Palette *palette) {
             palette->colors[color_count].r = (uint8_t)r;
             palette->colors[color_count].g = (uint8_t)g;
             palette->colors[color_count].b = (uint8_t)b;
+            snprintf(palette->colors[color_count].name, sizeof(palette->colors[color_count].name), "%s", name);
 
             // Convert and store HSV values
             _rgb_to_hsv(r, g, b, 
@@ -361,89 +512,311 @@ int _load_gimp_palette(const char *filename, Palette *palette) {
     // Store the final size
     palette->size = color_count;
 
+    // Prepare the nearest-color lookup
+    _init_palette_lookup(palette);
+
     return 0;
 }
 
+// Function to read a named-colors CSV file ("r,g,b,h,s,v,hex,name" per line) into the Palette struct
+int _load_csv_palette(const char *filename, Palette *palette) {
+    FILE *file = fopen(filename, "r");
+    if (!file) {
+        fprintf(stderr, "Error: Cannot open file %s\n", filename);
+        return -1;
+    }
+
+    // Temporary storage for reading each line in the CSV
+    char line[256];
+    size_t capacity = 256;  // Initial capacity for the palette colors
+    size_t color_count = 0;
+
+    // Allocate memory for the colors array
+    palette->rgb_lookup = NULL;
+    palette->rgb_planes = NULL;
+    palette->hsv_planes = NULL;
+    palette->hsv_lookup = NULL;
+    palette->hsv_rgb = NULL;
+    palette->colors = (Color *)malloc(capacity * sizeof(Color));
+    if (!palette->colors) {
+        fprintf(stderr, "Error: Memory allocation failed\n");
+        fclose(file);
+        return -1;
+    }
+
+    // Read the CSV file line by line
+    while (fgets(line, sizeof(line), file)) {
+        if (color_count >= capacity) {
+            capacity *= 2;  // Double the capacity if needed
+            palette->colors = (Color *)realloc(palette->colors, capacity * sizeof(Color));
+            if (!palette->colors) {
+                fprintf(stderr, "Error: Memory reallocation failed\n");
+                fclose(file);
+                return -1;
+            }
+        }
+
+        // Parse the CSV line (expecting "r,g,b,h,s,v,hex,name")
+        uint8_t r, g, b;
+        char name[64];  // For the color name
+        char hex[8];    // For the hex code (if needed)
+        float h, s, v;
+
+        if (sscanf(line, "%hhu,%hhu,%hhu,%f,%f,%f,%7[^,],%63[^\n]",
+                &r, &g, &b, &h, &s, &v, hex, name) == 8) {
+            // Fill in the RGB values
+            palette->colors[color_count].r = r;
+            palette->colors[color_count].g = g;
+            palette->colors[color_count].b = b;
+
+            // Convert RGB to HSV
+            _rgb_to_hsv(r, g, b, &palette->colors[color_count].h, &palette->colors[color_count].s, &palette->colors[color_count].v);
+
+            // Store the color name
+            snprintf(palette->colors[color_count].name, sizeof(palette->colors[color_count].name), "%s", name);
+            palette->colors[color_count].name[sizeof(palette->colors[color_count].name) - 1] = '\0';  // Ensure null-termination
+
+            // Increment the color count
+            color_count++;
+        }
+    }
+
+    // Close the file
+    fclose(file);
+
+    // Set the palette size
+    palette->size = color_count;
+
+    // Prepare the nearest-color lookup
+    _init_palette_lookup(palette);
+
+    return 0;
+}
+
+// Prepare the palette's nearest-color search structures: the structure-of-arrays
+// color planes and the lazily filled inverse colormap.
+// calloc leaves the colormap zeroed ("not yet computed"), and untouched pages are
+// never committed, so memory use tracks the number of distinct colors seen.
+// If the palette is too large for the colormap, or any allocation fails, searches
+// fall back to scanning palette->colors directly.
+void _init_palette_lookup(Palette *palette) {
+    palette->rgb_lookup = NULL;
+    palette->rgb_planes = NULL;
+    palette->hsv_planes = NULL;
+    palette->hsv_lookup = NULL;
+    palette->hsv_rgb = NULL;
+    if (palette->size == 0) {
+        return;
+    }
+
+    size_t size = palette->size;
+    palette->rgb_planes = (int32_t *)malloc(3 * size * sizeof(int32_t));
+    palette->hsv_planes = (float *)malloc(3 * size * sizeof(float));
+    for (size_t i = 0; i < size; ++i) {
+        const Color *color = &palette->colors[i];
+        if (palette->rgb_planes) {
+            palette->rgb_planes[i] = color->r;
+            palette->rgb_planes[size + i] = color->g;
+            palette->rgb_planes[2 * size + i] = color->b;
+        }
+        if (palette->hsv_planes) {
+            palette->hsv_planes[i] = color->h;
+            palette->hsv_planes[size + i] = color->s;
+            palette->hsv_planes[2 * size + i] = color->v;
+        }
+    }
+
+    // The HSV method writes each entry's RGB back out through _hsv_to_rgb, which can
+    // differ from the stored RGB by rounding, so compute those colors once here
+    palette->hsv_rgb = (uint8_t *)malloc(3 * size);
+    if (palette->hsv_rgb) {
+        for (size_t i = 0; i < size; ++i) {
+            const Color *color = &palette->colors[i];
+            _hsv_to_rgb(color->h, color->s, color->v, &palette->hsv_rgb[3 * i], &palette->hsv_rgb[3 * i + 1], &palette->hsv_rgb[3 * i + 2]);
+        }
+    }
+
+    if (size <= PALETTE_LOOKUP_MAX_COLORS) {
+        palette->rgb_lookup = (uint8_t *)calloc(PALETTE_LOOKUP_SIZE, sizeof(uint8_t));
+        palette->hsv_lookup = (uint8_t *)calloc(PALETTE_LOOKUP_SIZE, sizeof(uint8_t));
+    }
+}
+
 // Function to free the palette memory
 void _free_palette(Palette *palette) {
     if (palette->colors) {
         free(palette->colors);
         palette->colors = NULL;
     }
+    if (palette->rgb_lookup) {
+        free(palette->rgb_lookup);
+        palette->rgb_lookup = NULL;
+    }
+    free(palette->rgb_planes);
+    palette->rgb_planes = NULL;
+    free(palette->hsv_planes);
+    palette->hsv_planes = NULL;
+    free(palette->hsv_lookup);
+    palette->hsv_lookup = NULL;
+    free(palette->hsv_rgb);
+    palette->hsv_rgb = NULL;
     palette->size = 0;
 }
 
-void _convert_atkinson(uint8_t* image_data, int width, int height, Palette *palette) {
-    for (int y = 0; y < height; ++y) {
-        for (int x = 0; x < width; ++x) {
-            uint8_t* pixel = &image_data[(y * width + x) * 4];  // RGBA format
+// ===========================
+// Error-diffusion dithering
+// ---------------------------
+// Floyd-Steinberg and Atkinson share one engine driven by a kernel of taps.
+// Each tap sends ((error >> shift) * weight / divisor) to the pixel at (x + dx, y + dy),
+// clamping after every addition exactly as the original per-method loops did.
+// Taps only reach the current row and the next one (dy is 0 or 1).
+
+typedef struct {
+    int dx, dy, weight;
+} _diffusion_tap;
+
+typedef struct {
+    int shift;
+    int divisor;
+    int tap_count;
+    _diffusion_tap taps[5];
+} _diffusion_kernel;
+
+static const _diffusion_kernel floyd_steinberg_kernel = {
+    0, 16, 4, { {1, 0, 7}, {-1, 1, 3}, {0, 1, 5}, {1, 1, 1} }
+};
 
-            // Skip dithering for pixels with alpha channel value < 1
-            if (pixel[3] < 1) continue;
+// This variant does not reach two rows down, so it stays within the engine's dy <= 1 limit
+static const _diffusion_kernel atkinson_kernel = {
+    3, 1, 5, { {1, 0, 1}, {2, 0, 1}, {0, 1, 1}, {1, 1, 1}, {2, 1, 1} }
+};
 
-            // Create a Color struct for the current pixel's RGB values
-            Color current_pixel = { .r = pixel[0], .g = pixel[1], .b = pixel[2] };
+// How far (in pixels) row y - 1 must be ahead of row y before row y may process a pixel.
+// Row y at x writes its own row up to x + max(dx | dy == 0); those pixels must already have
+// received every contribution from row y - 1, the last of which comes from x + max - min(dx | dy == 1).
+static int _diffusion_lag(const _diffusion_kernel *kernel) {
+    int max_dx_same_row = 0, min_dx_next_row = 0;
+    for (int t = 0; t < kernel->tap_count; ++t) {
+        const _diffusion_tap *tap = &kernel->taps[t];
+        if (tap->dy == 0 && tap->dx > max_dx_same_row) max_dx_same_row = tap->dx;
+        if (tap->dy == 1 && tap->dx < min_dx_next_row) min_dx_next_row = tap->dx;
+    }
+    return max_dx_same_row - min_dx_next_row + 1;
+}
 
-            // Find the nearest RGB color in the palette
-            const Color* nearest_color = _nearest_rgb(&current_pixel, palette);
+// Publish row progress every this many pixels, to keep the shared counters off the hot path
+#define DIFFUSION_PROGRESS_STEP 16
 
-            // Compute the error (difference between original and nearest color)
-            int16_t err_r = pixel[0] - nearest_color->r;
-            int16_t err_g = pixel[1] - nearest_color->g;
-            int16_t err_b = pixel[2] - nearest_color->b;
+typedef struct {
+    uint8_t *image_data;
+    int width, height;
+    const Palette *palette;
+    const _diffusion_kernel *kernel;
+    bool serpentine;
+    int lag;
+    int *progress;  // Pixels finished per row, or NULL when rows run strictly in order
+} _diffusion_ctx;
+
+// Spin until row 'row' has finished at least 'needed' pixels
+static void _diffusion_wait(const int *progress, int row, int needed, int *seen) {
+    while (*seen < needed) {
+        *seen = __atomic_load_n(&progress[row], __ATOMIC_ACQUIRE);
+        if (*seen < needed) sched_yield();
+    }
+}
+
+// Dither one row, left to right (or right to left for odd rows in serpentine mode)
+static void _diffuse_row(const _diffusion_ctx *ctx, int y) {
+    uint8_t *image_data = ctx->image_data;
+    int width = ctx->width;
+    int height = ctx->height;
+    const _diffusion_kernel *kernel = ctx->kernel;
+    int direction = (ctx->serpentine && (y & 1)) ? -1 : 1;
+    int prev_seen = 0;
+
+    for (int i = 0; i < width; ++i) {
+        int x = direction > 0 ? i : width - 1 - i;
+
+        // Wavefront: wait for the row above to be far enough ahead
+        if (ctx->progress && y > 0) {
+            int needed = i + ctx->lag < width ? i + ctx->lag : width;
+            _diffusion_wait(ctx->progress, y - 1, needed, &prev_seen);
+        }
+
+        uint8_t *pixel = &image_data[(y * width + x) * 4];  // RGBA format
+
+        // Skip dithering for pixels with alpha channel value < 1
+        if (pixel[3] >= 1) {
+            Color current_pixel = { .r = pixel[0], .g = pixel[1], .b = pixel[2] };
+            const Color *nearest_color = _nearest_rgb(&current_pixel, ctx->palette);
+
+            // Error between the original and the chosen palette color
+            int err_r = (pixel[0] - nearest_color->r) >> kernel->shift;
+            int err_g = (pixel[1] - nearest_color->g) >> kernel->shift;
+            int err_b = (pixel[2] - nearest_color->b) >> kernel->shift;
 
-            // Update the current pixel with the nearest color
             pixel[0] = nearest_color->r;
             pixel[1] = nearest_color->g;
             pixel[2] = nearest_color->b;
 
-            // Propagate the error to neighboring pixels using Atkinson dithering
-            // Divide the error by 8 using bit-shifting (err / 8 = err >> 3)
-            int16_t error_r = err_r >> 3;
-            int16_t error_g = err_g >> 3;
-            int16_t error_b = err_b >> 3;
-
-            // Propagate to right neighbor (x + 1)
-            if (x + 1 < width) {
-                uint8_t* right_pixel = &image_data[(y * width + (x + 1)) * 4];
-                right_pixel[0] = _clamp_256(right_pixel[0] + error_r);
-                right_pixel[1] = _clamp_256(right_pixel[1] + error_g);
-                right_pixel[2] = _clamp_256(right_pixel[2] + error_b);
+            // Spread the error to the neighbours covered by the kernel (mirrored on reversed rows)
+            for (int t = 0; t < kernel->tap_count; ++t) {
+                const _diffusion_tap *tap = &kernel->taps[t];
+                int tx = x + tap->dx * direction;
+                int ty = y + tap->dy;
+                if (tx < 0 || tx >= width || ty >= height) continue;
+                uint8_t *target = &image_data[(ty * width + tx) * 4];
+                target[0] = _clamp_256(target[0] + err_r * tap->weight / kernel->divisor);
+                target[1] = _clamp_256(target[1] + err_g * tap->weight / kernel->divisor);
+                target[2] = _clamp_256(target[2] + err_b * tap->weight / kernel->divisor);
             }
+        }
 
-            // Propagate to right+2 neighbor (x + 2)
-            if (x + 2 < width) {
-                uint8_t* right2_pixel = &image_data[(y * width + (x + 2)) * 4];
-                right2_pixel[0] = _clamp_256(right2_pixel[0] + error_r);
-                right2_pixel[1] = _clamp_256(right2_pixel[1] + error_g);
-                right2_pixel[2] = _clamp_256(right2_pixel[2] + error_b);
-            }
+        if (ctx->progress && (i + 1) % DIFFUSION_PROGRESS_STEP == 0) {
+            __atomic_store_n(&ctx->progress[y], i + 1, __ATOMIC_RELEASE);
+        }
+    }
 
-            // Propagate to bottom neighbor (y + 1)
-            if (y + 1 < height) {
-                uint8_t* bottom_pixel = &image_data[((y + 1) * width + x) * 4];
-                bottom_pixel[0] = _clamp_256(bottom_pixel[0] + error_r);
-                bottom_pixel[1] = _clamp_256(bottom_pixel[1] + error_g);
-                bottom_pixel[2] = _clamp_256(bottom_pixel[2] + error_b);
-            }
+    if (ctx->progress) {
+        __atomic_store_n(&ctx->progress[y], width, __ATOMIC_RELEASE);
+    }
+}
 
-            // Propagate to bottom-right neighbor (y + 1, x + 1)
-            if (x + 1 < width && y + 1 < height) {
-                uint8_t* bottom_right_pixel = &image_data[((y + 1) * width + (x + 1)) * 4];
-                bottom_right_pixel[0] = _clamp_256(bottom_right_pixel[0] + error_r);
-                bottom_right_pixel[1] = _clamp_256(bottom_right_pixel[1] + error_g);
-                bottom_right_pixel[2] = _clamp_256(bottom_right_pixel[2] + error_b);
-            }
+// Work function for _parallel_for_each: rows are claimed in increasing order,
+// so the row each worker waits on is always already being processed
+static void _diffuse_rows(void *arg, int y_start, int y_end) {
+    const _diffusion_ctx *ctx = (const _diffusion_ctx *)arg;
+    for (int y = y_start; y < y_end; ++y) {
+        _diffuse_row(ctx, y);
+    }
+}
 
-            // Propagate to bottom-right+2 neighbor (y + 1, x + 2)
-            if (x + 2 < width && y + 1 < height) {
-                uint8_t* bottom_right2_pixel = &image_data[((y + 1) * width + (x + 2)) * 4];
-                bottom_right2_pixel[0] = _clamp_256(bottom_right2_pixel[0] + error_r);
-                bottom_right2_pixel[1] = _clamp_256(bottom_right2_pixel[1] + error_g);
-                bottom_right2_pixel[2] = _clamp_256(bottom_right2_pixel[2] + error_b);
-            }
-        }
+// Run error diffusion over the whole image.
+// With threads > 1 rows are dithered as a staggered wavefront: row y runs alongside row y - 1,
+// trailing it by the kernel's lag, which gives the same result as the serial raster scan.
+// Serpentine scans alternate direction each row, so they always run serially.
+static void _error_diffusion(uint8_t *image_data, int width, int height, Palette *palette, const _diffusion_kernel *kernel, bool serpentine, int threads) {
+    _diffusion_ctx ctx = { image_data, width, height, palette, kernel, serpentine, _diffusion_lag(kernel), NULL };
+
+    // Waiting rows spin, so never run more rows at once than there are CPUs
+    int cpus = _resolve_thread_count(0);
+    if (threads > cpus) threads = cpus;
+
+    if (threads > 1 && !serpentine && height > 1) {
+        ctx.progress = (int *)calloc(height, sizeof(int));
     }
+    if (!ctx.progress) {
+        _diffuse_rows(&ctx, 0, height);
+        return;
+    }
+
+    _parallel_for_each(height, threads, _diffuse_rows, &ctx);
+    free(ctx.progress);
+}
+
+// Atkinson dithering
+void _convert_atkinson(uint8_t* image_data, int width, int height, Palette *palette, bool serpentine, int threads) {
+    _error_diffusion(image_data, width, height, palette, &atkinson_kernel, serpentine, threads);
 }
 
 void extrapolate_color(const Color *orig, const Color *matched, Color *extrapolated) {
@@ -452,192 +825,171 @@ void extrapolate_color(const Color *orig, const Color *matched, Color *extrapola
     extrapolated->b = _clamp_256(orig->b + (orig->b - matched->b));
 }
 
-void _convert_bayer(uint8_t* image_data, int width, int height, Palette *palette) {
+// Shared state for the row-parallel conversion methods
+typedef struct {
+    uint8_t *image_data;
+    int width;
+    const Palette *palette;
+    bool has_transparent_color;
+    const uint8_t *transparent_rgb;
+} _convert_rows_ctx;
+
+// Bayer dithering for one row; y is the row's position in the image, which sets the pattern phase.
+// Every pixel is independent of its neighbours.
+static void _convert_bayer_row(uint8_t *row, int width, int y, const Palette *palette) {
     for (int x = 0; x < width; x++) {
-        for (int y = 0; y < height; y++) {
-            uint8_t* pixel = &image_data[(y * width + x) * 4];  // RGBA format
+        uint8_t* pixel = &row[x * 4];  // RGBA format
 
-            // Skip dithering for pixels with alpha channel value < 1
-            if (pixel[3] < 1) continue;
+        // Skip dithering for pixels with alpha channel value < 1
+        if (pixel[3] < 1) continue;
 
-            // Get the Bayer threshold value for the current pixel position
-            uint8_t threshold = bayer_matrix[x % 4][y % 4];
+        // Get the Bayer threshold value for the current pixel position
+        uint8_t threshold = bayer_matrix[x % 4][y % 4];
 
-            // Create a Color struct for the current pixel's RGB values
-            Color current_pixel = { .r = pixel[0], .g = pixel[1], .b = pixel[2] };
+        // Create a Color struct for the current pixel's RGB values
+        Color current_pixel = { .r = pixel[0], .g = pixel[1], .b = pixel[2] };
 
-            // Find the nearest RGB color in the palette (initial color1)
-            const Color* color1 = _nearest_rgb(&current_pixel, palette);
+        // Find the nearest RGB color in the palette (initial color1)
+        const Color* color1 = _nearest_rgb(&current_pixel, palette);
 
-            // Extrapolate a second color (color2) based on the error from color1
-            Color extrapolated_color;
-            extrapolate_color(&current_pixel, color1, &extrapolated_color);
+        // Extrapolate a second color (color2) based on the error from color1
+        Color extrapolated_color;
+        extrapolate_color(&current_pixel, color1, &extrapolated_color);
 
-            const Color* color2 = _nearest_rgb(&extrapolated_color, palette);
+        const Color* color2 = _nearest_rgb(&extrapolated_color, palette);
 
-            // Calculate distances
-            float err1 = _distance_rgb(&current_pixel, color1);
-            float err2 = _distance_rgb(&current_pixel, color2);
+        // Calculate distances
+        float err1 = _distance_rgb(&current_pixel, color1);
+        float err2 = _distance_rgb(&current_pixel, color2);
 
-            // Determine the relative probability of choosing color1 vs color2
-            if (err1 || err2) {
-                const int proportion2 = (255 * err2) / (err1 + err2);
-                if (threshold > proportion2) {
-                    color1 = color2;  // Use the alternative color2
-                }
+        // Determine the relative probability of choosing color1 vs color2
+        if (err1 || err2) {
+            const int proportion2 = (255 * err2) / (err1 + err2);
+            if (threshold > proportion2) {
+                color1 = color2;  // Use the alternative color2
             }
-
-            // Update the pixel with the final color
-            pixel[0] = color1->r;
-            pixel[1] = color1->g;
-            pixel[2] = color1->b;
         }
+
+        // Update the pixel with the final color
+        pixel[0] = color1->r;
+        pixel[1] = color1->g;
+        pixel[2] = color1->b;
     }
 }
 
-// Floyd-Steinberg dithering
-void _convert_floyd_steinberg(uint8_t* image_data, int width, int height, Palette *palette) {
-    for (int y = 0; y < height; ++y) {
-        for (int x = 0; x < width; ++x) {
-            int pixel_index = (y * width + x) * 4;  // RGBA format
-            uint8_t *pixel = &image_data[pixel_index];
-
-            // Skip pixels with alpha less than full (i.e., partially transparent)
-            if (pixel[3] < 1) {
-                continue;
-            }
-
-            // Create a temporary Color struct for the current pixel's RGB values
-            Color current_pixel = {
-                .r = pixel[0],  // Red
-                .g = pixel[1],  // Green
-                .b = pixel[2],  // Blue
-                .h = 0.0f,      // Not used for RGB matching
-                .s = 0.0f,      // Not used for RGB matching
-                .v = 0.0f,      // Not used for RGB matching
-            };
-
-            // Find the nearest RGB color in the palette
-            const Color* nearest_color = _nearest_rgb(&current_pixel, palette);
-
-            // Store the original pixel values
-            uint8_t old_r = pixel[0];
-            uint8_t old_g = pixel[1];
-            uint8_t old_b = pixel[2];
-
-            // Set the pixel to the nearest palette color
-            pixel[0] = nearest_color->r;  // Red
-            pixel[1] = nearest_color->g;  // Green
-            pixel[2] = nearest_color->b;  // Blue
-
-            // Calculate the error for each channel (RGB)
-            int error_r = old_r - nearest_color->r;
-            int error_g = old_g - nearest_color->g;
-            int error_b = old_b - nearest_color->b;
-
-            // Distribute the error to neighboring pixels (Floyd-Steinberg dithering)
-            if (x + 1 < width) {
-                int neighbor_index = (y * width + (x + 1)) * 4;
-                image_data[neighbor_index + 0] = _clamp_256(image_data[neighbor_index + 0] + (error_r * 7 / 16));
-                image_data[neighbor_index + 1] = _clamp_256(image_data[neighbor_index + 1] + (error_g * 7 / 16));
-                image_data[neighbor_index + 2] = _clamp_256(image_data[neighbor_index + 2] + (error_b * 7 / 16));
-            }
-            if (y + 1 < height) {
-                if (x > 0) {
-                    int neighbor_index = ((y + 1) * width + (x - 1)) * 4;
-                    image_data[neighbor_index + 0] = _clamp_256(image_data[neighbor_index + 0] + (error_r * 3 / 16));
-                    image_data[neighbor_index + 1] = _clamp_256(image_data[neighbor_index + 1] + (error_g * 3 / 16));
-                    image_data[neighbor_index + 2] = _clamp_256(image_data[neighbor_index + 2] + (error_b * 3 / 16));
-                }
-                int neighbor_index = ((y + 1) * width + x) * 4;
-                image_data[neighbor_index + 0] = _clamp_256(image_data[neighbor_index + 0] + (error_r * 5 / 16));
-                image_data[neighbor_index + 1] = _clamp_256(image_data[neighbor_index + 1] + (error_g * 5 / 16));
-                image_data[neighbor_index + 2] = _clamp_256(image_data[neighbor_index + 2] + (error_b * 5 / 16));
-                if (x + 1 < width) {
-                    int neighbor_index = ((y + 1) * width + (x + 1)) * 4;
-                    image_data[neighbor_index + 0] = _clamp_256(image_data[neighbor_index + 0] + (error_r * 1 / 16));
-                    image_data[neighbor_index + 1] = _clamp_256(image_data[neighbor_index + 1] + (error_g * 1 / 16));
-                    image_data[neighbor_index + 2] = _clamp_256(image_data[neighbor_index + 2] + (error_b * 1 / 16));
-                }
-            }
-        }
+// Bayer dithering for rows [y_start, y_end)
+static void _convert_bayer_rows(void *arg, int y_start, int y_end) {
+    const _convert_rows_ctx *ctx = (const _convert_rows_ctx *)arg;
+    for (int y = y_start; y < y_end; y++) {
+        _convert_bayer_row(&ctx->image_data[(size_t)y * ctx->width * 4], ctx->width, y, ctx->palette);
     }
 }
 
-// Convert a PNG image to use a custom palette by matching RGB colors
-void _convert_method_rgb(uint8_t *image_data, int width, int height, Palette *palette, bool has_transparent_color, const uint8_t transparent_rgb[3]) {
-    // Loop over every pixel in the image
-    for (int y = 0; y < height; ++y) {
-        for (int x = 0; x < width; ++x) {
-            int pixel_index = (y * width + x) * 4;  // Assuming RGBA format
-
-            uint8_t r = image_data[pixel_index];
-            uint8_t g = image_data[pixel_index + 1];
-            uint8_t b = image_data[pixel_index + 2];
-            uint8_t a = image_data[pixel_index + 3];
-
-            // Handle transparency based on alpha or a specific transparent color
-            if (a < 1 || (has_transparent_color && r == transparent_rgb[0] && g == transparent_rgb[1] && b == transparent_rgb[2])) {
-                image_data[pixel_index + 3] = 0;  // Fully transparent
-                continue;
-            }
+// Bayer ordered dithering; rows are split across 'threads' threads
+void _convert_bayer(uint8_t* image_data, int width, int height, Palette *palette, int threads) {
+    _convert_rows_ctx ctx = { image_data, width, palette, false, NULL };
+    _parallel_for(height, threads, _convert_bayer_rows, &ctx);
+}
+
+// Floyd-Steinberg dithering
+void _convert_floyd_steinberg(uint8_t* image_data, int width, int height, Palette *palette, bool serpentine, int threads) {
+    _error_diffusion(image_data, width, height, palette, &floyd_steinberg_kernel, serpentine, threads);
+}
 
-            // Create a temporary Color struct for the current pixel's RGB values
-            Color current_pixel = {r, g, b, 0.0f, 0.0f, 0.0f};
-            _rgb_to_hsv(r, g, b, &current_pixel.h, &current_pixel.s, &current_pixel.v);
+// Match one row to the palette by RGB distance
+static void _convert_method_rgb_row(uint8_t *row, int width, const Palette *palette, bool has_transparent_color, const uint8_t *transparent_rgb) {
+    for (int x = 0; x < width; ++x) {
+        uint8_t *pixel = &row[x * 4];  // Assuming RGBA format
 
-            // Find the nearest RGB color in the palette
-            const Color *nearest_rgb = _nearest_rgb(&current_pixel, palette);
+        uint8_t r = pixel[0];
+        uint8_t g = pixel[1];
+        uint8_t b = pixel[2];
+        uint8_t a = pixel[3];
 
-            // Update the image data with the nearest RGB color
-            image_data[pixel_index] = nearest_rgb->r;
-            image_data[pixel_index + 1] = nearest_rgb->g;
-            image_data[pixel_index + 2] = nearest_rgb->b;
+        // Handle transparency based on alpha or a specific transparent color
+        if (a < 1 || (has_transparent_color && r == transparent_rgb[0] && g == transparent_rgb[1] && b == transparent_rgb[2])) {
+            pixel[3] = 0;  // Fully transparent
+            continue;
         }
+
+        // Create a temporary Color struct for the current pixel's RGB values
+        Color current_pixel = {r, g, b, 0.0f, 0.0f, 0.0f};
+
+        // Find the nearest RGB color in the palette
+        const Color *nearest_rgb = _nearest_rgb(&current_pixel, palette);
+
+        // Update the image data with the nearest RGB color
+        pixel[0] = nearest_rgb->r;
+        pixel[1] = nearest_rgb->g;
+        pixel[2] = nearest_rgb->b;
     }
+}
 
-    // Free the palette memory
-    _free_palette(palette);
+// Match rows [y_start, y_end) to the palette by RGB distance
+static void _convert_method_rgb_rows(void *arg, int y_start, int y_end) {
+    const _convert_rows_ctx *ctx = (const _convert_rows_ctx *)arg;
+    for (int y = y_start; y < y_end; ++y) {
+        _convert_method_rgb_row(&ctx->image_data[(size_t)y * ctx->width * 4], ctx->width, ctx->palette, ctx->has_transparent_color, ctx->transparent_rgb);
+    }
 }
 
-// Convert a PNG image to use a custom palette by matching HSV colors
-void _convert_method_hsv(uint8_t *image_data, int width, int height, Palette *palette, bool has_transparent_color, const uint8_t transparent_rgb[3]) {
-    // Loop over every pixel in the image
-    for (int y = 0; y < height; ++y) {
-        for (int x = 0; x < width; ++x) {
-            int pixel_index = (y * width + x) * 4;  // Assuming RGBA format
-
-            uint8_t r = image_data[pixel_index];
-            uint8_t g = image_data[pixel_index + 1];
-            uint8_t b = image_data[pixel_index + 2];
-            uint8_t a = image_data[pixel_index + 3];
-
-            // Handle transparency based on alpha or a specific transparent color
-            if (a < 1 || (has_transparent_color && r == transparent_rgb[0] && g == transparent_rgb[1] && b == transparent_rgb[2])) {
-                image_data[pixel_index + 3] = 0;  // Fully transparent
-                continue;
-            }
+// Convert a PNG image to use a custom palette by matching RGB colors
+// Rows are independent, so they are split across 'threads' threads
+void _convert_method_rgb(uint8_t *image_data, int width, int height, Palette *palette, bool has_transparent_color, const uint8_t transparent_rgb[3], int threads) {
+    _convert_rows_ctx ctx = { image_data, width, palette, has_transparent_color, transparent_rgb };
+    _parallel_for(height, threads, _convert_method_rgb_rows, &ctx);
+}
 
-            // Convert the current pixel's RGB values to HSV
-            Color current_pixel;
-            _rgb_to_hsv(r, g, b, &current_pixel.h, &current_pixel.s, &current_pixel.v);
+// Match one row to the palette by HSV distance
+static void _convert_method_hsv_row(uint8_t *row, int width, const Palette *palette, bool has_transparent_color, const uint8_t *transparent_rgb) {
+    for (int x = 0; x < width; ++x) {
+        uint8_t *pixel = &row[x * 4];  // Assuming RGBA format
 
-            // Find the nearest HSV color in the palette
-            const Color *nearest_hsv = _nearest_hsv(&current_pixel, palette);
+        uint8_t r = pixel[0];
+        uint8_t g = pixel[1];
+        uint8_t b = pixel[2];
+        uint8_t a = pixel[3];
 
-            // Convert the nearest HSV color back to RGB for output
-            uint8_t nearest_r, nearest_g, nearest_b;
-            _hsv_to_rgb(nearest_hsv->h, nearest_hsv->s, nearest_hsv->v, &nearest_r, &nearest_g, &nearest_b);
+        // Handle transparency based on alpha or a specific transparent color
+        if (a < 1 || (has_transparent_color && r == transparent_rgb[0] && g == transparent_rgb[1] && b == transparent_rgb[2])) {
+            pixel[3] = 0;  // Fully transparent
+            continue;
+        }
 
-            // Update the image data with the nearest RGB color
-            image_data[pixel_index] = nearest_r;
-            image_data[pixel_index + 1] = nearest_g;
-            image_data[pixel_index + 2] = nearest_b;
+        // Find the nearest HSV color in the palette (memoized per 24-bit RGB)
+        size_t nearest_index = _nearest_hsv_index_rgb(r, g, b, palette);
+
+        // Output the palette color as it comes back from HSV
+        uint8_t nearest_r, nearest_g, nearest_b;
+        if (palette->hsv_rgb) {
+            nearest_r = palette->hsv_rgb[3 * nearest_index];
+            nearest_g = palette->hsv_rgb[3 * nearest_index + 1];
+            nearest_b = palette->hsv_rgb[3 * nearest_index + 2];
+        } else {
+            const Color *nearest_hsv = &palette->colors[nearest_index];
+            _hsv_to_rgb(nearest_hsv->h, nearest_hsv->s, nearest_hsv->v, &nearest_r, &nearest_g, &nearest_b);
         }
+
+        // Update the image data with the nearest RGB color
+        pixel[0] = nearest_r;
+        pixel[1] = nearest_g;
+        pixel[2] = nearest_b;
     }
+}
 
-    // Free the palette memory
-    _free_palette(palette);
+// Match rows [y_start, y_end) to the palette by HSV distance
+static void _convert_method_hsv_rows(void *arg, int y_start, int y_end) {
+    const _convert_rows_ctx *ctx = (const _convert_rows_ctx *)arg;
+    for (int y = y_start; y < y_end; ++y) {
+        _convert_method_hsv_row(&ctx->image_data[(size_t)y * ctx->width * 4], ctx->width, ctx->palette, ctx->has_transparent_color, ctx->transparent_rgb);
+    }
+}
+
+// Convert a PNG image to use a custom palette by matching HSV colors
+// Rows are independent, so they are split across 'threads' threads
+void _convert_method_hsv(uint8_t *image_data, int width, int height, Palette *palette, bool has_transparent_color, const uint8_t transparent_rgb[3], int threads) {
+    _convert_rows_ctx ctx = { image_data, width, palette, has_transparent_color, transparent_rgb };
+    _parallel_for(height, threads, _convert_method_hsv_rows, &ctx);
 }
 
 // Helper function to _clamp_256 values between 0 and 255
@@ -683,48 +1035,64 @@ bool _parse_transparent_color(PyObject *transparent_color, uint8_t transparent_r
     return use_transparent;
 }
 
-bool _parse_palette_conversion_args(PyObject *args, PyObject *kwargs, const char **src_file, const char **tgt_file, const char **palette_file, const char **palette_conversion_method, uint8_t **image_data, int *width, int *height, Palette *palette, bool *use_transparent, uint8_t transparent_rgb[3]) {
+bool _parse_palette_conversion_args(PyObject *args, PyObject *kwargs, const char **src_file, const char **tgt_file, PyObject **palette_obj, const char **palette_conversion_method, uint8_t **image_data, int *width, int *height, Palette **palette, bool *use_transparent, uint8_t transparent_rgb[3], int *threads) {
     PyObject *transparent_color = Py_None;  // Default to None
+    PyObject *palette_arg;
 
     // Define keyword argument names
-    static char *kwlist[] = {"src_file", "tgt_file", "palette_file", "palette_conversion_method", "transparent_color", NULL};
+    static char *kwlist[] = {"src_file", "tgt_file", "palette_file", "palette_conversion_method", "transparent_color", "threads", NULL};
+
+    // Parse the function arguments (palette_file may be a path or an agonutils.Palette)
+    *threads = 1;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ssOs|Oi", kwlist, src_file, tgt_file, &palette_arg, palette_conversion_method, &transparent_color, threads)) {
+        return false;
+    }
+    *threads = _resolve_thread_count(*threads);
 
-    // Parse the function arguments
-    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ssss|O", kwlist, src_file, tgt_file, palette_file, palette_conversion_method, &transparent_color)) {
+    // Determine transparency settings before loading anything
+    *use_transparent = _parse_transparent_color(transparent_color, transparent_rgb);
+    if (PyErr_Occurred()) {
         return false;
     }
 
-    // Load the palette
-    if (_load_gimp_palette(*palette_file, palette) != 0) {
-        PyErr_SetString(PyExc_IOError, "Failed to load palette file");
+    // Load the palette, or reuse an already loaded Palette object
+    *palette_obj = _palette_object_from_arg(palette_arg);
+    if (!*palette_obj) {
         return false;
     }
+    *palette = &((PaletteObject *)*palette_obj)->palette;
 
     // Load the source image
-    if (!_read_png(*src_file, image_data, width, height)) {
+    int read_ok;
+    Py_BEGIN_ALLOW_THREADS
+    read_ok = _read_png(*src_file, image_data, width, height);
+    Py_END_ALLOW_THREADS
+    if (!read_ok) {
         PyErr_SetString(PyExc_IOError, "Failed to load source PNG file");
-        _free_palette(palette);
+        Py_CLEAR(*palette_obj);
         return false;
     }
 
-    // Determine transparency settings
-    *use_transparent = _parse_transparent_color(transparent_color, transparent_rgb);
-
     return true;
 }
 
-uint8_t* _convert_to_palette(uint8_t *image_data, int width, int height, Palette *palette, const char *palette_conversion_method, bool use_transparent, uint8_t transparent_rgb[3]) {
+uint8_t* _convert_to_palette(uint8_t *image_data, int width, int height, Palette *palette, const char *palette_conversion_method, bool use_transparent, uint8_t transparent_rgb[3], int threads) {
     // Dispatch to the appropriate conversion function.
+    // The *_serpentine dithering modes alternate scan direction each row and ignore threads.
     if (strcasecmp(palette_conversion_method, "RGB") == 0) {
-        _convert_method_rgb(image_data, width, height, palette, use_transparent, transparent_rgb);
+        _convert_method_rgb(image_data, width, height, palette, use_transparent, transparent_rgb, threads);
     } else if (strcasecmp(palette_conversion_method, "HSV") == 0) {
-        _convert_method_hsv(image_data, width, height, palette, use_transparent, transparent_rgb);
+        _convert_method_hsv(image_data, width, height, palette, use_transparent, transparent_rgb, threads);
     } else if (strcasecmp(palette_conversion_method, "atkinson") == 0) {
-        _convert_atkinson(image_data, width, height, palette);
+        _convert_atkinson(image_data, width, height, palette, false, threads);
+    } else if (strcasecmp(palette_conversion_method, "atkinson_serpentine") == 0) {
+        _convert_atkinson(image_data, width, height, palette, true, threads);
     } else if (strcasecmp(palette_conversion_method, "bayer") == 0) {
-        _convert_bayer(image_data, width, height, palette);
+        _convert_bayer(image_data, width, height, palette, threads);
     } else if (strcasecmp(palette_conversion_method, "floyd") == 0) {
-        _convert_floyd_steinberg(image_data, width, height, palette);
+        _convert_floyd_steinberg(image_data, width, height, palette, false, threads);
+    } else if (strcasecmp(palette_conversion_method, "floyd_serpentine") == 0) {
+        _convert_floyd_steinberg(image_data, width, height, palette, true, threads);
     } else {
         // Invalid conversion palette_conversion_method provided.
         return NULL;
@@ -733,55 +1101,100 @@ uint8_t* _convert_to_palette(uint8_t *image_data, int width, int height, Palette
     return image_data;
 }
 
+bool _convert_row_to_palette(uint8_t *row, int width, int y, Palette *palette, const char *palette_conversion_method, bool use_transparent, const uint8_t transparent_rgb[3]) {
+    // Only methods whose pixels don't depend on other rows can convert a row at a time
+    if (strcasecmp(palette_conversion_method, "RGB") == 0) {
+        _convert_method_rgb_row(row, width, palette, use_transparent, transparent_rgb);
+    } else if (strcasecmp(palette_conversion_method, "HSV") == 0) {
+        _convert_method_hsv_row(row, width, palette, use_transparent, transparent_rgb);
+    } else if (strcasecmp(palette_conversion_method, "bayer") == 0) {
+        _convert_bayer_row(row, width, y, palette);
+    } else {
+        return false;
+    }
+    return true;
+}
+
+bool _is_row_conversion_method(const char *palette_conversion_method) {
+    return strcasecmp(palette_conversion_method, "RGB") == 0
+        || strcasecmp(palette_conversion_method, "HSV") == 0
+        || strcasecmp(palette_conversion_method, "bayer") == 0;
+}
+
+bool _is_palette_conversion_method(const char *palette_conversion_method) {
+    return _is_row_conversion_method(palette_conversion_method)
+        || strcasecmp(palette_conversion_method, "atkinson") == 0
+        || strcasecmp(palette_conversion_method, "atkinson_serpentine") == 0
+        || strcasecmp(palette_conversion_method, "floyd") == 0
+        || strcasecmp(palette_conversion_method, "floyd_serpentine") == 0;
+}
+
 PyObject* convert_to_palette(PyObject *self, PyObject *args, PyObject *kwargs) {
-    const char *src_file, *tgt_file, *palette_file, *palette_conversion_method; uint8_t *image_data; int width, height; Palette palette; bool use_transparent; uint8_t transparent_rgb[3] = {0, 0, 0};
+    const char *src_file, *tgt_file, *palette_conversion_method; PyObject *palette_obj; uint8_t *image_data; int width, height; Palette *palette; bool use_transparent; uint8_t transparent_rgb[3] = {0, 0, 0}; int threads;
 
     // Use helper function to parse arguments and set up data
-    if (!_parse_palette_conversion_args(args, kwargs, &src_file, &tgt_file, &palette_file, &palette_conversion_method, &image_data, &width, &height, &palette, &use_transparent, transparent_rgb)) {
+    if (!_parse_palette_conversion_args(args, kwargs, &src_file, &tgt_file, &palette_obj, &palette_conversion_method, &image_data, &width, &height, &palette, &use_transparent, transparent_rgb, &threads)) {
         return NULL;
     }
 
-    // Perform conversion
-    if (_convert_to_palette(image_data, width, height, &palette, palette_conversion_method, use_transparent, transparent_rgb) == NULL) {
+    // Perform conversion and write the output file without holding the GIL
+    uint8_t *converted;
+    int write_ok = 0;
+    Py_BEGIN_ALLOW_THREADS
+    converted = _convert_to_palette(image_data, width, height, palette, palette_conversion_method, use_transparent, transparent_rgb, threads);
+    if (converted) {
+        write_ok = _write_png(tgt_file, image_data, width, height);
+    }
+    Py_END_ALLOW_THREADS
+
+    if (converted == NULL) {
+        PyErr_Format(PyExc_ValueError, "Unknown palette conversion method '%s'", palette_conversion_method);
         free(image_data);
-        _free_palette(&palette);
+        Py_DECREF(palette_obj);
         return NULL;
     }
 
-    // Write output file
-    if (!_write_png(tgt_file, image_data, width, height)) {
+    // Check the output file
+    if (!write_ok) {
         PyErr_SetString(PyExc_IOError, "Failed to save target PNG file");
         free(image_data);
-        _free_palette(&palette);
+        Py_DECREF(palette_obj);
         return NULL;
     }
 
     free(image_data);
-    _free_palette(&palette);
+    Py_DECREF(palette_obj);
     Py_RETURN_NONE;
 }
 
 // Python-facing function: Convert a PNG to a palette-based image, then output it as an .rgba2 file
 PyObject* img_to_rgba2(PyObject *self, PyObject *args, PyObject *kwargs) {
-    const char *src_file, *tgt_file, *palette_file, *palette_conversion_method;
+    const char *src_file, *tgt_file, *palette_conversion_method;
+    PyObject *palette_obj;
     uint8_t *image_data = NULL;
     int width, height;
-    Palette palette;
+    Palette *palette;
     bool use_transparent;
     uint8_t transparent_rgb[3] = {0, 0, 0};
+    int threads;
 
     // Use helper function to parse arguments and set up data
     if (!_parse_palette_conversion_args(args, kwargs,
-            &src_file, &tgt_file, &palette_file, &palette_conversion_method,
+            &src_file, &tgt_file, &palette_obj, &palette_conversion_method,
             &image_data, &width, &height, &palette,
-            &use_transparent, transparent_rgb)) {
+            &use_transparent, transparent_rgb, &threads)) {
         return NULL;
     }
 
     // Perform the palette conversion on the image_data
-    if (_convert_to_palette(image_data, width, height, &palette, palette_conversion_method, use_transparent, transparent_rgb) == NULL) {
+    uint8_t *converted;
+    Py_BEGIN_ALLOW_THREADS
+    converted = _convert_to_palette(image_data, width, height, palette, palette_conversion_method, use_transparent, transparent_rgb, threads);
+    Py_END_ALLOW_THREADS
+    if (converted == NULL) {
+        PyErr_Format(PyExc_ValueError, "Unknown palette conversion method '%s'", palette_conversion_method);
         free(image_data);
-        _free_palette(&palette);
+        Py_DECREF(palette_obj);
         return NULL;
     }
 
@@ -792,44 +1205,228 @@ PyObject* img_to_rgba2(PyObject *self, PyObject *args, PyObject *kwargs) {
     if (!rgba2_data) {
         PyErr_SetString(PyExc_MemoryError, "Failed to allocate memory for RGBA2222 data.");
         free(image_data);
-        _free_palette(&palette);
+        Py_DECREF(palette_obj);
         return NULL;
     }
 
-    // Convert from 32-bit RGBA (palette converted) to RGBA2222 (8-bit per pixel)
+    // Convert from 32-bit RGBA (palette converted) to RGBA2222 (8-bit per pixel) and write it out
+    FILE *outfile;
+    size_t written = 0;
+    Py_BEGIN_ALLOW_THREADS
     _rgba32_to_rgba2(image_data, num_pixels, rgba2_data);
+    outfile = fopen(tgt_file, "wb");
+    if (outfile) {
+        written = fwrite(rgba2_data, 1, num_pixels, outfile);
+        fclose(outfile);
+    }
+    Py_END_ALLOW_THREADS
 
-    // Open the target file for writing in binary mode
-    FILE *outfile = fopen(tgt_file, "wb");
     if (!outfile) {
         PyErr_SetString(PyExc_IOError, "Failed to open output file for writing.");
         free(image_data);
         free(rgba2_data);
-        _free_palette(&palette);
+        Py_DECREF(palette_obj);
         return NULL;
     }
 
-    // Write the RGBA2222 data (one byte per pixel) to the file
-    size_t written = fwrite(rgba2_data, 1, num_pixels, outfile);
+    // Check that all the RGBA2222 data (one byte per pixel) was written
     if (written != num_pixels) {
         PyErr_SetString(PyExc_IOError, "Failed to write all RGBA2222 data to output file.");
-        fclose(outfile);
         free(image_data);
         free(rgba2_data);
-        _free_palette(&palette);
+        Py_DECREF(palette_obj);
         return NULL;
     }
-    fclose(outfile);
 
     // Clean up allocated resources
     free(image_data);
     free(rgba2_data);
-    _free_palette(&palette);
+    Py_DECREF(palette_obj);
 
     Py_RETURN_NONE;
 }
 
 
+// Helper function: Validate an RGBA8 buffer's stride and length and copy it row by row into a packed width*4 layout
+static bool _copy_rgba_buffer(const Py_buffer *view, int width, int height, Py_ssize_t stride, uint8_t *dst) {
+    Py_ssize_t row_bytes = (Py_ssize_t)width * 4;
+    if (stride == 0) stride = row_bytes;
+    if (stride < row_bytes) {
+        PyErr_Format(PyExc_ValueError, "stride (%zd) is smaller than width * 4 (%zd)", stride, row_bytes);
+        return false;
+    }
+    if (view->len < (Py_ssize_t)(height - 1) * stride + row_bytes) {
+        PyErr_Format(PyExc_ValueError, "buffer of %zd bytes is too small for %dx%d RGBA pixels with stride %zd", view->len, width, height, stride);
+        return false;
+    }
+
+    const uint8_t *src = (const uint8_t *)view->buf;
+    if (stride == row_bytes) {
+        memcpy(dst, src, (size_t)row_bytes * height);
+    } else {
+        for (int y = 0; y < height; ++y) {
+            memcpy(dst + (size_t)y * row_bytes, src + (size_t)y * stride, (size_t)row_bytes);
+        }
+    }
+    return true;
+}
+
+// Python-facing function: Palette-convert an in-memory RGBA8 buffer and return the converted RGBA8 pixels as bytes
+PyObject* convert_rgba_buffer(PyObject *self, PyObject *args, PyObject *kwargs) {
+    Py_buffer view;
+    int width, height;
+    PyObject *palette_arg, *transparent_color = Py_None;
+    const char *palette_conversion_method;
+    Py_ssize_t stride = 0;
+    uint8_t transparent_rgb[3] = {0, 0, 0};
+
+    int threads = 1;
+
+    static char *kwlist[] = {"buffer", "width", "height", "palette", "palette_conversion_method", "transparent_color", "stride", "threads", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*iiOs|Oni", kwlist, &view, &width, &height, &palette_arg, &palette_conversion_method, &transparent_color, &stride, &threads)) {
+        return NULL;
+    }
+    threads = _resolve_thread_count(threads);
+
+    PyObject *palette_obj = _palette_object_from_arg(palette_arg);
+    if (!palette_obj) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    bool use_transparent = _parse_transparent_color(transparent_color, transparent_rgb);
+    if (PyErr_Occurred()) {
+        Py_DECREF(palette_obj);
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    if (width <= 0 || height <= 0) {
+        PyErr_SetString(PyExc_ValueError, "width and height must be positive");
+        Py_DECREF(palette_obj);
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    // The output bytes object doubles as the working buffer, so the source is copied exactly once
+    PyObject *result = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)width * height * 4);
+    if (!result) {
+        Py_DECREF(palette_obj);
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    uint8_t *image_data = (uint8_t *)PyBytes_AS_STRING(result);
+    if (!_copy_rgba_buffer(&view, width, height, stride, image_data)) {
+        Py_DECREF(result);
+        Py_DECREF(palette_obj);
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    PyBuffer_Release(&view);
+
+    uint8_t *converted;
+    Palette *palette = &((PaletteObject *)palette_obj)->palette;
+    Py_BEGIN_ALLOW_THREADS
+    converted = _convert_to_palette(image_data, width, height, palette, palette_conversion_method, use_transparent, transparent_rgb, threads);
+    Py_END_ALLOW_THREADS
+    if (converted == NULL) {
+        PyErr_Format(PyExc_ValueError, "Unknown palette conversion method '%s'", palette_conversion_method);
+        Py_DECREF(result);
+        Py_DECREF(palette_obj);
+        return NULL;
+    }
+
+    Py_DECREF(palette_obj);
+    return result;
+}
+
+// Python-facing function: Convert an in-memory RGBA8 buffer to RGBA2222 bytes (one byte per pixel),
+// palette-converting it first unless palette is None
+PyObject* rgba_to_rgba2_buffer(PyObject *self, PyObject *args, PyObject *kwargs) {
+    Py_buffer view;
+    int width, height;
+    PyObject *palette_arg = Py_None, *transparent_color = Py_None;
+    const char *palette_conversion_method = "RGB";
+    Py_ssize_t stride = 0;
+    uint8_t transparent_rgb[3] = {0, 0, 0};
+
+    int threads = 1;
+
+    static char *kwlist[] = {"buffer", "width", "height", "palette", "palette_conversion_method", "transparent_color", "stride", "threads", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*ii|OsOni", kwlist, &view, &width, &height, &palette_arg, &palette_conversion_method, &transparent_color, &stride, &threads)) {
+        return NULL;
+    }
+    threads = _resolve_thread_count(threads);
+
+    PyObject *palette_obj = NULL;
+    if (palette_arg != Py_None) {
+        palette_obj = _palette_object_from_arg(palette_arg);
+        if (!palette_obj) {
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+    }
+
+    bool use_transparent = _parse_transparent_color(transparent_color, transparent_rgb);
+    if (PyErr_Occurred()) {
+        Py_XDECREF(palette_obj);
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    if (width <= 0 || height <= 0) {
+        PyErr_SetString(PyExc_ValueError, "width and height must be positive");
+        Py_XDECREF(palette_obj);
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    size_t num_pixels = (size_t)width * height;
+    uint8_t *image_data = (uint8_t *)malloc(num_pixels * 4);
+    if (!image_data) {
+        PyErr_SetString(PyExc_MemoryError, "Unable to allocate memory for image data.");
+        Py_XDECREF(palette_obj);
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    if (!_copy_rgba_buffer(&view, width, height, stride, image_data)) {
+        free(image_data);
+        Py_XDECREF(palette_obj);
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    PyBuffer_Release(&view);
+
+    PyObject *result = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)num_pixels);
+    if (!result) {
+        free(image_data);
+        Py_XDECREF(palette_obj);
+        return NULL;
+    }
+
+    uint8_t *converted = image_data;
+    Palette *palette = palette_obj ? &((PaletteObject *)palette_obj)->palette : NULL;
+    uint8_t *rgba2_data = (uint8_t *)PyBytes_AS_STRING(result);
+    Py_BEGIN_ALLOW_THREADS
+    if (palette) {
+        converted = _convert_to_palette(image_data, width, height, palette, palette_conversion_method, use_transparent, transparent_rgb, threads);
+    }
+    if (converted) {
+        _rgba32_to_rgba2(image_data, num_pixels, rgba2_data);
+    }
+    Py_END_ALLOW_THREADS
+
+    free(image_data);
+    Py_XDECREF(palette_obj);
+    if (converted == NULL) {
+        PyErr_Format(PyExc_ValueError, "Unknown palette conversion method '%s'", palette_conversion_method);
+        Py_DECREF(result);
+        return NULL;
+    }
+    return result;
+}
+
 // Function: Convert RGBA2 binary file to PNG
 PyObject* rgba2_to_img(PyObject *self, PyObject *args) {
     const char *input_filepath, *output_filepath;
@@ -861,31 +1458,34 @@ PyObject* rgba2_to_img(PyObject *self, PyObject *args) {
         return NULL;
     }
 
-    // Read and decode each packed byte
-    for (size_t i = 0; i < width * height; ++i) {
-        uint8_t packed_pixel;
-        if (fread(&packed_pixel, sizeof(uint8_t), 1, file) != 1) {
-            free(image_data);
-            fclose(file);
-            PyErr_SetString(PyExc_IOError, "Error reading RGBA2 file.");
-            return NULL;
+    // Read the packed file in one go, expand it and write the PNG, without holding the GIL
+    bool read_ok = false;
+    int write_ok = 0;
+    Py_BEGIN_ALLOW_THREADS
+    size_t num_pixels = width * height;
+    uint8_t *rgba2_data = (uint8_t *)malloc(num_pixels ? num_pixels : 1);
+    if (rgba2_data) {
+        read_ok = fread(rgba2_data, sizeof(uint8_t), num_pixels, file) == num_pixels;
+        if (read_ok) {
+            _rgba2_to_rgba32(rgba2_data, num_pixels, image_data);
         }
-        
-        // Use the helper function to decode the 2-bit packed pixel to 8-bit RGBA
-        uint8_t r, g, b, a;
-        _two_to_eight(packed_pixel, &r, &g, &b, &a);
-
-        // Store the expanded 8-bit values in the image data
-        image_data[i * 4 + 0] = r;
-        image_data[i * 4 + 1] = g;
-        image_data[i * 4 + 2] = b;
-        image_data[i * 4 + 3] = a;
+        free(rgba2_data);
     }
 
     fclose(file);
 
     // Write the PNG image using your libpng helper
-    if (!_write_png(output_filepath, image_data, width, height)) {
+    if (read_ok) {
+        write_ok = _write_png(output_filepath, image_data, width, height);
+    }
+    Py_END_ALLOW_THREADS
+
+    if (!read_ok) {
+        free(image_data);
+        PyErr_SetString(PyExc_IOError, "Error reading RGBA2 file.");
+        return NULL;
+    }
+    if (!write_ok) {
         PyErr_SetString(PyExc_IOError, "Failed to save PNG file.");
         free(image_data);
         return NULL;
@@ -921,18 +1521,25 @@ PyObject* rgba8_to_img(PyObject *self, PyObject *args) {
         return NULL;
     }
 
-    // Read RGBA8 data from file
-    if (fread(image_data, sizeof(uint8_t), image_size, file) != image_size) {
+    // Read RGBA8 data from file and write the PNG without holding the GIL
+    bool read_ok;
+    int write_ok = 0;
+    Py_BEGIN_ALLOW_THREADS
+    read_ok = fread(image_data, sizeof(uint8_t), image_size, file) == image_size;
+    fclose(file);
+
+    // Write the PNG image using your libpng helper
+    if (read_ok) {
+        write_ok = _write_png(output_filepath, image_data, width, height);
+    }
+    Py_END_ALLOW_THREADS
+
+    if (!read_ok) {
         free(image_data);
-        fclose(file);
         PyErr_SetString(PyExc_IOError, "Error reading RGBA8 file.");
         return NULL;
     }
-
-    fclose(file);
-
-    // Write the PNG image using your libpng helper
-    if (!_write_png(output_filepath, image_data, width, height)) {
+    if (!write_ok) {
         PyErr_SetString(PyExc_IOError, "Failed to save PNG file.");
         free(image_data);
         return NULL;
@@ -952,79 +1559,435 @@ PyObject* csv_to_palette(PyObject *self, PyObject *args) {
         return NULL;
     }
 
-    // Open the CSV file
-    FILE *file = fopen(csv_filepath, "r");
-    if (!file) {
-        PyErr_SetString(PyExc_IOError, "Could not open the CSV file");
+    Palette palette;
+    if (_load_csv_palette(csv_filepath, &palette) != 0) {
+        PyErr_SetString(PyExc_IOError, "Could not load the CSV file");
         return NULL;
     }
 
-    // Allocate memory for the Palette
-    Palette *palette = (Palette *)malloc(sizeof(Palette));
-    if (!palette) {
-        PyErr_SetString(PyExc_MemoryError, "Unable to allocate memory for the Palette");
-        fclose(file);
+    // Return the Palette object to Python
+    return _palette_object_from_struct(&palette);
+}
+
+// ===========================
+// Batch conversion
+// ---------------------------
+
+// Output formats batch_convert can write, in the order they appear in its stats
+enum { BATCH_OUTPUT_PNG, BATCH_OUTPUT_RGBA2, BATCH_OUTPUT_COUNT };
+static const char *batch_output_names[BATCH_OUTPUT_COUNT] = { "png", "rgba2" };
+
+// Per-file outcome, set by the worker that converted the file
+enum { BATCH_OK, BATCH_READ_FAILED, BATCH_BAD_METHOD, BATCH_NO_MEMORY, BATCH_WRITE_FAILED };
+
+typedef struct {
+    const char *src_path;
+    char *tgt_paths[BATCH_OUTPUT_COUNT];  // NULL for outputs that were not requested
+    long long output_sizes[BATCH_OUTPUT_COUNT];
+    int width, height;
+    double decode_time, convert_time, write_time;
+    int status;
+    const char *failed_path;  // File that caused a non-OK status
+} _batch_job;
+
+typedef struct {
+    _batch_job *jobs;
+    Palette *palette;
+    const char *palette_conversion_method;
+    bool use_transparent;
+    uint8_t transparent_rgb[3];
+} _batch_ctx;
+
+// Helper function: Build out_dir/<src basename without extension>.<ext>
+static char* _batch_output_path(const char *out_dir, const char *src_path, const char *ext) {
+    const char *base = strrchr(src_path, '/');
+    base = base ? base + 1 : src_path;
+    const char *dot = strrchr(base, '.');
+    size_t base_len = (dot && dot != base) ? (size_t)(dot - base) : strlen(base);
+    size_t dir_len = strlen(out_dir);
+    bool needs_sep = dir_len > 0 && out_dir[dir_len - 1] != '/';
+
+    char *path = (char *)malloc(dir_len + 1 + base_len + 1 + strlen(ext) + 1);
+    if (!path) return NULL;
+    sprintf(path, "%s%s%.*s.%s", out_dir, needs_sep ? "/" : "", (int)base_len, base, ext);
+    return path;
+}
+
+static int _batch_compare_paths(const void *a, const void *b) {
+    return strcmp(*(const char *const *)a, *(const char *const *)b);
+}
+
+// Helper function: Find two jobs that would write the same output path, so workers can't overwrite each other.
+// Returns false if a temporary allocation failed; otherwise *first is -1 or the pair is in *first and *second.
+static bool _batch_find_duplicate_target(const _batch_job *jobs, Py_ssize_t count, int kind, Py_ssize_t *first, Py_ssize_t *second) {
+    *first = *second = -1;
+    const char **paths = (const char **)malloc((count > 0 ? count : 1) * sizeof(const char *));
+    if (!paths) return false;
+    for (Py_ssize_t i = 0; i < count; ++i) paths[i] = jobs[i].tgt_paths[kind];
+    qsort(paths, (size_t)count, sizeof(const char *), _batch_compare_paths);
+    const char *duplicate = NULL;
+    for (Py_ssize_t i = 1; i < count && !duplicate; ++i) {
+        if (strcmp(paths[i - 1], paths[i]) == 0) duplicate = paths[i];
+    }
+    free(paths);
+    // Report the first two sources, in source order, that map to it
+    for (Py_ssize_t i = 0; duplicate && i < count; ++i) {
+        if (strcmp(jobs[i].tgt_paths[kind], duplicate) != 0) continue;
+        if (*first < 0) {
+            *first = i;
+        } else {
+            *second = i;
+            break;
+        }
+    }
+    return true;
+}
+
+// Decode one source image, convert it once and write every requested output from the same buffer
+static void _batch_convert_file(void *arg, int index, int end) {
+    _batch_ctx *ctx = (_batch_ctx *)arg;
+    _batch_job *job = &ctx->jobs[index];
+    uint8_t *image_data = NULL;
+
+    double start = _monotonic_seconds();
+    if (!_read_png(job->src_path, &image_data, &job->width, &job->height)) {
+        job->status = BATCH_READ_FAILED;
+        job->failed_path = job->src_path;
+        return;
+    }
+    double decoded = _monotonic_seconds();
+    job->decode_time = decoded - start;
+
+    // Files are already spread across workers, so each conversion runs on one thread
+    if (!_convert_to_palette(image_data, job->width, job->height, ctx->palette, ctx->palette_conversion_method, ctx->use_transparent, ctx->transparent_rgb, 1)) {
+        job->status = BATCH_BAD_METHOD;
+        free(image_data);
+        return;
+    }
+    double converted = _monotonic_seconds();
+    job->convert_time = converted - decoded;
+
+    if (job->tgt_paths[BATCH_OUTPUT_PNG]) {
+        const char *tgt_path = job->tgt_paths[BATCH_OUTPUT_PNG];
+        struct stat st;
+        if (!_write_png(tgt_path, image_data, job->width, job->height) || stat(tgt_path, &st) != 0) {
+            job->status = BATCH_WRITE_FAILED;
+            job->failed_path = tgt_path;
+            free(image_data);
+            return;
+        }
+        job->output_sizes[BATCH_OUTPUT_PNG] = (long long)st.st_size;
+    }
+
+    if (job->tgt_paths[BATCH_OUTPUT_RGBA2]) {
+        const char *tgt_path = job->tgt_paths[BATCH_OUTPUT_RGBA2];
+        size_t num_pixels = (size_t)job->width * job->height;
+        uint8_t *rgba2_data = (uint8_t *)malloc(num_pixels);
+        if (!rgba2_data) {
+            job->status = BATCH_NO_MEMORY;
+            free(image_data);
+            return;
+        }
+        _rgba32_to_rgba2(image_data, num_pixels, rgba2_data);
+
+        FILE *outfile = fopen(tgt_path, "wb");
+        size_t written = 0;
+        if (outfile) {
+            written = fwrite(rgba2_data, 1, num_pixels, outfile);
+            if (fclose(outfile) != 0) written = 0;
+        }
+        free(rgba2_data);
+        if (written != num_pixels) {
+            job->status = BATCH_WRITE_FAILED;
+            job->failed_path = tgt_path;
+            free(image_data);
+            return;
+        }
+        job->output_sizes[BATCH_OUTPUT_RGBA2] = (long long)num_pixels;
+    }
+    job->write_time = _monotonic_seconds() - converted;
+
+    free(image_data);
+}
+
+// Helper function: Resolve the output directory for each format from a path or a {format: path} mapping.
+// On success dirs holds new references (or NULL for formats the mapping leaves out).
+static bool _batch_output_dirs(PyObject *out_dir, PyObject *dirs[BATCH_OUTPUT_COUNT]) {
+    for (int i = 0; i < BATCH_OUTPUT_COUNT; ++i) dirs[i] = NULL;
+
+    if (!PyDict_Check(out_dir)) {
+        PyObject *dir_bytes;
+        if (!PyUnicode_FSConverter(out_dir, &dir_bytes)) return false;
+        for (int i = 0; i < BATCH_OUTPUT_COUNT; ++i) {
+            Py_INCREF(dir_bytes);
+            dirs[i] = dir_bytes;
+        }
+        Py_DECREF(dir_bytes);
+        return true;
+    }
+
+    for (int i = 0; i < BATCH_OUTPUT_COUNT; ++i) {
+        PyObject *dir = PyDict_GetItemString(out_dir, batch_output_names[i]);
+        if (dir && !PyUnicode_FSConverter(dir, &dirs[i])) {
+            for (int j = 0; j < i; ++j) Py_CLEAR(dirs[j]);
+            return false;
+        }
+    }
+    return true;
+}
+
+// Helper function: Build the stats dict returned for one converted file
+static PyObject* _batch_job_stats(const _batch_job *job) {
+    PyObject *outputs = PyDict_New();
+    PyObject *sizes = PyDict_New();
+    if (!outputs || !sizes) {
+        Py_XDECREF(outputs);
+        Py_XDECREF(sizes);
         return NULL;
     }
 
-    // Temporary storage for reading each line in the CSV
-    char line[256];
-    size_t capacity = 256;  // Initial capacity for the palette colors
-    size_t color_count = 0;
+    for (int i = 0; i < BATCH_OUTPUT_COUNT; ++i) {
+        if (!job->tgt_paths[i]) continue;
+        PyObject *path = PyUnicode_DecodeFSDefault(job->tgt_paths[i]);
+        PyObject *size = PyLong_FromLongLong(job->output_sizes[i]);
+        if (!path || !size || PyDict_SetItemString(outputs, batch_output_names[i], path) < 0 || PyDict_SetItemString(sizes, batch_output_names[i], size) < 0) {
+            Py_XDECREF(path);
+            Py_XDECREF(size);
+            Py_DECREF(outputs);
+            Py_DECREF(sizes);
+            return NULL;
+        }
+        Py_DECREF(path);
+        Py_DECREF(size);
+    }
 
-    // Allocate memory for the colors array
-    palette->colors = (Color *)malloc(capacity * sizeof(Color));
-    if (!palette->colors) {
-        PyErr_SetString(PyExc_MemoryError, "Unable to allocate memory for colors");
-        free(palette);
-        fclose(file);
+    return Py_BuildValue("{s:O&,s:i,s:i,s:N,s:N,s:d,s:d,s:d}",
+                         "src", PyUnicode_DecodeFSDefault, job->src_path,
+                         "width", job->width,
+                         "height", job->height,
+                         "outputs", outputs,
+                         "sizes", sizes,
+                         "decode_time", job->decode_time,
+                         "convert_time", job->convert_time,
+                         "write_time", job->write_time);
+}
+
+// Python-facing function: Convert many PNGs to a palette, writing PNG and/or RGBA2222 outputs for each
+PyObject* batch_convert(PyObject *self, PyObject *args, PyObject *kwargs) {
+    PyObject *src_paths, *out_dir, *palette_arg;
+    PyObject *outputs = NULL, *transparent_color = Py_None;
+    const char *palette_conversion_method;
+    int workers = 0;
+
+    static char *kwlist[] = {"src_paths", "out_dir", "palette", "palette_conversion_method", "outputs", "transparent_color", "workers", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OOOs|OOi", kwlist, &src_paths, &out_dir, &palette_arg, &palette_conversion_method, &outputs, &transparent_color, &workers)) {
+        return NULL;
+    }
+    // Check the method before any worker decodes a file
+    if (!_is_palette_conversion_method(palette_conversion_method)) {
+        PyErr_Format(PyExc_ValueError, "Unknown palette conversion method '%s'", palette_conversion_method);
         return NULL;
     }
 
-    // Read the CSV file line by line
-    while (fgets(line, sizeof(line), file)) {
-        if (color_count >= capacity) {
-            capacity *= 2;  // Double the capacity if needed
-            palette->colors = (Color *)realloc(palette->colors, capacity * sizeof(Color));
-            if (!palette->colors) {
-                PyErr_SetString(PyExc_MemoryError, "Memory reallocation failed");
-                fclose(file);
+    // Work out which outputs were requested (default: both)
+    bool wanted[BATCH_OUTPUT_COUNT] = { outputs == NULL, outputs == NULL };
+    if (outputs) {
+        PyObject *seq = PySequence_Fast(outputs, "outputs must be a sequence of 'png' and/or 'rgba2'");
+        if (!seq) return NULL;
+        for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(seq); ++i) {
+            const char *name = PyUnicode_Check(PySequence_Fast_GET_ITEM(seq, i)) ? PyUnicode_AsUTF8(PySequence_Fast_GET_ITEM(seq, i)) : NULL;
+            int kind = -1;
+            for (int k = 0; name && k < BATCH_OUTPUT_COUNT; ++k) {
+                if (strcasecmp(name, batch_output_names[k]) == 0) kind = k;
+            }
+            if (kind < 0) {
+                PyErr_SetString(PyExc_ValueError, "outputs must be a sequence of 'png' and/or 'rgba2'");
+                Py_DECREF(seq);
                 return NULL;
             }
+            wanted[kind] = true;
         }
+        Py_DECREF(seq);
+    }
 
-        // Parse the CSV line (expecting "r,g,b,h,s,v,hex,name")
-        uint8_t r, g, b;
-        char name[64];  // For the color name
-        char hex[8];    // For the hex code (if needed)
-        float h, s, v;
+    PyObject *dirs[BATCH_OUTPUT_COUNT];
+    if (!_batch_output_dirs(out_dir, dirs)) {
+        return NULL;
+    }
+    for (int k = 0; k < BATCH_OUTPUT_COUNT; ++k) {
+        if (wanted[k] && !dirs[k]) {
+            PyErr_Format(PyExc_ValueError, "out_dir has no directory for '%s' output", batch_output_names[k]);
+            for (int j = 0; j < BATCH_OUTPUT_COUNT; ++j) Py_XDECREF(dirs[j]);
+            return NULL;
+        }
+    }
 
-        if (sscanf(line, "%hhu,%hhu,%hhu,%f,%f,%f,%7[^,],%63[^\n]",
-                &r, &g, &b, &h, &s, &v, hex, name) == 8) {
-            // Fill in the RGB values
-            palette->colors[color_count].r = r;
-            palette->colors[color_count].g = g;
-            palette->colors[color_count].b = b;
+    // Encode every source path up front; the bytes objects stay alive until the batch is done
+    PyObject *path_list = PySequence_List(src_paths);
+    PyObject *encoded = NULL, *palette_obj = NULL, *result = NULL;
+    _batch_job *jobs = NULL;
+    Py_ssize_t count = 0;
+    if (!path_list) goto cleanup;
+    count = PyList_GET_SIZE(path_list);
+    encoded = PyList_New(count);
+    jobs = (_batch_job *)calloc(count > 0 ? count : 1, sizeof(_batch_job));
+    if (!encoded || !jobs) {
+        if (!jobs) PyErr_NoMemory();
+        goto cleanup;
+    }
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        PyObject *path_bytes;
+        if (!PyUnicode_FSConverter(PyList_GET_ITEM(path_list, i), &path_bytes)) goto cleanup;
+        PyList_SET_ITEM(encoded, i, path_bytes);
+        jobs[i].src_path = PyBytes_AS_STRING(path_bytes);
+        for (int k = 0; k < BATCH_OUTPUT_COUNT; ++k) {
+            if (!wanted[k]) continue;
+            jobs[i].tgt_paths[k] = _batch_output_path(PyBytes_AS_STRING(dirs[k]), jobs[i].src_path, batch_output_names[k]);
+            if (!jobs[i].tgt_paths[k]) {
+                PyErr_NoMemory();
+                goto cleanup;
+            }
+        }
+    }
+    // Sources with the same basename in different directories would share an output file
+    for (int k = 0; k < BATCH_OUTPUT_COUNT; ++k) {
+        Py_ssize_t first, second;
+        if (!wanted[k]) continue;
+        if (!_batch_find_duplicate_target(jobs, count, k, &first, &second)) {
+            PyErr_NoMemory();
+            goto cleanup;
+        }
+        if (first >= 0) {
+            PyErr_Format(PyExc_ValueError, "'%s' and '%s' would both be written to '%s'",
+                         jobs[first].src_path, jobs[second].src_path, jobs[first].tgt_paths[k]);
+            goto cleanup;
+        }
+    }
 
-            // Convert RGB to HSV
-            _rgb_to_hsv(r, g, b, &palette->colors[color_count].h, &palette->colors[color_count].s, &palette->colors[color_count].v);
+    // Load the palette once; its lookup table is shared by every worker
+    palette_obj = _palette_object_from_arg(palette_arg);
+    if (!palette_obj) goto cleanup;
+
+    _batch_ctx ctx;
+    ctx.jobs = jobs;
+    ctx.palette = &((PaletteObject *)palette_obj)->palette;
+    ctx.palette_conversion_method = palette_conversion_method;
+    ctx.use_transparent = _parse_transparent_color(transparent_color, ctx.transparent_rgb);
+    if (PyErr_Occurred()) goto cleanup;
+
+    workers = _resolve_thread_count(workers);
+    Py_BEGIN_ALLOW_THREADS
+    _parallel_for_each((int)count, workers, _batch_convert_file, &ctx);
+    Py_END_ALLOW_THREADS
+
+    // Report the first failure, in source order
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        switch (jobs[i].status) {
+            case BATCH_OK:
+                continue;
+            case BATCH_BAD_METHOD:
+                PyErr_Format(PyExc_ValueError, "Unknown palette conversion method '%s'", palette_conversion_method);
+                goto cleanup;
+            case BATCH_NO_MEMORY:
+                PyErr_SetString(PyExc_MemoryError, "Failed to allocate memory for RGBA2222 data.");
+                goto cleanup;
+            case BATCH_READ_FAILED:
+                PyErr_Format(PyExc_IOError, "Failed to load source PNG file '%s'", jobs[i].failed_path);
+                goto cleanup;
+            default:
+                PyErr_Format(PyExc_IOError, "Failed to write output file '%s'", jobs[i].failed_path);
+                goto cleanup;
+        }
+    }
 
-            // Store the color name
-            snprintf(palette->colors[color_count].name, sizeof(palette->colors[color_count].name), "%s", name);
-            palette->colors[color_count].name[sizeof(palette->colors[color_count].name) - 1] = '\0';  // Ensure null-termination
+    result = PyList_New(count);
+    if (!result) goto cleanup;
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        PyObject *stats = _batch_job_stats(&jobs[i]);
+        if (!stats) {
+            Py_CLEAR(result);
+            goto cleanup;
+        }
+        PyList_SET_ITEM(result, i, stats);
+    }
 
-            // Increment the color count
-            color_count++;
+cleanup:
+    if (jobs) {
+        for (Py_ssize_t i = 0; i < count; ++i) {
+            for (int k = 0; k < BATCH_OUTPUT_COUNT; ++k) free(jobs[i].tgt_paths[k]);
         }
+        free(jobs);
     }
+    for (int k = 0; k < BATCH_OUTPUT_COUNT; ++k) Py_XDECREF(dirs[k]);
+    Py_XDECREF(palette_obj);
+    Py_XDECREF(encoded);
+    Py_XDECREF(path_list);
+    return result;
+}
 
-    // Close the file
-    fclose(file);
+// ===========================
+// RGBA2222 packing
+// ---------------------------
 
-    // Set the palette size
-    palette->size = color_count;
+// Python-facing function: Pack an RGBA8888 buffer into RGBA2222 bytes (one byte per pixel)
+PyObject* pack_rgba2(PyObject *self, PyObject *args) {
+    Py_buffer view;
 
-    // Return the Palette object to Python
-    PyObject *palette_py = PyCapsule_New((void *)palette, "Palette", NULL);
-    return palette_py;
-}
\ No newline at end of file
+    if (!PyArg_ParseTuple(args, "y*", &view)) {
+        return NULL;
+    }
+    if (!PyBuffer_IsContiguous(&view, 'C') || view.len % 4 != 0) {
+        PyErr_SetString(PyExc_ValueError, "buffer must be contiguous RGBA8888 data (a multiple of 4 bytes)");
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    size_t num_pixels = (size_t)view.len / 4;
+    PyObject *result = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)num_pixels);
+    if (!result) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    uint8_t *rgba2_data = (uint8_t *)PyBytes_AS_STRING(result);
+    Py_BEGIN_ALLOW_THREADS
+    _rgba32_to_rgba2((const uint8_t *)view.buf, num_pixels, rgba2_data);
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&view);
+    return result;
+}
+
+// Python-facing function: Expand an RGBA2222 buffer into RGBA8888 bytes (four bytes per pixel)
+PyObject* unpack_rgba2(PyObject *self, PyObject *args) {
+    Py_buffer view;
+
+    if (!PyArg_ParseTuple(args, "y*", &view)) {
+        return NULL;
+    }
+    if (!PyBuffer_IsContiguous(&view, 'C')) {
+        PyErr_SetString(PyExc_ValueError, "buffer must be contiguous RGBA2222 data");
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+    if (view.len > PY_SSIZE_T_MAX / 4) {
+        PyBuffer_Release(&view);
+        return PyErr_NoMemory();
+    }
+
+    size_t num_pixels = (size_t)view.len;
+    PyObject *result = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)(num_pixels * 4));
+    if (!result) {
+        PyBuffer_Release(&view);
+        return NULL;
+    }
+
+    uint8_t *image_data = (uint8_t *)PyBytes_AS_STRING(result);
+    Py_BEGIN_ALLOW_THREADS
+    _rgba2_to_rgba32((const uint8_t *)view.buf, num_pixels, image_data);
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&view);
+    return result;
+}
@@ -22,8 +22,31 @@ typedef struct {
 typedef struct {
     Color *colors;  // Array of colors
     size_t size;    // Number of colors in the palette
+    uint8_t *rgb_lookup;  // Lazily filled RGB888 -> (palette index + 1) inverse colormap, 0 = not yet computed
+    int32_t *rgb_planes;  // Structure-of-arrays copy of the colors for vectorized search: size reds, then greens, then blues
+    float *hsv_planes;    // Same layout for h, s, v
+    uint8_t *hsv_lookup;  // Like rgb_lookup, but for nearest-by-HSV matching
+    uint8_t *hsv_rgb;     // r, g, b per entry as produced by _hsv_to_rgb(h, s, v), the HSV method's output colors
 } Palette;
 
+// Lookup entries are filled lazily, possibly by several threads converting
+// against the same palette; every writer stores the same value, so relaxed
+// atomic byte accesses are all that is needed.
+#if defined(__GNUC__) || defined(__clang__)
+#define LOOKUP_LOAD(p) __atomic_load_n((p), __ATOMIC_RELAXED)
+#define LOOKUP_STORE(p, v) __atomic_store_n((p), (v), __ATOMIC_RELAXED)
+#else
+#define LOOKUP_LOAD(p) (*(p))
+#define LOOKUP_STORE(p, v) (*(p) = (v))
+#endif
+
+// One lookup entry per 24-bit RGB value
+#define PALETTE_LOOKUP_SIZE (1 << 24)
+// Entries store index + 1 in a byte, so the lookup only covers palettes of up to 255 colors
+#define PALETTE_LOOKUP_MAX_COLORS 255
+// Nearest-color searches score this many palette entries per pass
+#define PALETTE_SEARCH_CHUNK 256
+
 static const uint8_t bayer_matrix[4][4] = {
     {   0, 136,  34, 170 },
     { 204,  68, 238, 102 },
@@ -36,6 +59,7 @@ static const uint8_t bayer_matrix[4][4] = {
 // ===========================
 // 1. Image I/O (Reading and Writing PNG)
 // ---------------------------
+void _png_set_rgba8_transforms(png_structp png, png_infop info);
 int _read_png(const char *filename, uint8_t **image_data, int *width, int *height);
 int _write_png(const char *filename, uint8_t *image_data, int width, int height);
 
@@ -47,7 +71,8 @@ void _hsv_to_rgb(float h, float s, float v, uint8_t *r, uint8_t *g, uint8_t *b);
 uint8_t _quantize_channel(uint8_t channel);
 uint8_t _eight_to_two(uint8_t r, uint8_t g, uint8_t b, uint8_t a);
 void _two_to_eight(uint8_t pixel, uint8_t *r, uint8_t *g, uint8_t *b, uint8_t *a);
-void _rgba32_to_rgba2(uint8_t *image_data, size_t num_pixels, uint8_t *output_buffer);
+void _rgba32_to_rgba2(const uint8_t *image_data, size_t num_pixels, uint8_t *output_buffer);
+void _rgba2_to_rgba32(const uint8_t *rgba2_data, size_t num_pixels, uint8_t *image_data);
 int _parse_color(PyObject *args, Color *color);
 
 // ===========================
@@ -59,24 +84,30 @@ float _distance_rgb(const Color *color1, const Color *color2);
 // 4. Palette Color Finding
 // ---------------------------
 int _load_gimp_palette(const char *filename, Palette *palette);
+int _load_csv_palette(const char *filename, Palette *palette);
+void _init_palette_lookup(Palette *palette);
+void _free_palette(Palette *palette);
 const Color* _nearest_rgb(const Color *target_rgb, const Palette *palette);
 const Color* _nearest_hsv(const Color *target_hsv, const Palette *palette);
 
 // ===========================
 // 5. Dithering Functions
 // ---------------------------
-void _convert_atkinson(uint8_t* image_data, int width, int height, Palette *palette);
-void _convert_bayer(uint8_t* image_data, int width, int height, Palette *palette);
-void _convert_floyd_steinberg(uint8_t* image_data, int width, int height, Palette *palette);
+void _convert_atkinson(uint8_t* image_data, int width, int height, Palette *palette, bool serpentine, int threads);
+void _convert_bayer(uint8_t* image_data, int width, int height, Palette *palette, int threads);
+void _convert_floyd_steinberg(uint8_t* image_data, int width, int height, Palette *palette, bool serpentine, int threads);
 
 // ===========================
 // 6. Image Conversion Functions
 // ---------------------------
-void _convert_method_rgb(uint8_t *image_data, int width, int height, Palette *palette, bool has_transparent_color, const uint8_t transparent_rgb[3]);
-void _convert_method_hsv(uint8_t *image_data, int width, int height, Palette *palette, bool has_transparent_color, const uint8_t transparent_rgb[3]);
+void _convert_method_rgb(uint8_t *image_data, int width, int height, Palette *palette, bool has_transparent_color, const uint8_t transparent_rgb[3], int threads);
+void _convert_method_hsv(uint8_t *image_data, int width, int height, Palette *palette, bool has_transparent_color, const uint8_t transparent_rgb[3], int threads);
 bool _parse_transparent_color(PyObject *transparent_color, uint8_t transparent_rgb[3]);
-bool _parse_palette_conversion_args(PyObject *args, PyObject *kwargs, const char **src_file, const char **tgt_file, const char **palette_file, const char **palette_conversion_method, uint8_t **image_data, int *width, int *height, Palette *palette, bool *use_transparent, uint8_t transparent_rgb[3]);
-uint8_t* _convert_to_palette(uint8_t *image_data, int width, int height, Palette *palette, const char *palette_conversion_method, bool use_transparent, uint8_t transparent_rgb[3]);
+bool _parse_palette_conversion_args(PyObject *args, PyObject *kwargs, const char **src_file, const char **tgt_file, PyObject **palette_obj, const char **palette_conversion_method, uint8_t **image_data, int *width, int *height, Palette **palette, bool *use_transparent, uint8_t transparent_rgb[3], int *threads);
+uint8_t* _convert_to_palette(uint8_t *image_data, int width, int height, Palette *palette, const char *palette_conversion_method, bool use_transparent, uint8_t transparent_rgb[3], int threads);
+bool _is_palette_conversion_method(const char *palette_conversion_method);
+bool _is_row_conversion_method(const char *palette_conversion_method);
+bool _convert_row_to_palette(uint8_t *row, int width, int y, Palette *palette, const char *palette_conversion_method, bool use_transparent, const uint8_t transparent_rgb[3]);
 
 // ===========================
 // 8. Utility Functions
@@ -87,19 +118,38 @@ uint8_t _clamp_256(int value);
 // Prototypes for the Python C-extension entry points:
 // ---------------------------------------------------
 
-// convert_to_palette(src_file, tgt_file, palette_file, palette_conversion_method, transparent_color)
+// convert_to_palette(src_file, tgt_file, palette_file, palette_conversion_method, transparent_color, threads=1)
+// palette_file may be a palette file path or an agonutils.Palette
 PyObject* convert_to_palette(PyObject *self, PyObject *args, PyObject *kwargs);
 
-// img_to_rgba2(src_file, tgt_file, palette_file, palette_conversion_method, transparent_color)
+// img_to_rgba2(src_file, tgt_file, palette_file, palette_conversion_method, transparent_color, threads=1)
 PyObject* img_to_rgba2(PyObject *self, PyObject *args, PyObject *kwargs);
 
+// convert_rgba_buffer(buffer, width, height, palette, palette_conversion_method, transparent_color=None, stride=0, threads=1) -> bytes
+PyObject* convert_rgba_buffer(PyObject *self, PyObject *args, PyObject *kwargs);
+
+// rgba_to_rgba2_buffer(buffer, width, height, palette=None, palette_conversion_method='RGB', transparent_color=None, stride=0, threads=1) -> bytes
+PyObject* rgba_to_rgba2_buffer(PyObject *self, PyObject *args, PyObject *kwargs);
+
+// batch_convert(src_paths, out_dir, palette, palette_conversion_method, outputs=('png', 'rgba2'), transparent_color=None, workers=0) -> list[dict]
+// out_dir may be a directory or a {'png': dir, 'rgba2': dir} mapping
+PyObject* batch_convert(PyObject *self, PyObject *args, PyObject *kwargs);
+
 // rgba8_to_img(input_filepath, output_filepath, width, height)
 PyObject* rgba8_to_img(PyObject *self, PyObject *args);
 
 // rgba2_to_img(input_filepath, output_filepath, width, height)
 PyObject* rgba2_to_img(PyObject *self, PyObject *args);
 
-// csv_to_palette(csv_filepath)
+// pack_rgba2(buffer) -> bytes
+// RGBA8888 buffer to RGBA2222, one byte per pixel
+PyObject* pack_rgba2(PyObject *self, PyObject *args);
+
+// unpack_rgba2(buffer) -> bytes
+// RGBA2222 buffer to RGBA8888, four bytes per pixel
+PyObject* unpack_rgba2(PyObject *self, PyObject *args);
+
+// csv_to_palette(csv_filepath) -> agonutils.Palette
 PyObject* csv_to_palette(PyObject *self, PyObject *args);
 
 
@@ -0,0 +1,209 @@
+#define PY_SSIZE_T_CLEAN
+
+#include "palette.h"
+#include <string.h>
+#include <strings.h>
+
+// Helper function: Load a palette file, choosing the parser by extension
+// (.csv -> named-colors CSV, anything else -> GIMP palette)
+static int _load_palette_file(const char *filename, Palette *palette) {
+    size_t len = strlen(filename);
+    if (len >= 4 && strcasecmp(filename + len - 4, ".csv") == 0) {
+        return _load_csv_palette(filename, palette);
+    }
+    return _load_gimp_palette(filename, palette);
+}
+
+// Helper function: Fill a Palette struct from a Python sequence of (r, g, b[, name]) items
+static int _load_sequence_palette(PyObject *sequence, Palette *palette) {
+    PyObject *items = PySequence_Fast(sequence, "palette must be a file path or a sequence of (r, g, b) tuples");
+    if (!items) return -1;
+
+    Py_ssize_t count = PySequence_Fast_GET_SIZE(items);
+    palette->rgb_lookup = NULL;
+    palette->rgb_planes = NULL;
+    palette->hsv_planes = NULL;
+    palette->hsv_lookup = NULL;
+    palette->hsv_rgb = NULL;
+    palette->size = 0;
+    palette->colors = (Color *)calloc(count > 0 ? (size_t)count : 1, sizeof(Color));
+    if (!palette->colors) {
+        Py_DECREF(items);
+        PyErr_SetString(PyExc_MemoryError, "Unable to allocate memory for palette colors");
+        return -1;
+    }
+
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        PyObject *item = PySequence_Fast_GET_ITEM(items, i);
+        int r, g, b;
+        const char *name = NULL;
+
+        if (!PyTuple_Check(item) && !PyList_Check(item)) {
+            PyErr_Format(PyExc_TypeError, "palette entry %zd must be a tuple of (r, g, b) or (r, g, b, name)", i);
+            goto fail;
+        }
+        PyObject *entry = PySequence_Tuple(item);
+        if (!entry) goto fail;
+        int ok = PyArg_ParseTuple(entry, "iii|s", &r, &g, &b, &name);
+        Py_DECREF(entry);
+        if (!ok) goto fail;
+        if (r < 0 || r > 255 || g < 0 || g > 255 || b < 0 || b > 255) {
+            PyErr_Format(PyExc_ValueError, "palette entry %zd has a component outside 0..255", i);
+            goto fail;
+        }
+
+        Color *color = &palette->colors[i];
+        color->r = (uint8_t)r;
+        color->g = (uint8_t)g;
+        color->b = (uint8_t)b;
+        _rgb_to_hsv(color->r, color->g, color->b, &color->h, &color->s, &color->v);
+        snprintf(color->name, sizeof(color->name), "%s", name ? name : "");
+    }
+
+    Py_DECREF(items);
+    palette->size = (size_t)count;
+    _init_palette_lookup(palette);
+    return 0;
+
+fail:
+    Py_DECREF(items);
+    _free_palette(palette);
+    return -1;
+}
+
+// Palette(source): source is a .gpl/.csv path or a sequence of (r, g, b[, name]) tuples
+static int Palette_init(PaletteObject *self, PyObject *args, PyObject *kwargs) {
+    PyObject *source;
+    static char *kwlist[] = {"source", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O", kwlist, &source)) {
+        return -1;
+    }
+    // Palettes are immutable: conversions use the colors and lookup tables with the GIL released
+    if (self->palette.colors) {
+        PyErr_SetString(PyExc_TypeError, "Palette is already initialised; create a new Palette instead");
+        return -1;
+    }
+
+    Palette palette = {NULL, 0, NULL, NULL, NULL, NULL, NULL};
+
+    if (PyUnicode_Check(source) || PyBytes_Check(source) || PyObject_HasAttrString(source, "__fspath__")) {
+        PyObject *path_bytes = NULL;
+        if (!PyUnicode_FSConverter(source, &path_bytes)) {
+            return -1;
+        }
+        int status = _load_palette_file(PyBytes_AS_STRING(path_bytes), &palette);
+        if (status != 0) {
+            PyErr_Format(PyExc_IOError, "Failed to load palette file '%s'", PyBytes_AS_STRING(path_bytes));
+            Py_DECREF(path_bytes);
+            return -1;
+        }
+        Py_DECREF(path_bytes);
+    } else if (_load_sequence_palette(source, &palette) != 0) {
+        return -1;
+    }
+
+    if (palette.size == 0) {
+        _free_palette(&palette);
+        PyErr_SetString(PyExc_ValueError, "Palette contains no colors");
+        return -1;
+    }
+
+    self->palette = palette;
+    return 0;
+}
+
+static void Palette_dealloc(PaletteObject *self) {
+    _free_palette(&self->palette);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static Py_ssize_t Palette_len(PaletteObject *self) {
+    return (Py_ssize_t)self->palette.size;
+}
+
+static PyObject* Palette_repr(PaletteObject *self) {
+    return PyUnicode_FromFormat("<agonutils.Palette with %zd colors>", (Py_ssize_t)self->palette.size);
+}
+
+// Palette.colors -> list of (r, g, b) tuples
+static PyObject* Palette_get_colors(PaletteObject *self, void *closure) {
+    PyObject *list = PyList_New((Py_ssize_t)self->palette.size);
+    if (!list) return NULL;
+    for (size_t i = 0; i < self->palette.size; ++i) {
+        const Color *color = &self->palette.colors[i];
+        PyObject *rgb = Py_BuildValue("(iii)", color->r, color->g, color->b);
+        if (!rgb) {
+            Py_DECREF(list);
+            return NULL;
+        }
+        PyList_SET_ITEM(list, (Py_ssize_t)i, rgb);
+    }
+    return list;
+}
+
+// Palette.names -> list of color names ('' where the source had none)
+static PyObject* Palette_get_names(PaletteObject *self, void *closure) {
+    PyObject *list = PyList_New((Py_ssize_t)self->palette.size);
+    if (!list) return NULL;
+    for (size_t i = 0; i < self->palette.size; ++i) {
+        PyObject *name = PyUnicode_FromString(self->palette.colors[i].name);
+        if (!name) {
+            Py_DECREF(list);
+            return NULL;
+        }
+        PyList_SET_ITEM(list, (Py_ssize_t)i, name);
+    }
+    return list;
+}
+
+static PyGetSetDef Palette_getset[] = {
+    {"colors", (getter)Palette_get_colors, NULL, "List of (r, g, b) tuples in palette order", NULL},
+    {"names", (getter)Palette_get_names, NULL, "List of color names in palette order", NULL},
+    {NULL, NULL, NULL, NULL, NULL}  // Sentinel
+};
+
+static PySequenceMethods Palette_as_sequence = {
+    .sq_length = (lenfunc)Palette_len,
+};
+
+PyTypeObject PaletteType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "agonutils.Palette",
+    .tp_doc = "Palette(source: str | os.PathLike | Sequence[tuple]) -> Palette\n\n"
+              "A palette loaded once from a GIMP .gpl file, a named-colors .csv file, or a list of "
+              "(r, g, b[, name]) tuples. Accepted anywhere a palette_file path is accepted.",
+    .tp_basicsize = sizeof(PaletteObject),
+    .tp_itemsize = 0,
+    .tp_flags = Py_TPFLAGS_DEFAULT,
+    .tp_new = PyType_GenericNew,
+    .tp_init = (initproc)Palette_init,
+    .tp_dealloc = (destructor)Palette_dealloc,
+    .tp_repr = (reprfunc)Palette_repr,
+    .tp_as_sequence = &Palette_as_sequence,
+    .tp_getset = Palette_getset,
+};
+
+PyObject* _palette_object_from_struct(Palette *palette) {
+    PaletteObject *self = PyObject_New(PaletteObject, &PaletteType);
+    if (!self) {
+        _free_palette(palette);
+        return NULL;
+    }
+    self->palette = *palette;
+    return (PyObject *)self;
+}
+
+PyObject* _palette_object_from_arg(PyObject *arg) {
+    if (PaletteObject_Check(arg)) {
+        // Palette.__new__ without __init__ leaves an empty object
+        const Palette *palette = &((PaletteObject *)arg)->palette;
+        if (!palette->colors || palette->size == 0) {
+            PyErr_SetString(PyExc_ValueError, "Palette is not initialised");
+            return NULL;
+        }
+        Py_INCREF(arg);
+        return arg;
+    }
+    return PyObject_CallOneArg((PyObject *)&PaletteType, arg);
+}
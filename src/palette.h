@@ -0,0 +1,41 @@
+#ifndef PALETTE_H
+#define PALETTE_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#include <Python.h>
+#include "images.h"
+
+// ----------------------------------------------------------------
+// agonutils.Palette:
+// A palette loaded once (from a GIMP .gpl file, a named-colors CSV file,
+// or a list of (r, g, b[, name]) tuples) together with its precomputed
+// HSV values and nearest-color lookup, so it can be reused across many
+// conversions without re-reading the palette file.
+// ----------------------------------------------------------------
+typedef struct {
+    PyObject_HEAD
+    Palette palette;
+} PaletteObject;
+
+extern PyTypeObject PaletteType;
+
+#define PaletteObject_Check(op) PyObject_TypeCheck(op, &PaletteType)
+
+// Return a new reference to a Palette object for a conversion argument.
+// Accepts either an existing agonutils.Palette (returned as-is) or a
+// palette file path, which is loaded into a new Palette object.
+// Returns NULL with a Python exception set on failure.
+PyObject* _palette_object_from_arg(PyObject *arg);
+
+// Wrap an already loaded Palette struct in a new Palette object.
+// Ownership of the palette's memory passes to the returned object.
+PyObject* _palette_object_from_struct(Palette *palette);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // PALETTE_H
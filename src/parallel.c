@@ -0,0 +1,97 @@
+#include "parallel.h"
+#include <pthread.h>
+#include <stdlib.h>
+#include <time.h>
+#include <unistd.h>
+
+typedef struct {
+    parallel_range_fn fn;
+    void *ctx;
+    int start, end;
+} _parallel_task;
+
+static void* _parallel_worker(void *arg) {
+    _parallel_task *task = (_parallel_task *)arg;
+    task->fn(task->ctx, task->start, task->end);
+    return NULL;
+}
+
+int _resolve_thread_count(int threads) {
+    if (threads > 0) return threads;
+    long cpus = sysconf(_SC_NPROCESSORS_ONLN);
+    return cpus > 0 ? (int)cpus : 1;
+}
+
+void _parallel_for(int count, int threads, parallel_range_fn fn, void *ctx) {
+    if (count <= 0) return;
+    if (threads > count) threads = count;
+    if (threads <= 1) {
+        fn(ctx, 0, count);
+        return;
+    }
+
+    pthread_t *handles = (pthread_t *)malloc(sizeof(pthread_t) * threads);
+    _parallel_task *tasks = (_parallel_task *)malloc(sizeof(_parallel_task) * threads);
+    char *started = (char *)calloc(threads, 1);
+    if (!handles || !tasks || !started) {
+        free(handles);
+        free(tasks);
+        free(started);
+        fn(ctx, 0, count);
+        return;
+    }
+
+    // Contiguous, near-equal ranges; range 0 runs on the calling thread
+    for (int t = 0; t < threads; ++t) {
+        tasks[t].fn = fn;
+        tasks[t].ctx = ctx;
+        tasks[t].start = (int)((long long)count * t / threads);
+        tasks[t].end = (int)((long long)count * (t + 1) / threads);
+    }
+    for (int t = 1; t < threads; ++t) {
+        started[t] = pthread_create(&handles[t], NULL, _parallel_worker, &tasks[t]) == 0;
+    }
+
+    fn(ctx, tasks[0].start, tasks[0].end);
+
+    for (int t = 1; t < threads; ++t) {
+        if (started[t]) {
+            pthread_join(handles[t], NULL);
+        } else {
+            // Thread creation failed: do this range here instead
+            fn(ctx, tasks[t].start, tasks[t].end);
+        }
+    }
+
+    free(handles);
+    free(tasks);
+    free(started);
+}
+
+typedef struct {
+    parallel_range_fn fn;
+    void *ctx;
+    int count;
+    int next;  // Next unclaimed item, advanced atomically
+} _parallel_queue;
+
+static void _parallel_queue_drain(void *arg, int start, int end) {
+    _parallel_queue *queue = (_parallel_queue *)arg;
+    int i;
+    while ((i = __atomic_fetch_add(&queue->next, 1, __ATOMIC_RELAXED)) < queue->count) {
+        queue->fn(queue->ctx, i, i + 1);
+    }
+}
+
+void _parallel_for_each(int count, int threads, parallel_range_fn fn, void *ctx) {
+    _parallel_queue queue = { fn, ctx, count, 0 };
+    if (threads > count) threads = count;
+    // Each "range" is one worker draining the shared queue
+    _parallel_for(threads, threads, _parallel_queue_drain, &queue);
+}
+
+double _monotonic_seconds(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (double)ts.tv_sec + (double)ts.tv_nsec / 1e9;
+}
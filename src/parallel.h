@@ -0,0 +1,38 @@
+#ifndef PARALLEL_H
+#define PARALLEL_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// ----------------------------------------------------------------
+// Minimal pthread helpers for splitting pixel work across threads,
+// plus a monotonic clock for timing stats.
+// All functions here are pure C and safe to call with the GIL released.
+// ----------------------------------------------------------------
+
+// Work function for _parallel_for: processes items [start, end) using ctx.
+typedef void (*parallel_range_fn)(void *ctx, int start, int end);
+
+// Resolve a user-supplied thread count: values <= 0 mean "one per online CPU".
+int _resolve_thread_count(int threads);
+
+// Split [0, count) into up to 'threads' contiguous ranges and run fn on each,
+// one range on the calling thread and the rest on worker threads.
+// Returns once every range has been processed. Falls back to a single call
+// on the calling thread if threads <= 1 or thread creation fails.
+void _parallel_for(int count, int threads, parallel_range_fn fn, void *ctx);
+
+// Run fn(ctx, i, i + 1) for every i in [0, count), handing items out one at a
+// time to up to 'threads' threads. Use this instead of _parallel_for when
+// items vary a lot in cost (e.g. one item per file).
+void _parallel_for_each(int count, int threads, parallel_range_fn fn, void *ctx);
+
+// Seconds from an arbitrary fixed point, for measuring elapsed wall time.
+double _monotonic_seconds(void);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // PARALLEL_H
@@ -1,3 +1,5 @@
+#define PY_SSIZE_T_CLEAN
+
 #include "rle.h"
 #include <stdlib.h>
 #include <stdint.h>
@@ -18,19 +20,10 @@
 //            first byte: 0x80 OR (n-1)
 //            second byte: 0xC0 OR (color)
 //
-// This function allocates an output buffer with an upper-bound capacity of input_size * 2,
-// then returns a buffer reallocated to the exact used size.
-uint8_t *_rle_encode_internal(const uint8_t *input, size_t input_size, size_t *output_size) {
-    if (!input || input_size == 0) {
-        if (output_size) *output_size = 0;
-        return NULL;
-    }
-    // Allocate worst-case buffer (each pixel might expand to 2 bytes).
-    size_t capacity = input_size * 2;
-    uint8_t *output = malloc(capacity);
-    if (!output) {
-        return NULL;
-    }
+// _rle_encode_into writes into a caller-supplied buffer of at least
+// RLE_ENCODE_MAX_SIZE(input_size) bytes; _rle_encode_internal allocates an output
+// buffer with that upper-bound capacity, then returns it reallocated to the exact used size.
+size_t _rle_encode_into(const uint8_t *input, size_t input_size, uint8_t *output) {
     size_t out_index = 0;
     size_t i = 0;
     while (i < input_size) {
@@ -40,7 +33,7 @@ uint8_t *_rle_encode_internal(const uint8_t *input, size_t input_size, size_t *o
         uint8_t color = pixel & 0x3F;  // 6-bit color.
         // Count run length, cap at 64.
         size_t count = 1;
-        while (i + count < input_size && input[i + count] == pixel && count < 64) {
+        while (i + count < input_size && input[i + count] == pixel && count < RLE_MAX_RUN) {
             count++;
         }
         
@@ -64,6 +57,20 @@ uint8_t *_rle_encode_internal(const uint8_t *input, size_t input_size, size_t *o
         }
         i += count;
     }
+    return out_index;
+}
+
+uint8_t *_rle_encode_internal(const uint8_t *input, size_t input_size, size_t *output_size) {
+    if (!input || input_size == 0) {
+        if (output_size) *output_size = 0;
+        return NULL;
+    }
+    // Allocate worst-case buffer (each pixel might expand to 2 bytes).
+    uint8_t *output = malloc(RLE_ENCODE_MAX_SIZE(input_size));
+    if (!output) {
+        return NULL;
+    }
+    size_t out_index = _rle_encode_into(input, input_size, output);
     
     // Optionally reallocate to shrink the output buffer to the actual size.
     uint8_t *final_output = realloc(output, out_index);
@@ -77,7 +84,7 @@ uint8_t *_rle_encode_internal(const uint8_t *input, size_t input_size, size_t *o
 }
 
 
-// First, a helper to compute the decoded size.
+// First, a helper to compute the decoded size; RLE_DECODE_ERROR if a command is invalid.
 static size_t _rle_decoded_size(const uint8_t *input, size_t input_size) {
     size_t decoded_size = 0;
     size_t i = 0;
@@ -101,29 +108,15 @@ static size_t _rle_decoded_size(const uint8_t *input, size_t input_size) {
                 decoded_size += 1;
             }
         } else {
-            fprintf(stderr, "Invalid command type: 0x%X\n", type);
-            return 0;
+            return RLE_DECODE_ERROR;
         }
     }
     return decoded_size;
 }
 
-uint8_t *_rle_decode_internal(const uint8_t *input, size_t input_size, size_t *output_size) {
-    if (!input || input_size == 0) {
-        if (output_size) *output_size = 0;
-        return NULL;
-    }
-    
-    size_t dec_size = _rle_decoded_size(input, input_size);
-    if (dec_size == 0) {
-        if (output_size) *output_size = 0;
-        return NULL;
-    }
-    
-    uint8_t *output = (uint8_t *)malloc(dec_size);
-    if (!output)
-        return NULL;
-    
+// _rle_decode_into: decode into a caller-owned buffer, stopping with RLE_DECODE_ERROR
+// at an invalid command or a run that would pass output_capacity.
+size_t _rle_decode_into(const uint8_t *input, size_t input_size, uint8_t *output, size_t output_capacity) {
     size_t out_index = 0;
     size_t i = 0;
     while (i < input_size) {
@@ -132,28 +125,224 @@ uint8_t *_rle_decode_internal(const uint8_t *input, size_t input_size, size_t *o
         if (type == 0x40) {
             uint8_t run = cmd & 0x3F;
             size_t count = (run == 0) ? 1 : (run + 1);
-            for (size_t j = 0; j < count; j++) {
-                // Transparent pixel in our native representation is 0x00.
-                output[out_index++] = 0x00;
+            if (count > output_capacity - out_index) {
+                return RLE_DECODE_ERROR;
             }
+            // Transparent pixel in our native representation is 0x00.
+            memset(output + out_index, 0x00, count);
+            out_index += count;
         } else if (type == 0x80) {
             if (i < input_size && ((input[i] & 0xC0) == 0xC0)) {
                 size_t count = (cmd & 0x3F) + 1;
                 uint8_t literal = input[i++];
-                for (size_t j = 0; j < count; j++) {
-                    output[out_index++] = literal;
+                if (count > output_capacity - out_index) {
+                    return RLE_DECODE_ERROR;
                 }
+                memset(output + out_index, literal, count);
+                out_index += count;
             } else {
-                uint8_t pixel = 0xC0 | (cmd & 0x3F);
-                output[out_index++] = pixel;
+                if (out_index == output_capacity) {
+                    return RLE_DECODE_ERROR;
+                }
+                output[out_index++] = 0xC0 | (cmd & 0x3F);
             }
         } else {
-            free(output);
-            if (output_size) *output_size = 0;
-            return NULL;
+            return RLE_DECODE_ERROR;
         }
     }
+    return out_index;
+}
+
+uint8_t *_rle_decode_internal(const uint8_t *input, size_t input_size, size_t *output_size) {
+    if (!input || input_size == 0) {
+        if (output_size) *output_size = 0;
+        return NULL;
+    }
+    
+    size_t dec_size = _rle_decoded_size(input, input_size);
+    if (dec_size == RLE_DECODE_ERROR) {
+        fprintf(stderr, "Invalid RLE command\n");
+        if (output_size) *output_size = 0;
+        return NULL;
+    }
+    
+    uint8_t *output = (uint8_t *)malloc(dec_size);
+    if (!output)
+        return NULL;
+    
+    size_t out_index = _rle_decode_into(input, input_size, output, dec_size);
     if (output_size)
         *output_size = out_index;
     return output;
-}
\ No newline at end of file
+}
+
+
+// ===========================
+// Python wrappers
+// ---------------------------
+
+// Get a writable contiguous view of the into= argument
+static int _rle_get_into(PyObject *into, Py_buffer *view) {
+    if (PyObject_GetBuffer(into, view, PyBUF_WRITABLE) < 0) {
+        PyErr_SetString(PyExc_TypeError, "into must be a writable buffer such as a bytearray");
+        return -1;
+    }
+    return 0;
+}
+
+/* 
+ * rle_encode()
+ * Python wrapper for RLE encoding of RGBA2222 pixels.
+ * Reads any contiguous buffer in place. Returns the encoded bytes, or with
+ * into= writes them into that buffer and returns the number of bytes written.
+ */
+PyObject *rle_encode(PyObject *self, PyObject *args, PyObject *kwargs) {
+    Py_buffer view, out_view;
+    PyObject *into = Py_None;
+    static char *kwlist[] = {"data", "into", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*|$O", kwlist, &view, &into)) {
+        return NULL;
+    }
+    if ((size_t)view.len > PY_SSIZE_T_MAX / 2) {
+        PyBuffer_Release(&view);
+        return PyErr_NoMemory();
+    }
+
+    size_t max_size = RLE_ENCODE_MAX_SIZE((size_t)view.len);
+    PyObject *result = NULL;
+    if (into == Py_None) {
+        result = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)max_size);
+        if (!result) {
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+        out_view.buf = PyBytes_AS_STRING(result);
+    } else {
+        if (_rle_get_into(into, &out_view) < 0) {
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+        if ((size_t)out_view.len < max_size) {
+            PyErr_Format(PyExc_ValueError, "into must hold at least %zu bytes (twice the pixel count)", max_size);
+            PyBuffer_Release(&out_view);
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+    }
+
+    size_t out_size;
+    Py_BEGIN_ALLOW_THREADS
+    out_size = _rle_encode_into((const uint8_t *)view.buf, (size_t)view.len, (uint8_t *)out_view.buf);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&view);
+
+    if (into != Py_None) {
+        PyBuffer_Release(&out_view);
+        return PyLong_FromSize_t(out_size);
+    }
+    if (_PyBytes_Resize(&result, (Py_ssize_t)out_size) < 0) {
+        return NULL;
+    }
+    return result;
+}
+
+/* 
+ * rle_decode()
+ * Python wrapper for RLE decoding to RGBA2222 pixels.
+ * Reads any contiguous buffer in place. expected_size, if given, must be the
+ * decoded size. Returns the pixels, or with into= writes them into that buffer
+ * and returns the number of pixels written.
+ */
+PyObject *rle_decode(PyObject *self, PyObject *args, PyObject *kwargs) {
+    Py_buffer view, out_view;
+    PyObject *expected_arg = Py_None, *into = Py_None;
+    Py_ssize_t expected_size = -1;
+    static char *kwlist[] = {"data", "expected_size", "into", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*|O$O", kwlist, &view, &expected_arg, &into)) {
+        return NULL;
+    }
+    if (expected_arg != Py_None) {
+        expected_size = PyLong_AsSsize_t(expected_arg);
+        if (expected_size < 0) {
+            if (!PyErr_Occurred()) {
+                PyErr_SetString(PyExc_ValueError, "expected_size must not be negative");
+            }
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+        // Each input byte decodes to at most 64 pixels; check before allocating expected_size
+        if (((size_t)expected_size + RLE_MAX_RUN - 1) / RLE_MAX_RUN > (size_t)view.len) {
+            PyErr_Format(PyExc_ValueError, "data is too short to decode to expected_size (%zd) bytes", expected_size);
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+    }
+
+    const uint8_t *in = (const uint8_t *)view.buf;
+    size_t in_len = (size_t)view.len;
+    PyObject *result = NULL;
+    size_t capacity;
+    if (into == Py_None) {
+        if (expected_size < 0) {
+            // Without a size to check against, measure the output first
+            Py_BEGIN_ALLOW_THREADS
+            capacity = _rle_decoded_size(in, in_len);
+            Py_END_ALLOW_THREADS
+            if (capacity == RLE_DECODE_ERROR || capacity > PY_SSIZE_T_MAX) {
+                PyBuffer_Release(&view);
+                PyErr_SetString(PyExc_ValueError, "data is not valid RLE data");
+                return NULL;
+            }
+        } else {
+            capacity = (size_t)expected_size;
+        }
+        result = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)capacity);
+        if (!result) {
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+        out_view.buf = PyBytes_AS_STRING(result);
+    } else {
+        if (_rle_get_into(into, &out_view) < 0) {
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+        if (expected_size > out_view.len) {
+            PyErr_Format(PyExc_ValueError, "into must hold at least expected_size (%zd) bytes", expected_size);
+            PyBuffer_Release(&out_view);
+            PyBuffer_Release(&view);
+            return NULL;
+        }
+        capacity = expected_size < 0 ? (size_t)out_view.len : (size_t)expected_size;
+    }
+
+    size_t out_size;
+    Py_BEGIN_ALLOW_THREADS
+    out_size = _rle_decode_into(in, in_len, (uint8_t *)out_view.buf, capacity);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&view);
+    if (into != Py_None) {
+        PyBuffer_Release(&out_view);
+    }
+
+    if (out_size == RLE_DECODE_ERROR) {
+        Py_XDECREF(result);
+        if (into != Py_None && expected_size < 0) {
+            PyErr_SetString(PyExc_ValueError, "data is not valid RLE data or doesn't fit in into");
+        } else {
+            PyErr_SetString(PyExc_ValueError, "data is not valid RLE data or decodes to more than expected_size");
+        }
+        return NULL;
+    }
+    if (expected_size >= 0 && out_size != (size_t)expected_size) {
+        Py_XDECREF(result);
+        PyErr_Format(PyExc_ValueError, "data decodes to %zu bytes, expected %zd", out_size, expected_size);
+        return NULL;
+    }
+    if (into != Py_None) {
+        return PyLong_FromSize_t(out_size);
+    }
+    return result;
+}
@@ -1,6 +1,8 @@
 #ifndef RLE_H
 #define RLE_H
 
+#include <Python.h>
+
 #ifdef __cplusplus
 extern "C" {
 #endif
@@ -22,6 +24,24 @@ extern "C" {
  */
 uint8_t *_rle_encode_internal(const uint8_t *input, size_t input_size, size_t *output_size);
 
+// Longest run one command encodes, so the most pixels an encoded byte can decode to.
+#define RLE_MAX_RUN 64
+
+// Worst-case encoded size: every pixel may take two bytes.
+#define RLE_ENCODE_MAX_SIZE(input_size) ((input_size) * 2)
+
+/**
+ * _rle_encode_into - Same encoding as _rle_encode_internal, into a caller-owned buffer.
+ *
+ * @input:      Pointer to the input array of pixels (each pixel is 8 bits).
+ * @input_size: Number of pixels in the input array.
+ * @output:     Buffer of at least RLE_ENCODE_MAX_SIZE(input_size) bytes.
+ *
+ * Returns: The number of bytes written to output. Allocates nothing, so one output
+ *          buffer can be reused for every frame of a video.
+ */
+size_t _rle_encode_into(const uint8_t *input, size_t input_size, uint8_t *output);
+
 /**
  * _rle_decode_internal - Decode an RLE-encoded buffer of rgba2222 pixels.
  *
@@ -34,6 +54,47 @@ uint8_t *_rle_encode_internal(const uint8_t *input, size_t input_size, size_t *o
  */
 uint8_t *_rle_decode_internal(const uint8_t *input, size_t input_size, size_t *output_size);
 
+// Returned by _rle_decode_into for invalid data or output that doesn't fit.
+#define RLE_DECODE_ERROR ((size_t)-1)
+
+/**
+ * _rle_decode_into - Same decoding as _rle_decode_internal, into a caller-owned buffer.
+ *
+ * @input:           Pointer to the RLE-encoded data.
+ * @input_size:      Size of the encoded data in bytes.
+ * @output:          Buffer for the decoded (raw rgba2222) pixels.
+ * @output_capacity: Size of output in bytes.
+ *
+ * Returns: The number of pixels written, or RLE_DECODE_ERROR if a command is invalid
+ *          or the pixels would run past output_capacity. Allocates nothing.
+ */
+size_t _rle_decode_into(const uint8_t *input, size_t input_size, uint8_t *output, size_t output_capacity);
+
+// ===================================================
+// Prototypes for the Python C-extension entry points:
+// ---------------------------------------------------
+/**
+ * RLE-encode RGBA2222 pixels from any contiguous buffer, read in place.
+ * Python call signature: `rle_encode(data: bytes, *, into: bytearray = None) -> bytes | int`
+ * 
+ * Arguments:
+ *   - into: Writable buffer of at least 2 * len(data) bytes to encode into instead of
+ *           returning new bytes; the number of bytes written is returned.
+ */
+PyObject *rle_encode(PyObject *self, PyObject *args, PyObject *kwargs);
+
+/**
+ * Decode RLE data from any contiguous buffer, read in place, to RGBA2222 pixels.
+ * Python call signature: `rle_decode(data: bytes, expected_size: int = None, *, into: bytearray = None) -> bytes | int`
+ * Raises ValueError if the data is invalid or doesn't decode to expected_size pixels.
+ * 
+ * Arguments:
+ *   - expected_size: The decoded size, if known; saves measuring the output first.
+ *   - into: Writable buffer to decode into instead of returning new bytes; the number
+ *           of pixels written is returned.
+ */
+PyObject *rle_decode(PyObject *self, PyObject *args, PyObject *kwargs);
+
 #ifdef __cplusplus
 }
 #endif
@@ -7,9 +7,9 @@
 */
 
 #define PY_SSIZE_T_CLEAN
-#define _GNU_SOURCE
 
 #include "simz.h"
+#include "parallel.h"
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
@@ -22,132 +22,426 @@ char coderversion[] = "simple zip v1.0 (c)1999 Michael Schindler";
 /* Maximum block size (keep below 1<<16 to avoid overflows) */
 #define BLOCKSIZE 60000
 
-#define SIMZ_HEADER_SIZE 10
-
 /***************** Compression Functions *****************/
 
-/* Compress from input stream 'in' to output stream 'out' */
-void _simz_encode(FILE *in, FILE *out) {
-    simz_rangecoder rc;
-    unsigned char buffer[BLOCKSIZE];
-    simz_freq counts[257], blocksize;
+/* Each block costs a flag bit and 256 16-bit counts, then at most 8 bits per
+   symbol plus the coder's rounding loss (range >= 2^23 over totals < 2^16, so
+   under 1/64 bit a symbol). The coder adds its first byte and up to 5+4 at the end. */
+size_t _simz_max_encoded_size(size_t in_len) {
+    size_t blocks = in_len / BLOCKSIZE + 1;
+    return SIMZ_HEADER_SIZE + in_len + in_len / 64 + (blocks + 1) * 520 + 16;
+}
+
+/* Code one block's statistics, then its symbols */
+static void _simz_encode_symbols(simz_rangecoder *rc, const uint8_t *buffer, simz_freq blocksize) {
+    simz_freq counts[257];
     simz_freq i;
 
-    /* Determine total uncompressed size */
-    fseek(in, 0, SEEK_END);
-    uint32_t uncompressed_size = ftell(in);
-    rewind(in);
+    /* Build statistics for this block */
+    for (i = 0; i < 257; i++) counts[i] = 0;
+    for (i = 0; i < blocksize; i++) counts[buffer[i]]++;
+
+    /* Write the frequency statistics */
+    for (i = 0; i < 256; i++) encode_short(rc, counts[i]);
+
+    /* Convert counts[] into cumulative counts */
+    counts[256] = blocksize;
+    for (i = 256; i > 0; i--) counts[i - 1] = counts[i] - counts[i - 1];
+
+    /* Encode each symbol using its frequency interval */
+    for (i = 0; i < blocksize; i++) {
+        int ch = buffer[i];
+        simz_encode_freq(rc, counts[ch+1] - counts[ch], counts[ch], counts[256]);
+    }
+}
 
-    /* Write the SIMZ header */
-    uint8_t header[SIMZ_HEADER_SIZE] = {'S', 'I', 'M', 'Z', 0, 9, 
+/* Write a SIMZ header for in_len bytes of uncompressed data */
+static void _simz_write_header(uint8_t *out, uint8_t major, uint8_t minor, size_t in_len) {
+    uint32_t uncompressed_size = (uint32_t)in_len;
+    uint8_t header[SIMZ_HEADER_SIZE] = {'S', 'I', 'M', 'Z', major, minor, 
         (uncompressed_size & 0xFF), 
         ((uncompressed_size >> 8) & 0xFF), 
         ((uncompressed_size >> 16) & 0xFF), 
         ((uncompressed_size >> 24) & 0xFF)};
-    fwrite(header, 1, SIMZ_HEADER_SIZE, out);
+    memcpy(out, header, SIMZ_HEADER_SIZE);
+}
 
-    /* Assign the file pointers for proper I/O */
-    rc.fin = in;
-    rc.fout = out;
+static void _simz_write_u32(uint8_t *out, uint32_t value) {
+    out[0] = value & 0xFF;
+    out[1] = (value >> 8) & 0xFF;
+    out[2] = (value >> 16) & 0xFF;
+    out[3] = (value >> 24) & 0xFF;
+}
+
+static uint32_t _simz_read_u32(const uint8_t *in) {
+    return (uint32_t)in[0] | ((uint32_t)in[1] << 8) | ((uint32_t)in[2] << 16) | ((uint32_t)in[3] << 24);
+}
+
+/* Compress in[0..in_len) into out */
+size_t _simz_encode_buffer(const uint8_t *in, size_t in_len, uint8_t *out, size_t out_size) {
+    simz_rangecoder rc;
+    simz_freq blocksize;
+
+    if (out_size < SIMZ_HEADER_SIZE || in_len > UINT32_MAX) return 0;
+    _simz_write_header(out, 0, 9, in_len);
+
+    /* Point the coder at the rest of the output buffer */
+    rc.out = out + SIMZ_HEADER_SIZE;
+    rc.out_end = out + out_size;
+    rc.overflow = 0;
 
     /* Initialize the range coder */
     simz_start_encoding(&rc, 0, 0);
 
-    while ((blocksize = (simz_freq)fread(buffer, 1, BLOCKSIZE, in)) > 0) {
+    for (size_t start = 0; start < in_len; start += blocksize) {
+        blocksize = (simz_freq)(in_len - start < BLOCKSIZE ? in_len - start : BLOCKSIZE);
+
         /* Write a flag (one-bit coding) to signal a new block */
         simz_encode_freq(&rc, 1, 1, 2);
+        _simz_encode_symbols(&rc, &in[start], blocksize);
+    }
+
+    /* Flag the absence of a next block */
+    simz_encode_freq(&rc, 1, 0, 2);
+
+    /* Finish encoding */
+    simz_done_encoding(&rc);
+    return rc.overflow ? 0 : (size_t)(rc.out - out);
+}
 
-        /* Build statistics for this block */
-        for (i = 0; i < 257; i++) counts[i] = 0;
-        for (i = 0; i < blocksize; i++) counts[buffer[i]]++;
+/* Independent blocks: one range-coded stream per block, each in a slot of the
+   output sized for its worst case, so blocks can be coded in any order. */
+#define SIMZ_BLOCK_MAX_ENCODED_SIZE (BLOCKSIZE + BLOCKSIZE / 64 + 520 + 16)
 
-        /* Write the frequency statistics */
-        for (i = 0; i < 256; i++) encode_short(&rc, counts[i]);
+static size_t _simz_block_count(size_t in_len) {
+    return (in_len + BLOCKSIZE - 1) / BLOCKSIZE;
+}
 
-        /* Convert counts[] into cumulative counts */
-        counts[256] = blocksize;
-        for (i = 256; i > 0; i--) counts[i - 1] = counts[i] - counts[i - 1];
+size_t _simz_max_encoded_blocks_size(size_t in_len) {
+    size_t blocks = _simz_block_count(in_len);
+    return SIMZ_BLOCKS_HEADER_SIZE + blocks * (4 + SIMZ_BLOCK_MAX_ENCODED_SIZE);
+}
 
-        /* Encode each symbol using its frequency interval */
-        for (i = 0; i < blocksize; i++) {
-            int ch = buffer[i];
-            simz_encode_freq(&rc, counts[ch+1] - counts[ch], counts[ch], counts[256]);
+typedef struct {
+    const uint8_t *in;
+    size_t in_len;
+    uint8_t *slots;      /* Block i's stream goes at slots + i * SIMZ_BLOCK_MAX_ENCODED_SIZE */
+    size_t *sizes;       /* Coded size of each block, 0 if it overflowed its slot */
+} _simz_blocks_ctx;
+
+static void _simz_encode_block_range(void *arg, int start, int end) {
+    _simz_blocks_ctx *ctx = (_simz_blocks_ctx *)arg;
+    for (int b = start; b < end; b++) {
+        size_t offset = (size_t)b * BLOCKSIZE;
+        simz_freq blocksize = (simz_freq)(ctx->in_len - offset < BLOCKSIZE ? ctx->in_len - offset : BLOCKSIZE);
+        simz_rangecoder rc;
+        rc.out = ctx->slots + (size_t)b * SIMZ_BLOCK_MAX_ENCODED_SIZE;
+        rc.out_end = rc.out + SIMZ_BLOCK_MAX_ENCODED_SIZE;
+        rc.overflow = 0;
+        uint8_t *stream = rc.out;
+        simz_start_encoding(&rc, 0, 0);
+        _simz_encode_symbols(&rc, &ctx->in[offset], blocksize);
+        simz_done_encoding(&rc);
+        ctx->sizes[b] = rc.overflow ? 0 : (size_t)(rc.out - stream);
+    }
+}
+
+size_t _simz_encode_blocks(const uint8_t *in, size_t in_len, uint8_t *out, size_t out_size, int threads) {
+    size_t blocks = _simz_block_count(in_len);
+    if (in_len > UINT32_MAX || out_size < _simz_max_encoded_blocks_size(in_len)) return 0;
+    size_t *sizes = (size_t *)malloc((blocks ? blocks : 1) * sizeof(size_t));
+    if (!sizes) return 0;
+
+    /* Code every block into its slot, after the header and block table */
+    uint8_t *table = out + SIMZ_BLOCKS_HEADER_SIZE;
+    uint8_t *data = table + blocks * 4;
+    _simz_blocks_ctx ctx = {in, in_len, data, sizes};
+    _parallel_for((int)blocks, threads, _simz_encode_block_range, &ctx);
+
+    /* Close the gaps between the streams and record where each ends */
+    _simz_write_header(out, 1, 0, in_len);
+    _simz_write_u32(out + SIMZ_HEADER_SIZE, BLOCKSIZE);
+    _simz_write_u32(out + SIMZ_HEADER_SIZE + 4, (uint32_t)blocks);
+    size_t end = 0;
+    for (size_t b = 0; b < blocks; b++) {
+        if (sizes[b] == 0) {
+            free(sizes);
+            return 0;
         }
+        memmove(data + end, data + b * SIMZ_BLOCK_MAX_ENCODED_SIZE, sizes[b]);
+        end += sizes[b];
+        _simz_write_u32(table + b * 4, (uint32_t)end);
     }
+    free(sizes);
+    return (size_t)(data + end - out);
+}
 
-    /* Flag the absence of a next block */
-    simz_encode_freq(&rc, 1, 0, 2);
+/* Read a whole stream into memory. Returns SIMZ_OK, SIMZ_READ_FAILED or SIMZ_NO_MEMORY. */
+static int _simz_read_all(FILE *in, uint8_t **data, size_t *len) {
+    size_t capacity = 1 << 16;
+    *len = 0;
+    *data = (uint8_t *)malloc(capacity);
+    if (!*data) return SIMZ_NO_MEMORY;
+    size_t n;
+    while ((n = fread(*data + *len, 1, capacity - *len, in)) > 0) {
+        *len += n;
+        if (*len == capacity) {
+            uint8_t *grown = (uint8_t *)realloc(*data, capacity * 2);
+            if (!grown) {
+                free(*data);
+                return SIMZ_NO_MEMORY;
+            }
+            *data = grown;
+            capacity *= 2;
+        }
+    }
+    if (ferror(in)) {
+        free(*data);
+        return SIMZ_READ_FAILED;
+    }
+    return SIMZ_OK;
+}
 
-    /* Finish encoding */
-    simz_done_encoding(&rc);
+/* Compress from input stream 'in' to output stream 'out' */
+int _simz_encode(FILE *in, FILE *out) {
+    uint8_t *data;
+    size_t len;
+    int status = _simz_read_all(in, &data, &len);
+    if (status != SIMZ_OK) return status;
+    if (len > UINT32_MAX) {
+        free(data);
+        return SIMZ_TOO_LARGE;
+    }
+
+    size_t out_size = _simz_max_encoded_size(len);
+    uint8_t *encoded = (uint8_t *)malloc(out_size);
+    if (!encoded) {
+        free(data);
+        return SIMZ_NO_MEMORY;
+    }
+    size_t encoded_len = _simz_encode_buffer(data, len, encoded, out_size);
+    if (encoded_len == 0 || fwrite(encoded, 1, encoded_len, out) != encoded_len) {
+        status = SIMZ_WRITE_FAILED;
+    }
+    free(data);
+    free(encoded);
+    return status;
 }
 
 /**************** Decompression Functions ****************/
 
-/* Decompress from input stream 'in' to output stream 'out' */
-void _simz_decode(FILE *in, FILE *out) {
-    simz_rangecoder rc;
-    simz_freq counts[257], i, blocksize;
+int _simz_decoded_size(const uint8_t *in, size_t in_len, size_t *size) {
+    /* Verify the SIMZ header */
+    if (in_len < SIMZ_HEADER_SIZE || memcmp(in, "SIMZ", 4) != 0
+        || !((in[4] == 0 && in[5] == 9) || (in[4] == 1 && in[5] == 0))) {
+        return SIMZ_BAD_DATA;
+    }
+    *size = _simz_read_u32(&in[6]);
+    return SIMZ_OK;
+}
 
-    /* Read and verify the SIMZ header */
-    uint8_t header[SIMZ_HEADER_SIZE];
-    if (fread(header, 1, SIMZ_HEADER_SIZE, in) != SIMZ_HEADER_SIZE) {
-        fprintf(stderr, "Invalid SIMZ file: header too short\n");
-        exit(1);
+/* Decode one block's statistics, then its symbols into out, stopping after max_out of them.
+   Returns the number written, or -1 if the data is corrupt. Sets *blocksize to the block's size. */
+static long _simz_decode_symbols(simz_rangecoder *rc, uint8_t *out, size_t max_out, simz_freq *blocksize) {
+    simz_freq counts[257], i, total;
+    uint8_t symbols[BLOCKSIZE];  /* The block's symbol for each cumulative frequency */
+
+    /* Read the 256 frequency counts */
+    for (i = 0; i < 256; i++) counts[i] = simz_decode_short(rc);
+
+    /* Compute cumulative counts */
+    total = 0;
+    for (i = 0; i < 256; i++) {
+        simz_freq tmp = counts[i];
+        counts[i] = total;
+        total += tmp;
     }
-    if (header[0] != 'S' || header[1] != 'I' || header[2] != 'M' || header[3] != 'Z') {
-        fprintf(stderr, "Invalid SIMZ file: bad magic bytes\n");
-        exit(1);
+    counts[256] = total;
+    *blocksize = total;
+    /* The encoder never writes bigger blocks; corrupt counts could divide by zero below */
+    if (total > BLOCKSIZE) return -1;
+
+    /* Map every cumulative frequency straight to its symbol, once per block */
+    for (i = 0; i < 256; i++) {
+        memset(&symbols[counts[i]], (int)i, counts[i + 1] - counts[i]);
     }
-    if (header[4] != 0 || header[5] != 9) {
-        fprintf(stderr, "Unsupported SIMZ version: %d.%d\n", header[4], header[5]);
-        exit(1);
+
+    /* Decode each symbol in the block */
+    size_t n = total < max_out ? total : max_out;
+    for (size_t k = 0; k < n; k++) {
+        simz_freq cf_sym = simz_decode_culfreq(rc, total);
+        if (cf_sym >= total) {
+            /* Only corrupt data gets here */
+            return -1;
+        }
+        simz_freq symbol = symbols[cf_sym];
+        simz_decode_update(rc, counts[symbol+1] - counts[symbol], counts[symbol], total);
+        out[k] = (uint8_t)symbol;
     }
+    return (long)n;
+}
 
-    uint32_t expectedOutputSize = header[6] | (header[7] << 8) | (header[8] << 16) | (header[9] << 24);
+/* Decompress a version 0.9 stream, where one coder runs across all the blocks */
+static int _simz_decode_stream(const uint8_t *in, size_t in_len, uint8_t *out, size_t expectedOutputSize, size_t *out_len) {
+    simz_rangecoder rc;
+    simz_freq blocksize;
 
-    /* Assign file pointers for proper I/O */
-    rc.fin = in;
-    rc.fout = out;
+    /* Point the coder at the data after the header */
+    rc.in = in + SIMZ_HEADER_SIZE;
+    rc.in_end = in + in_len;
 
     if (simz_start_decoding(&rc) != 0) {
-        fprintf(stderr, "Could not successfully open input data\n");
-        exit(1);
+        return SIMZ_BAD_DATA;
     }
 
-    uint32_t out_index = 0;
+    size_t out_index = 0;
     while (out_index < expectedOutputSize) {
         /* Check for the flag that indicates a new block */
         simz_freq cf = simz_decode_culfreq(&rc, 2);
         if (cf == 0) break; // No more blocks
         simz_decode_update(&rc, 1, 1, 2);
 
-        /* Read the 256 frequency counts */
-        for (i = 0; i < 256; i++) counts[i] = simz_decode_short(&rc);
-
-        /* Compute cumulative counts */
-        blocksize = 0;
-        for (i = 0; i < 256; i++) {
-            simz_freq tmp = counts[i];
-            counts[i] = blocksize;
-            blocksize += tmp;
-        }
-        counts[256] = blocksize;
-
-        /* Decode each symbol in the block */
-        for (i = 0; i < blocksize && out_index < expectedOutputSize; i++) {
-            simz_freq cf_sym = simz_decode_culfreq(&rc, blocksize);
-            simz_freq symbol = 0;
-
-            while (counts[symbol + 1] <= cf_sym) symbol++;
-            
-            simz_decode_update(&rc, counts[symbol+1] - counts[symbol], counts[symbol], blocksize);
-            fputc((int)symbol, out);
-            out_index++;
+        long n = _simz_decode_symbols(&rc, &out[out_index], expectedOutputSize - out_index, &blocksize);
+        if (n < 0) {
+            *out_len = out_index;
+            return SIMZ_BAD_DATA;
         }
+        out_index += (size_t)n;
     }
 
     simz_done_decoding(&rc);
+    *out_len = out_index;
+    return SIMZ_OK;
+}
+
+/* Where the blocks of a version 1.0 stream are */
+typedef struct {
+    const uint8_t *table;   /* Per block: uint32 end offset of its stream, from data */
+    const uint8_t *data;
+    size_t data_len;
+    size_t block_size, block_count;
+    size_t decoded_size;
+} _simz_block_layout;
+
+/* Check a version 1.0 header and block table. Returns SIMZ_OK or SIMZ_BAD_DATA. */
+static int _simz_block_layout_read(const uint8_t *in, size_t in_len, _simz_block_layout *layout) {
+    if (_simz_decoded_size(in, in_len, &layout->decoded_size) != SIMZ_OK || in[4] != 1
+        || in_len < SIMZ_BLOCKS_HEADER_SIZE) {
+        return SIMZ_BAD_DATA;
+    }
+    layout->block_size = _simz_read_u32(&in[SIMZ_HEADER_SIZE]);
+    layout->block_count = _simz_read_u32(&in[SIMZ_HEADER_SIZE + 4]);
+    if (layout->block_size == 0 || layout->block_size > BLOCKSIZE
+        || layout->block_count != (layout->decoded_size + layout->block_size - 1) / layout->block_size
+        || layout->block_count > (in_len - SIMZ_BLOCKS_HEADER_SIZE) / 4) {
+        return SIMZ_BAD_DATA;
+    }
+    layout->table = in + SIMZ_BLOCKS_HEADER_SIZE;
+    layout->data = layout->table + layout->block_count * 4;
+    layout->data_len = in_len - (size_t)(layout->data - in);
+    size_t end = 0;
+    for (size_t b = 0; b < layout->block_count; b++) {
+        size_t next = _simz_read_u32(&layout->table[b * 4]);
+        if (next < end || next > layout->data_len) return SIMZ_BAD_DATA;
+        end = next;
+    }
+    return SIMZ_OK;
+}
+
+/* Decode block b of a checked layout into out, which has room for block_size bytes */
+static int _simz_decode_layout_block(const _simz_block_layout *layout, size_t b, uint8_t *out) {
+    size_t start = b ? _simz_read_u32(&layout->table[(b - 1) * 4]) : 0;
+    size_t end = _simz_read_u32(&layout->table[b * 4]);
+    size_t expected = layout->decoded_size - b * layout->block_size;
+    if (expected > layout->block_size) expected = layout->block_size;
+
+    simz_rangecoder rc;
+    simz_freq blocksize;
+    rc.in = layout->data + start;
+    rc.in_end = layout->data + end;
+    if (simz_start_decoding(&rc) != 0) {
+        return SIMZ_BAD_DATA;
+    }
+    long n = _simz_decode_symbols(&rc, out, expected, &blocksize);
+    return n == (long)expected && blocksize == expected ? SIMZ_OK : SIMZ_BAD_DATA;
+}
+
+typedef struct {
+    const _simz_block_layout *layout;
+    uint8_t *out;
+    int status;   /* SIMZ_BAD_DATA once any block fails */
+} _simz_decode_ctx;
+
+static void _simz_decode_block_range(void *arg, int start, int end) {
+    _simz_decode_ctx *ctx = (_simz_decode_ctx *)arg;
+    for (int b = start; b < end; b++) {
+        if (_simz_decode_layout_block(ctx->layout, (size_t)b, ctx->out + (size_t)b * ctx->layout->block_size) != SIMZ_OK) {
+            __atomic_store_n(&ctx->status, SIMZ_BAD_DATA, __ATOMIC_RELAXED);
+        }
+    }
+}
+
+/* Decompress SIMZ data in[0..in_len) into out */
+int _simz_decode_buffer(const uint8_t *in, size_t in_len, uint8_t *out, size_t *out_len, int threads) {
+    size_t expectedOutputSize;
+
+    *out_len = 0;
+    if (_simz_decoded_size(in, in_len, &expectedOutputSize) != SIMZ_OK) {
+        return SIMZ_BAD_DATA;
+    }
+    if (in[4] == 0) {
+        return _simz_decode_stream(in, in_len, out, expectedOutputSize, out_len);
+    }
+
+    /* Independent blocks decode straight into their place in out */
+    _simz_block_layout layout;
+    if (_simz_block_layout_read(in, in_len, &layout) != SIMZ_OK) {
+        return SIMZ_BAD_DATA;
+    }
+    _simz_decode_ctx ctx = {&layout, out, SIMZ_OK};
+    _parallel_for((int)layout.block_count, threads, _simz_decode_block_range, &ctx);
+    if (ctx.status == SIMZ_OK) {
+        *out_len = expectedOutputSize;
+    }
+    return ctx.status;
+}
+
+int _simz_decode_block(const uint8_t *in, size_t in_len, size_t block, uint8_t *out, size_t *out_len) {
+    _simz_block_layout layout;
+    *out_len = 0;
+    if (_simz_block_layout_read(in, in_len, &layout) != SIMZ_OK || block >= layout.block_count) {
+        return SIMZ_BAD_DATA;
+    }
+    int status = _simz_decode_layout_block(&layout, block, out);
+    if (status == SIMZ_OK) {
+        *out_len = block + 1 < layout.block_count ? layout.block_size : layout.decoded_size - block * layout.block_size;
+    }
+    return status;
+}
+
+/* Decompress from input stream 'in' to output stream 'out' */
+int _simz_decode(FILE *in, FILE *out) {
+    uint8_t *data;
+    size_t len, decoded_size, decoded_len;
+    int status = _simz_read_all(in, &data, &len);
+    if (status != SIMZ_OK) return status;
+    if (_simz_decoded_size(data, len, &decoded_size) != SIMZ_OK) {
+        free(data);
+        return SIMZ_BAD_DATA;
+    }
+
+    uint8_t *decoded = (uint8_t *)malloc(decoded_size ? decoded_size : 1);
+    if (!decoded) {
+        free(data);
+        return SIMZ_NO_MEMORY;
+    }
+    status = _simz_decode_buffer(data, len, decoded, &decoded_len, 1);
+    if (status == SIMZ_OK && fwrite(decoded, 1, decoded_len, out) != decoded_len) {
+        status = SIMZ_WRITE_FAILED;
+    }
+    free(data);
+    free(decoded);
+    return status;
 }
 
 /************** rangecod.c *****************/
@@ -164,10 +458,11 @@ void _simz_decode(FILE *in, FILE *out) {
 
 
 /* all IO is done by these macros - change them if you want to */
-/* no checking is done - do it here if you want it             */
+/* they work straight on the coder's memory buffers: a full    */
+/* output buffer sets overflow, reading past the input is EOF  */
 /* cod is a pointer to the used simz_rangecoder                     */
-#define outbyte(cod, x) fputc((x), (cod)->fout)
-#define inbyte(cod)     fgetc((cod)->fin)
+#define outbyte(cod, x) ((cod)->out < (cod)->out_end ? (void)(*(cod)->out++ = (unsigned char)(x)) : (void)((cod)->overflow = 1))
+#define inbyte(cod)     ((cod)->in < (cod)->in_end ? (int)*(cod)->in++ : EOF)
 
 #define SHIFT_BITS (CODE_BITS - 9)
 #define EXTRA_BITS ((CODE_BITS-2) % 8 + 1)
@@ -382,12 +677,31 @@ void simz_done_decoding( simz_rangecoder *rc )
 // ===================================================
 // Python C-extension entry points:
 // ---------------------------------------------------
-/* 
- * simz_encode()
- * Python wrapper for _simz_encode().
- * Expects two string arguments: the input file path and the output file path.
- */
-PyObject *simz_encode(PyObject *self, PyObject *args) {
+
+/* Raise the Python exception for a failed simz call on in_filename, or on in-memory data if NULL;
+   always returns NULL */
+static PyObject *_simz_error(int status, const char *in_filename) {
+    const char *what = in_filename ? in_filename : "<data>";
+    switch (status) {
+        case SIMZ_NO_MEMORY:
+            return PyErr_NoMemory();
+        case SIMZ_BAD_DATA:
+            PyErr_Format(PyExc_ValueError, "'%s' is not valid SIMZ data", what);
+            return NULL;
+        case SIMZ_TOO_LARGE:
+            PyErr_Format(PyExc_ValueError, "'%s' is too large for SIMZ (4 GiB at most)", what);
+            return NULL;
+        case SIMZ_READ_FAILED:
+            PyErr_Format(PyExc_IOError, "Could not read input file '%s'", what);
+            return NULL;
+        default:
+            PyErr_SetString(PyExc_IOError, "Could not write output file");
+            return NULL;
+    }
+}
+
+/* Open both files and run a FILE-based coder on them with the GIL released */
+static PyObject *_simz_files(PyObject *args, int (*coder)(FILE *, FILE *)) {
     const char *in_filename;
     const char *out_filename;
     
@@ -408,48 +722,37 @@ PyObject *simz_encode(PyObject *self, PyObject *args) {
         return NULL;
     }
     
-    /* Call the compressor routine (defined in your simz code) */
-    _simz_encode(infile, outfile);
-    
+    int status;
+    Py_BEGIN_ALLOW_THREADS
+    status = coder(infile, outfile);
     fclose(infile);
-    fclose(outfile);
+    if (fclose(outfile) != 0 && status == SIMZ_OK) {
+        status = SIMZ_WRITE_FAILED;
+    }
+    Py_END_ALLOW_THREADS
     
+    if (status != SIMZ_OK) {
+        return _simz_error(status, in_filename);
+    }
     Py_RETURN_NONE;
 }
 
+/* 
+ * simz_encode()
+ * Python wrapper for _simz_encode().
+ * Expects two string arguments: the input file path and the output file path.
+ */
+PyObject *simz_encode(PyObject *self, PyObject *args) {
+    return _simz_files(args, _simz_encode);
+}
+
 /* 
  * simz_decode()
  * Python wrapper for _simz_decode().
  * Expects two string arguments: the input file path and the output file path.
  */
 PyObject *simz_decode(PyObject *self, PyObject *args) {
-    const char *in_filename;
-    const char *out_filename;
-    
-    if (!PyArg_ParseTuple(args, "ss", &in_filename, &out_filename)) {
-        return NULL;
-    }
-    
-    FILE *infile = fopen(in_filename, "rb");
-    if (!infile) {
-        PyErr_Format(PyExc_IOError, "Could not open input file '%s'", in_filename);
-        return NULL;
-    }
-    
-    FILE *outfile = fopen(out_filename, "wb");
-    if (!outfile) {
-        fclose(infile);
-        PyErr_Format(PyExc_IOError, "Could not open output file '%s'", out_filename);
-        return NULL;
-    }
-    
-    /* Call the decompressor routine (defined in your simz code) */
-    _simz_decode(infile, outfile);
-    
-    fclose(infile);
-    fclose(outfile);
-    
-    Py_RETURN_NONE;
+    return _simz_files(args, _simz_decode);
 }
 
 /* 
@@ -457,43 +760,46 @@ PyObject *simz_decode(PyObject *self, PyObject *args) {
  * Python wrapper for in-memory compression.
  * Accepts one bytes object (the raw data),
  * returns a bytes object (the compressed data).
+ * Compresses straight into a worst-case sized bytes object, then shrinks it.
  */
-PyObject *simz_encode_bytes(PyObject *self, PyObject *args) {
+PyObject *simz_encode_bytes(PyObject *self, PyObject *args, PyObject *kwargs) {
     const char *in_data = NULL;
     Py_ssize_t in_len = 0;
+    int independent_blocks = 0, threads = 0;
+    static char *kwlist[] = {"data", "independent_blocks", "threads", NULL};
 
     /* Parse Python arguments: y# means "read a bytes-like object" */
-    if (!PyArg_ParseTuple(args, "y#", &in_data, &in_len)) {
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y#|pi", kwlist, &in_data, &in_len, &independent_blocks, &threads)) {
         return NULL;
     }
-
-    /* Create a memory stream from the input data */
-    FILE *in_mem = fmemopen((void *)in_data, (size_t)in_len, "rb");
-    if (!in_mem) {
-        PyErr_SetString(PyExc_RuntimeError, "Unable to open input memory stream.");
-        return NULL;
+    if ((size_t)in_len > UINT32_MAX) {
+        return _simz_error(SIMZ_TOO_LARGE, NULL);
     }
 
-    /* Create a memory stream to capture the compressed output */
-    char *out_buf = NULL;
-    size_t out_size = 0;
-    FILE *out_mem = open_memstream(&out_buf, &out_size);
-    if (!out_mem) {
-        fclose(in_mem);
-        PyErr_SetString(PyExc_RuntimeError, "Unable to open output memory stream.");
+    size_t max_size = independent_blocks ? _simz_max_encoded_blocks_size((size_t)in_len) : _simz_max_encoded_size((size_t)in_len);
+    PyObject *result = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)max_size);
+    if (!result) {
         return NULL;
     }
 
-    /* Reuse the file-based compressor logic, but with our memory streams */
-    _simz_encode(in_mem, out_mem);
-
-    fclose(in_mem);
-    fclose(out_mem);
-
-    /* Create a Python bytes object from the in-memory compressed data */
-    PyObject *result = PyBytes_FromStringAndSize(out_buf, out_size);
-    free(out_buf);   /* open_memstream() allocated this buffer */
+    size_t out_size;
+    uint8_t *out = (uint8_t *)PyBytes_AS_STRING(result);
+    Py_BEGIN_ALLOW_THREADS
+    if (independent_blocks) {
+        out_size = _simz_encode_blocks((const uint8_t *)in_data, (size_t)in_len, out, max_size, _resolve_thread_count(threads));
+    } else {
+        out_size = _simz_encode_buffer((const uint8_t *)in_data, (size_t)in_len, out, max_size);
+    }
+    Py_END_ALLOW_THREADS
 
+    if (out_size == 0) {
+        Py_DECREF(result);
+        /* The worst-case sizes always fit, so only the block table allocation can fail */
+        return PyErr_NoMemory();
+    }
+    if (_PyBytes_Resize(&result, (Py_ssize_t)out_size) < 0) {
+        return NULL;
+    }
     return result;
 }
 
@@ -502,41 +808,39 @@ PyObject *simz_encode_bytes(PyObject *self, PyObject *args) {
  * Python wrapper for in-memory decompression.
  * Accepts one bytes object (the compressed data),
  * returns a bytes object (the decompressed data).
+ * Decompresses straight into a bytes object of the size the header gives.
  */
-PyObject *simz_decode_bytes(PyObject *self, PyObject *args) {
+PyObject *simz_decode_bytes(PyObject *self, PyObject *args, PyObject *kwargs) {
     const char *in_data = NULL;
     Py_ssize_t in_len = 0;
+    int threads = 0;
+    static char *kwlist[] = {"data", "threads", NULL};
 
-    if (!PyArg_ParseTuple(args, "y#", &in_data, &in_len)) {
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y#|i", kwlist, &in_data, &in_len, &threads)) {
         return NULL;
     }
 
-    /* Create a memory stream from the compressed input data */
-    FILE *in_mem = fmemopen((void *)in_data, (size_t)in_len, "rb");
-    if (!in_mem) {
-        PyErr_SetString(PyExc_RuntimeError, "Unable to open input memory stream.");
-        return NULL;
+    size_t decoded_size;
+    if (_simz_decoded_size((const uint8_t *)in_data, (size_t)in_len, &decoded_size) != SIMZ_OK) {
+        return _simz_error(SIMZ_BAD_DATA, NULL);
     }
-
-    /* Create a memory stream to capture the decompressed output */
-    char *out_buf = NULL;
-    size_t out_size = 0;
-    FILE *out_mem = open_memstream(&out_buf, &out_size);
-    if (!out_mem) {
-        fclose(in_mem);
-        PyErr_SetString(PyExc_RuntimeError, "Unable to open output memory stream.");
+    PyObject *result = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)decoded_size);
+    if (!result) {
         return NULL;
     }
 
-    /* Reuse the file-based decompressor logic, but with memory streams */
-    _simz_decode(in_mem, out_mem);
-
-    fclose(in_mem);
-    fclose(out_mem);
-
-    /* Create a Python bytes object from the decompressed data */
-    PyObject *result = PyBytes_FromStringAndSize(out_buf, out_size);
-    free(out_buf);
+    int status;
+    size_t out_len;
+    Py_BEGIN_ALLOW_THREADS
+    status = _simz_decode_buffer((const uint8_t *)in_data, (size_t)in_len, (uint8_t *)PyBytes_AS_STRING(result), &out_len, _resolve_thread_count(threads));
+    Py_END_ALLOW_THREADS
 
+    if (status != SIMZ_OK) {
+        Py_DECREF(result);
+        return _simz_error(status, NULL);
+    }
+    if (out_len < decoded_size && _PyBytes_Resize(&result, (Py_ssize_t)out_len) < 0) {
+        return NULL;
+    }
     return result;
 }
@@ -2,6 +2,9 @@
 #define SIMZ_H
 
 #include <Python.h>
+#include <stddef.h>
+#include <stdint.h>
+#include <stdio.h>
 
 #ifdef __cplusplus
 extern "C" {
@@ -32,9 +35,12 @@ typedef struct {
     unsigned char buffer;/* Buffer for input/output */
     uint4 bytecount;     /* Counter for output bytes */
 
-    /* Add these two fields so we can store actual file pointers */
-    FILE *fin;           /* Pointer to input file */
-    FILE *fout;          /* Pointer to output file */
+    /* In-memory I/O: the coder reads and writes these buffers directly */
+    const unsigned char *in;      /* Next input byte */
+    const unsigned char *in_end;  /* End of the input; reads past it return EOF */
+    unsigned char *out;           /* Next output byte */
+    unsigned char *out_end;       /* End of the output buffer */
+    int overflow;                 /* Set when the output didn't fit; the excess is dropped */
 } simz_rangecoder;
 
 /* Prototypes for range coder functions */
@@ -56,9 +62,53 @@ unsigned short simz_decode_short(simz_rangecoder *rc);
 
 void simz_done_decoding(simz_rangecoder *rc);
 
-/* Prototypes for simz compression and decompression */
-void _simz_encode(FILE *in, FILE *out);
-void _simz_decode(FILE *in, FILE *out);
+/* Result codes for simz compression and decompression */
+enum {
+    SIMZ_OK,
+    SIMZ_BAD_DATA,     /* Not SIMZ data, an unsupported version, or corrupt */
+    SIMZ_NO_MEMORY,
+    SIMZ_READ_FAILED,
+    SIMZ_WRITE_FAILED,
+    SIMZ_TOO_LARGE     /* Input over 4 GiB, which the header can't record */
+};
+
+/* SIMZ data starts with a 10-byte header: "SIMZ", version major and minor, and
+   the uncompressed size as a little-endian uint32.
+   Version 0.9 follows it with one range-coded stream covering every block.
+   Version 1.0 codes each block as its own stream so blocks can be coded in
+   parallel and decoded on their own. After the header come the block size and
+   block count (uint32 each), then per block the uint32 end offset of its
+   stream, counted from the end of that table, then the streams. */
+#define SIMZ_HEADER_SIZE 10
+#define SIMZ_BLOCKS_HEADER_SIZE 18
+
+/* Worst-case compressed size of in_len bytes, header included */
+size_t _simz_max_encoded_size(size_t in_len);
+
+/* Compress in[0..in_len) into out, which has room for out_size bytes (_simz_max_encoded_size is always enough).
+   Returns the compressed size, or 0 if it didn't fit. */
+size_t _simz_encode_buffer(const uint8_t *in, size_t in_len, uint8_t *out, size_t out_size);
+
+/* Version 1.0 (independent blocks): the worst-case size, and compression on up to 'threads' threads (<= 0 for one per CPU).
+   Returns the compressed size, or 0 if out is smaller than _simz_max_encoded_blocks_size or memory ran out. */
+size_t _simz_max_encoded_blocks_size(size_t in_len);
+size_t _simz_encode_blocks(const uint8_t *in, size_t in_len, uint8_t *out, size_t out_size, int threads);
+
+/* Read the uncompressed size from the header of SIMZ data of either version. Returns SIMZ_OK or SIMZ_BAD_DATA. */
+int _simz_decoded_size(const uint8_t *in, size_t in_len, size_t *size);
+
+/* Decompress SIMZ data into out, which has room for the header's uncompressed size (see _simz_decoded_size).
+   *out_len is set to the bytes produced, which is fewer if version 0.9 data ends early.
+   Version 1.0 blocks are decoded on up to 'threads' threads. Returns SIMZ_OK or SIMZ_BAD_DATA. */
+int _simz_decode_buffer(const uint8_t *in, size_t in_len, uint8_t *out, size_t *out_len, int threads);
+
+/* Decode just block 'block' of version 1.0 data into out, which has room for the block size.
+   Returns SIMZ_OK or SIMZ_BAD_DATA (also for version 0.9 data or a block past the end). */
+int _simz_decode_block(const uint8_t *in, size_t in_len, size_t block, uint8_t *out, size_t *out_len);
+
+/* File versions: read all of in, then code it in memory and write it to out. Return a SIMZ_* code. */
+int _simz_encode(FILE *in, FILE *out);
+int _simz_decode(FILE *in, FILE *out);
 
 // ===================================================
 // Prototypes for the Python C-extension entry points:
@@ -85,15 +135,21 @@ PyObject *simz_decode(PyObject *self, PyObject *args);
 
 /**
  * Compress a Python bytes object (in memory) and return a bytes object.
- * Python call signature: `simz_encode_bytes(data: bytes) -> bytes`
+ * Python call signature: `simz_encode_bytes(data: bytes, independent_blocks: bool = False, threads: int = 0) -> bytes`
+ * 
+ * Arguments:
+ *   - independent_blocks: Write version 1.0 data, whose blocks are coded separately (a little larger, but parallel)
+ *   - threads: Threads for independent blocks; 0 means one per CPU. The output doesn't depend on it.
  */
-PyObject *simz_encode_bytes(PyObject *self, PyObject *args);
+PyObject *simz_encode_bytes(PyObject *self, PyObject *args, PyObject *kwargs);
 
 /**
  * Decompress a Python bytes object (in memory) and return a bytes object.
- * Python call signature: `simz_decode_bytes(data: bytes) -> bytes`
+ * Python call signature: `simz_decode_bytes(data: bytes, threads: int = 0) -> bytes`
+ * Independent blocks are decoded on up to 'threads' threads (0 means one per CPU).
+ * Raises ValueError if data isn't valid SIMZ data.
  */
-PyObject *simz_decode_bytes(PyObject *self, PyObject *args);
+PyObject *simz_decode_bytes(PyObject *self, PyObject *args, PyObject *kwargs);
 
 #ifdef __cplusplus
 }
@@ -0,0 +1,204 @@
+#include "stream.h"
+#include "palette.h"
+#include <strings.h>
+
+// Everything _stream_convert_png has to clean up. Kept off the stack so its
+// fields are still valid after libpng longjmps back on an error.
+typedef struct {
+    FILE *src, *tgt;
+    png_structp read_png;
+    png_infop read_info;
+    png_structp write_png;
+    png_infop write_info;
+    uint8_t *row;        // One RGBA8888 row
+    uint8_t *rgba2_row;  // One RGBA2222 row
+} _stream_state;
+
+static void _stream_state_free(_stream_state *state) {
+    if (state->read_png) png_destroy_read_struct(&state->read_png, &state->read_info, NULL);
+    if (state->write_png) png_destroy_write_struct(&state->write_png, &state->write_info);
+    if (state->src) fclose(state->src);
+    if (state->tgt) fclose(state->tgt);
+    free(state->row);
+    free(state->rgba2_row);
+    free(state);
+}
+
+int _stream_convert_png(const char *src_file, const char *tgt_file, Palette *palette, const char *palette_conversion_method, bool use_transparent, const uint8_t transparent_rgb[3], bool rgba2_output) {
+    _stream_state *state = (_stream_state *)calloc(1, sizeof(_stream_state));
+    if (!state) return STREAM_NO_MEMORY;
+
+    state->src = fopen(src_file, "rb");
+    if (!state->src) {
+        _stream_state_free(state);
+        return STREAM_READ_FAILED;
+    }
+    state->read_png = png_create_read_struct(PNG_LIBPNG_VER_STRING, NULL, NULL, NULL);
+    state->read_info = state->read_png ? png_create_info_struct(state->read_png) : NULL;
+    if (!state->read_info) {
+        _stream_state_free(state);
+        return STREAM_NO_MEMORY;
+    }
+    if (setjmp(png_jmpbuf(state->read_png))) {
+        _stream_state_free(state);
+        return STREAM_READ_FAILED;
+    }
+
+    png_init_io(state->read_png, state->src);
+    png_read_info(state->read_png, state->read_info);
+    if (png_get_interlace_type(state->read_png, state->read_info) != PNG_INTERLACE_NONE) {
+        _stream_state_free(state);
+        return STREAM_INTERLACED;
+    }
+    _png_set_rgba8_transforms(state->read_png, state->read_info);
+
+    int width = (int)png_get_image_width(state->read_png, state->read_info);
+    int height = (int)png_get_image_height(state->read_png, state->read_info);
+
+    state->row = (uint8_t *)malloc((size_t)width * 4);
+    state->rgba2_row = rgba2_output ? (uint8_t *)malloc((size_t)width) : NULL;
+    if (!state->row || (rgba2_output && !state->rgba2_row)) {
+        _stream_state_free(state);
+        return STREAM_NO_MEMORY;
+    }
+
+    state->tgt = fopen(tgt_file, "wb");
+    if (!state->tgt) {
+        _stream_state_free(state);
+        return STREAM_WRITE_FAILED;
+    }
+
+    if (!rgba2_output) {
+        state->write_png = png_create_write_struct(PNG_LIBPNG_VER_STRING, NULL, NULL, NULL);
+        state->write_info = state->write_png ? png_create_info_struct(state->write_png) : NULL;
+        if (!state->write_info) {
+            _stream_state_free(state);
+            return STREAM_NO_MEMORY;
+        }
+        if (setjmp(png_jmpbuf(state->write_png))) {
+            _stream_state_free(state);
+            return STREAM_WRITE_FAILED;
+        }
+        png_init_io(state->write_png, state->tgt);
+        png_set_IHDR(state->write_png, state->write_info, width, height, 8, PNG_COLOR_TYPE_RGBA,
+                     PNG_INTERLACE_NONE, PNG_COMPRESSION_TYPE_DEFAULT, PNG_FILTER_TYPE_DEFAULT);
+        png_write_info(state->write_png, state->write_info);
+    }
+
+    // Read, convert and write one row at a time
+    for (int y = 0; y < height; ++y) {
+        png_read_row(state->read_png, state->row, NULL);
+        _convert_row_to_palette(state->row, width, y, palette, palette_conversion_method, use_transparent, transparent_rgb);
+
+        if (rgba2_output) {
+            _rgba32_to_rgba2(state->row, (size_t)width, state->rgba2_row);
+            if (fwrite(state->rgba2_row, 1, (size_t)width, state->tgt) != (size_t)width) {
+                _stream_state_free(state);
+                return STREAM_WRITE_FAILED;
+            }
+        } else {
+            png_write_row(state->write_png, state->row);
+        }
+    }
+
+    if (!rgba2_output) {
+        png_write_end(state->write_png, NULL);
+    }
+
+    // Report errors that only show up when the output is flushed
+    int close_failed = fclose(state->tgt) != 0;
+    state->tgt = NULL;
+    _stream_state_free(state);
+    return close_failed ? STREAM_WRITE_FAILED : STREAM_OK;
+}
+
+// Helper function: Whole-frame conversion for sources that can't be streamed
+static int _stream_convert_whole_frame(const char *src_file, const char *tgt_file, Palette *palette, const char *palette_conversion_method, bool use_transparent, uint8_t transparent_rgb[3], bool rgba2_output) {
+    uint8_t *image_data = NULL;
+    int width, height;
+    if (!_read_png(src_file, &image_data, &width, &height)) {
+        return STREAM_READ_FAILED;
+    }
+    _convert_to_palette(image_data, width, height, palette, palette_conversion_method, use_transparent, transparent_rgb, 1);
+
+    int status = STREAM_OK;
+    if (rgba2_output) {
+        size_t num_pixels = (size_t)width * height;
+        FILE *outfile = fopen(tgt_file, "wb");
+        if (!outfile) {
+            status = STREAM_WRITE_FAILED;
+        } else {
+            // Pack in place: each output byte is written at or before the pixel it came from
+            _rgba32_to_rgba2(image_data, num_pixels, image_data);
+            if (fwrite(image_data, 1, num_pixels, outfile) != num_pixels) status = STREAM_WRITE_FAILED;
+            if (fclose(outfile) != 0) status = STREAM_WRITE_FAILED;
+        }
+    } else if (!_write_png(tgt_file, image_data, width, height)) {
+        status = STREAM_WRITE_FAILED;
+    }
+
+    free(image_data);
+    return status;
+}
+
+// Python-facing function: Convert a PNG to a palette a row at a time, writing PNG or RGBA2222
+PyObject* stream_convert(PyObject *self, PyObject *args, PyObject *kwargs) {
+    const char *src_file, *tgt_file, *palette_conversion_method;
+    const char *output = "png";
+    PyObject *palette_arg, *transparent_color = Py_None;
+
+    static char *kwlist[] = {"src_file", "tgt_file", "palette", "palette_conversion_method", "transparent_color", "output", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ssOs|Os", kwlist, &src_file, &tgt_file, &palette_arg, &palette_conversion_method, &transparent_color, &output)) {
+        return NULL;
+    }
+
+    bool rgba2_output;
+    if (strcasecmp(output, "png") == 0) {
+        rgba2_output = false;
+    } else if (strcasecmp(output, "rgba2") == 0) {
+        rgba2_output = true;
+    } else {
+        PyErr_Format(PyExc_ValueError, "Unknown output format '%s' (expected 'png' or 'rgba2')", output);
+        return NULL;
+    }
+
+    if (!_is_row_conversion_method(palette_conversion_method)) {
+        PyErr_Format(PyExc_ValueError, "Palette conversion method '%s' can't be streamed (use RGB, HSV or bayer)", palette_conversion_method);
+        return NULL;
+    }
+
+    uint8_t transparent_rgb[3];
+    bool use_transparent = _parse_transparent_color(transparent_color, transparent_rgb);
+    if (PyErr_Occurred()) {
+        return NULL;
+    }
+
+    PyObject *palette_obj = _palette_object_from_arg(palette_arg);
+    if (!palette_obj) {
+        return NULL;
+    }
+    Palette *palette = &((PaletteObject *)palette_obj)->palette;
+
+    int status;
+    Py_BEGIN_ALLOW_THREADS
+    status = _stream_convert_png(src_file, tgt_file, palette, palette_conversion_method, use_transparent, transparent_rgb, rgba2_output);
+    if (status == STREAM_INTERLACED) {
+        status = _stream_convert_whole_frame(src_file, tgt_file, palette, palette_conversion_method, use_transparent, transparent_rgb, rgba2_output);
+    }
+    Py_END_ALLOW_THREADS
+    Py_DECREF(palette_obj);
+
+    switch (status) {
+        case STREAM_OK:
+            Py_RETURN_NONE;
+        case STREAM_NO_MEMORY:
+            return PyErr_NoMemory();
+        case STREAM_READ_FAILED:
+            PyErr_SetString(PyExc_IOError, "Failed to load source PNG file");
+            return NULL;
+        default:
+            PyErr_SetString(PyExc_IOError, "Failed to write target file");
+            return NULL;
+    }
+}
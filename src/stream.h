@@ -0,0 +1,41 @@
+#ifndef STREAM_H
+#define STREAM_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#include <Python.h>
+#include "images.h"
+
+// ----------------------------------------------------------------
+// Row-streaming palette conversion:
+// Reads a PNG one row at a time, converts each row to the palette and
+// writes it straight out as PNG or RGBA2222, so peak memory is a couple
+// of rows rather than the whole frame. Only methods whose pixels don't
+// depend on other rows (RGB, HSV, bayer) can be streamed.
+// ----------------------------------------------------------------
+
+// Result codes for _stream_convert_png
+enum {
+    STREAM_OK,
+    STREAM_READ_FAILED,
+    STREAM_WRITE_FAILED,
+    STREAM_NO_MEMORY,
+    STREAM_INTERLACED  // Interlaced PNGs deliver rows in several passes and can't be streamed
+};
+
+// Convert src_file to tgt_file a row at a time, writing RGBA2222 if rgba2_output is set, else PNG.
+// The caller must check the method with _is_row_conversion_method first.
+// Pure C; safe to call with the GIL released.
+int _stream_convert_png(const char *src_file, const char *tgt_file, Palette *palette, const char *palette_conversion_method, bool use_transparent, const uint8_t transparent_rgb[3], bool rgba2_output);
+
+// stream_convert(src_file, tgt_file, palette, palette_conversion_method, transparent_color=None, output='png')
+// output is 'png' or 'rgba2'; interlaced sources fall back to whole-frame conversion
+PyObject* stream_convert(PyObject *self, PyObject *args, PyObject *kwargs);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // STREAM_H
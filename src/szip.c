@@ -1,4 +1,626 @@
+/* szip.c - szip 1.12 (c)1997-2000 Michael Schindler, built into agonutils
+
+   The szip distribution's modules follow one another in this file: bitmodel,
+   qsmodel, qsort_u4, rangecod, reorder, szip's block format, sz_mod4 and sz_srt,
+   with their headers gathered just below. Compared with the szip tool:
+     - the coders read and write memory buffers instead of stdin and stdout
+     - there is no global state, so several calls can run at once with the GIL released
+     - the sorters return errors instead of aborting, and corrupt input is rejected
+   The output is byte for byte what `szip -b<blocksize>o<order>` writes. */
+
+#define PY_SSIZE_T_CLEAN
+
 #include "szip.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+
+#if !defined port_h
+#define port_h
+
+typedef unsigned int uint;
+
+#if defined GCC
+#define Inline inline
+#else
+#define Inline __inline
+#endif
+
+/* change to 1 if types.h exists */
+#if 1
+#include <sys/types.h>
+#define uint2 u_int16_t
+#define uint4 u_int32_t
+/* uint is alredy defined in types.h */
+
+#else
+#include <limits.h>
+#if INT_MAX > 0x7FFF
+typedef unsigned short uint2;  /* two-byte integer (large arrays)      */
+typedef unsigned int   uint4;  /* four-byte integers (range needed)    */
+#else
+typedef unsigned int   uint2;
+typedef unsigned long  uint4;
+#endif /* INT_MAX */
+
+typedef unsigned int uint;     /* fast unsigned integer, 2 or 4 bytes  */
+
+#endif
+
+
+#endif
+#ifndef BITMODEL_H
+#define BITMODEL_H
+
+/*
+  bitmodel.h     headerfile for bit indexed trees probability model
+
+  (c) Michael Schindler
+  1997, 1998
+  http://www.compressconsult.com or http://eiunix.tuwien.ac.at/~michael
+  michael@compressconsult.com        michael@eiunix.tuwien.ac.at
+
+  based on: Peter Fenwick: A New Data Structure for Cumulative Probability Tables
+  Technical Report 88, Dep. of Computer Science, University of Auckland, NZ
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.  It may be that this
+  program violates local patents in your country, however it is
+  belived (NO WARRANTY!) to be patent-free here in Austria and I am
+  not aware of a violation elsewhere.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 59 Temple Place - Suite 330, Boston,
+  MA 02111-1307, USA.
+
+  Bitmodel implements bit indexed trees for frequency storage described
+  by Peter Fenwick: A New Data Structure for Cumulative Probability Tables
+  Technical Report 88, Dep. of Computer Science, University of Auckland, NZ.
+  It features a fast method for cumulative frequency storage and updating.
+  The difference to the fenwick paper is the way the table is recalculated
+  after rescaling; the method here is faster.
+
+  There is a compiletime switch; if EXCLUDEONUPDATE is defined symbols
+  are excluded on update; to be able to use them again you have to call
+  the include function for that symbol.
+
+  The module provides functions for creation, reset, deletion, query for
+  probabilities, queries for symbols, reenabling symbols and model updating.
+*/
+
+// #include "port.h"
+
+#define EXCLUDEONUPDATE
+
+typedef struct {
+    int n,             /* number of symbols */
+        totalfreq,     /* total frequency count (without excluded symbols) */
+        max_totf,      /* maximum allowed total frequency count */
+        incr,          /* increment per update */
+        mask;          /* initial bitmask used for search */
+    uint2 *f,          /* frequency for the symbol; first bit set if excluded */
+        *cf;           /* array of cumulative frequencies */
+} bitmodel;
+
+/* initialisation of bitmodel                          */
+/* m   bitmodel to be initialized                      */
+/* n   number of symbols in that model                 */
+/* max_totf  maximum allowed total frequency count     */
+/* rescale  desired rescaling interval, must be <max_totf/2 */
+/* init  array of int's to be used for initialisation (NULL ok) */
+static void initbitmodel( bitmodel *m, int n, int max_totf, int rescale,
+   int *init );
+
+/* reinitialisation of bitmodel                        */
+/* m   bitmodel to be initialized                      */
+/* init  array of int's to be used for initialisation (NULL ok) */
+static void resetbitmodel( bitmodel *m, int *init);
+
+
+/* deletion of bitmodel m                              */
+static void deletebitmodel( bitmodel *m );
+
+
+/* retrieval of estimated frequencies for a symbol     */
+/* m   bitmodel to be questioned                       */
+/* sym  symbol for which data is desired; must be <n   */
+/* sy_f frequency of that symbol                       */
+/* lt_f frequency of all smaller symbols together      */
+/* the total frequency can be obtained with bit_totf   */
+static void bitgetfreq( bitmodel *m, int sym, int *sy_f, int *lt_f);
+
+/* find out total frequency for a bitmodel             */
+/* m   bitmodel to be questioned                       */
+#define bittotf(m) ((m)->totalfreq)
+
+/* scales the culmulative frequency tables by 0.5 and keeps nonzero values */
+static void scalefreqbitmod(bitmodel *m);
+
+/* find out symbol for a given cumulative frequency    */
+/* m   bitmodel to be questioned                       */
+/* lt_f  cumulative frequency                          */
+static int bitgetsym( bitmodel *m, int lt_f );
+
+
+#ifdef EXCLUDEONUPDATE
+/* update model and exclude symbol                     */
+/* m   bitmodel to be updated                          */
+/* sym  symbol that occurred (must be <n from init)    */
+static void bitupdate_ex( bitmodel *m, int sym );
+
+
+/* deactivate symbol                                   */
+/* m   bitmodel to be updated                          */
+/* sym  symbol to be deactivated                       */
+static void bitdeactivate( bitmodel *m, int sym );
+
+/* reactivate symbol                                   */
+/* m   bitmodel to be updated                          */
+/* sym  symbol to be reactivated                       */
+static void bitreactivate( bitmodel *m, int sym );
+#endif
+
+#endif
+#ifndef QSMODEL_H
+#define QSMODEL_H
+
+/*
+  qsmodel.h     headerfile for quasistatic probability model
+
+  (c) Michael Schindler
+  1997, 1998
+  http://www.compressconsult.com/ or http://eiunix.tuwien.ac.at/~michael
+  michael@compressconsult.com        michael@eiunix.tuwien.ac.at
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.  It may be that this
+  program violates local patents in your country, however it is
+  belived (NO WARRANTY!) to be patent-free here in Austria.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 59 Temple Place - Suite 330, Boston,
+  MA 02111-1307, USA.
+
+  Qsmodel is a quasistatic probability model that periodically
+  (at chooseable intervals) updates probabilities of symbols;
+  it also allows to initialize probabilities. Updating is done more
+  frequent in the beginning, so it adapts very fast even without
+  initialisation.
+
+  it provides function for creation, deletion, query for probabilities
+  and symbols and model updating.
+
+  for usage see example.c
+*/
+
+// #include "port.h"
+
+typedef struct {
+    int n,             /* number of symbols */
+        left,          /* symbols to next rescale */
+        nextleft,      /* symbols with other increment */
+        rescale,       /* intervals between rescales */
+        targetrescale, /* should be interval between rescales */
+        incr,          /* increment per update */
+        searchshift;   /* shift for lt_freq before using as index */
+    uint2 *cf,         /* array of cumulative frequencies */
+        *newf,         /* array for collecting ststistics */
+        *search;       /* structure for searching on decompression */
+} qsmodel;
+
+/* initialisation of qsmodel                           */
+/* m   qsmodel to be initialized                       */
+/* n   number of symbols in that model                 */
+/* lg_totf  base2 log of total frequency count         */
+/* rescale  desired rescaling interval, should be < 1<<(lg_totf+1) */
+/* init  array of int's to be used for initialisation (NULL ok) */
+/* compress  set to 1 on compression, 0 on decompression */
+static void initqsmodel( qsmodel *m, int n, int lg_totf, int rescale,
+   int *init, int compress );
+
+/* reinitialisation of qsmodel                         */
+/* m   qsmodel to be initialized                       */
+/* init  array of int's to be used for initialisation (NULL ok) */
+static void resetqsmodel( qsmodel *m, int *init);
+
+
+/* deletion of qsmodel m                               */
+static void deleteqsmodel( qsmodel *m );
+
+
+/* retrieval of estimated frequencies for a symbol     */
+/* m   qsmodel to be questioned                        */
+/* sym  symbol for which data is desired; must be <n   */
+/* sy_f frequency of that symbol                       */
+/* lt_f frequency of all smaller symbols together      */
+/* the total frequency is 1<<lg_totf                   */
+static void qsgetfreq( qsmodel *m, int sym, int *sy_f, int *lt_f );
+
+
+/* find out symbol for a given cumulative frequency    */
+/* m   qsmodel to be questioned                        */
+/* lt_f  cumulative frequency                          */
+static int qsgetsym( qsmodel *m, int lt_f );
+
+
+/* update model                                        */
+/* m   qsmodel to be updated                           */
+/* sym  symbol that occurred (must be <n from init)    */
+static void qsupdate( qsmodel *m, int sym );
+
+#endif
+#ifndef rangecod_h
+#define rangecod_h
+
+/*
+  rangecod.h     headerfile for range encoding
+
+  (c) Michael Schindler
+  1997, 1998, 1999
+  http://www.compressconsult.com/ or http://eiunix.tuwien.ac.at/~michael
+  michael@compressconsult.com        michael@eiunix.tuwien.ac.at
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+  This program is distributed in the hope that it will be useful,
+  but WITHOUT ANY WARRANTY; without even the implied warranty of
+  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+  GNU General Public License for more details.  It may be that this
+  program violates local patents in your country, however it is
+  belived (NO WARRANTY!) to be patent-free here in Austria. Glen
+  Langdon also confirmed my poinion that IBM UK did not protect that
+  method.
+
+  You should have received a copy of the GNU General Public License
+  along with this program; if not, write to the Free Software
+  Foundation, Inc., 59 Temple Place - Suite 330, Boston,
+  MA 02111-1307, USA.
+
+  Range encoding is based on an article by G.N.N. Martin, submitted
+  March 1979 and presented on the Video & Data Recording Conference,
+  Southampton, July 24-27, 1979. If anyone can name the original
+  copyright holder of that article or locate G.N.N. Martin please
+  contact me; this might allow me to make that article available on
+  the net for general public.
+
+  Range coding is closely related to arithmetic coding, except that
+  it does renormalisation in larger units than bits and is thus
+  faster. An earlier version of this code was distributed as byte
+  oriented arithmetic coding, but then I had no knowledge of Martin's
+  paper from seventy-nine.
+
+  The input and output is done by the INBYTE and OUTBYTE macros
+  defined in the .c file; change them as needed; the first parameter
+  passed to them is a pointer to the rangecoder structure; extend that
+  structure as needed (and don't forget to initialize the values in
+  start_encoding resp. start_decoding). This version reads and writes
+  memory buffers (see szip_buffer).
+
+  There are no global or static var's, so if the IO is thread save the
+  whole rangecoder is - unless GLOBALRANGECODER is defined.
+
+  For error recovery the last 3 bytes written contain the total number
+  of bytes written since starting the encoder. This can be used to
+  locate the beginning of a block if you have only the end.
+
+  For some application using a global coder variable may provide a better
+  performance. This will allow you to use only one coder at a time and
+  will destroy thread savety. To enabble this feature uncomment the
+  #define GLOBALRANGECODER line below.
+*/
+/* Left off: the extension runs several coders at once, one per szip_compress
+   or szip_decompress call, with the GIL released. */
+/* #define GLOBALRANGECODER */
+
+
+// #include "port.h"
+#if 0    /* done in port.h */
+#include <limits.h>
+#if INT_MAX > 0xffff
+typedef unsigned int uint4;
+typedef unsigned short uint2;
+#else
+typedef unsigned long uint4;
+typedef unsigned int uint2;
+#endif
+#endif
+
+typedef uint4 code_value;       /* Type of an rangecode value       */
+                                /* must accomodate 32 bits          */
+/* it is highly recommended that the total frequency count is less  */
+/* than 1 << 19 to minimize rounding effects.                       */
+/* the total frequency count MUST be less than 1<<23                */
+
+typedef uint4 freq; 
+
+/* Growable output buffer the encoder and the block writer append to */
+typedef struct {
+    unsigned char *data;
+    size_t size, capacity;
+    int failed;          /* growing the buffer failed; later bytes were dropped */
+} szip_buffer;
+
+/* make the following private in the arithcoder object in C++	    */
+
+typedef struct {
+    uint4 low,           /* low end of interval */
+          range,         /* length of interval */
+          help;          /* bytes_to_follow resp. intermediate value */
+    unsigned char buffer;/* buffer for input/output */
+/* the following is used only when encoding */
+    uint4 bytecount;     /* counter for outputed bytes  */
+/* insert fields you need for input/output below this line! */
+    szip_buffer *out;             /* encoder output */
+    const unsigned char *in;      /* decoder input: next byte */
+    const unsigned char *in_end;  /* end of the input; reads past it return EOF */
+    int overrun;                  /* the decoder read past in_end */
+} rangecoder;
+
+
+/* supply the following as methods of the arithcoder object  */
+/* omit the first parameter then (C++)                       */
+#ifdef GLOBALRANGECODER
+#define start_encoding(rc,a,b) M_start_encoding(a,b)
+#define encode_freq(rc,a,b,c) M_encode_freq(a,b,c)
+#define encode_shift(rc,a,b,c) M_encode_shift(a,b,c)
+#define done_encoding(rc) M_done_encoding()
+#define start_decoding(rc) M_start_decoding()
+#define decode_culfreq(rc,a) M_decode_culfreq(a)
+#define decode_culshift(rc,a) M_decode_culshift(a)
+#define decode_update(rc,a,b,c) M_decode_update(a,b,c)
+#define done_decoding(rc) M_done_decoding()
+#endif
+
+
+/* Start the encoder                                         */
+/* rc is the range coder to be used                          */
+/* c is written as first byte in the datastream (header,...) */
+static void start_encoding( rangecoder *rc, char c, int initlength);
+
+
+/* Encode a symbol using frequencies                         */
+/* rc is the range coder to be used                          */
+/* sy_f is the interval length (frequency of the symbol)     */
+/* lt_f is the lower end (frequency sum of < symbols)        */
+/* tot_f is the total interval length (total frequency sum)  */
+/* or (a lot faster): tot_f = 1<<shift                       */
+static void encode_freq( rangecoder *rc, freq sy_f, freq lt_f, freq tot_f );
+static void encode_shift( rangecoder *rc, freq sy_f, freq lt_f, freq shift );
+
+/* Encode a byte/short without modelling                     */
+/* rc is the range coder to be used                          */
+/* b,s is the data to be encoded                             */
+#define encode_byte(ac,b)  encode_shift(ac,(freq)1,(freq)(b),(freq)8)
+#define encode_short(ac,s) encode_shift(ac,(freq)1,(freq)(s),(freq)16)
+
+
+/* Finish encoding                                           */
+/* rc is the range coder to be shut down                     */
+/* returns number of bytes written                           */
+static uint4 done_encoding( rangecoder *rc );
+
+
+
+/* Start the decoder                                         */
+/* rc is the range coder to be used                          */
+/* returns the char from start_encoding or EOF               */
+static int start_decoding( rangecoder *rc );
+
+/* Calculate culmulative frequency for next symbol. Does NO update!*/
+/* rc is the range coder to be used                          */
+/* tot_f is the total frequency                              */
+/* or: totf is 1<<shift                                      */
+/* returns the <= culmulative frequency                      */
+static freq decode_culfreq( rangecoder *rc, freq tot_f );
+static freq decode_culshift( rangecoder *ac, freq shift );
+
+/* Update decoding state                                     */
+/* rc is the range coder to be used                          */
+/* sy_f is the interval length (frequency of the symbol)     */
+/* lt_f is the lower end (frequency sum of < symbols)        */
+/* tot_f is the total interval length (total frequency sum)  */
+static void decode_update( rangecoder *rc, freq sy_f, freq lt_f, freq tot_f);
+#define decode_update_shift(rc,f1,f2,f3) decode_update((rc),(f1),(f2),(freq)1<<(f3));
+
+
+/* Finish decoding                                           */
+/* rc is the range coder to be used                          */
+static void done_decoding( rangecoder *rc );
+
+#endif
+#ifndef REORDER_H
+
+// #include "port.h"
+
+static void unreorder(unsigned char *in, unsigned char *out, uint4 length, uint recordsize);
+
+#endif // REORDER_H
+// SZ error messages
+#ifndef ERR_H
+#define ERR_H
+
+// the sorters return these (0 on success) instead of aborting
+
+// those are ok:
+#define NOMEM			0x6500
+#define SZ_NOMEM_HASH		0x6502
+#define SZ_NOMEM_SORT		0x6503
+
+// those are a bug:
+#define UNEXPECTED		0x6600
+#define SZ_NOTCYCLIC		0x6601
+#define SZ_NOTFOUND			0x6602
+#define SZ_NOTIMPLEMENTED	0x6603
+#define SZ_DOUBLEINDIRECT   0x6604
+#define AR_OUTSTANDING		0x6605
+
+#endif
+/* sz_model4.h (c) Michael Schindler 1998 */
+#ifndef SZ_MODEL4_H
+#define SZ_MODEL4_H
+
+// #include "port.h"
+// #include "qsmodel.h"
+// #include "bitmodel.h"
+// #include "rangecod.h"
+
+#define ALPHABETSIZE 256
+#define CACHESIZE 32
+#define MTFSIZE 20
+#define MTFHISTSIZE 256  /* must pe power of 2 */
+// #define MODELGLOBAL
+
+typedef struct {
+    uint sym, next;
+} mtfentry;
+
+typedef struct cacheS *cacheptr;
+
+typedef struct cacheS {
+    unsigned char symbol, sy_f, weight, what;
+    cacheptr next, prev;
+} cacheentry;
+
+typedef struct {
+    uint whatmod[3];  /* probabilities for the submodels */
+    cacheptr newest,  /* points to newest element in cache */
+             lastnew; /* points to last element with heigher weight */
+    uint cachetotf;   /* total frequency count in cache */
+    uint mtffirst;    /* where to find the newest entry in mtfhist */
+    uint mtfsize;     /* size of mtflist */
+    uint mtfsizeact;  /* size of active mtflist */
+    cacheptr lastseen[ALPHABETSIZE]; /* tell if and where symbol is in cache */
+    cacheentry cache[CACHESIZE]; /* cache */
+    mtfentry mtfhist[MTFHISTSIZE];
+    bitmodel full;    /* fallback model */
+    qsmodel mtfmod;   /* probabilities for mtf ranks */
+    qsmodel rlemod[5];
+    rangecoder ac;
+    uint compress;    /* 1 on compression, 0 on decompression */
+} sz_model;
+
+#ifdef MODELGLOBAL
+#define initmodel(m,a,b) M_initmodel(a,b)
+#define fixafterfirst(m) M_fixafterfirst()
+#define deletemodel(m) M_deletemodel()
+#define sz_finishrun(m) M_sz_finishrun()
+#define sz_encode(m,a,b) M_sz_encode(a,b)
+#define sz_decode(m,a,b) M_sz_decode(a,b)
+#endif
+
+
+/* initialisation if the model */
+/* headersize -1 means decompression */
+/* first is the first byte written by the arithcoder */
+static void initmodel(sz_model *m, int headersize, unsigned char *first);
+
+/* call fixafterfirst after encoding/decoding the first run */
+static void fixafterfirst(sz_model *m);
+
+/* deletion of the model */
+static void deletemodel(sz_model *m);
+
+/* encode/decode a run of equal symbols */
+static void sz_encode(sz_model *m, uint symbol, uint4 runlength);
+static void sz_decode(sz_model *m, uint *symbol, uint4 *runlength);
+
+
+#endif
+#ifndef SZ_SRT_H
+#define SZ_SRT_H
+// #include "port.h"
+
+
+// inout: bytes to be sorted; sorted bytes on return. must be length+order bytes long
+// length: number of bytes in inout
+// *indexlast: returns position of last context (needed for unsort)
+// order: order of context used in sorting (must be >=3)
+// the code assumes length>=order
+// and inout is length+order bytes long (only the first length need to be filled)
+// the sorters and unsorters return 0, or SZ_NOMEM_SORT or SZ_NOTCYCLIC (corrupt input)
+static int sz_srt(unsigned char *inout, uint4 length, uint4 *indexlast, unsigned int order);
+
+
+// in: bytes to be unsorted
+// out: unsorted bytes
+// length: number of bytes in in (and out)
+// indexlast: position of last context (as returned bt sorttrans)
+// counts: number of occurances of each byte in in (if NULL it will be calculated)
+// order: order of context used in sorting (must be >=3)
+// the code assumes length>=order
+static int sz_unsrt(unsigned char *in, unsigned char *out, uint4 length, uint4 indexlast,
+			   uint4 *counts, unsigned int order);
+
+
+// comment the following #defines if you dont want them
+#define SZ_SRT_O4
+#define SZ_SRT_BW
+
+// alternate sorter for order 4 (different method, same result)
+#if defined SZ_SRT_O4
+static int sz_srt_o4(unsigned char *inout, uint4 length, uint4 *indexlast);
+#endif
+
+
+#if defined SZ_SRT_BW
+// unlimited context sort (BWT but with context before symbol)
+static int sz_srt_BW(unsigned char *inout, uint4 length, uint4 *indexfirst);
+
+// unsorter for unlimited context sort
+static int sz_unsrt_BW(unsigned char *in, unsigned char *out, uint4 length,
+			   uint4 indexfirst, uint4 *counts);
+#endif
+#endif
+
+/* Make room for size more bytes in out. Returns 0, or -1 with out->failed set if memory ran out. */
+static int _szip_reserve(szip_buffer *out, size_t size)
+{
+    if (out->failed) {
+        return -1;
+    }
+    if (out->capacity - out->size >= size) {
+        return 0;
+    }
+    size_t capacity = out->capacity ? out->capacity : 4096;
+    while (capacity - out->size < size) {
+        capacity *= 2;
+    }
+    unsigned char *data = (unsigned char *)realloc(out->data, capacity);
+    if (!data) {
+        out->failed = 1;
+        return -1;
+    }
+    out->data = data;
+    out->capacity = capacity;
+    return 0;
+}
+
+static Inline void _szip_put(szip_buffer *out, unsigned char c)
+{
+    if (out->size < out->capacity || _szip_reserve(out, 1) == 0) {
+        out->data[out->size++] = c;
+    }
+}
 
 /*
   bitmodel.c     bit indexed trees probability model
@@ -182,7 +804,7 @@ int bitgetsym( bitmodel *m, int lt_f )
 static Inline void bit_cfupd( bitmodel *m, int sym, int delta )
 {   m->totalfreq += delta;
     if (m->totalfreq > m->max_totf)
-        scalefreq(m);
+        scalefreqbitmod(m);
     else
     {   uint2 *cf;
         sym++;
@@ -195,15 +817,6 @@ static Inline void bit_cfupd( bitmodel *m, int sym, int delta )
 }
 
 
-/* update model                                        */
-/* m   bitmodel to be updated                          */
-/* sym  symbol that occurred (must be <n from init)    */
-void bitupdate( bitmodel *m, int sym )
-{   m->f[sym] += m->incr;
-    bit_cfupd(m, sym, m->incr);
-}
-
-
 #ifdef EXCLUDEONUPDATE
 /* update model and exclude symbol                     */
 /* m   bitmodel to be updated                          */
@@ -211,190 +824,28 @@ void bitupdate( bitmodel *m, int sym )
 void bitupdate_ex( bitmodel *m, int sym )
 {   int delta;
     delta = -m->f[sym];
-    m->f[sym] = (m->f[sym] + m->incr) | 0x8000;
-    bit_cfupd(m, sym, delta);
-}
-
-
-/* deactivate symbol                                   */
-/* m   bitmodel to be updated                          */
-/* sym  symbol to be reactivated                       */
-void bitdeactivate( bitmodel *m, int sym )
-{   bit_cfupd(m, sym, -m->f[sym]);
-    m->f[sym] |= 0x8000;
-}
-
-
-/* reactivate symbol                                   */
-/* m   bitmodel to be updated                          */
-/* sym  symbol to be reactivated                       */
-void bitreactivate( bitmodel *m, int sym )
-{   m->f[sym] &= 0x7fff;
-    bit_cfupd(m, sym, m->f[sym]);
-}
-#endif
-
-/* check.c - checks stdin for equality with a given file,
-reports filename to logfile if not equal */
-
-#include <stdio.h>
-#include <stdlib.h>
-#ifndef unix
-// #include <io.h>
-#include <fcntl.h>
-#endif
-
-void usage()
-{	fprintf(stderr,"check <otherfile> <logfile>\n");
-	exit(2);
-}
-
-
-void bugfound(char *filename, char *logfilename)
-{   FILE *logfil;
-    logfil = fopen( logfilename, "ab" );
-    fprintf(logfil,"%s\n",filename);
-    fclose(logfil);
-    exit(1);
-}
-
-int main( int argc, char *argv[] )
-{   FILE *infil;
-    int ch;
-    if (argc!=3) usage();
-
-    infil = fopen( argv[1], "rb" );
-    if (infil==NULL) bugfound(argv[1],argv[2]);
-
-
-#ifndef unix
-    setmode( fileno( infil ), O_BINARY );
-    setmode( fileno( stdin ), O_BINARY );
-#endif
-
-    while ((ch=getchar()) != EOF)
-        if (getc(infil) != ch)
-        {   fclose(infil);
-            bugfound(argv[1],argv[2]);
-        }
-    if (getc(infil) != EOF)
-        {   fclose(infil);
-            bugfound(argv[1],argv[2]);
-        }
-    return 0;
-}
-
-// #include "rangecod.c"
-// #include "qsmodel.c"
-// #include "bitmodel.c"
-// #include "sz_mod4.c"
-// #include "szip.c"
-// #include "sz_srt.c"
-// #include "reorder.c"
-
-/* extract.c - extracts buggy datablocks for szip 1.10 */
-
-#include <stdio.h>
-#include <stdlib.h>
-#include <ctype.h>
-#ifndef unix
-// #include <io.h>
-#include <fcntl.h>
-#endif
-
-void usage()
-{	fprintf(stderr,"extract [blocksize] originalfile corruptfile logfile [errorblockfile]\n");
-    fprintf(stderr,"the blocksize must be the same as used with szip (example: -b1)\n");
-	exit(2);
-}
-
-int readnum(char *s, int min, int max)
-{	int j=0;
-	while (isdigit(*s))
-	{	j=10*j+*s-'0';
-		s++;
-	}
-	if (j<min || j>max)
-		usage();
-	return j;
-}
-
-
-void bugfound(unsigned char *buffer, size_t bufsize, char *logfilename,
-char *blockfilename)
-{   FILE *blockfil;
-    size_t writebytes;
-    blockfil = fopen( logfilename, "ab" );
-    fprintf(blockfil,"%s\n",blockfilename);
-    fclose(blockfil);
-    blockfil = fopen( blockfilename, "wb" );
-#ifndef unix
-    setmode( fileno( blockfil ), O_BINARY );
-#endif
-    writebytes = fwrite( (char *)buffer, 1, (size_t)bufsize, blockfil);
-    fclose(blockfil);
-    if (writebytes==bufsize)
-        exit(1);
-    else
-        exit(2);
+    m->f[sym] = (m->f[sym] + m->incr) | 0x8000;
+    bit_cfupd(m, sym, delta);
 }
 
 
-size_t blocksize=1703936;
-
-int main( int argc, char *argv[] )
-{   unsigned char *infilename=NULL, *outfilename=NULL,
-        *blockfilename=NULL, *logfilename=NULL, *buffer;
-    FILE *infil, *outfil;
-    size_t i, bufsize;
-
-    for (i=1; i<(unsigned)argc; i++)
-	{	char *s=argv[i];
-	    if (*s == '-')
-		{	s++;
-			if (*s=='b')
-                blocksize = (100000*readnum(s+1,1,41)+0x7fff) & 0x7fff8000L;
-            else
-                usage();
-        }
-		else if (infilename == NULL)
-			infilename = s;
-		else if (outfilename == NULL)
-			outfilename = s;
-		else if (logfilename == NULL)
-			logfilename = s;
-		else if (blockfilename == NULL)
-			blockfilename = s;
-		else
-			usage();
-	}
-    if (logfilename==NULL)
-        usage();
-
-    infil = fopen( infilename, "rb" );
-    outfil = fopen( outfilename, "rb" );
+/* deactivate symbol                                   */
+/* m   bitmodel to be updated                          */
+/* sym  symbol to be reactivated                       */
+void bitdeactivate( bitmodel *m, int sym )
+{   bit_cfupd(m, sym, -m->f[sym]);
+    m->f[sym] |= 0x8000;
+}
 
-#ifndef unix
-    setmode( fileno( infil ), O_BINARY );
-    setmode( fileno( outfil ), O_BINARY );
-#endif
 
-    buffer = (unsigned char*) malloc(blocksize);
-    do
-    {   bufsize = fread( (char *)buffer, 1, (size_t)blocksize, infil);
-        for (i=0; i<bufsize; i++)
-            if (buffer[i] != getc(outfil))
-            {   fclose(infil);
-                fclose(outfil);
-                // bugfound(buffer,bufsize,logfilename,blockfilename);
-                bugfound(logfilename,blockfilename);
-            }
-    } while (bufsize==blocksize);
-    fclose(infil);
-    fclose(outfil);
-    return 0;
+/* reactivate symbol                                   */
+/* m   bitmodel to be updated                          */
+/* sym  symbol to be reactivated                       */
+void bitreactivate( bitmodel *m, int sym )
+{   m->f[sym] &= 0x7fff;
+    bit_cfupd(m, sym, m->f[sym]);
 }
-
+#endif
 /*
   qsmodel.c     headerfile for quasistatic probability model
 
@@ -585,7 +1036,6 @@ void qsupdate( qsmodel *m, int sym )
     m->left--;
     m->newf[sym] += m->incr;
 }
-
 // #include "port.h"
 #include <stdlib.h>
 
@@ -593,7 +1043,7 @@ void qsupdate( qsmodel *m, int sym )
 
 
 /* prototypes for local routines */
-void shortsort ( uint4 *lo, uint4 *hi, unsigned char *data, uint4 minmatch );
+static void shortsort ( uint4 *lo, uint4 *hi, unsigned char *data, uint4 minmatch );
 
 static Inline int qscmp(uint4 a, uint4 b, unsigned char *data, uint4 *ml)
 {	unsigned char *a1,*b1;
@@ -920,8 +1370,8 @@ void shortsort ( uint4 *lo, uint4 *hi, unsigned char *data, uint4 minmatch )
   defined in the .c file; change them as needed; the first parameter
   passed to them is a pointer to the rangecoder structure; extend that
   structure as needed (and don't forget to initialize the values in
-  start_encoding resp. start_decoding). This distribution writes to
-  stdout and reads from stdin.
+  start_encoding resp. start_decoding). This version reads and writes
+  memory buffers (see szip_buffer).
 
   There are no global or static var's, so if the IO is thread save the
   whole rangecoder is.
@@ -955,7 +1405,7 @@ void shortsort ( uint4 *lo, uint4 *hi, unsigned char *data, uint4 minmatch )
 */
 #define EXTRAFAST
 
-#include <stdio.h>		/* fprintf(), getchar(), putchar(), NULL */
+#include <stdio.h>		/* EOF */
 // #include "port.h"
 // #include "rangecod.h"
 
@@ -966,10 +1416,10 @@ void shortsort ( uint4 *lo, uint4 *hi, unsigned char *data, uint4 minmatch )
 
 
 /* all IO is done by these macros - change them if you want to */
-/* no checking is done - do it here if you want it             */
+/* output grows cod->out; input past cod->in_end reads as EOF  */
 /* cod is a pointer to the used rangecoder                     */
-#define outbyte(cod,x) putchar(x)
-#define inbyte(cod)    getchar()
+#define outbyte(cod,x) _szip_put((cod)->out, (unsigned char)(x))
+#define inbyte(cod)    ((cod)->in < (cod)->in_end ? (int)*(cod)->in++ : ((cod)->overrun = 1, EOF))
 
 
 #ifdef RENORM95
@@ -980,19 +1430,6 @@ void shortsort ( uint4 *lo, uint4 *hi, unsigned char *data, uint4 minmatch )
 #define EXTRA_BITS ((CODE_BITS-2) % 8 + 1)
 #define Bottom_value (Top_value >> 8)
 
-#ifdef NOWARN
-#ifdef GLOBALRANGECODER
-char coderversion[]="rangecode 1.1c NOWARN GLOBAL (c) 1997-1999 Michael Schindler";
-#else
-char coderversion[]="rangecode 1.1c NOWARN (c) 1997-1999 Michael Schindler";
-#endif
-#else    /*NOWARN*/
-#ifdef GLOBALRANGECODER
-char coderversion[]="rangecode 1.1c GLOBAL (c) 1997-1999 Michael Schindler";
-#else
-char coderversion[]="rangecode 1.1c (c) 1997-1999 Michael Schindler";
-#endif
-#endif   /*NOWARN*/
 #endif   /*RENORM95*/
 
 
@@ -1162,11 +1599,9 @@ freq decode_culfreq( rangecoder *rc, freq tot_f )
     dec_normalize(rc);
     RNGC.help = RNGC.range/tot_f;
     tmp = RNGC.low/RNGC.help;
-#ifdef EXTRAFAST
-    return tmp;
-#else
+    /* clamped even with EXTRAFAST: valid data never needs it, but
+       corrupt data would look up symbols past the end of the models */
     return (tmp>=tot_f ? tot_f-1 : tmp);
-#endif
 }
 
 freq decode_culshift( rangecoder *rc, freq shift )
@@ -1174,11 +1609,7 @@ freq decode_culshift( rangecoder *rc, freq shift )
     dec_normalize(rc);
     RNGC.help = RNGC.range>>shift;
     tmp = RNGC.low/RNGC.help;
-#ifdef EXTRAFAST
-    return tmp;
-#else
     return (tmp>>shift ? ((code_value)1<<shift)-1 : tmp);
-#endif
 }
 
 
@@ -1202,21 +1633,6 @@ void Inline decode_update( rangecoder *rc, freq sy_f, freq lt_f, freq tot_f)
 }
 
 
-/* Decode a byte/short without modelling                     */
-/* rc is the range coder to be used                          */
-unsigned char decode_byte(rangecoder *rc)
-{   unsigned char tmp = decode_culshift(rc,8);
-    decode_update( rc,1,tmp,(freq)1<<8);
-    return tmp;
-}
-
-unsigned short decode_short(rangecoder *rc)
-{   unsigned short tmp = decode_culshift(rc,16);
-    decode_update( rc,1,tmp,(freq)1<<16);
-    return tmp;
-}
-
-
 /* Finish decoding                                           */
 /* rc is the range coder to be used                          */
 void done_decoding( rangecoder *rc )
@@ -1225,127 +1641,12 @@ void done_decoding( rangecoder *rc )
 
 // #include "port.h"
 
-void reorder(unsigned char *in, unsigned char *out, uint4 length, uint recordsize)
-{	uint4 i,j;
-	for (i=0; i<recordsize; i++)
-		for(j=i; j<length; j+=recordsize)
-			*(out++) = in[j];
-}
-
 void unreorder(unsigned char *in, unsigned char *out, uint4 length, uint recordsize)
 {	uint4 i,j;
 	for (i=0; i<recordsize; i++)
 		for(j=i; j<length; j+=recordsize)
 			out[j] = *(in++);
 }
-
-/* b_i_t.c                                                                   */
-/* this implements bit indexed trees for culmulative frequency storeage      */
-/* described in                                                              */
-/* Peter Fenwick: A New Data Structure for Cumulative Probability Tables     */
-/* Technical Report 88, Dep. of Computer Science, University of Auckland, NZ */
-/* I used it in Pascal in 1993? for random number generation                 */
-
-// #include "sz_bit.h"
-#include <stdio.h>
-#include <stdlib.h>
-
-/* returns the culmulative frequency <= the given symbol */
-Inline freq getcf(symb s, cumtbl *tbl)
-{ freq sum, *cf;
-  sum = (cf=tbl->cf)[s+1] - tbl->f[s];
-  s++;
-  while (s &= s-1)
-    sum += cf[s];
-  return sum;
-}
-
-/* updates the given culmulative frequency */
-Inline void updatecumonly(symb s, cumtbl *tbl, int delta)
-{ freq *cf;
-  symb size;
-  tbl->totfreq += delta;
-  s++;
-  cf = tbl->cf;
-  size = tbl->size;
-  while (s<=size) {
-     cf[s] += delta;
-     s = (s | (s-1)) + 1;
-  }
-}
-
-/* get symbol for this culmulative frequency */
-Inline symb getsym(freq f, cumtbl *tbl)
-{ symb s, m, x, size;
-  freq *cf;
-  m = tbl->mask;
-  size = tbl->size;
-  cf = tbl->cf;
-  s = 0;
-  do {
-    if ((x=s|m) <= size && f >= cf[x]) {
-      f -= cf[x];
-      s = x;
-    }
-  } while (m >>= 1);
-  return s;
-}
-
-#define RECALC(cond) {                   \
-  symb i;                                \
-  freq *cf;                              \
-  cf = tbl->cf;                          \
-  tbl->totfreq = 0;                      \
-  for (i=1; i<=tbl->size; i<<=1) {       \
-    symb j;                              \
-    for (j=i; j<=tbl->size; j+= i<<1) {  \
-      symb k;                            \
-      if (cond)                          \
-        cf[j] = 0;                       \
-      else                               \
-        tbl->totfreq += cf[j] = tbl->f[j-1];\
-      for (k=i>>1; k; k>>=1)             \
-        cf[j] += cf[j-k];                \
-    } /* end for j */                    \
-  } /* end for i */                      \
-}
-
-/* scales the culmulative frequency tables by 0.5 and keeps nonzero values */
-void scalefreq(cumtbl *tbl)
-{ freq *f, *endf;
-  for (f=tbl->f, endf = f+tbl->size; f<endf; f++)
-     *f = (*f + 1)>>1;
-  RECALC(0);
-}
-
-/* scales the culmulative frequency tables by 0.5 and keeps nonzero values */
-void scalefreqcond(cumtbl *tbl, uint *donotuse)
-{ freq *f, *endf;
-  for (f=tbl->f, endf = f+tbl->size; f<endf; f++)
-     *f = (*f + 1)>>1;
-  RECALC(donotuse[j-1]!=3);
-}
-
-/* allocates memory for the frequency table and initializes it */
-int initfreq(cumtbl *tbl, symb tblsize, freq initvalue)
-{ symb i;
-  if ((tbl->f = (freq*)malloc(2*tblsize*sizeof(freq))) == NULL) return 1;
-  tbl->cf = tbl->f + tblsize - 1;
-  tbl->size = tblsize;
-  tbl->mask = 1;
-  while (tblsize>>=1)
-     tbl->mask <<=1;
-  for (i=0; i<tbl->size; i++)
-     tbl->f[i] = initvalue;
-  RECALC(0);
-  return 0;
-}
-
-/* does the obvious thing */
-void freefreq(cumtbl *tbl)
-{ free(tbl->f);
-}
-
 /* szip.c                                                                   *
 *                                                                           *
 *  written by Michael Schindler michael@compressconsult.com                 *
@@ -1354,228 +1655,166 @@ void freefreq(cumtbl *tbl)
 
 static char vmayor=1, vminor=12;
 
-#include <stdio.h>
-#include <stdlib.h>
-#ifndef unix
-// #include <io.h>
-#include <fcntl.h>
-#endif
-#include <string.h>
-#include <ctype.h>
-// #include "szip.h"
-#include <sys/stat.h>
-
-#define BLOCK_SIZE (1 << SIZE_SHIFT)
 #define COMPRESSION_TYPE_SZIP 'S'
 
-static void usage()
-{   fprintf(stderr,"szip %d.%d (c)1997-2000 Michael Schindler, szip@compressconsult.com\n",
-        vmayor, vminor);
-    fprintf(stderr,"homepage: http://www.compressconsult.com/szip/\n");
-    fprintf(stderr,"usage: szip [options] [inputfile [outputfile]]\n");
-    fprintf(stderr,"option           meaning              default   range\n");
-    fprintf(stderr,"-d               decompress\n");
-    fprintf(stderr,"-b<blocksize>    blocksize in 100kB   -b1      1-41\n"); // default block size to minimum for ESP32-friendly decompression
-    fprintf(stderr,"-o<order>        order of context     -o6       0, 3-255\n");
-    fprintf(stderr,"-r<recordsize>   recordsize           -r1       1-127\n");
-    fprintf(stderr,"-i               incremental          -i\n");
-    fprintf(stderr,"-v<level>        verbositylevel       -v0       0-255\n");
-    fprintf(stderr,"options may be combined into one, like -r3i\n");
-    exit(1);
-}
-
-static int readnum(char **s, int min, int max)
-{	int j=0;
-	while (isdigit(**s))
-	{	j=10*j+**s-'0';
-		*s += 1;
-	}
-	if (j<min || j>max)
-		usage();
-	return j;
+/* Largest block the szip tool writes (-b41); the unsorter can't go past 1<<23 */
+#define SZIP_MAX_BLOCK_SIZE 4128768
+/* Most output to allocate up front from the size in the header, which may be wrong */
+#define SZIP_SIZE_HINT_MAX (1 << 26)
+
+/* input for the block reader; szip blocks hand it on to the range decoder */
+typedef struct {
+    const unsigned char *pos, *end;
+} szip_reader;
+
+static Inline int readbyte(szip_reader *in)
+{   return in->pos < in->end ? *(in->pos++) : EOF;
 }
 
-/* parameter values */
-// uint4 blocksize=1703936;
-uint4 blocksize = 32768; // 32 KB = 0x8000, ESP32-friendly default
-uint order=6, verbosity=0, compress=1;
-unsigned char recordsize=1;
 
-static void no_szip()
-{   fprintf(stderr, "probably not an szip file; could be szip version prior to 1.10\n");
-    exit(1);
+/* -b<blocksize>: in units of 100kB, at least 32kB and rounded up to 32kB */
+static uint4 blockbytes(uint blocksize)
+{   uint4 custom_size = blocksize * 100000;
+    if (custom_size < 32768)
+        custom_size = 32768;
+    return (custom_size + 0x7fff) & 0x7FFF8000L;
 }
 
-static void writeglobalheader(uint4 orig_size) 
+
+static void writeglobalheader(szip_buffer *out, uint4 orig_size)
 {   /* Write Agon compression header prefix: "Cmp" and COMPRESSION_TYPE_SZIP */
-    putchar('C');
-    putchar('m');
-    putchar('p');
-    putchar(COMPRESSION_TYPE_SZIP);
+    _szip_put(out, 'C');
+    _szip_put(out, 'm');
+    _szip_put(out, 'p');
+    _szip_put(out, COMPRESSION_TYPE_SZIP);
     /* Write original file size (4 bytes, little-endian order) */
-    putchar(orig_size & 0xFF);
-    putchar((orig_size >> 8) & 0xFF);
-    putchar((orig_size >> 16) & 0xFF);
-    putchar((orig_size >> 24) & 0xFF);
+    _szip_put(out, orig_size & 0xFF);
+    _szip_put(out, (orig_size >> 8) & 0xFF);
+    _szip_put(out, (orig_size >> 16) & 0xFF);
+    _szip_put(out, (orig_size >> 24) & 0xFF);
     /* write SZIP magic SZ\012\004 and version numbers */
-    putchar(0x53); // S
-    putchar(0x5a); // Z
-    putchar(0x0a); // \n
-    putchar(0x04); // \004
-    putchar(vmayor); /* version mayor of first version using the format */
-    putchar(vminor); /* version minor of first version using the format */
+    _szip_put(out, 0x53); // S
+    _szip_put(out, 0x5a); // Z
+    _szip_put(out, 0x0a); // \n
+    _szip_put(out, 0x04); // \004
+    _szip_put(out, vmayor); /* version mayor of first version using the format */
+    _szip_put(out, vminor); /* version minor of first version using the format */
 }
 
-static void readglobalheader()
+static int readglobalheader(szip_reader *in, uint4 *orig_size)
 {   /* Verify the Agon compression header prefix */
-    if (getchar() != 'C') no_szip();
-    if (getchar() != 'm') no_szip();
-    if (getchar() != 'p') no_szip();
-    if (getchar() != COMPRESSION_TYPE_SZIP) no_szip();
-    /* Read the original file size (4 bytes, little-endian order).
-       We could store this value if needed; for now we just read and ignore it. */
-    uint4 orig_size = 0;
-    orig_size |= (uint4)(unsigned char)getchar();
-    orig_size |= (uint4)(unsigned char)getchar() << 8;
-    orig_size |= (uint4)(unsigned char)getchar() << 16;
-    orig_size |= (uint4)(unsigned char)getchar() << 24;
+    if (readbyte(in) != 'C') return SZIP_BAD_DATA;
+    if (readbyte(in) != 'm') return SZIP_BAD_DATA;
+    if (readbyte(in) != 'p') return SZIP_BAD_DATA;
+    if (readbyte(in) != COMPRESSION_TYPE_SZIP) return SZIP_BAD_DATA;
+    /* Read the original file size (4 bytes, little-endian order) */
+    if (in->end - in->pos < 4) return SZIP_BAD_DATA;
+    *orig_size = (uint4)in->pos[0] | (uint4)in->pos[1] << 8
+        | (uint4)in->pos[2] << 16 | (uint4)in->pos[3] << 24;
+    in->pos += 4;
 
     /* Verify the SZIP magic SZ\012\004 and version numbers */
     int ch, vmay;
-    ch = getchar();
-    if (ch == EOF) return;
-    if (ch == 0x42) {ungetc(ch, stdin); return;} /* maybe blockheader */
-    if (ch != 0x53) no_szip();
-    if (getchar() != 0x5a) no_szip();
-    if (getchar() != 0x0a) no_szip();
-    if (getchar() != 0x04) no_szip();
-    vmay = getchar();
-    if (vmay == EOF || vmay==0) no_szip();
-    ch = getchar();
-    if (ch == EOF) no_szip();
-    if (vmay>vmayor || (vmay==vmayor && ch>vminor))
-    {   fprintf(stderr, "This file is szip version %d.%d, this program is %d.%d.\n Please update\n",
-        vmay, ch, vmayor, vminor);
-        exit(1);
-    }
-    if (vmay==1 && ch==10)
-    {   fprintf(stderr, "This file is szip version 1.10ALPHAi");
-        fprintf(stderr, "A decoder is available at the website http://www.compressconsult.com");
-        exit(1);
-    }
+    ch = readbyte(in);
+    if (ch == EOF) return SZIP_OK;
+    if (ch == 0x42) {in->pos--; return SZIP_OK;} /* maybe blockheader */
+    if (ch != 0x53) return SZIP_BAD_DATA;
+    if (readbyte(in) != 0x5a) return SZIP_BAD_DATA;
+    if (readbyte(in) != 0x0a) return SZIP_BAD_DATA;
+    if (readbyte(in) != 0x04) return SZIP_BAD_DATA;
+    vmay = readbyte(in);
+    if (vmay == EOF || vmay==0) return SZIP_BAD_DATA;
+    ch = readbyte(in);
+    if (ch == EOF) return SZIP_BAD_DATA;
+    /* a newer version, or 1.10ALPHA, which has its own decoder */
+    if (vmay>vmayor || (vmay==vmayor && ch>vminor) || (vmay==1 && ch==10))
+        return SZIP_BAD_DATA;
+    return SZIP_OK;
 }
 
 
-static void writeuint3(uint4 x)
-{   putchar((char)((x>>16)&0xff));
-    putchar((char)((x>>8)&0xff));
-    putchar((char)(x&0xff));
+static void writeuint3(szip_buffer *out, uint4 x)
+{   _szip_put(out, (char)((x>>16)&0xff));
+    _szip_put(out, (char)((x>>8)&0xff));
+    _szip_put(out, (char)(x&0xff));
 }
 
 
-static uint4 readuint3()
+/* past the end of the input this returns garbage, which the callers reject */
+static uint4 readuint3(szip_reader *in)
 {   uint4 x;
-    x = getchar();
-    x = x<<8 | getchar();
-    x = x<<8 | getchar();
+    x = readbyte(in);
+    x = x<<8 | readbyte(in);
+    x = x<<8 | readbyte(in);
     return x;
 }
 
 
-static uint writeblockdir(uint4 buflen)
+static uint writeblockdir(szip_buffer *out, uint4 buflen)
 {   /* write magic */
-    putchar(0x42);
-    putchar(0x48);
-    writeuint3(buflen);
-    putchar(0);   /* FIXME: empty filename to indicate end of dir */
+    _szip_put(out, 0x42);
+    _szip_put(out, 0x48);
+    writeuint3(out, buflen);
+    _szip_put(out, 0);   /* FIXME: empty filename to indicate end of dir */
     return 6;
 }
 
 
-static uint readblockdir(uint4 *buflen)
+/* returns the directory size, 0 at the end of the input or -1 if it isn't a directory */
+static int readblockdir(szip_reader *in, uint4 *buflen)
 {   int ch;
-    ch = getchar();
+    ch = readbyte(in);
     if (ch == EOF) {*buflen = 0; return 0;}
-    if (ch == 0x53)
-    {   ungetc(ch, stdin);
-        readglobalheader();
-        ch=getchar();
-        if (ch == EOF) {*buflen = 0; return 0;}
-    }
-    if (ch != 0x42) no_szip();
-    if (getchar() != 0x48) no_szip();
-    *buflen = readuint3();
-    if (getchar() != 0) no_szip();  /* FIXME: read until empty filename */
+    if (ch != 0x42) return -1;
+    if (readbyte(in) != 0x48) return -1;
+    *buflen = readuint3(in);
+    if (readbyte(in) != 0) return -1;  /* FIXME: read until empty filename */
     return 6;
-} 
+}
 
 
-static void writestorblock(uint dirsize, uint4 buflen, unsigned char *buffer)
-{   unsigned char *end;
-    if (verbosity&1) fprintf( stderr, "Storing %d bytes ...", buflen);
-    putchar(0); /* 0 means stored block */
-    end = buffer + buflen;
-    while (buffer<end)
-    {   putchar(*buffer);
-        buffer++;
+static void writestorblock(szip_buffer *out, uint dirsize, uint4 buflen, const unsigned char *buffer)
+{   _szip_put(out, 0); /* 0 means stored block */
+    if (_szip_reserve(out, buflen) == 0)
+    {   memcpy(out->data + out->size, buffer, buflen);
+        out->size += buflen;
     }
-    writeuint3(dirsize+4+buflen);
+    writeuint3(out, dirsize+4+buflen);
 }
 
 
-static void readstorblock(uint dirsize, uint4 buflen, unsigned char *buffer)
-{   if (verbosity&1) fprintf( stderr, "Reading %d bytes ...", buflen);
-    if (fread(buffer,1,buflen,stdin) != buflen)
-    {   fprintf(stderr,"Error reading input\n"); exit(1);}
-    if (fwrite(buffer,1,buflen,stdout) != buflen)
-    {   fprintf(stderr,"Error writing output\n"); exit(1);}
-    if (readuint3() != dirsize+3+buflen) no_szip();
+static int readstorblock(szip_reader *in, uint dirsize, uint4 buflen, unsigned char *buffer)
+{   if ((size_t)(in->end - in->pos) < buflen)
+        return SZIP_BAD_DATA;
+    memcpy(buffer, in->pos, buflen);
+    in->pos += buflen;
+    if (readuint3(in) != dirsize+3+buflen) return SZIP_BAD_DATA;
+    return SZIP_OK;
 }
 
-   
-static void writeszipblock(uint dirsize, uint4 buflen, unsigned char *buffer)
-{   uint4 indexlast;
-#ifndef MODELGLOBAL
-    sz_model m;
-#endif
-    if (verbosity&1) fprintf( stderr, "Processing %d bytes ...", buflen);
-    putchar(1); /* 1 means szip block */
-    if ((recordsize&0x7f) != 1)
-    {	unsigned char *tmp;
-		tmp = (unsigned char*) malloc(buflen+order);
-		if (tmp==NULL)
-		{	fprintf(stderr, "memory allocation error\n");
-			exit(1);
-		}
-		reorder(buffer,tmp,buflen,recordsize&0x7f);
-        memcpy(buffer,tmp,buflen);
-		free(tmp);
-	}
 
-    if (recordsize &0x80)
-	{	unsigned char tmp = *buffer;
-        uint4 i;
-		for (i=1; i<buflen; i++)
-		{	unsigned char tmp1 = buffer[i];
-			buffer[i] = (0x100 + tmp1 - tmp) & 0xff;
-			tmp = tmp1;
-		}
-	}
+/* buffer holds buflen bytes and has room for order+1 more */
+static int writeszipblock(szip_buffer *out, uint dirsize, uint4 buflen, unsigned char *buffer, uint order)
+{   uint4 indexlast=0;
+    unsigned char recordsize=1;
+    int err;
+    sz_model m;
+    _szip_put(out, 1); /* 1 means szip block */
 
     if (order==4)
-		sz_srt_o4(buffer,buflen,&indexlast);
-	else if (order==0)
-		sz_srt_BW(buffer,buflen,&indexlast);
-	else
-		sz_srt(buffer,buflen,&indexlast,order);
-
-    if (verbosity&1) fprintf(stderr," coding ...");
+        err = sz_srt_o4(buffer,buflen,&indexlast);
+    else if (order==0)
+        err = sz_srt_BW(buffer,buflen,&indexlast);
+    else
+        err = sz_srt(buffer,buflen,&indexlast,order);
+    if (err)
+        return SZIP_NO_MEMORY;
 
-    writeuint3(indexlast);
-    putchar((char)(order&0xff));
+    writeuint3(out, indexlast);
+    _szip_put(out, (char)(order&0xff));
 
+    m.ac.out = out;
     initmodel(&m, dirsize+5, &recordsize);
-    /* FIXME: write recordsize with putchar with planned output */
 
   { unsigned char *end;
     end = buffer+buflen;
@@ -1598,50 +1837,39 @@ static void writeszipblock(uint dirsize, uint4 buflen, unsigned char *buffer)
     }
   }
 
-    // #ifndef MODELGLOBAL
-    //     FILE *model_file = fopen("0szip_model.bin", "wb");
-    //     fwrite(&m, sizeof(sz_model), 1, model_file);
-    //     fclose(model_file);
-    // #else
-    //     fwrite(m, sizeof(sz_model), 1, model_file);
-    // #endif // MODELGLOBAL
-
     deletemodel(&m);
+    return SZIP_OK;
 }
 
 
-static void readszipblock(uint dirsize, uint4 buflen, unsigned char *buffer)
-{   unsigned char *tmp;
+/* decodes into buffer, then unsorts into out; both hold buflen bytes */
+static int readszipblock(szip_reader *in, uint dirsize, uint4 buflen, unsigned char *buffer,
+                         unsigned char *out)
+{   unsigned char *tmp, recordsize;
     uint4 indexlast, charcount[256], bytesleft;
-#ifndef MODELGLOBAL
+    int order, err;
     sz_model m;
-#endif
-    if (verbosity&1) fprintf( stderr, "Decoding %d bytes ", buflen);
-    indexlast = readuint3();
-    order = getchar();
-
-	memset(charcount, 0, 256*sizeof(uint4));
+    indexlast = readuint3(in);
+    order = readbyte(in);
+    /* the encoder stores blocks this short, and only writes these orders */
+    if (buflen<=5 || order==EOF || order==1 || order==2 || (uint4)order>=buflen)
+        return SZIP_BAD_DATA;
+
+    memset(charcount, 0, 256*sizeof(uint4));
+    m.ac.in = in->pos;
+    m.ac.in_end = in->end;
+    m.ac.overrun = 0;
     initmodel(&m, -1, &recordsize);
 
-    if (verbosity&1)
-    {   if (order != 6)
-            fprintf( stderr, "-o%d ",order);
-        if ((recordsize & 0x7f) != 1)
-            fprintf( stderr, "-r%d ",recordsize&0x7f);
-        if (recordsize & 0x80)
-            fprintf( stderr, "-i ");
-        fprintf( stderr, "...");
-    }
-
     tmp = buffer;
     bytesleft = buflen;
     {   uint4 runlength;
         uint ch;
         sz_decode(&m, &ch, &runlength);
         if (runlength>bytesleft)
-        {	fprintf(stderr, "input file corrupt");
-			exit(1);
-		}
+        {   deletemodel(&m);
+            return SZIP_BAD_DATA;
+        }
         bytesleft -= runlength;
         charcount[ch] += runlength;
         while (runlength)
@@ -1655,9 +1883,9 @@ static void readszipblock(uint dirsize, uint4 buflen, unsigned char *buffer)
         uint ch;
         sz_decode(&m, &ch, &runlength);
         if (runlength>bytesleft)
-        {	fprintf(stderr, "input file corrupt");
-			exit(1);
-		}
+        {   deletemodel(&m);
+            return SZIP_BAD_DATA;
+        }
         bytesleft -= runlength;
         charcount[ch] += runlength;
         while (runlength)
@@ -1666,200 +1894,123 @@ static void readszipblock(uint dirsize, uint4 buflen, unsigned char *buffer)
         }
     }
     deletemodel(&m);
+    in->pos = m.ac.in;
+    if (m.ac.overrun || (recordsize & 0x7f) == 0)
+        return SZIP_BAD_DATA;
 
-    if (verbosity&1) fprintf( stderr, " processing ...");
-
-	if (recordsize == 1)
-	{	if (order==0)
-			sz_unsrt_BW(buffer, NULL, buflen, indexlast, charcount);
-		else
-			sz_unsrt(buffer, NULL, buflen, indexlast, charcount, order);
-//fwrite(buffer,1,buflen,stdout);
-    }
-	else
-	{	tmp = (unsigned char*) malloc(buflen);
-		if (tmp==NULL)
-		{	fprintf(stderr, "memory allocation failure");
-			exit(1);
-		}
-		if (order==0)
-			sz_unsrt_BW(buffer, tmp, buflen, indexlast, charcount);
-		else
-			sz_unsrt(buffer, tmp, buflen, indexlast, charcount, order);
-		if (recordsize & 0x80)
-		{	uint4 i;
-            unsigned char c = *tmp;
-			for (i=1; i<buflen; i++)
-			{	c = (c+tmp[i])&0xff;
-				tmp[i] = c;
-			}
-		}
-		unreorder(tmp,buffer,buflen,recordsize&0x7f);
-		free(tmp);
-
-        bytesleft = fwrite(buffer,1,buflen,stdout);
-        if (bytesleft != buflen)
-		{	fprintf(stderr, "error writing output");
-			exit(1);
-		}
+    if (order==0)
+        err = sz_unsrt_BW(buffer, out, buflen, indexlast, charcount);
+    else
+        err = sz_unsrt(buffer, out, buflen, indexlast, charcount, order);
+    if (err)
+        return err == SZ_NOMEM_SORT ? SZIP_NO_MEMORY : SZIP_BAD_DATA;
+
+    if (recordsize != 1)
+    {   if (recordsize & 0x80)
+        {   uint4 i;
+            unsigned char c = *out;
+            for (i=1; i<buflen; i++)
+            {   c = (c+out[i])&0xff;
+                out[i] = c;
+            }
+        }
+        unreorder(out,buffer,buflen,recordsize&0x7f);
+        memcpy(out,buffer,buflen);
     }
+    return SZIP_OK;
 }
 
 
-static void compressit()
-{   unsigned char *inoutbuffer;
-
-    inoutbuffer = (unsigned char*) malloc(blocksize+order+1);
-	if (inoutbuffer==NULL)
-	{	fprintf(stderr, "memory allocation error\n");
-		exit(1);
-	}
+int _szip_compress(const uint8_t *in, size_t in_len, unsigned int blocksize, unsigned int order,
+                   uint8_t **out, size_t *out_len) {
+    if (in_len > UINT32_MAX) {
+        return SZIP_TOO_LARGE;
+    }
+    uint4 block_bytes = blockbytes(blocksize);
+    unsigned char *buffer = (unsigned char *)malloc((in_len < block_bytes ? in_len : block_bytes) + order + 1);
+    szip_buffer result = {0};
+    int status = SZIP_OK;
+    if (!buffer || _szip_reserve(&result, in_len / 2 + 64) != 0) {
+        status = SZIP_NO_MEMORY;
+    }
 
-    /* Attempt to get the original file size from stdin */
-    uint4 orig_size = 0;
-    struct stat st;
-    if (fstat(fileno(stdin), &st) == 0) {
-        orig_size = (uint4) st.st_size;
-        /* If stdin is a regular file, rewind to the beginning */
-        if (S_ISREG(st.st_mode)) {
-            rewind(stdin);
+    writeglobalheader(&result, (uint4)in_len);
+    for (size_t pos = 0; status == SZIP_OK && pos < in_len; ) {
+        uint4 buflen = in_len - pos < block_bytes ? (uint4)(in_len - pos) : block_bytes;
+        uint dirsize = writeblockdir(&result, buflen);
+        if (buflen <= order || buflen <= 5) {
+            writestorblock(&result, dirsize, buflen, in + pos);
+        } else {
+            // The sorters work in place and need order+1 bytes past the block
+            memcpy(buffer, in + pos, buflen);
+            status = writeszipblock(&result, dirsize, buflen, buffer, order);
         }
-    } else {
-        fprintf(stderr, "Warning: unable to determine file size; using 0\n");
+        pos += buflen;
     }
+    free(buffer);
 
-    writeglobalheader(orig_size);
-
-    while (1)
-    {   uint4 buflen;
-        uint i;
-        buflen = fread( (char *)inoutbuffer, 1, (size_t)blocksize, stdin);
-        if (buflen == 0) break;
-
-        i = writeblockdir(buflen);
-
-        if (buflen<=order || buflen<=5)
-            writestorblock(i, buflen, inoutbuffer);
-        else
-            writeszipblock(i, buflen, inoutbuffer);
-
-		if (verbosity&1) fprintf(stderr," done\n");
-	}
-    free(inoutbuffer);
-}
-
-
-static void decompressit()
-{   unsigned char *inoutbuffer=NULL;
-
-    blocksize = 0;
-    readglobalheader();
-
-    while (1)
-    {   uint4 blocklen;
-        uint dirsize;
-        int ch;
-        dirsize = readblockdir(&blocklen);
-        if (dirsize==0) break;
-        if (blocklen>blocksize)
-        {   if (inoutbuffer != NULL)
-                free(inoutbuffer);
-            inoutbuffer = (unsigned char *) malloc(blocklen);
-            blocksize = blocklen;
-        	if (inoutbuffer==NULL)
-        	{	fprintf(stderr, "memory allocation error\n");
-        		exit(1);
-	        }
+    if (status == SZIP_OK && result.failed) {
+        status = SZIP_NO_MEMORY;
+    }
+    if (status != SZIP_OK) {
+        free(result.data);
+        return status;
+    }
+    *out = result.data;
+    *out_len = result.size;
+    return SZIP_OK;
+}
+
+int _szip_decompress(const uint8_t *in, size_t in_len, uint8_t **out, size_t *out_len) {
+    szip_reader reader = {in, in + in_len};
+    szip_buffer result = {0};
+    unsigned char *buffer = NULL;
+    uint4 buffer_size = 0, orig_size = 0;
+
+    int status = readglobalheader(&reader, &orig_size);
+    // The tool records 0 when compressing a pipe, so the size is only a hint
+    if (status == SZIP_OK
+        && _szip_reserve(&result, orig_size < SZIP_SIZE_HINT_MAX ? orig_size : SZIP_SIZE_HINT_MAX) != 0) {
+        status = SZIP_NO_MEMORY;
+    }
+    while (status == SZIP_OK) {
+        uint4 blocklen;
+        int dirsize = readblockdir(&reader, &blocklen);
+        if (dirsize == 0) {
+            break;
         }
-        ch = getchar();
-        if (ch==0)
-            readstorblock(dirsize+1, blocklen, inoutbuffer);
-        else if (ch==1)
-            readszipblock(dirsize+1, blocklen, inoutbuffer);
-        else
-            no_szip();
-		if (verbosity&1) fprintf(stderr," done\n");
-	}
-    free(inoutbuffer);
-}
-
-
-int main( int argc, char *argv[] )
-{	char *infilename=NULL, *outfilename=NULL;
-    uint i;
-
-    for (i=1; i<(unsigned)argc; i++)
-	{	char *s=argv[i];
-	    if (*s == '-')
-		{	s++;
-			while (*s)
-				switch (*(s++))
-				{	
-                    case 'o': {
-                        order = readnum(&s, 0, 255);
-                        if (order == 1 || order == 2) {
-                            usage();
-                        }
-                        break;
-                    }                    
-					case 'r': {recordsize = (recordsize & 0x80) | 
-								  readnum(&s,1,255); break;}
-					// case 'b': {blocksize = (100000*readnum(&s,1,41)+0x7fff) & 0x7fff8000L; break;}
-                    case 'b': { // modification for ESP32-friendly block size
-                        uint custom_size = readnum(&s, 1, 41) * 100000; // User-specified size in 100 KB units
-                        if (custom_size < 32768) { // Ensure blocksize never goes below 32 KB
-                            custom_size = 32768;
-                        }
-                        blocksize = (custom_size + 0x7fff) & 0x7FFF8000L; // Align to 32 KB boundary
-                        break;
-                    } // end modification for ESP32-friendly block size
-					case 'i': {recordsize |= 0x80; break;}
-                    case 'v': {verbosity = readnum(&s,0,255); break;}
-                    case 'd': {compress = 0; break;}
-					default: usage();
-				}
-		} else if (infilename == NULL)
-			infilename = s;
-		else if (outfilename == NULL)
-			outfilename = s;
-		else
-			usage();
-	}
-
-	if (verbosity) fprintf( stderr, "szip Version %d.%d on ", vmayor, vminor);
-
-    if (infilename == NULL) {
-        if (verbosity) fprintf(stderr, "stdin");
-    } else {
-        if (!freopen(infilename, "rb", stdin)) {
-            fprintf(stderr, "Error opening input file: %s\n", infilename);
-            exit(1);
+        if (dirsize < 0 || blocklen > SZIP_MAX_BLOCK_SIZE) {
+            status = SZIP_BAD_DATA;
+            break;
         }
-        if (verbosity) fprintf(stderr, "%s", infilename);
-    }
-    
-    if (outfilename == NULL) {
-        if (verbosity) fprintf(stderr, " to stdout\n");
-    } else {
-        if (!freopen(outfilename, "wb", stdout)) {
-            fprintf(stderr, "Error opening output file: %s\n", outfilename);
-            exit(1);
+        if (blocklen > buffer_size) {
+            free(buffer);
+            buffer = (unsigned char *)malloc(blocklen);
+            buffer_size = buffer ? blocklen : 0;
         }
-        if (verbosity) fprintf(stderr, " to %s\n", outfilename);
-    }    
-
-#ifndef unix
-    setmode( fileno( stdin ), O_BINARY );
-    setmode( fileno( stdout ), O_BINARY );
-#endif
-
-    if (compress) {
-        compressit();
-    } else {
-        decompressit();
+        if (!buffer || _szip_reserve(&result, blocklen) != 0) {
+            status = SZIP_NO_MEMORY;
+            break;
+        }
+        int ch = readbyte(&reader);
+        if (ch == 0) {
+            status = readstorblock(&reader, dirsize + 1, blocklen, result.data + result.size);
+        } else if (ch == 1) {
+            status = readszipblock(&reader, dirsize + 1, blocklen, buffer, result.data + result.size);
+        } else {
+            status = SZIP_BAD_DATA;
+        }
+        result.size += blocklen;
     }
+    free(buffer);
 
-    return 0;
+    if (status != SZIP_OK) {
+        free(result.data);
+        return status;
+    }
+    *out = result.data;
+    *out_len = result.size;
+    return SZIP_OK;
 }
 
 /* sz_mod4.c   (c) Michael Schindler, 1998
@@ -2192,7 +2343,7 @@ found: /* we found it in MTF, so encode it and remove it */
     return 1;
 }
 
-static unsigned char readrun(qsmodel *rlmod, uint4 *n)
+static unsigned char readrun(sz_model *m, qsmodel *rlmod, uint4 *n)
 {   int sy_f, lt_f, rl;
     rl = qsgetsym( rlmod, decode_culshift( &(MOD.ac), RLSHIFT));
     qsgetfreq( rlmod, rl, &sy_f, &lt_f );
@@ -2232,7 +2383,7 @@ static unsigned char readrun(qsmodel *rlmod, uint4 *n)
 
 
 /* writes out the runlength */
-static unsigned char writerun(qsmodel *rlmod, uint4 n)
+static unsigned char writerun(sz_model *m, qsmodel *rlmod, uint4 n)
 {   int sy_f, lt_f;
 	if (n<=4)       /* no extra bits */
     {   qsgetfreq( rlmod, n-1, &sy_f, &lt_f );
@@ -2289,7 +2440,7 @@ void sz_encode(sz_model *m, uint symbol, uint4 runlength)
         encode_freq(&(MOD.ac), old->sy_f, lt_f, MOD.cachetotf - tmp->sy_f);
         tmp = tmp->next;
         tmp->what = 0;
-        tmp->weight = writerun(MOD.rlemod + old->weight, runlength);
+        tmp->weight = writerun(m, MOD.rlemod + old->weight, runlength);
         tmp->sy_f = tmp->weight + old->sy_f;
         old->sy_f = 0;
         MOD.newest = tmp;
@@ -2297,7 +2448,7 @@ void sz_encode(sz_model *m, uint symbol, uint4 runlength)
     else
     {   tmp = MOD.newest->next;
         tmp->what = encodeother(m,symbol);
-        tmp->weight = writerun(MOD.rlemod, runlength);
+        tmp->weight = writerun(m, MOD.rlemod, runlength);
         tmp->sy_f = tmp->weight;
         MOD.newest = tmp;
     }
@@ -2339,6 +2490,8 @@ void sz_decode(sz_model *m, uint *symbol, uint4 *runlength)
         MOD.whatmod[0] += 6;
         tmp = MOD.newest;
         tot_f = MOD.cachetotf - tmp->sy_f;
+        if (tot_f == 0)
+            goto corrupt;
         sym = decode_culfreq( &(MOD.ac), tot_f);
         tmp = tmp->prev;
         lt_f = tmp->sy_f;
@@ -2350,7 +2503,7 @@ void sz_decode(sz_model *m, uint *symbol, uint4 *runlength)
       { cacheptr free = MOD.newest->next;
         MOD.newest = free;
         free->what = 0;
-        free->weight = readrun(MOD.rlemod + tmp->weight, runlength);
+        free->weight = readrun(m, MOD.rlemod + tmp->weight, runlength);
         free->sy_f = free->weight + tmp->sy_f;
       }
         tmp->sy_f = 0;
@@ -2365,8 +2518,8 @@ void sz_decode(sz_model *m, uint *symbol, uint4 *runlength)
         qsgetfreq( &(MOD.mtfmod), sym, &sy_f, &lt_f );
         decode_update_shift(&(MOD.ac), sy_f, lt_f, MTFSHIFT);
         qsupdate( &(MOD.mtfmod), sym);
-        if (MOD.mtfsizeact == 0)
-            activatenext(&MOD,&(MOD.mtffirst));
+        if (MOD.mtfsizeact == 0 && !activatenext(&MOD,&(MOD.mtffirst)))
+            goto corrupt;
 
         pred = MOD.mtfhist + MOD.mtffirst;
         if (sym==0)    /* the first entry */
@@ -2387,10 +2540,12 @@ void sz_decode(sz_model *m, uint *symbol, uint4 *runlength)
             {   for (n=MOD.mtfsizeact-1; n; n--) /* skip active part of MTF */
                     pred = MOD.mtfhist + pred->next;
                 while (MOD.mtfsizeact<sym)
-                {   activatenext(&MOD,&(pred->next));
+                {   if (!activatenext(&MOD,&(pred->next)))
+                        goto corrupt;
                     pred = MOD.mtfhist + pred->next;
                 }
-                activatenext(&MOD,&(pred->next));
+                if (!activatenext(&MOD,&(pred->next)))
+                    goto corrupt;
             }
             target = MOD.mtfhist + pred->next;
             sym = target->sym;
@@ -2402,7 +2557,7 @@ void sz_decode(sz_model *m, uint *symbol, uint4 *runlength)
       { cacheptr free = MOD.newest->next;
         MOD.newest = free;
         free->what = 1;
-        free->weight = readrun(MOD.rlemod, runlength);
+        free->weight = readrun(m, MOD.rlemod, runlength);
         free->sy_f = free->weight;
       }
         *symbol = sym;
@@ -2440,6 +2595,8 @@ void sz_decode(sz_model *m, uint *symbol, uint4 *runlength)
             while (MOD.mtfsizeact<MTFSIZE && activatenext(&(MOD), &(pred->next)))
                 pred = MOD.mtfhist + pred->next;
         }
+        if (bittotf(&(MOD.full)) == 0)
+            goto corrupt;
         sym = bitgetsym( &(MOD.full), decode_culfreq( &(MOD.ac), bittotf(&(MOD.full))));
         bitgetfreq( &(MOD.full), sym, &sy_f, &lt_f );
         decode_update(&(MOD.ac), sy_f, lt_f, bittotf(&(MOD.full)));
@@ -2447,12 +2604,17 @@ void sz_decode(sz_model *m, uint *symbol, uint4 *runlength)
       { cacheptr free = MOD.newest->next;
         MOD.newest = free;
         free->what = 2;
-        free->weight = readrun(MOD.rlemod, runlength);
+        free->weight = readrun(m, MOD.rlemod, runlength);
         free->sy_f = free->weight;
       }
         *symbol = sym;
     }
     finishupdate(m, *symbol);
+    return;
+
+corrupt: /* the encoder never gets here; a run longer than any block stops the caller */
+    *symbol = 0;
+    *runlength = 0xffffffff;
 };
 
 
@@ -2555,7 +2717,6 @@ void deletemodel(sz_model *m)
     for(i=0; i<5; i++)
         deleteqsmodel(MOD.rlemod+i);
 }
-
 //#define CHECKINDIRECT
 
 #include <string.h>
@@ -2565,14 +2726,6 @@ void deletemodel(sz_model *m)
 // #include "sz_err.h"
 // #include "sz_srt.h"
 
-#ifndef verbosity
-extern uint verbosity;
-#endif
-
-#if defined SZ_UNSRT_O4
-// #include "sz_hash2.h"		// only used in sz_unsrt_o4
-#endif
-
 // the sorting is a little slow due to attempts to reuse memory as soon as possible.
 // since the n-1 order sorted block is read sequentially a block can be freed (inserted
 // in a freelist) as soon as it is processed. Since the new n-order sorted pointers
@@ -2599,70 +2752,58 @@ typedef struct {
 	ptrblock *block;
 	ptrblock *spare[18];
 	uint4 nrblocks;
+	int failed;				// ran out of memory; the rest of the pass went to overflow
+	ptrblock overflow;
 } ptrstruct;
 
 
-static ptrstruct globalptr;
-static int globalinit = 0;
 
-static void allocptrs(uint4 length, ptrstruct *p)
+static int allocptrs(uint4 length, ptrstruct *p)
 {	uint4 i;
 	p->nrblocks = (length+BLOCKSIZE-1)/BLOCKSIZE;
-	if (globalinit && (p->nrblocks>globalptr.nrblocks)) {
-		free(globalptr.index);
-		free(globalptr.oldindex);
-		free(globalptr.block);
-	    globalinit = 0;
-	}
-	if (!globalinit) {
-		globalptr.nrblocks = p->nrblocks;
-		globalptr.index = (ptrblock**) malloc(sizeof(ptrblock*)*globalptr.nrblocks);
-		if (globalptr.index == NULL)
-			sz_error(SZ_NOMEM_SORT);
-		globalptr.oldindex = (ptrblock**) malloc(sizeof(ptrblock*)*globalptr.nrblocks);
-		if (globalptr.oldindex == NULL)
-			sz_error(SZ_NOMEM_SORT);
-		globalptr.block = (ptrblock*) malloc(sizeof(ptrblock)*globalptr.nrblocks);
-		if (globalptr.block == NULL)
-			sz_error(SZ_NOMEM_SORT);
-	    globalinit = 1;
-	}
-	p->index = globalptr.index;
-	p->oldindex = globalptr.oldindex;
-	p->block = globalptr.block;
 	p->freelist = NULL;
+	p->failed = 0;
 	for(i=0; i<18; i++)
 		p->spare[i] = NULL;
+	p->index = (ptrblock**) malloc(sizeof(ptrblock*)*p->nrblocks);
+	p->oldindex = (ptrblock**) malloc(sizeof(ptrblock*)*p->nrblocks);
+	p->block = (ptrblock*) malloc(sizeof(ptrblock)*p->nrblocks);
+	if (p->index == NULL || p->oldindex == NULL || p->block == NULL)
+		return SZ_NOMEM_SORT;
 	for (i=0; i<p->nrblocks; i++)
 		p->index[i] = p->block + i;
+	return 0;
 }
 
-static void extraspare(ptrstruct *p, int blocks)
+static int extraspare(ptrstruct *p, int blocks)
 {	int i;
-	for (i=0; p->spare[i]!= NULL; i++)
+	for (i=0; i<18 && p->spare[i]!= NULL; i++)
 		/* void */;
+	if (i == 18)
+		return SZ_NOMEM_SORT;
 	p->spare[i] = (ptrblock*) malloc(sizeof(ptrblock)*blocks);
 	if (p->spare[i] == NULL)
-		sz_error(SZ_NOMEM_SORT);
+		return SZ_NOMEM_SORT;
 	p->spare[i]->nextfree = p->freelist;
 	p->freelist = p->spare[i];
 	for(i=1; i<blocks; i++)
 		p->freelist[i-1].nextfree = p->freelist + i;
 	p->freelist[blocks-1].nextfree = NULL;
+	return 0;
 }
 
-static void allocspareptrs(uint4 length, ptrstruct *p)
+static int allocspareptrs(uint4 length, ptrstruct *p)
 {	length = (length>>BITSSAMEBLOCK) + 1;
 	if (length>256) length = 256;
-	extraspare(p,length);
+	return extraspare(p,length);
 }
 
 static void freeptrs(ptrstruct *p)
 {	int i;
-//	free(p->index);
-//	free(p->oldindex);
-//	free(p->block);
-	for (i=0; p->spare[i] != NULL; i++)
+	free(p->index);
+	free(p->oldindex);
+	free(p->block);
+	for (i=0; i<18 && p->spare[i] != NULL; i++)
 		free(p->spare[i]);
 }
 
@@ -2670,24 +2811,29 @@ static Inline void setptr(ptrstruct *p, uint4 i, uint4 ptr)
 {	ptrblock *tmp;
 	tmp = p->index[i>>BITSSAMEBLOCK];
 	if (tmp==NULL)
-	{	if (p->freelist == NULL)
-			extraspare(p,16);
-		tmp = p->index[i>>BITSSAMEBLOCK] = p->freelist;
-		p->freelist = p->freelist->nextfree;
+	{	if (p->freelist == NULL && extraspare(p,16) != 0)
+		{	// finish the pass in a scratch block; the caller checks failed
+			p->failed = 1;
+			tmp = p->index[i>>BITSSAMEBLOCK] = &p->overflow;
+		}
+		else
+		{	tmp = p->index[i>>BITSSAMEBLOCK] = p->freelist;
+			p->freelist = p->freelist->nextfree;
+		}
 	}
 	i &= BLOCKMASK;
 	tmp->msbytes[i] = ptr>>8;
 	tmp->lsbyte[i] = ptr & 0xff;
 }
 
-static void sortorder2(ptrstruct *p, unsigned char *in, uint4 length,
+static int sortorder2(ptrstruct *p, unsigned char *in, uint4 length,
 					   uint4 *counts, unsigned int offset, uint4 *indexlast)
 {	uint4 i, *o2counts, sum;
 	unsigned int context;
 	memset(counts, 0, 256*sizeof(uint4));
 	o2counts = (uint4*) calloc(0x10000, sizeof(uint4));
 	if (o2counts == NULL)
-		sz_error(SZ_NOMEM_SORT);
+		return SZ_NOMEM_SORT;
 	context = (unsigned)in[length-1]<<8;
 	for(i=0; i<length; i++)
 	{	context = context>>8 | (unsigned)(in[i])<<8;
@@ -2722,6 +2868,7 @@ static void sortorder2(ptrstruct *p, unsigned char *in, uint4 length,
 		o2counts[context]++;
 	}
 	free(o2counts);
+	return 0;
 }
 
 static void incsortorder(ptrstruct *p, unsigned char *in, uint4 length,
@@ -2805,6 +2952,8 @@ static void finishsort(ptrstruct *p, unsigned char *in, uint4 length,
 	}
 	curblock->nextfree = p->freelist;
 	p->freelist = curblock;
+	if (p->failed)
+		return;
 	for (i=0; i<p->nrblocks-1; i++)
 		memcpy(in+i*BLOCKSIZE, p->index[i]->lsbyte, BLOCKSIZE);
 	i= p->nrblocks - 1;
@@ -2818,20 +2967,30 @@ static void finishsort(ptrstruct *p, unsigned char *in, uint4 length,
 // order: order of context used in sorting (must be >=3)
 // the code assumes length>=order
 // and inout is length+order bytes long (only the first length need to be filled)
-void sz_srt(unsigned char *inout, uint4 length, uint4 *indexlast, unsigned int order)
+int sz_srt(unsigned char *inout, uint4 length, uint4 *indexlast, unsigned int order)
 {	uint4 i;
 	ptrstruct p;
 	uint4 counts[256];
-	allocptrs(length, &p);
-	sortorder2(&p, inout, length, counts, order, indexlast);
-	allocspareptrs(length, &p);
-	for (i=order-2; i>1; i--)
-		incsortorder(&p, inout, length, counts, i, indexlast);
-	finishsort(&p, inout, length, counts, indexlast);
+	int err;
+	err = allocptrs(length, &p);
+	if (!err)
+		err = sortorder2(&p, inout, length, counts, order, indexlast);
+	if (!err)
+		err = allocspareptrs(length, &p);
+	for (i=order-2; !err && i>1; i--)
+	{	incsortorder(&p, inout, length, counts, i, indexlast);
+		if (p.failed)
+			err = SZ_NOMEM_SORT;
+	}
+	if (!err)
+	{	finishsort(&p, inout, length, counts, indexlast);
+		if (p.failed)
+			err = SZ_NOMEM_SORT;
+	}
 	freeptrs(&p);
+	return err;
 }
 
-
 #define INDIRECT 0x800000
 
 #define setbit(flags,bit) (flags[bit>>3] |= 1<<(bit & 7))
@@ -2898,24 +3057,30 @@ static void maketable(unsigned char *inflags, uint4 *table, unsigned char *in,
 }
 
 // in: bytes to be unsorted
-// out: unsorted bytes; if out==NULL output is written to stdout
+// out: unsorted bytes
 // length: number of bytes in in (and out)
 // indexlast: position of last context (as returned bt sorttrans)
 // counts: number of occurances of each byte in in (if NULL it will be calculated)
 // order: order of context used in sorting (must be >=3)
 // the code assumes length>=order
-void sz_unsrt(unsigned char *in, unsigned char *out, uint4 length, uint4 indexlast,
+int sz_unsrt(unsigned char *in, unsigned char *out, uint4 length, uint4 indexlast,
 			uint4 *counts, unsigned int order)
 {	uint4 i, j;
-    static uint4 *table;
-	static unsigned char *flags1=NULL;
-	static unsigned char *flags2=NULL;
+	uint4 *table=NULL;
+	unsigned char *flags1=NULL;
+	unsigned char *flags2=NULL;
 	unsigned char nocounts;
+	int err = SZ_NOMEM_SORT;
+
+	if (indexlast >= length)
+		return SZ_NOTCYCLIC;
 
 	// get counts if not supplied
 	nocounts = counts==NULL;
 	if (nocounts)
 	{	counts = (uint4*) calloc(256, sizeof(uint4));
+		if (counts == NULL)
+			return SZ_NOMEM_SORT;
 		for (i=0; i<length; i++)
 			counts[in[i]]++;
 	}
@@ -2926,22 +3091,15 @@ void sz_unsrt(unsigned char *in, unsigned char *out, uint4 length, uint4 indexla
 		counts[i] = j;
 	}
 
-	if (flags1==NULL){
-		flags1 = (unsigned char*) calloc((length+8)>>3,1);
-		if (flags1 == NULL)
-			sz_error(SZ_NOMEM_SORT);
-	} else 
-		memset(flags1,0,(length+8)>>3);
+	flags1 = (unsigned char*) calloc((length+8)>>3,1);
+	flags2 = (unsigned char*) calloc((length+8)>>3,1);
+	table = (uint4*)malloc((length+1)*sizeof(uint4));
+	if (flags1 == NULL || flags2 == NULL || table == NULL)
+		goto done;
 
 	makeorder2(flags1, in, counts, length);
 	
 	// now incease the order to desired order-1
-	if (flags2==NULL){
-		flags2 = (unsigned char*) calloc((length+8)>>3,1);
-		if (flags2 == NULL)
-			sz_error(SZ_NOMEM_SORT);
-	} else 
-		memset(flags2,0,(length+8)>>3);
 	for (i=2; i<order-1; i++)
 	{	unsigned char *tmpflags;
 		increaseorder(flags1, flags2, in, counts, length);
@@ -2949,72 +3107,63 @@ void sz_unsrt(unsigned char *in, unsigned char *out, uint4 length, uint4 indexla
 		flags1 = flags2;		// flags1 now contains the updated beginflags
 		flags2 = tmpflags;		// no need to clear, the set bits will be set again
 	}
-//	free(flags2);
 
 	// construct permutation table
-	if (table==NULL) {
-		table = (uint4*)malloc((length+1)*sizeof(uint4));
-		if (table == NULL)
-			sz_error(SZ_NOMEM_SORT);
-	}
 	maketable(flags1, table, in, counts, length);
 	table[length] = INDIRECT;
-//	free(flags1);
-	if (nocounts)
-		free(counts);
 
 	// do the actual unsorting
+	err = SZ_NOTCYCLIC;
 	j = indexlast;
-	if (out == NULL)
-		for (i=0; i<length; i++)
-		{	uint4 tmp = table[j];
-			if (tmp & INDIRECT)
-			{	j = table[tmp & ~INDIRECT]++;
+	for (i=0; i<length; i++)
+	{	uint4 tmp = table[j];
+		if (tmp & INDIRECT)
+		{	j = table[tmp & ~INDIRECT]++;
 #ifdef CHECKINDIRECT
-				if (j&INDIRECT)
-					sz_error(SZ_DOUBLEINDIRECT);
+			if (j&INDIRECT)
+				goto done;
 #endif
-			}
-			else
-			{	table[j]++;
-				j = tmp;
-			}
-			putc(in[j],stdout);
 		}
-	else
-		for (i=0; i<length; i++)
-		{	uint4 tmp = table[j];
-			if (tmp & INDIRECT)
-				j = table[tmp & ~INDIRECT]++;
-			else
-			{	table[j]++;
-				j = tmp;
-			}
-			out[i] = in[j];
+		else
+		{	table[j]++;
+			j = tmp;
 		}
+		if (j >= length)	// only on corrupt input
+			goto done;
+		out[i] = in[j];
+	}
 
-	if (j != indexlast)
-		sz_error(SZ_NOTCYCLIC);
-//	free(table);
+	if (j == indexlast)
+		err = 0;
+done:
+	free(flags1);
+	free(flags2);
+	free(table);
+	if (nocounts)
+		free(counts);
+	return err;
 }
 
 
 #if defined SZ_SRT_O4
 // a fast alternate sort, only for order 4. inout only length bytes is OK here.
-void sz_srt_o4(unsigned char *inout, uint4 length, uint4 *indexlast)
-{	static uint4 *counters=NULL;
-	static uint2 *context=NULL;
-	static unsigned char *symbols=NULL;
+int sz_srt_o4(unsigned char *inout, uint4 length, uint4 *indexlast)
+{	uint4 *counters;
+	uint2 *context;
+	unsigned char *symbols;
 	register uint4 i;
 
-	// count contexts
-	if (counters==NULL) {
-		counters = (uint4*)calloc(0x10000,sizeof(uint4));
-		if (counters == NULL)
-			sz_error(SZ_NOMEM_SORT);
-	} else {
-		memset(counters,0,0x10000*sizeof(uint4));
+	counters = (uint4*)calloc(0x10000,sizeof(uint4));
+	context = (uint2*)malloc(length*sizeof(uint2));
+	symbols = (unsigned char*)(malloc(length));
+	if (counters == NULL || context == NULL || symbols == NULL)
+	{	free(counters);
+		free(context);
+		free(symbols);
+		return SZ_NOMEM_SORT;
 	}
+
+	// count contexts
 	i = (uint)(inout[length-1])<<8;
   {	register unsigned char *tmp;
 	for (tmp=inout; tmp<inout+length; tmp++)
@@ -3032,17 +3181,6 @@ void sz_srt_o4(unsigned char *inout, uint4 length, uint4 *indexlast)
   }
 
 	// first sort pass
-    if (context==NULL) {
-		context = (uint2*)malloc(length*sizeof(uint2));
-		if (context == NULL)
-			sz_error(SZ_NOMEM_SORT);
-	}
-	if (symbols==NULL) {
-		symbols = (unsigned char*)(malloc(length));
-		if (symbols == NULL)
-			sz_error(SZ_NOMEM_SORT);
-	}
-
 	// the following loop in assembler it would probably be a lot faster
   {	register unsigned char *tmp;
 	register uint4 ctx = (uint4)inout[length-4]<<8 | inout[length-5];
@@ -3070,129 +3208,10 @@ void sz_srt_o4(unsigned char *inout, uint4 length, uint4 *indexlast)
 	while (i--)
 		inout[--counters[context[i]]] = symbols[i];
 
-//	free(counters);
-//	free(context);
-//	free(symbols);
-}
-#endif
-
-
-#ifdef SZ_UNSRT_O4
-// an alternate backtransform for order 4 using hash tables
-void sz_unsrt_o4(unsigned char *in, unsigned char *out, uint4 length, uint4 indexlast,
-			   uint4 *counts)
-{	uint4 i, *contexts2, *contexts4, initcontext;
-	uint2 *lastseen;
-	unsigned char *loop, *endloop, nocounts;
-	h2table htable;
-
-	// get counts if not supplied
-	nocounts = counts==NULL;
-	if (nocounts)
-	{	counts = (uint4*) calloc(256, sizeof(uint4));
-		for (i=0; i<length; i++)
-			counts[in[i]]++;
-	}
-	
-	// allocate tables (could do on stack, but will cause problems with some compilers
-	contexts2 = (uint4*)calloc(0x10000, sizeof(uint4));
-	if (contexts2 == NULL)
-		sz_error(SZ_NOMEM_SORT);
-
-	// count contexts
-	loop = in;
-	for (i=0; i<0x100; i++)
-		for (endloop = loop+counts[i]; loop<endloop; loop++)
-			contexts2[(unsigned int)(*loop)<<8 | i]++;
-		
-	// put sum of order2 contexts in order 4 contexts
-	contexts4 = (uint4*)malloc(0x10000*sizeof(uint4));
-	if (contexts4 == NULL)
-		sz_error(SZ_NOMEM_SORT);
-  {	uint4 sum = length;
-	for (i=0x10000; i--;)
-	{	if (sum > indexlast)
-			initcontext = i;
-		sum -= contexts2[i];
-		contexts4[i] = sum;
-	}
-	initcontext <<= 16;
-	// sum counts
-	sum = length;
-	for (i=0x100; i--;)
-	{	sum -= counts[i];
-		counts[i] = sum;
-	}
-  }
-
-	initHash2(htable);
-
-	// in hardware: make lastseen a bitfield and zero them all when you hit a new
-	// order 2 context. set them whenever you see a new order 4 context.
-	// much like in the loop for the 0x????0000 contexts.
-
-	// loop over all order 2 contexts
-	// count contexts 0x????0000 first
-	loop = in;
-	lastseen = (uint2*)calloc(0x10000,sizeof(uint2));
-	if (lastseen == NULL)
-		sz_error(SZ_NOMEM_SORT);
-	for (endloop = loop+contexts2[0]; loop<endloop; loop++)
-	{	uint4 j, tmp = (uint4)(*loop);
-		j = counts[tmp]++;
-		tmp |= (uint4)(in[j])<<8;
-		if (!lastseen[tmp])
-		{	lastseen[tmp] = 1;
-			h2_insert(htable, tmp<<16, contexts4[tmp]);
-		}
-		contexts4[tmp]++;
-	}
-
-	
-	// and now all others (couldnt do it in one because of lastseens limited size)
-	memset(lastseen, 0, 0x10000*sizeof(uint2));		// zero lastseen again
-	for (i=1; i<0x10000; i++)
-	{	if (indexlast >= contexts4[initcontext>>16])
-			initcontext = (initcontext & 0xffff0000) | i;
-		for (endloop = loop+contexts2[i]; loop<endloop; loop++)
-		{	uint4 j, tmp = (uint4)(*loop);
-			j = counts[tmp]++;
-			tmp |= (uint4)(in[j])<<8;
-			if (lastseen[tmp] != i)
-			{	lastseen[tmp] = i;
-				h2_insert(htable, tmp<<16 | i, contexts4[tmp]);
-			}
-			contexts4[tmp]++;
-		}
-	}
-
-	free(contexts2);
-	free(contexts4);
-	free(lastseen);
-	if (nocounts)
-		free(counts);
-
-	// do the actual unsorting
-	initcontext = initcontext>>8 | (uint4)in[indexlast]<<24;
-  {	uint4 context = initcontext;
-	if (out == NULL)
-		for ( i=0; i<length; i++ )
-		{	unsigned char outchar;
-			outchar = in[h2_get_inc(htable, context)];
-			context = (context>>8) | ((uint4)outchar<<24);
-			putc(outchar, stdout);
-		}
-	else
-		for ( i=0; i<length; i++ )
-		{	unsigned char outchar;
-			out[i] = outchar = in[h2_get_inc(htable, context)];
-			context = (context>>8) | ((uint4)outchar<<24);
-		}
-
-	if (context != initcontext)
-		sz_error(SZ_NOTCYCLIC);
-  }
-	freeHash2(htable);
+	free(counters);
+	free(context);
+	free(symbols);
+	return 0;
 }
 #endif
 
@@ -3201,7 +3220,7 @@ void sz_unsrt_o4(unsigned char *in, unsigned char *out, uint4 length, uint4 inde
 
 // #include "qsort_u4.c"
 
-void sz_srt_BW(unsigned char *inout, uint4 length, uint4 *indexfirst)
+int sz_srt_BW(unsigned char *inout, uint4 length, uint4 *indexfirst)
 {	uint4 i, counts[256], counts1[256], *contextp, start;
 
 	for (i=0; i<256; i++)
@@ -3214,15 +3233,14 @@ void sz_srt_BW(unsigned char *inout, uint4 length, uint4 *indexfirst)
 	
 	contextp = (uint4*) calloc(length, sizeof(uint4));
 	if (contextp == NULL)
-		sz_error(SZ_NOMEM_SORT);
+		return SZ_NOMEM_SORT;
 
 	for (i=0; i<length; i++)
 		contextp[counts1[inout[i]]++] = i;
 
 	start = 0;
 	for (i=0; i<256; i++)
-    {   if (verbosity&1) fputc((char)('0'+i%10),stderr);
-        if (counts[i])
+    {   if (counts[i])
         {	qsort_u4(contextp+start, counts[i], inout, i==inout[0]?0:1);
 			if (i==inout[length-1]) // search for indexfirst
 			{	uint4 j=start;
@@ -3242,20 +3260,24 @@ void sz_srt_BW(unsigned char *inout, uint4 length, uint4 *indexfirst)
 		inout[i] = contextp[i];
 
 	free(contextp);
+	return 0;
 }
 
 
-void sz_unsrt_BW(unsigned char *in, unsigned char *out, uint4 length,
+int sz_unsrt_BW(unsigned char *in, unsigned char *out, uint4 length,
 			   uint4 indexfirst, uint4 *counts)
 {	uint4 i, *transvec;
 	unsigned char nocounts;
 
+	if (indexfirst >= length)
+		return SZ_NOTCYCLIC;
+
 	// get counts if not supplied
 	nocounts = counts==NULL;
 	if (nocounts)
 	{	counts = (uint4*) calloc(256, sizeof(uint4));
 		if (counts == NULL)
-			sz_error(SZ_NOMEM_SORT);
+			return SZ_NOMEM_SORT;
 		for (i=0; i<length; i++)
 			counts[in[i]]++;
 	}
@@ -3270,7 +3292,10 @@ void sz_unsrt_BW(unsigned char *in, unsigned char *out, uint4 length,
 	// prepare transposition vector
 	transvec = (uint4*)malloc((length)*sizeof(uint4));
 	if (transvec == NULL)
-		sz_error(SZ_NOMEM_SORT);
+	{	if (nocounts)
+			free(counts);
+		return SZ_NOMEM_SORT;
+	}
 
 	transvec[indexfirst] = counts[in[indexfirst]]++;
 	for (i=0; i<indexfirst; i++)
@@ -3284,19 +3309,96 @@ void sz_unsrt_BW(unsigned char *in, unsigned char *out, uint4 length,
 
 	// undo the blocksort
   {	uint4 ic=indexfirst;
-	if (out==NULL)
-		for (i=0; i<length; i++)
-		{	putc(in[ic], stdout);
-			ic = transvec[ic];
-		}
-	else
-		for (i=0; i<length; i++)
-		{	out[i] = in[ic];
-			ic = transvec[ic];
-		}
-	if (ic != indexfirst)
-		sz_error(SZ_NOTCYCLIC);
-  }
+	for (i=0; i<length; i++)
+	{	out[i] = in[ic];
+		ic = transvec[ic];
+	}
 	free(transvec);
+	return ic == indexfirst ? 0 : SZ_NOTCYCLIC;
+  }
 }
 #endif
+
+
+
+/* Raise the Python exception for a failed szip call; always returns NULL */
+static PyObject *_szip_error(int status) {
+    switch (status) {
+        case SZIP_NO_MEMORY:
+            return PyErr_NoMemory();
+        case SZIP_TOO_LARGE:
+            PyErr_SetString(PyExc_ValueError, "data is too large for szip (4 GiB at most)");
+            return NULL;
+        default:
+            PyErr_SetString(PyExc_ValueError, "data is not valid szip data");
+            return NULL;
+    }
+}
+
+/* 
+ * szip_compress()
+ * Python wrapper for in-memory szip compression.
+ * Accepts one bytes object (the raw data) and the tool's -b and -o options,
+ * returns a bytes object (the compressed data).
+ */
+PyObject *szip_compress(PyObject *self, PyObject *args, PyObject *kwargs) {
+    const char *in_data = NULL;
+    Py_ssize_t in_len = 0;
+    int blocksize = 41, order = 3;
+    static char *kwlist[] = {"data", "blocksize", "order", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y#|ii", kwlist, &in_data, &in_len, &blocksize, &order)) {
+        return NULL;
+    }
+    if (blocksize < 1 || blocksize > 41) {
+        PyErr_SetString(PyExc_ValueError, "blocksize must be between 1 and 41 (units of 100 kB)");
+        return NULL;
+    }
+    if (order != 0 && (order < 3 || order > 255)) {
+        PyErr_SetString(PyExc_ValueError, "order must be 0 (full BWT) or between 3 and 255");
+        return NULL;
+    }
+
+    int status;
+    uint8_t *out = NULL;
+    size_t out_len = 0;
+    Py_BEGIN_ALLOW_THREADS
+    status = _szip_compress((const uint8_t *)in_data, (size_t)in_len, (unsigned int)blocksize, (unsigned int)order, &out, &out_len);
+    Py_END_ALLOW_THREADS
+
+    if (status != SZIP_OK) {
+        return _szip_error(status);
+    }
+    PyObject *result = PyBytes_FromStringAndSize((const char *)out, (Py_ssize_t)out_len);
+    free(out);
+    return result;
+}
+
+/* 
+ * szip_decompress()
+ * Python wrapper for in-memory szip decompression.
+ * Accepts one bytes object (the compressed data),
+ * returns a bytes object (the decompressed data).
+ */
+PyObject *szip_decompress(PyObject *self, PyObject *args) {
+    const char *in_data = NULL;
+    Py_ssize_t in_len = 0;
+
+    if (!PyArg_ParseTuple(args, "y#", &in_data, &in_len)) {
+        return NULL;
+    }
+
+    int status;
+    uint8_t *out = NULL;
+    size_t out_len = 0;
+    Py_BEGIN_ALLOW_THREADS
+    status = _szip_decompress((const uint8_t *)in_data, (size_t)in_len, &out, &out_len);
+    Py_END_ALLOW_THREADS
+
+    if (status != SZIP_OK) {
+        return _szip_error(status);
+    }
+    PyObject *result = PyBytes_FromStringAndSize((const char *)out, (Py_ssize_t)out_len);
+    free(out);
+    return result;
+}
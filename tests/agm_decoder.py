@@ -0,0 +1,122 @@
+"""Reference decoder for AGM movies written by agonutils.mp4_to_agm.
+
+Kept independent of the C code so the encoder and AgmReader can be checked
+against it. The file is a 40-byte header (52 bytes in version 2, which adds
+the audio fields), then the records, then a frame index of (offset, size word)
+pairs. Each record is a little-endian uint32 size word, with the top bit set
+for delta frames and the next for audio chunks, followed by that many bytes
+of RLE data or signed 8-bit PCM. An empty delta frame repeats the previous
+frame. Only frames are indexed.
+"""
+import struct
+from collections import namedtuple
+
+AGM_DELTA_FLAG = 0x80000000
+AGM_AUDIO_FLAG = 0x40000000
+AGM_SIZE_MASK = 0x3FFFFFFF
+HEADER_FORMAT = '<4sHHHHIIIIIII'
+AUDIO_HEADER_FORMAT = '<III'
+
+AgmHeader = namedtuple('AgmHeader', 'version header_size width height fps_num fps_den '
+                                    'palette_id flags frame_count index_offset '
+                                    'audio_rate audio_chunk_size audio_sample_count',
+                       defaults=(0, 0, 0))
+
+
+def rle_decode(data):
+    """Decode RLE data to packed RGBA2 pixels; transparent pixels decode as 0."""
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        cmd = data[i]
+        i += 1
+        kind = cmd & 0xC0
+        if kind == 0x40:
+            out += bytes((cmd & 0x3F) + 1)
+        elif kind == 0x80:
+            if i < len(data) and (data[i] & 0xC0) == 0xC0:
+                out += bytes([data[i]]) * ((cmd & 0x3F) + 1)
+                i += 1
+            else:
+                out.append(0xC0 | (cmd & 0x3F))
+        else:
+            raise ValueError(f'Invalid RLE command 0x{cmd:02X} at offset {i - 1}')
+    return bytes(out)
+
+
+def make_header(width, height, frame_count, index_offset, fps=(0, 1), palette_id=64, flags=1, audio=None):
+    """Pack a header; audio is (rate, chunk_size, sample_count) for a version 2 header."""
+    if audio is None:
+        return struct.pack(HEADER_FORMAT, b'AGMV', 1, struct.calcsize(HEADER_FORMAT), width, height,
+                           fps[0], fps[1], palette_id, flags, frame_count, index_offset, 0)
+    size = struct.calcsize(HEADER_FORMAT) + struct.calcsize(AUDIO_HEADER_FORMAT)
+    return (struct.pack(HEADER_FORMAT, b'AGMV', 2, size, width, height,
+                        fps[0], fps[1], palette_id, flags, frame_count, index_offset, 0)
+            + struct.pack(AUDIO_HEADER_FORMAT, *audio))
+
+
+def read_header(f):
+    magic, *fields, _reserved = struct.unpack(HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+    if magic != b'AGMV':
+        raise ValueError('Not an AGM file')
+    header = AgmHeader(*fields)
+    if header.version >= 2 and header.header_size >= struct.calcsize(HEADER_FORMAT) + struct.calcsize(AUDIO_HEADER_FORMAT):
+        header = header._replace(**dict(zip(('audio_rate', 'audio_chunk_size', 'audio_sample_count'),
+                                            struct.unpack(AUDIO_HEADER_FORMAT, f.read(struct.calcsize(AUDIO_HEADER_FORMAT))))))
+    return header
+
+
+def read_all_records(path):
+    """Return the header, every record as (offset, size_word, data) in file order, and the frame index."""
+    with open(path, 'rb') as f:
+        header = read_header(f)
+        f.seek(header.header_size)
+        records = []
+        while f.tell() < header.index_offset:
+            offset = f.tell()
+            (size_word,) = struct.unpack('<I', f.read(4))
+            records.append((offset, size_word, f.read(size_word & AGM_SIZE_MASK)))
+        if f.tell() != header.index_offset:
+            raise ValueError('Frame index is not where the header says')
+        index = struct.unpack(f'<{header.frame_count * 2}I', f.read(header.frame_count * 8))
+    return header, records, index
+
+
+def read_records(path):
+    """Return the header and a list of (is_delta, rle_data) frames, checking the frame index as we go."""
+    header, records, index = read_all_records(path)
+    frames = [(offset, size_word, data) for offset, size_word, data in records if not size_word & AGM_AUDIO_FLAG]
+    if len(frames) != header.frame_count:
+        raise ValueError(f'{len(frames)} frame records, header says {header.frame_count}')
+    if list(index[0::2]) != [offset for offset, _, _ in frames] or list(index[1::2]) != [size for _, size, _ in frames]:
+        raise ValueError('Frame index does not match the records')
+    return header, [(bool(size_word & AGM_DELTA_FLAG), data) for _, size_word, data in frames]
+
+
+def read_audio(path):
+    """Return the audio track as signed 8-bit PCM, without the last chunk's padding."""
+    header, records, _ = read_all_records(path)
+    audio = b''.join(data for _, size_word, data in records if size_word & AGM_AUDIO_FLAG)
+    return audio[:header.audio_sample_count]
+
+
+def decode_frames(path):
+    """Yield every frame as width * height bytes of packed RGBA2."""
+    header, records = read_records(path)
+    frame = None
+    for is_delta, data in records:
+        if is_delta and not data and frame is not None:
+            # Repeat of the previous frame
+            yield frame
+            continue
+        pixels = rle_decode(data)
+        if len(pixels) != header.width * header.height:
+            raise ValueError(f'Frame decodes to {len(pixels)} pixels, expected {header.width * header.height}')
+        if is_delta:
+            if frame is None:
+                raise ValueError('Delta frame before the first keyframe')
+            # Zero means unchanged; anything else replaces the pixel
+            frame = bytes(new if new else old for old, new in zip(frame, pixels))
+        else:
+            frame = pixels
+        yield frame
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Time simz_decode_bytes on every tests/images/*.rgba2 file.
+
+Checks each file round-trips unchanged and prints decode throughput.
+Run it against two builds to compare them; results are kept in simz_benchmarks.txt.
+"""
+import glob
+import os
+import time
+import agonutils as au
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+repeats = 20
+
+
+def best_time(fn, data):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    total_bytes = total_time = 0.0
+    print(f"{'File':<36} {'Size':>8} {'SIMZ':>8} {'Decode MB/s':>12}")
+    for path in sorted(glob.glob(os.path.join(tests_dir, 'images', '*.rgba2'))):
+        with open(path, 'rb') as f:
+            data = f.read()
+        encoded = au.simz_encode_bytes(data)
+        if au.simz_decode_bytes(encoded) != data:
+            raise SystemExit(f'{path} did not round-trip')
+        seconds = best_time(au.simz_decode_bytes, encoded)
+        total_bytes += len(data)
+        total_time += seconds
+        print(f'{os.path.basename(path):<36} {len(data):>8} {len(encoded):>8} {len(data) / seconds / 1e6:>12.1f}')
+    print(f"{'All files':<36} {int(total_bytes):>8} {'':>8} {total_bytes / total_time / 1e6:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+import os
+import shutil
+import struct
+import subprocess
+import threading
+import pytest
+import agonutils as au
+import agm_decoder
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+palette_file = os.path.join(tests_dir, '..', 'examples', 'palettes', 'Agon64.gpl')
+
+
+def test_mp4_to_agm_rejects_unknown_method(tmp_path):
+    with pytest.raises(ValueError):
+        au.mp4_to_agm('missing.mp4', str(tmp_path / 'out.agm'), 64, 48, palette_file, 'RGB', 'nope', 3)
+
+
+def test_mp4_to_agm_missing_source(tmp_path):
+    with pytest.raises(IOError):
+        au.mp4_to_agm(str(tmp_path / 'missing.mp4'), str(tmp_path / 'out.agm'), 64, 48, palette_file, 'RGB', 'floyd', 3, workers=2)
+
+
+@pytest.mark.parametrize('options', [
+    {'thread_type': 'fiber'},
+    {'scale_algorithm': 'nearest-ish'},
+    {'decode_threads': -1},
+    {'crop': 'left'},
+    {'crop': (0, 0, 0, 10)},
+    {'target_fps': -1.0},
+])
+def test_mp4_to_agm_rejects_bad_source_options(tmp_path, options):
+    with pytest.raises(ValueError):
+        au.mp4_to_agm('missing.mp4', str(tmp_path / 'out.agm'), 64, 48, palette_file, 'RGB', 'floyd', 3, **options)
+
+
+def write_agm(path, width, height, records):
+    """Write an AGM file from (is_delta, rle_data) records."""
+    body = b''
+    index = []
+    offset = len(agm_decoder.make_header(0, 0, 0, 0))
+    for is_delta, data in records:
+        size_word = len(data) | (agm_decoder.AGM_DELTA_FLAG if is_delta else 0)
+        index += [offset + len(body), size_word]
+        body += struct.pack('<I', size_word) + data
+    with open(path, 'wb') as f:
+        f.write(agm_decoder.make_header(width, height, len(records), offset + len(body), fps=(25, 1), flags=3))
+        f.write(body + struct.pack(f'<{len(index)}I', *index))
+
+
+def test_agm_reader_random_access(tmp_path):
+    agm_file = tmp_path / 'frames.agm'
+    keyframe = bytes([0x83, 0xC5])        # 4 pixels of color 5
+    delta = bytes([0x41, 0x89, 0x40])     # skip 2, color 9, skip 1
+    write_agm(agm_file, 2, 2, [(False, keyframe), (True, delta), (True, bytes([0xBF, 0x40, 0x40, 0x40])), (False, keyframe)])
+    expected = [bytes([0xC5] * 4), bytes([0xC5, 0xC5, 0xC9, 0xC5]), bytes([0xFF, 0xC5, 0xC9, 0xC5]), bytes([0xC5] * 4)]
+    assert list(agm_decoder.decode_frames(agm_file)) == expected
+
+    with au.AgmReader(agm_file) as reader:
+        assert (reader.width, reader.height, len(reader), reader.fps) == (2, 2, 4, 25.0)
+        assert [reader.is_keyframe(i) for i in range(4)] == [True, False, False, True]
+        assert reader.record(1) == delta
+        for i in (2, 0, 3, 1, 2, -1):
+            assert reader[i] == expected[i]
+    with pytest.raises(ValueError):
+        reader[0]
+
+
+def test_agm_reader_repeat_record(tmp_path):
+    agm_file = tmp_path / 'repeat.agm'
+    write_agm(agm_file, 2, 2, [(False, bytes([0x83, 0xC5])), (True, b''), (True, bytes([0x40, 0x89, 0x41])), (True, b'')])
+    expected = [bytes([0xC5] * 4)] * 2 + [bytes([0xC5, 0xC9, 0xC5, 0xC5])] * 2
+    assert list(agm_decoder.decode_frames(agm_file)) == expected
+    with au.AgmReader(agm_file) as reader:
+        assert [reader[i] for i in (3, 1, 2, 0)] == [expected[i] for i in (3, 1, 2, 0)]
+
+
+def test_agm_reader_rejects_delta_first(tmp_path):
+    agm_file = tmp_path / 'delta_first.agm'
+    write_agm(agm_file, 2, 2, [(True, bytes([0x41, 0x89, 0x40])), (True, b''), (False, bytes([0x83, 0xC5]))])
+    with pytest.raises(ValueError):
+        list(agm_decoder.decode_frames(agm_file))
+    with au.AgmReader(agm_file) as reader:
+        # Frames 0 and 1 walk back to a delta with no frame decoded before it, also after a failure
+        for i in (0, 0, 1):
+            with pytest.raises(ValueError):
+                reader[i]
+        assert reader[2] == bytes([0xC5] * 4)
+        with pytest.raises(ValueError):
+            reader[1]
+
+
+def test_agm_reader_rejects_headerless_file(tmp_path):
+    agm_file = tmp_path / 'old.agm'
+    agm_file.write_bytes(struct.pack('<I', 2) + bytes([0x83, 0xC5]) * 30)
+    with pytest.raises(ValueError):
+        au.AgmReader(agm_file)
+
+
+def test_agm_reader_audio(tmp_path):
+    agm_file = tmp_path / 'audio.agm'
+    keyframe = bytes([0x83, 0xC5])
+    chunks = [bytes(range(0, 4)), bytes(range(4, 8)), bytes([8, 9, 0, 0])]
+    header_size = len(agm_decoder.make_header(0, 0, 0, 0, audio=(0, 0, 0)))
+    body = b''
+    index = []
+    for chunk, frame in zip(chunks, [keyframe, keyframe, None]):
+        body += struct.pack('<I', len(chunk) | agm_decoder.AGM_AUDIO_FLAG) + chunk
+        if frame:
+            index += [header_size + len(body), len(frame)]
+            body += struct.pack('<I', len(frame)) + frame
+    agm_file.write_bytes(agm_decoder.make_header(2, 2, 2, header_size + len(body), fps=(25, 1), flags=5, audio=(8000, 4, 10))
+                         + body + struct.pack('<4I', *index))
+    with au.AgmReader(agm_file) as reader:
+        assert (reader.version, reader.audio_rate, reader.audio_chunk_size) == (2, 8000, 4)
+        assert reader.audio() == bytes(range(10))
+        assert [reader[0], reader[1]] == [bytes([0xC5] * 4)] * 2
+    assert agm_decoder.read_audio(agm_file) == bytes(range(10))
+
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='needs the ffmpeg command to make a test video')
+
+
+def make_test_video(tmp_path):
+    """Write a 3 second, 10 fps, 128x96 test pattern video."""
+    src_file = str(tmp_path / 'testsrc.mp4')
+    subprocess.run(['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc=size=128x96:rate=10', '-t', '3',
+                    '-pix_fmt', 'yuv420p', src_file], check=True)
+    return src_file
+
+
+@needs_ffmpeg
+def test_delta_frames_decode_like_keyframes(tmp_path):
+    src_file = make_test_video(tmp_path)
+    keyframes_file = str(tmp_path / 'keyframes.agm')
+    delta_file = str(tmp_path / 'delta.agm')
+    keyframe_stats = au.mp4_to_agm(src_file, keyframes_file, 64, 48, palette_file, 'RGB', 'floyd', 4)
+    delta_stats = au.mp4_to_agm(src_file, delta_file, 64, 48, palette_file, 'RGB', 'floyd', 4, keyframe_interval=10)
+    assert keyframe_stats['keyframes'] == keyframe_stats['frames'] == 30
+    assert delta_stats['keyframes'] >= 3
+    assert delta_stats['bytes_written'] < keyframe_stats['bytes_written']
+    frames = list(agm_decoder.decode_frames(keyframes_file))
+    assert list(agm_decoder.decode_frames(delta_file)) == frames
+    with au.AgmReader(delta_file) as reader:
+        assert (reader.width, reader.height, reader.fps, reader.palette_id) == (64, 48, 10.0, 64)
+        assert [reader[i] for i in reversed(range(len(reader)))] == frames[::-1]
+
+
+def test_iter_video_frames_missing_source(tmp_path):
+    with pytest.raises(IOError):
+        au.iter_video_frames(str(tmp_path / 'missing.mp4'), 64, 48, palette_file, 'floyd', 3)
+    with pytest.raises(ValueError):
+        au.iter_video_frames(str(tmp_path / 'missing.mp4'), 64, 48, palette_file, 'nope', 3)
+
+
+@needs_ffmpeg
+def test_iter_video_frames_matches_agm(tmp_path):
+    src_file = make_test_video(tmp_path)
+    agm_file = str(tmp_path / 'movie.agm')
+    au.mp4_to_agm(src_file, agm_file, 64, 48, palette_file, 'RGB', 'floyd', 4)
+    frames = list(au.iter_video_frames(src_file, 64, 48, palette_file, 'floyd', 4, workers=2, prefetch=2))
+    assert frames == list(agm_decoder.decode_frames(agm_file))
+    with au.iter_video_frames(src_file, 64, 48, palette_file, 'floyd', 4) as frame_iter:
+        assert next(frame_iter) == frames[0]
+    with pytest.raises(StopIteration):
+        next(frame_iter)
+
+
+@needs_ffmpeg
+def test_iter_video_frames_close_from_another_thread(tmp_path):
+    src_file = make_test_video(tmp_path)
+    for delay in (0, 0.01, 0.05):
+        frame_iter = au.iter_video_frames(src_file, 64, 48, palette_file, 'floyd', 4, prefetch=1)
+        closer = threading.Timer(delay, frame_iter.close)
+        closer.start()
+        # Ends with StopIteration whether close() or the last frame comes first
+        assert len(list(frame_iter)) <= 30
+        closer.join()
+        frame_iter.close()
+
+
+def test_mp4_to_agm_rejects_bad_scene_cut_threshold(tmp_path):
+    with pytest.raises(ValueError):
+        au.mp4_to_agm('missing.mp4', str(tmp_path / 'out.agm'), 64, 48, palette_file, 'RGB', 'floyd', 3, scene_cut_threshold=1.5)
+
+
+@needs_ffmpeg
+def test_scene_cut_starts_keyframe(tmp_path):
+    src_file = str(tmp_path / 'cut.mp4')
+    subprocess.run(['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i',
+                    'testsrc=size=128x96:rate=10:duration=1.5[a];smptebars=size=128x96:rate=10:duration=1.5[b];[a][b]concat',
+                    '-pix_fmt', 'yuv420p', src_file], check=True)
+    agm_file = str(tmp_path / 'cut.agm')
+    stats = au.mp4_to_agm(src_file, agm_file, 64, 48, palette_file, 'RGB', 'floyd', 4, keyframe_interval=30, scene_cut_threshold=0.5)
+    assert len(stats['change_ratios']) == stats['frames'] == 30
+    assert stats['change_ratios'][15] >= 0.5
+    assert stats['scene_cuts'] >= 1
+    with au.AgmReader(agm_file) as reader:
+        assert reader.is_keyframe(15)
+
+
+@needs_ffmpeg
+def test_audio_chunks_interleaved(tmp_path):
+    src_file = str(tmp_path / 'tone.mp4')
+    subprocess.run(['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc=size=128x96:rate=10', '-f', 'lavfi',
+                    '-i', 'sine=frequency=440:sample_rate=44100', '-t', '3', '-pix_fmt', 'yuv420p', '-shortest', src_file], check=True)
+    agm_file = str(tmp_path / 'tone.agm')
+    stats = au.mp4_to_agm(src_file, agm_file, 64, 48, palette_file, 'RGB', 'floyd', 4, audio_rate=16384)
+    assert abs(stats['audio_samples'] - 3 * 16384) < 16384 // 5
+    header, records, _ = agm_decoder.read_all_records(agm_file)
+    assert header.audio_chunk_size == 16384 // 10 + 1
+    # Every frame is preceded by the audio chunks that start before it ends
+    chunks = frames = 0
+    for _, size_word, _ in records:
+        if size_word & agm_decoder.AGM_AUDIO_FLAG:
+            chunks += 1
+        else:
+            frames += 1
+            assert chunks * header.audio_chunk_size >= min(frames * 16384 // 10, header.audio_sample_count)
+    with au.AgmReader(agm_file) as reader:
+        assert reader.audio_rate == 16384
+        assert reader.audio() == agm_decoder.read_audio(agm_file)
+        assert len(reader) == 30
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize('keyframe_interval', [30, 0])
+def test_target_fps_and_repeats(tmp_path, keyframe_interval):
+    src_file = str(tmp_path / 'still.mp4')
+    # One second of test pattern at 30 fps, then a second of a still color
+    subprocess.run(['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i',
+                    'testsrc=size=128x96:rate=30:duration=1[a];color=c=blue:size=128x96:rate=30:duration=1[b];[a][b]concat',
+                    '-pix_fmt', 'yuv420p', src_file], check=True)
+    agm_file = str(tmp_path / 'still.agm')
+    stats = au.mp4_to_agm(src_file, agm_file, 64, 48, palette_file, 'RGB', 'floyd', 4, keyframe_interval=keyframe_interval, target_fps=10)
+    assert (stats['frames'], stats['frames_dropped']) == (20, 40)
+    # Repeats don't depend on difference frames being enabled
+    assert stats['repeats'] >= 8
+    frames = list(agm_decoder.decode_frames(agm_file))
+    assert len(frames) == 20 and len(set(frames[11:])) == 1
+    with au.AgmReader(agm_file) as reader:
+        assert reader.fps == 10.0
+        assert reader.flags & 2
+        assert reader.record(19) == b''
+        assert [reader[i] for i in range(len(reader))] == frames
+
+
+def test_mp4_to_agm_rejects_uncallable_progress(tmp_path):
+    with pytest.raises(TypeError):
+        au.mp4_to_agm('missing.mp4', str(tmp_path / 'out.agm'), 64, 48, palette_file, 'RGB', 'floyd', 3, progress=3)
+
+
+@needs_ffmpeg
+def test_progress_callback_and_stage_times(tmp_path):
+    src_file = make_test_video(tmp_path)
+    agm_file = str(tmp_path / 'movie.agm')
+    seen = []
+    stats = au.mp4_to_agm(src_file, agm_file, 64, 48, palette_file, 'RGB', 'floyd', 4, progress=seen.append)
+    assert [s['frames'] for s in seen] == list(range(1, 31))
+    for stage in ('decode', 'scale', 'convert', 'lookback', 'rle', 'write'):
+        assert stats[f'{stage}_time'] >= 0.0
+    assert stats['convert_time'] > 0.0
+    assert stats['compression_ratio'] == pytest.approx(30 * 64 * 48 / stats['bytes_written'])
+    assert stats['frames_per_second'] == pytest.approx(30 / stats['elapsed_time'])
+
+    class Stop(Exception):
+        pass
+
+    def stop_at_ten(progress):
+        if progress['frames'] == 10:
+            raise Stop
+    with pytest.raises(Stop):
+        au.mp4_to_agm(src_file, agm_file, 64, 48, palette_file, 'RGB', 'floyd', 4, progress=stop_at_ten)
@@ -1,19 +1,16 @@
 #!/usr/bin/env python3
-import os
 import subprocess
 import math
+import agonutils as au
 
 # ----- Configuration -----
 source_file = '/home/smith/Agon/mystuff/AgonJukebox/tgt/music/Singles/Barracuda.wav'
-full_compressed_file = source_file + '.szip'
-tmp_chunk_file = 'tmp_chunk.raw'
-tmp_compressed_file = 'tmp_chunk.szip'
 wav_header_size = 44  # Standard WAV header size; adjust if needed
 
 # ----- Full File Compression -----
 print("Compressing full file...")
-subprocess.run(['szip', '-b41o3', source_file, full_compressed_file], check=True)
-full_size = os.path.getsize(full_compressed_file)
+with open(source_file, 'rb') as f:
+    full_size = len(au.szip_compress(f.read(), blocksize=41, order=3))
 print(f"Full file compressed size: {full_size} bytes")
 
 # ----- Get Audio Info via ffprobe -----
@@ -53,17 +50,9 @@ for i in range(num_chunks):
     end = start + bytes_per_second
     chunk = audio_data[start:end]
     
-    # Write the chunk to a temporary file
-    with open(tmp_chunk_file, 'wb') as f_chunk:
-        f_chunk.write(chunk)
-    
-    # Compress the chunk using szip with the correct syntax
-    subprocess.run(['szip', '-b41o3', tmp_chunk_file, tmp_compressed_file], check=True)
-    chunk_compressed_size = os.path.getsize(tmp_compressed_file)
+    # Compress the chunk in memory, as szip -b41o3 would
+    chunk_compressed_size = len(au.szip_compress(chunk, blocksize=41, order=3))
     print(f"Chunk {i+1}: Original {len(chunk)} bytes, Compressed {chunk_compressed_size} bytes")
     total_chunk_compressed += chunk_compressed_size
 
-    # Cleanup temporary compressed file
-    os.remove(tmp_compressed_file)
-
 print(f"Total compressed size (chunked): {total_chunk_compressed} bytes")
@@ -0,0 +1,57 @@
+import os
+import pytest
+import agonutils as au
+from PIL import Image
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+images_dir = os.path.join(tests_dir, 'images')
+palette_file = os.path.join(tests_dir, '..', 'examples', 'palettes', 'Agon64.gpl')
+
+
+def test_batch_convert_matches_single_conversions(tmp_path):
+    src_file = os.path.join(images_dir, 'rainbow_240x180.png')
+    png_dir = tmp_path / 'png'
+    rgba2_dir = tmp_path / 'rgba2'
+    png_dir.mkdir()
+    rgba2_dir.mkdir()
+
+    stats = au.batch_convert([src_file], {'png': str(png_dir), 'rgba2': str(rgba2_dir)}, palette_file, 'floyd', workers=2)
+
+    assert len(stats) == 1
+    assert (stats[0]['width'], stats[0]['height']) == (240, 180)
+    assert stats[0]['sizes']['rgba2'] == 240 * 180
+    assert stats[0]['sizes']['png'] == os.path.getsize(stats[0]['outputs']['png'])
+    with open(stats[0]['outputs']['rgba2'], 'rb') as f, open(os.path.join(images_dir, 'rainbow_240x180_floyd.rgba2'), 'rb') as ref:
+        assert f.read() == ref.read()
+    converted = Image.open(stats[0]['outputs']['png']).convert('RGBA')
+    reference = Image.open(os.path.join(images_dir, 'rainbow_240x180_floyd.png')).convert('RGBA')
+    assert converted.tobytes() == reference.tobytes()
+
+
+def test_batch_convert_many_files(tmp_path):
+    src_files = [os.path.join(images_dir, name) for name in sorted(os.listdir(images_dir))
+                 if name.endswith('.png') and '_' in name]
+    stats = au.batch_convert(src_files, str(tmp_path), au.Palette(palette_file), 'RGB', outputs=('rgba2',), workers=4)
+
+    assert [s['src'] for s in stats] == src_files
+    for s in stats:
+        assert list(s['outputs']) == ['rgba2']
+        assert os.path.getsize(s['outputs']['rgba2']) == s['width'] * s['height']
+
+
+def test_batch_convert_rejects_shared_outputs(tmp_path):
+    src_file = os.path.join(images_dir, 'rainbow_240x180.png')
+    for name in ('a', 'b'):
+        (tmp_path / name).mkdir()
+        Image.open(src_file).save(tmp_path / name / 'x.png')
+    out_dir = tmp_path / 'o'
+    out_dir.mkdir()
+    with pytest.raises(ValueError):
+        au.batch_convert([str(tmp_path / 'a' / 'x.png'), str(tmp_path / 'b' / 'x.png')], str(out_dir), palette_file, 'RGB')
+    assert list(out_dir.iterdir()) == []
+
+
+def test_batch_convert_checks_method_first(tmp_path):
+    # The missing source would raise IOError if it were read before the method was checked
+    with pytest.raises(ValueError):
+        au.batch_convert([str(tmp_path / 'missing.png')], str(tmp_path), palette_file, 'nearest')
@@ -0,0 +1,62 @@
+import os
+import agonutils as au
+from PIL import Image
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+images_dir = os.path.join(tests_dir, 'images')
+palette_file = os.path.join(tests_dir, '..', 'examples', 'palettes', 'Agon64.gpl')
+
+
+def load_rgba(filename):
+    return Image.open(os.path.join(images_dir, filename)).convert('RGBA')
+
+
+def test_convert_rgba_buffer_matches_file_conversion():
+    src_img = load_rgba('rainbow_240x180.png')
+    width, height = src_img.size
+    palette = au.Palette(palette_file)
+    for method in ('RGB', 'HSV', 'bayer', 'floyd'):
+        converted = au.convert_rgba_buffer(memoryview(src_img.tobytes()), width, height, palette, method)
+        assert converted == load_rgba(f'rainbow_240x180_{method}.png').tobytes()
+
+
+def test_rgba_to_rgba2_buffer_matches_file_conversion():
+    src_img = load_rgba('rainbow_240x180.png')
+    width, height = src_img.size
+    rgba2 = au.rgba_to_rgba2_buffer(src_img.tobytes(), width, height, palette_file, 'floyd')
+    with open(os.path.join(images_dir, 'rainbow_240x180_floyd.rgba2'), 'rb') as f:
+        assert rgba2 == f.read()
+
+
+def test_buffer_stride():
+    width, height, stride = 2, 2, 12
+    padded = bytes([255, 0, 0, 255, 0, 255, 0, 255, 9, 9, 9, 9,
+                    0, 0, 255, 255, 0, 0, 0, 0, 9, 9, 9, 9])
+    assert au.rgba_to_rgba2_buffer(padded, width, height, stride=stride) == bytes([0xC3, 0xCC, 0xF0, 0x00])
+
+
+def test_hsv_lookup_reused_across_images():
+    palette = au.Palette(palette_file)
+    for size in ('240x180', '320x240', '240x180'):
+        src_img = load_rgba(f'rainbow_{size}.png')
+        width, height = src_img.size
+        converted = au.convert_rgba_buffer(src_img.tobytes(), width, height, palette, 'HSV')
+        assert converted == load_rgba(f'rainbow_{size}_HSV.png').tobytes()
+
+
+def test_pack_unpack_rgba2():
+    all_packed = bytes(range(256))
+    expanded = au.unpack_rgba2(bytearray(all_packed))
+    levels = (0, 85, 170, 255)
+    assert expanded == bytes(levels[(p >> shift) & 3] for p in range(256) for shift in (0, 2, 4, 6))
+    assert au.pack_rgba2(memoryview(expanded)) == all_packed
+
+    with open(os.path.join(images_dir, 'rainbow_240x180_floyd.rgba2'), 'rb') as f:
+        rgba2 = f.read()
+    assert au.unpack_rgba2(rgba2) == load_rgba('rainbow_240x180_floyd.png').tobytes()
+
+
+def test_rgba2_to_img(tmp_path):
+    tgt_file = str(tmp_path / 'floyd.png')
+    au.rgba2_to_img(os.path.join(images_dir, 'rainbow_240x180_floyd.rgba2'), tgt_file, 240, 180)
+    assert Image.open(tgt_file).convert('RGBA').tobytes() == load_rgba('rainbow_240x180_floyd.png').tobytes()
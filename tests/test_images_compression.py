@@ -2,6 +2,7 @@
 import os
 import csv
 import subprocess
+import agonutils as au
 
 # ----- Helper Functions -----
 
@@ -17,20 +18,14 @@ def compress_with_simz(input_file):
     return size
 
 def compress_with_szip_b41o3(input_file):
-    """Compress using szip, writing output to a temp file."""
-    temp_file = "temp.szip"
-    subprocess.run(["szip", "-b41o3", input_file, temp_file], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    size = os.path.getsize(temp_file)
-    os.remove(temp_file)
-    return size
+    """Compress using agonutils' built-in szip (same output as szip -b41o3)."""
+    with open(input_file, "rb") as f:
+        return len(au.szip_compress(f.read(), blocksize=41, order=3))
 
 def compress_with_szip_b41o0(input_file):
-    """Compress using szip, writing output to a temp file."""
-    temp_file = "temp.szip"
-    subprocess.run(["szip", "-b41o0", input_file, temp_file], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    size = os.path.getsize(temp_file)
-    os.remove(temp_file)
-    return size
+    """Compress using agonutils' built-in szip (same output as szip -b41o0)."""
+    with open(input_file, "rb") as f:
+        return len(au.szip_compress(f.read(), blocksize=41, order=0))
 
 def compress_with_tvc(input_file):
     """Compress using tvc compression, writing output to a temp file."""
@@ -49,14 +44,11 @@ def compress_with_rle2(input_file):
     return size
 
 def compress_with_srle2(input_file):
-    """Compress using rlecompress and szip, writing output to a temp file."""
+    """Compress using rlecompress and szip, writing the rle2 output to a temp file."""
     rle2_file = "temp.rle2"
-    srle2_file = "temp.srle2"
     subprocess.run(["rle2", "-c", input_file, rle2_file], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    subprocess.run(["szip", "-b41o3", rle2_file, srle2_file], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    size = os.path.getsize(srle2_file)
+    size = compress_with_szip_b41o3(rle2_file)
     os.remove(rle2_file)
-    os.remove(srle2_file)
     return size
 
 def compress_with_mskz(input_file):
@@ -0,0 +1,61 @@
+import os
+import pytest
+import agonutils as au
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+images_dir = os.path.join(tests_dir, 'images')
+palette_file = os.path.join(tests_dir, '..', 'examples', 'palettes', 'Agon64.gpl')
+
+
+def test_palette_from_gpl():
+    palette = au.Palette(palette_file)
+    assert len(palette) == 64
+    assert palette.colors[1] == (170, 0, 0)
+    assert palette.names[1] == 'Dark red'
+
+
+def test_palette_from_list():
+    palette = au.Palette([(0, 0, 0, 'Black'), (255, 255, 255)])
+    assert palette.colors == [(0, 0, 0), (255, 255, 255)]
+    assert palette.names == ['Black', '']
+
+
+def test_palette_object_reused_for_conversions(tmp_path):
+    palette = au.Palette(palette_file)
+    src_file = os.path.join(images_dir, 'rainbow_240x180.png')
+    for method in ('RGB', 'HSV', 'bayer', 'floyd'):
+        tgt_file = str(tmp_path / f'{method}.rgba2')
+        au.img_to_rgba2(src_file, tgt_file, palette, method)
+        with open(tgt_file, 'rb') as f, open(os.path.join(images_dir, f'rainbow_240x180_{method}.rgba2'), 'rb') as ref:
+            assert f.read() == ref.read()
+
+
+def test_palette_rejects_out_of_range_components():
+    with pytest.raises(ValueError):
+        au.Palette([(300, -1, 256)])
+    with pytest.raises(ValueError):
+        au.Palette([(0, 0, 0), (0, 256, 0)])
+
+
+def test_palette_is_immutable():
+    palette = au.Palette([(0, 0, 0), (255, 255, 255)])
+    with pytest.raises(TypeError):
+        palette.__init__([(1, 2, 3)])
+    assert palette.colors == [(0, 0, 0), (255, 255, 255)]
+
+
+def test_uninitialised_palette_rejected():
+    palette = au.Palette.__new__(au.Palette)
+    with pytest.raises(ValueError):
+        au.convert_rgba_buffer(bytes(4 * 16), 4, 4, palette, 'RGB')
+    palette.__init__([(0, 0, 0)])
+    assert len(au.convert_rgba_buffer(bytes(4 * 16), 4, 4, palette, 'RGB')) == 4 * 16
+
+
+@pytest.mark.parametrize('convert', [au.convert_to_palette, au.img_to_rgba2])
+def test_bad_transparent_color_rejected_before_converting(tmp_path, convert):
+    src_file = os.path.join(images_dir, 'rainbow_240x180.png')
+    tgt_file = tmp_path / 'out'
+    with pytest.raises(TypeError):
+        convert(src_file, str(tgt_file), palette_file, 'RGB', transparent_color=(1, 2))
+    assert not tgt_file.exists()
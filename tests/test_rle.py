@@ -0,0 +1,68 @@
+import random
+import pytest
+import agonutils as au
+from agm_decoder import rle_decode as reference_rle_decode
+
+
+def make_pixels(count, seed=1):
+    # Runs of opaque colours and transparent pixels, as the RLE decoder returns them
+    rng = random.Random(seed)
+    pixels = bytearray()
+    while len(pixels) < count:
+        pixel = rng.choice([0, 0xC0 | rng.getrandbits(6)])
+        pixels += bytes([pixel]) * rng.choice([1, 1, 2, 5, 64, 70])
+    return bytes(pixels[:count])
+
+
+def test_rle_round_trip():
+    for pixels in (b'', b'\0', b'\xc5', make_pixels(1000), make_pixels(50000, seed=2)):
+        encoded = au.rle_encode(pixels)
+        assert reference_rle_decode(encoded) == pixels
+        assert au.rle_decode(encoded) == pixels
+        assert au.rle_decode(encoded, len(pixels)) == pixels
+
+
+def test_rle_buffers():
+    pixels = make_pixels(4000)
+    encoded = au.rle_encode(pixels)
+    assert au.rle_encode(bytearray(pixels)) == encoded
+    assert au.rle_encode(memoryview(pixels)) == encoded
+    assert au.rle_decode(memoryview(encoded)) == pixels
+
+
+def test_rle_into():
+    pixels = make_pixels(4000)
+    encoded = au.rle_encode(pixels)
+    out = bytearray(2 * len(pixels))
+    assert au.rle_encode(pixels, into=out) == len(encoded)
+    assert out[:len(encoded)] == encoded
+
+    frame = bytearray(len(pixels))
+    assert au.rle_decode(encoded, into=frame) == len(pixels)
+    assert frame == pixels
+    assert au.rle_decode(encoded, len(pixels), into=memoryview(frame)) == len(pixels)
+
+    with pytest.raises(ValueError):
+        au.rle_encode(pixels, into=bytearray(len(pixels)))
+    with pytest.raises(ValueError):
+        au.rle_decode(encoded, into=bytearray(len(pixels) - 1))
+    with pytest.raises(TypeError):
+        au.rle_decode(encoded, into=bytes(len(pixels)))
+
+
+def test_rle_decode_rejects_bad_data():
+    encoded = au.rle_encode(make_pixels(1000))
+    with pytest.raises(ValueError):
+        au.rle_decode(b'\x40\x00')
+    with pytest.raises(ValueError):
+        au.rle_decode(encoded, 999)
+    with pytest.raises(ValueError):
+        au.rle_decode(encoded, 1001)
+    with pytest.raises(ValueError):
+        au.rle_decode(encoded, -1)
+    # More than 64 pixels per input byte is rejected before allocating
+    with pytest.raises(ValueError):
+        au.rle_decode(b'', 10**15)
+    with pytest.raises(ValueError):
+        au.rle_decode(b'\x7f', 65)
+    assert au.rle_decode(b'\x7f', 64) == bytes(64)
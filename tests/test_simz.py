@@ -0,0 +1,59 @@
+import random
+import zlib
+import pytest
+import agonutils as au
+
+
+def test_simz_bytes_round_trip():
+    rng = random.Random(1)
+    for data in (b'', b'a', bytes(range(256)) * 300, bytes(rng.getrandbits(8) for _ in range(150000)), b'\0' * 130000):
+        encoded = au.simz_encode_bytes(data)
+        assert encoded[:6] == b'SIMZ\x00\x09'
+        assert int.from_bytes(encoded[6:10], 'little') == len(data)
+        assert au.simz_decode_bytes(encoded) == data
+
+
+def test_simz_output_unchanged():
+    # Output of the original stdio-based coder, which the simz tool still reads
+    encoded = au.simz_encode_bytes(b'ab' * 10)
+    assert (len(encoded), zlib.crc32(encoded)) == (529, 763737716)
+
+
+def test_simz_files(tmp_path):
+    data = bytes(range(200)) * 1000
+    (tmp_path / 'data').write_bytes(data)
+    au.simz_encode(str(tmp_path / 'data'), str(tmp_path / 'data.simz'))
+    assert (tmp_path / 'data.simz').read_bytes() == au.simz_encode_bytes(data)
+    au.simz_decode(str(tmp_path / 'data.simz'), str(tmp_path / 'data.out'))
+    assert (tmp_path / 'data.out').read_bytes() == data
+    with pytest.raises(IOError):
+        au.simz_encode(str(tmp_path / 'missing'), str(tmp_path / 'out'))
+    with pytest.raises(ValueError):
+        au.simz_decode(str(tmp_path / 'data'), str(tmp_path / 'out'))
+
+
+@pytest.mark.parametrize('data', [b'', b'SIMZ', b'ZMIS\x00\x09\x01\x00\x00\x00\x00', b'SIMZ\x00\x08\x01\x00\x00\x00\x00'])
+def test_simz_decode_rejects_bad_data(data):
+    with pytest.raises(ValueError):
+        au.simz_decode_bytes(data)
+
+
+def test_simz_independent_blocks_round_trip():
+    rng = random.Random(2)
+    for data in (b'', b'a', bytes(rng.getrandbits(3) for _ in range(200000)), b'\0' * 120000):
+        encoded = au.simz_encode_bytes(data, independent_blocks=True, threads=1)
+        assert encoded[:6] == b'SIMZ\x01\x00'
+        assert int.from_bytes(encoded[6:10], 'little') == len(data)
+        assert au.simz_encode_bytes(data, independent_blocks=True, threads=4) == encoded
+        for threads in (1, 3, 0):
+            assert au.simz_decode_bytes(encoded, threads=threads) == data
+
+
+def test_simz_decode_rejects_bad_block_table():
+    encoded = bytearray(au.simz_encode_bytes(bytes(range(256)) * 500, independent_blocks=True))
+    # Point the first block's stream past the end of the data
+    encoded[18:22] = (len(encoded)).to_bytes(4, 'little')
+    with pytest.raises(ValueError):
+        au.simz_decode_bytes(bytes(encoded))
+    with pytest.raises(ValueError):
+        au.simz_decode_bytes(bytes(encoded[:20]))
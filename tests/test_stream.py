@@ -0,0 +1,28 @@
+import os
+import pytest
+import agonutils as au
+from PIL import Image
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+images_dir = os.path.join(tests_dir, 'images')
+palette_file = os.path.join(tests_dir, '..', 'examples', 'palettes', 'Agon64.gpl')
+
+
+def test_stream_convert_matches_whole_frame(tmp_path):
+    src_file = os.path.join(images_dir, 'rainbow_320x240.png')
+    palette = au.Palette(palette_file)
+    for method in ('RGB', 'HSV', 'bayer'):
+        png_file = str(tmp_path / f'{method}.png')
+        rgba2_file = str(tmp_path / f'{method}.rgba2')
+        au.stream_convert(src_file, png_file, palette, method)
+        au.stream_convert(src_file, rgba2_file, palette, method, output='rgba2')
+
+        reference = Image.open(os.path.join(images_dir, f'rainbow_320x240_{method}.png')).convert('RGBA')
+        assert Image.open(png_file).convert('RGBA').tobytes() == reference.tobytes()
+        with open(rgba2_file, 'rb') as f, open(os.path.join(images_dir, f'rainbow_320x240_{method}.rgba2'), 'rb') as ref:
+            assert f.read() == ref.read()
+
+
+def test_stream_convert_rejects_error_diffusion(tmp_path):
+    with pytest.raises(ValueError):
+        au.stream_convert(os.path.join(images_dir, 'rainbow_320x240.png'), str(tmp_path / 'out.png'), palette_file, 'floyd')
@@ -0,0 +1,48 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import agonutils as au
+from PIL import Image
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+images_dir = os.path.join(tests_dir, 'images')
+palette_file = os.path.join(tests_dir, '..', 'examples', 'palettes', 'Agon64.gpl')
+
+
+def read_rgba2(method):
+    with open(os.path.join(images_dir, f'rainbow_240x180_{method}.rgba2'), 'rb') as f:
+        return f.read()
+
+
+def test_threaded_methods_match_serial():
+    src_img = Image.open(os.path.join(images_dir, 'rainbow_240x180.png')).convert('RGBA')
+    width, height = src_img.size
+    palette = au.Palette(palette_file)
+    for method in ('RGB', 'HSV', 'bayer', 'floyd'):
+        rgba2 = au.rgba_to_rgba2_buffer(src_img.tobytes(), width, height, palette, method, threads=3)
+        assert rgba2 == read_rgba2(method)
+
+
+def test_shared_palette_across_thread_pool():
+    src_img = Image.open(os.path.join(images_dir, 'rainbow_240x180.png')).convert('RGBA')
+    width, height = src_img.size
+    data = src_img.tobytes()
+    palette = au.Palette(palette_file)
+    methods = ['RGB', 'HSV', 'bayer', 'floyd'] * 2
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda m: au.rgba_to_rgba2_buffer(data, width, height, palette, m), methods))
+    for method, rgba2 in zip(methods, results):
+        assert rgba2 == read_rgba2(method)
+
+
+def test_serpentine_dithering():
+    src_img = Image.open(os.path.join(images_dir, 'rainbow_240x180.png')).convert('RGBA')
+    width, height = src_img.size
+    palette = au.Palette(palette_file)
+    for method in ('floyd_serpentine', 'atkinson_serpentine'):
+        # Serpentine scans run serially whatever the thread count
+        rgba2 = au.rgba_to_rgba2_buffer(src_img.tobytes(), width, height, palette, method, threads=4)
+        assert rgba2 == read_rgba2(method)
+        serpentine = au.convert_rgba_buffer(src_img.tobytes(), width, height, palette, method)
+        with Image.open(os.path.join(images_dir, f'rainbow_240x180_{method}.png')) as ref:
+            assert serpentine == ref.convert('RGBA').tobytes()
+    assert read_rgba2('floyd_serpentine') != read_rgba2('floyd')